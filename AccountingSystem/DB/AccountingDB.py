@@ -527,11 +527,14 @@ class AccountingDB(DB):
     if not retVal['OK']:
       return retVal
     connection = retVal['Value']
-    self.log.info("Value %s for key %s didn't exist, inserting" % (keyValue, keyName))
-    retVal = self.insertFields(keyTable, ['id', 'value'], [0, keyValue], connection)
-    if not retVal['OK'] and retVal['Message'].find("Duplicate key") == -1:
-      return retVal
-    result = self.__getIdForKeyValue(typeName, keyName, keyValue, connection)
+    try:
+      self.log.info("Value %s for key %s didn't exist, inserting" % (keyValue, keyName))
+      retVal = self.insertFields(keyTable, ['id', 'value'], [0, keyValue], connection)
+      if not retVal['OK'] and retVal['Message'].find("Duplicate key") == -1:
+        return retVal
+      result = self.__getIdForKeyValue(typeName, keyName, keyValue, connection)
+    finally:
+      self._releaseConnection()
     if not result['OK']:
       return result
     keyCache[keyValue] = result['Value']
@@ -692,7 +695,7 @@ class AccountingDB(DB):
         return retVal
       return self.__commitTransaction(connObj)
     finally:
-      connObj.close()
+      self._releaseConnection()
 
   def deleteRecord(self, typeName, startTime, endTime, valuesList):
     """
@@ -743,27 +746,32 @@ class AccountingDB(DB):
     if not retVal['OK']:
       return retVal
     connObj = retVal['Value']
-    retVal = self.__startTransaction(connObj)
-    if not retVal['OK']:
-      return retVal
-    retVal = self._update("DELETE FROM `%s` WHERE %s" % (mainTable, " AND ".join(sqlCond)),
-                          conn=connObj)
-    if not retVal['OK']:
-      return retVal
-    numInsertions = retVal['Value']
-    # Deleted from type, now the buckets
-    # HACK: One more record to split in the buckets to be able to count total entries
-    if numInsertions == 0:
-      return S_OK(0)
-    sqlValues.append(1)
-    retVal = self.__deleteFromBuckets(typeName, startTime, endTime, sqlValues, numInsertions, connObj=connObj)
-    if not retVal['OK']:
-      self.__rollbackTransaction(connObj)
-      return retVal
-    retVal = self.__commitTransaction(connObj)
-    if not retVal['OK']:
-      self.__rollbackTransaction(connObj)
-      return retVal
+    try:
+      retVal = self.__startTransaction(connObj)
+      if not retVal['OK']:
+        return retVal
+      retVal = self._update("DELETE FROM `%s` WHERE %s" % (mainTable, " AND ".join(sqlCond)),
+                            conn=connObj)
+      if not retVal['OK']:
+        self.__rollbackTransaction(connObj)
+        return retVal
+      numInsertions = retVal['Value']
+      # Deleted from type, now the buckets
+      # HACK: One more record to split in the buckets to be able to count total entries
+      if numInsertions == 0:
+        self.__rollbackTransaction(connObj)
+        return S_OK(0)
+      sqlValues.append(1)
+      retVal = self.__deleteFromBuckets(typeName, startTime, endTime, sqlValues, numInsertions, connObj=connObj)
+      if not retVal['OK']:
+        self.__rollbackTransaction(connObj)
+        return retVal
+      retVal = self.__commitTransaction(connObj)
+      if not retVal['OK']:
+        self.__rollbackTransaction(connObj)
+        return retVal
+    finally:
+      self._releaseConnection()
     return S_OK(numInsertions)
 
   def __splitInBuckets(self, typeName, startTime, endTime, valuesList, connObj=False):
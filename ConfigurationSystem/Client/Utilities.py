@@ -509,8 +509,8 @@ def getDBParameters(fullname):
   defaultQueueSize is the QueueSize to return if the option is not found in the
   CS
 
-  Returns a dictionary with the keys: 'host', 'port', 'user', 'password',
-  'db' and 'queueSize'
+  Returns a dictionary with the keys: 'Host', 'Port', 'User', 'Password',
+  'DBName', 'MaxConnections' and 'ConnectionWaitTimeout'
   """
 
   cs_path = getDatabaseSection(fullname)
@@ -567,6 +567,12 @@ def getDBParameters(fullname):
   dbName = result['Value']
   parameters['DBName'] = dbName
 
+  # Optional bounded connection pool, 0 means one connection per thread. There is no common
+  # value: the databases keeping connections with _getConnection() must not be bounded blindly
+  for option, default in (('MaxConnections', 0), ('ConnectionWaitTimeout', 30)):
+    result = gConfig.getOption(cs_path + '/' + option)
+    parameters[option] = int(result['Value']) if result['OK'] else default
+
   return S_OK(parameters)
 
 
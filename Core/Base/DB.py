@@ -36,7 +36,9 @@ class DB(MySQL):
                              passwd=self.dbPass,
                              dbName=self.dbName,
                              port=self.dbPort,
-                             debug=debug)
+                             debug=debug,
+                             maxConnections=dbParameters.get('MaxConnections', 0),
+                             connectionWaitTimeout=dbParameters.get('ConnectionWaitTimeout', 30))
 
     if not self._connected:
       raise RuntimeError("Can not connect to DB '%s', exiting..." % self.dbName)
@@ -113,6 +113,8 @@ class RequestHandler(object):
     :type proposalTuple: tuple
     :param proposalTuple: Type of action to execute. First position of the tuple must be the type
                         of action to execute. The second position is the action itself.
+
+    :return: S_OK([result of sending the response, execution time, True if the action returned S_OK])
     """
     actionTuple = proposalTuple[1]
     gLogger.debug("Executing %s:%s action" % tuple(actionTuple))
@@ -137,9 +139,10 @@ class RequestHandler(object):
       retVal = S_ERROR(message)
     elapsedTime = time.time() - startTime
     self.__logRemoteQueryResponse(retVal, elapsedTime)
+    actionOK = retVal['OK']
     result = self.__trPool.send(self.__trid, retVal)  # this will delete the value from the S_OK(value)
     del retVal
-    return S_OK([result, elapsedTime])
+    return S_OK([result, elapsedTime, actionOK])
 
 #####
 #
@@ -509,6 +512,22 @@ class RequestHandler(object):
     """
     return S_OK(data)
 
+  types_getServiceStatistics = []
+  auth_getServiceStatistics = ['authenticated']
+
+  def export_getServiceStatistics(self):
+    """
+    Get the statistics of the actions served by this service since its start: for each action,
+    the number of calls and errors, and the distributions of the handshake time, of the time waited
+    for a thread, of the execution time and of the request and response sizes
+
+    :return: S_OK, Value is a dict, see ServiceStatistics.getStatistics
+    """
+    serviceStatistics = self.serviceInfoDict.get('serviceStatistics')
+    if not serviceStatistics:
+      return S_ERROR("No statistics for service %s" % self.serviceInfoDict['serviceName'])
+    return S_OK(serviceStatistics.getStatistics())
+
   types_refreshConfiguration = [bool]
   auth_refreshConfiguration = [CS_ADMINISTRATOR]
 
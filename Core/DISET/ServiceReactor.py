@@ -26,6 +26,7 @@ import multiprocessing
 from DIRAC import gLogger, S_OK, S_ERROR
 from DIRAC.Core.DISET.private.Service import Service
 from DIRAC.Core.DISET.private.GatewayService import GatewayService
+from DIRAC.Core.DISET.private.ServiceEventLoop import ServiceEventLoop
 from DIRAC.Core.DISET.RequestHandler import RequestHandler
 from DIRAC.Core.Utilities import Time
 from DIRAC.Core.Base.private.ModuleLoader import ModuleLoader
@@ -56,6 +57,7 @@ class ServiceReactor(object):
     self.__listeningConnections = {}
     self.__stats = ReactorStats()
     self.__processes = []
+    self.__eventLoop = None
 
   def initialize(self, servicesList):
     try:
@@ -165,9 +167,27 @@ class ServiceReactor(object):
           p.start()
           gLogger.always("Started clone process %s for %s" % (i, svcName))
 
+    self.__createEventLoop(self.__listeningConnections.keys())
     while self.__alive:
       self.__acceptIncomingConnection()
 
+  def __createEventLoop(self, svcNames):
+    """ Create the event loop of this process if any of the services uses it.
+        Each clone process has its own loop.
+
+    :param list svcNames: names of the services served by this process
+    """
+    eventLoopServices = [svcName for svcName in svcNames
+                         if self.__services[svcName].getConfig().useEventLoop()]
+    if not eventLoopServices:
+      return
+    idleTimeout = max(self.__services[svcName].getConfig().getIdleConnectionTimeout()
+                      for svcName in eventLoopServices)
+    self.__eventLoop = ServiceEventLoop(idleTimeout=idleTimeout)
+    for svcName in eventLoopServices:
+      gLogger.info("Using the event loop for %s" % svcName)
+      self.__services[svcName].setEventLoop(self.__eventLoop)
+
   def stopAllProcess(self):
     """
     It stops all the running processes.
@@ -182,6 +202,7 @@ class ServiceReactor(object):
   def __startCloneProcess(self, svcName, i):
     self.__services[svcName].setCloneProcessId(i)
     self.__alive = i
+    self.__createEventLoop([svcName])
     while self.__alive:
       self.__acceptIncomingConnection(svcName)
 
@@ -207,7 +228,10 @@ class ServiceReactor(object):
     sockets = self.__getListeningSocketsList(svcName)
     while self.__alive:
       try:
-        inList, _outList, _exList = select.select(sockets, [], [], 10)
+        if self.__eventLoop:
+          inList = self.__eventLoop.poll(sockets, 10)
+        else:
+          inList, _outList, _exList = select.select(sockets, [], [], 10)
         if len(inList) == 0:
           return
         for inSocket in inList:
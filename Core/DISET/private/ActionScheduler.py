@@ -0,0 +1,140 @@
+""" Admission control of the actions of a Service: the actions are queued by priority class before
+    being given to the thread pool, so that a burst of heavy calls does not delay the cheap ones.
+
+    - The jobs of the highest priority class with waiting jobs are given first to the thread pool,
+      which never gets more jobs than it has threads, so that the jobs wait in the priority queues.
+    - Each class can be limited to a number of running jobs, leaving the other threads to the other classes.
+    - The jobs which waited more than maxQueueTime are rejected, without being executed.
+"""
+
+__RCSID__ = "$Id$"
+
+import time
+import threading
+from collections import deque
+
+from DIRAC import gLogger, S_OK, S_ERROR
+
+# Priority classes, from the highest priority to the lowest
+PRIORITY_CLASSES = ('High', 'Normal', 'Low')
+DEFAULT_PRIORITY_CLASS = 'Normal'
+
+
+class ActionScheduler(object):
+  """ Priority queues in front of a thread pool
+  """
+
+  def __init__(self, submitFunction, maxRunning, actionPriorities=None, classLimits=None,
+               maxQueueTime=0, maxQueued=0):
+    """ c'tor
+
+    :param submitFunction: function giving a job to the thread pool, called with the function and its arguments,
+                           returning S_OK/S_ERROR
+    :param int maxRunning: number of jobs given to the thread pool at the same time, i.e. its number of threads
+    :param dict actionPriorities: priority class of the actions, the others are in DEFAULT_PRIORITY_CLASS
+    :param dict classLimits: maximum number of running jobs for some classes
+    :param float maxQueueTime: seconds after which the waiting jobs are rejected, 0 for no limit
+    :param int maxQueued: maximum number of waiting jobs, 0 for no limit
+    """
+    self.__submitFunction = submitFunction
+    self.__maxRunning = max(1, maxRunning)
+    self.__actionPriorities = {}
+    for actionName, className in (actionPriorities or {}).iteritems():
+      if className not in PRIORITY_CLASSES:
+        gLogger.error("Unknown priority class", "%s for %s, using %s" % (className, actionName, DEFAULT_PRIORITY_CLASS))
+        className = DEFAULT_PRIORITY_CLASS
+      self.__actionPriorities[actionName] = className
+    self.__classLimits = dict(classLimits or {})
+    self.__maxQueueTime = maxQueueTime
+    self.__maxQueued = maxQueued
+    self.__lock = threading.Lock()
+    self.__queues = dict((className, deque()) for className in PRIORITY_CLASSES)
+    self.__running = dict((className, 0) for className in PRIORITY_CLASSES)
+    self.__stats = {'rejected': 0, 'expired': 0}
+
+  def getPriorityClass(self, actionName):
+    """ Priority class of an action
+
+    :param str actionName: e.g. RPC/ping
+    :return: class name
+    """
+    return self.__actionPriorities.get(actionName, DEFAULT_PRIORITY_CLASS)
+
+  def submit(self, actionName, func, args, rejectFunction):
+    """ Queue a job of an action
+
+    :param str actionName: action of the job, giving its priority class
+    :param func: function of the job, called with args in a thread of the pool
+    :param tuple args: arguments of the job
+    :param rejectFunction: function called with args instead of func if the job waited too long
+    :return: S_OK/S_ERROR if too many jobs are waiting
+    """
+    with self.__lock:
+      if self.__maxQueued and sum(len(queue) for queue in self.__queues.itervalues()) >= self.__maxQueued:
+        self.__stats['rejected'] += 1
+        return S_ERROR("Too many waiting requests")
+      self.__queues[self.getPriorityClass(actionName)].append((time.time(), func, args, rejectFunction))
+    self.__dispatch()
+    return S_OK()
+
+  def __dispatch(self):
+    """ Give the jobs to the thread pool while it has free threads, by priority,
+        and reject the jobs which waited too long
+    """
+    toRun = []
+    toReject = []
+    with self.__lock:
+      expiryTime = time.time() - self.__maxQueueTime if self.__maxQueueTime else 0
+      for className in PRIORITY_CLASSES:
+        queue = self.__queues[className]
+        while queue and queue[0][0] < expiryTime:
+          toReject.append(queue.popleft())
+          self.__stats['expired'] += 1
+      running = sum(self.__running.itervalues())
+      for className in PRIORITY_CLASSES:
+        queue = self.__queues[className]
+        classLimit = self.__classLimits.get(className)
+        while queue and running < self.__maxRunning and \
+                (not classLimit or self.__running[className] < classLimit):
+          toRun.append((className, queue.popleft()))
+          self.__running[className] += 1
+          running += 1
+    for _queuedTime, _func, args, rejectFunction in toReject:
+      self.__callJobFunction(rejectFunction, args)
+    for className, job in toRun:
+      result = self.__submitFunction(self.__runJob, className, job)
+      if not result['OK']:
+        self.__jobDone(className)
+        self.__callJobFunction(job[3], job[2])
+
+  def __runJob(self, className, job):
+    """ Execute a job in a thread of the pool, and dispatch the next ones """
+    _queuedTime, func, args, _rejectFunction = job
+    try:
+      self.__callJobFunction(func, args)
+    finally:
+      self.__jobDone(className)
+      self.__dispatch()
+
+  def __jobDone(self, className):
+    with self.__lock:
+      self.__running[className] -= 1
+
+  @staticmethod
+  def __callJobFunction(func, args):
+    try:
+      func(*args)
+    except Exception as e:  # pylint: disable=broad-except
+      gLogger.exception("Exception in a scheduled job", lException=e)
+
+  def getStats(self):
+    """ Current state of the queues
+
+    :return: dict with the waiting and running jobs by class, and the numbers of jobs rejected
+             because too many were waiting or because they waited too long
+    """
+    with self.__lock:
+      stats = dict(self.__stats)
+      stats['waiting'] = dict((className, len(queue)) for className, queue in self.__queues.iteritems())
+      stats['running'] = dict(self.__running)
+    return stats
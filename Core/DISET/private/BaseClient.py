@@ -4,19 +4,24 @@
 
 __RCSID__ = "$Id$"
 
+import os
 import six
 import time
 import thread
+from hashlib import md5
+
 import DIRAC
 from DIRAC.Core.DISET.private.Protocols import gProtocolDict
 from DIRAC.FrameworkSystem.Client.Logger import gLogger
-from DIRAC.Core.Utilities import List, Network
+from DIRAC.Core.Utilities import List, Network, BinEncode
 from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
 from DIRAC.ConfigurationSystem.Client.Config import gConfig
 from DIRAC.ConfigurationSystem.Client.PathFinder import getServiceURL, getServiceFailoverURL
 from DIRAC.ConfigurationSystem.Client.Helpers import Registry
 from DIRAC.ConfigurationSystem.Client.Helpers.CSGlobals import skipCACheck
 from DIRAC.Core.DISET.private.TransportPool import getGlobalTransportPool
+from DIRAC.Core.DISET.private.Transports.BaseTransport import gCompressions, COMPRESSION_ENABLED
+from DIRAC.Core.DISET.private.ClientConnectionPool import getGlobalClientConnectionPool
 from DIRAC.Core.DISET.ThreadConfig import ThreadConfig
 
 
@@ -40,6 +45,7 @@ class BaseClient(object):
   KW_PROXY_CHAIN = "proxyChain"
   KW_SKIP_CA_CHECK = "skipCACheck"
   KW_KEEP_ALIVE_LAPSE = "keepAliveLapse"
+  KW_KEEP_CONNECTION = "keepConnection"
 
   __threadConfig = ThreadConfig()
 
@@ -59,6 +65,8 @@ class BaseClient(object):
       :param proxyChain: Specify the proxy chain
       :param skipCACheck: Do not check the CA
       :param keepAliveLapse: Duration for keepAliveLapse (heartbeat like)
+      :param keepConnection: Ask the service to keep the connection open after a RPC call,
+                             to reuse it for the next calls with the same credentials
     """
 
     if not isinstance(serviceName, six.string_types):
@@ -422,6 +430,8 @@ and this is thread %s
         In case the connection cannot be established, __discoverURL
         is called again, and _connect calls itself.
         We stop after trying self.__nbOfRetry * self.__nbOfUrls
+        With the keepConnection option, an idle connection is reused if there is one,
+        and the returned structure has the 'reused' flag.
 
     """
     # Check if the useServerCertificate configuration changed
@@ -444,6 +454,14 @@ and this is thread %s
     if self.__enableThreadCheck:
       self.__checkThreadID()
 
+    if self.kwargs.get(self.KW_KEEP_CONNECTION):
+      idleConnection = getGlobalClientConnectionPool().get(self.__getConnectionKey())
+      if idleConnection:
+        gLogger.debug("Reusing connection to: %s" % self.serviceURL)
+        result = S_OK(idleConnection)
+        result['reused'] = True
+        return result
+
     gLogger.debug("Trying to connect to: %s" % self.serviceURL)
     try:
       # Calls the transport method of the apropriate protocol.
@@ -498,6 +516,28 @@ and this is thread %s
     """
     getGlobalTransportPool().close(trid)
 
+  def _releaseConnection(self, trid):
+    """ Keep the connection open for the next calls, once the service agreed to it.
+
+        :param trid: Transport ID in the transportPool
+    """
+    getGlobalClientConnectionPool().put(self.__getConnectionKey(), trid)
+
+  def __getConnectionKey(self):
+    """ Key of the connections which can be reused: the transports are bound
+        to the service URL and to the credentials used for the handshake
+    """
+    proxyString = self.kwargs.get(self.KW_PROXY_STRING)
+    if proxyString:
+      proxyString = md5(proxyString).hexdigest()
+    return (self.serviceURL,
+            bool(self.__useCertificates),
+            self.kwargs.get(self.KW_PROXY_LOCATION),
+            proxyString,
+            os.environ.get('X509_USER_PROXY'),
+            self.kwargs.get(self.KW_SKIP_CA_CHECK),
+            self.timeout)
+
   @staticmethod
   def _serializeStConnectionInfo(stConnectionInfo):
     """ We want to send tuple but we need to convert
@@ -526,7 +566,13 @@ and this is thread %s
                        subclasses of BaseClient. <action type> can be for example
                        'RPC' or 'FileTransfer'
 
-       :return: whatever the server sent back
+       For RPC, the options of the call are sent as a last element: keepConnection,
+       the codecs the client can use instead of DEncode and the compressions it supports
+       for the arguments and the response. The service tells in its answer which codec
+       and compression it chose, if any.
+
+       :return: whatever the server sent back. For a RPC with the keepConnection option,
+                the value has 'keepConnection': True if the service keeps the connection open
 
     """
     if not self.__initStatus['OK']:
@@ -535,6 +581,16 @@ and this is thread %s
                         action,
                         self.__extraCredentials,
                         DIRAC.version)
+    if action[0] == 'RPC':
+      options = {}
+      if self.kwargs.get(self.KW_KEEP_CONNECTION):
+        options['keepConnection'] = True
+      if BinEncode.BINARY_CODEC_ENABLED:
+        options['codecs'] = [BinEncode.CODEC_NAME]
+      if COMPRESSION_ENABLED:
+        options['compressions'] = sorted(gCompressions)
+      if options:
+        stConnectionInfo += (options,)
 
     # Send the connection info and get the answer back
     retVal = transport.sendData(S_OK(BaseClient._serializeStConnectionInfo(stConnectionInfo)))
@@ -549,6 +605,10 @@ and this is thread %s
       if 'delegate' in serverRequirements:
         gLogger.debug("A delegation is requested")
         serverReturn = self.__delegateCredentials(transport, serverRequirements['delegate'])
+      elif serverRequirements.get('codec') or serverRequirements.get('compression'):
+        retVal = transport.setNegotiatedOptions(serverRequirements)
+        if not retVal['OK']:
+          return retVal
     return serverReturn
 
   def __delegateCredentials(self, transport, delegationRequest):
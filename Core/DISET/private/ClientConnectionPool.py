@@ -0,0 +1,146 @@
+""" Pool of the client connections kept open between RPC calls
+
+    A client created with the keepConnection option asks the service to keep the
+    connection open after the call. If the service agrees (services running with the
+    EventLoop option do), the transport is put in this pool instead of being closed,
+    and the next call to the same URL with the same credentials reuses it, saving the
+    connection and the handshake. The idle transports stay in the TransportPool, which
+    sends them keep alives, and are closed after maxIdleTime.
+"""
+
+__RCSID__ = "$Id$"
+
+import time
+import select
+import threading
+
+from DIRAC import gLogger
+from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
+from DIRAC.Core.DISET.private.TransportPool import getGlobalTransportPool
+
+
+class ClientConnectionPool(object):
+  """ Idle client transports, by connection key
+  """
+
+  def __init__(self, transportPool=None, maxIdleTime=60, maxIdlePerKey=10):
+    """ c'tor
+
+        :param transportPool: TransportPool holding the transports, the global one by default
+        :param int maxIdleTime: seconds after which an idle transport is closed
+        :param int maxIdlePerKey: maximum number of idle transports kept for a key
+    """
+    self.log = gLogger.getSubLogger("ClientConnectionPool")
+    if not transportPool:
+      transportPool = getGlobalTransportPool()
+    self.__trPool = transportPool
+    self.__maxIdleTime = maxIdleTime
+    self.__maxIdlePerKey = maxIdlePerKey
+    self.__lock = threading.Lock()
+    # key -> list of ( trid, time of release ), the most recent last
+    self.__idle = {}
+    self.__stats = {'reused': 0, 'released': 0, 'discarded': 0}
+
+  def getStats(self):
+    """ Number of idle transports and counters of the pool
+
+        :return: dict
+    """
+    with self.__lock:
+      stats = dict(self.__stats)
+      stats['idle'] = sum(len(idleList) for idleList in self.__idle.values())
+    return stats
+
+  def get(self, key):
+    """ Take an idle transport
+
+        :param key: connection key, see BaseClient
+        :return: ( trid, transport ) or None if there is no usable idle transport
+    """
+    now = time.time()
+    while True:
+      with self.__lock:
+        idleList = self.__idle.get(key)
+        if not idleList:
+          return None
+        trid, releaseTime = idleList.pop()
+        if not idleList:
+          del self.__idle[key]
+      transport = self.__trPool.get(trid)
+      if transport and now - releaseTime < self.__maxIdleTime and self.__isUsable(transport):
+        with self.__lock:
+          self.__stats['reused'] += 1
+        return trid, transport
+      self.__discard(trid)
+
+  def put(self, key, trid):
+    """ Give back a transport after a call
+
+        :param key: connection key, see BaseClient
+        :param trid: id of the transport in the TransportPool
+    """
+    toClose = []
+    with self.__lock:
+      idleList = self.__idle.setdefault(key, [])
+      idleList.append((trid, time.time()))
+      self.__stats['released'] += 1
+      while len(idleList) > self.__maxIdlePerKey:
+        toClose.append(idleList.pop(0)[0])
+    for trid in toClose:
+      self.__discard(trid)
+
+  def clean(self):
+    """ Close the transports idle for more than maxIdleTime
+    """
+    now = time.time()
+    toClose = []
+    with self.__lock:
+      for key in list(self.__idle):
+        idleList = self.__idle[key]
+        toClose.extend(trid for trid, releaseTime in idleList if now - releaseTime >= self.__maxIdleTime)
+        idleList = [(trid, releaseTime) for trid, releaseTime in idleList if now - releaseTime < self.__maxIdleTime]
+        if idleList:
+          self.__idle[key] = idleList
+        else:
+          del self.__idle[key]
+    for trid in toClose:
+      self.__discard(trid)
+
+  def __discard(self, trid):
+    with self.__lock:
+      self.__stats['discarded'] += 1
+    self.__trPool.close(trid)
+
+  def __isUsable(self, transport):
+    """ Check that the service did not close the connection while it was idle.
+        Data waiting on an idle connection can only be keep alives or the end of the connection.
+    """
+    try:
+      while True:
+        inList = select.select([transport.getSocket()], [], [], 0)[0]
+        if not inList:
+          return True
+        result = transport.readAvailable()
+        if not result['OK']:
+          return False
+        while transport.isKeepAliveBuffered():
+          result = transport.receiveData(blockAfterKeepAlive=False)
+          if not result['OK']:
+            return False
+        if transport.getBufferedSize():
+          self.log.debug("Unexpected data on an idle connection")
+          return False
+    except Exception as e:
+      self.log.debug("Idle connection is not usable", repr(e))
+      return False
+
+
+gClientConnectionPool = None
+
+
+def getGlobalClientConnectionPool():
+  global gClientConnectionPool
+  if not gClientConnectionPool:
+    gClientConnectionPool = ClientConnectionPool()
+    gThreadScheduler.addPeriodicTask(30, gClientConnectionPool.clean)
+  return gClientConnectionPool
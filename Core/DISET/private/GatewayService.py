@@ -99,8 +99,8 @@ class GatewayService(Service):
     self._msgForwarder = MessageForwarder(self._msgBroker)
     return S_OK()
 
-  def _processInThread(self, clientTransport):
-    """ Threaded process function
+  def _processInThread(self, clientTransport, queuedTime=None):
+    """ Threaded process function, the gateway does not keep statistics of the forwarded calls
     """
     # Handshake
     try:
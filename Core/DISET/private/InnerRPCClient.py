@@ -17,6 +17,9 @@ class InnerRPCClient(BaseClient):
         * sends the method parameters
         * retrieve the result
         * disconnect
+
+      With the keepConnection option, the connection is instead kept for the
+      next calls if the service agrees to it.
   """
 
   # Number of times we retry the call.
@@ -44,10 +47,15 @@ class InnerRPCClient(BaseClient):
       return retVal
     # Get the transport connection ID as well as the Transport object
     trid, transport = retVal['Value']
+    reusedConnection = retVal.get('reused', False)
+    keepConnection = False
     try:
       # Handshake to perform the RPC call for functionName
       retVal = self._proposeAction(transport, ("RPC", functionName))
       if not retVal['OK']:
+        if reusedConnection and not cmpError(retVal, ENOAUTH):
+          # The service closed the idle connection, try again with another one
+          return self.executeRPC(functionName, args)
         if cmpError(retVal, ENOAUTH):  # This query is unauthorized
           retVal['rpcStub'] = stub
           return retVal
@@ -58,6 +66,7 @@ class InnerRPCClient(BaseClient):
           else:
             retVal['rpcStub'] = stub
             return retVal
+      serverKeepsConnection = isinstance(retVal.get('Value'), dict) and retVal['Value'].get('keepConnection', False)
 
       # Send the arguments to the function
       # Note: we need to convert the arguments to list
@@ -71,6 +80,12 @@ class InnerRPCClient(BaseClient):
       receivedData = transport.receiveData()
       if isinstance(receivedData, dict):
         receivedData['rpcStub'] = stub
+        keepConnection = serverKeepsConnection
       return receivedData
     finally:
-      self._disconnect(trid)
+      if keepConnection:
+        # The next call negotiates its codec and compression again
+        transport.setNegotiatedOptions()
+        self._releaseConnection(trid)
+      else:
+        self._disconnect(trid)
@@ -24,10 +24,12 @@ import DIRAC
 from DIRAC import gConfig, gLogger, S_OK, S_ERROR
 from DIRAC.Core.Utilities.DErrno import ENOAUTH
 from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
-from DIRAC.Core.Utilities import Time, MemStat, Network
+from DIRAC.Core.Utilities import Time, MemStat, Network, BinEncode
 from DIRAC.Core.DISET.private.LockManager import LockManager
 from DIRAC.FrameworkSystem.Client.MonitoringClient import MonitoringClient
 from DIRAC.Core.DISET.private.ServiceConfiguration import ServiceConfiguration
+from DIRAC.Core.DISET.private.ServiceStatistics import ServiceStatistics, TIME_MEASURES
+from DIRAC.Core.DISET.private.ActionScheduler import ActionScheduler, PRIORITY_CLASSES
 from DIRAC.Core.DISET.private.TransportPool import getGlobalTransportPool
 from DIRAC.Core.DISET.private.MessageBroker import MessageBroker, MessageSender
 from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
@@ -75,10 +77,13 @@ class Service(object):
     self._standalone = serviceData['standalone']
     self.__monitorLastStatsUpdate = time.time()
     self._stats = {'queries': 0, 'connections': 0}
+    self._statistics = ServiceStatistics()
     self._authMgr = AuthManager("%s/Authorization" % PathFinder.getServiceSection(serviceData['loadName']))
     self._transportPool = getGlobalTransportPool()
     self.__cloneId = 0
     self.__maxFD = 0
+    self._eventLoop = None
+    self._scheduler = None
 
   def setCloneProcessId(self, cloneId):
     self.__cloneId = cloneId
@@ -112,6 +117,15 @@ class Service(object):
                                     max(0, self._cfg.getMaxThreads()),
                                     self._cfg.getMaxWaitingPetitions())
       self._threadPool.daemonize()
+    # Queue the actions by priority before the thread pool, if the service defines priorities or limits
+    actionPriorities = self._cfg.getActionPriorities()
+    classLimits = dict((className, self._cfg.getPriorityClassLimit(className)) for className in PRIORITY_CLASSES)
+    classLimits = dict((className, limit) for className, limit in classLimits.iteritems() if limit > 0)
+    maxQueueTime = self._cfg.getMaxQueueTime()
+    if actionPriorities or classLimits or maxQueueTime:
+      self._scheduler = ActionScheduler(self.__queueInThreadPool, self._cfg.getMaxThreads(),
+                                        actionPriorities=actionPriorities, classLimits=classLimits,
+                                        maxQueueTime=maxQueueTime, maxQueued=self._cfg.getMaxWaitingPetitions())
     self._msgBroker = MessageBroker("%sMSB" % self._name, threadPool=self._threadPool)
     # Create static dict
     self._serviceInfoDict = {'serviceName': self._name,
@@ -119,7 +133,8 @@ class Service(object):
                              'URL': self._cfg.getURL(),
                              'messageSender': MessageSender(self._name, self._msgBroker),
                              'validNames': self._validNames,
-                             'csPaths': [PathFinder.getServiceSection(svcName) for svcName in self._validNames]
+                             'csPaths': [PathFinder.getServiceSection(svcName) for svcName in self._validNames],
+                             'serviceStatistics': self._statistics
                              }
     # Initialize Monitoring
     # This is a flag used to check whether "EnableActivityMonitoring" is enabled or not from the config file.
@@ -302,6 +317,10 @@ class Service(object):
           'threads',
           MonitoringClient.OP_MEAN)
       self._monitor.registerActivity('MaxFD', "Max File Descriptors", 'Framework', 'fd', MonitoringClient.OP_MEAN)
+      self._monitor.registerActivity('CompressionSavedBytes', "Bytes saved by compression", 'Framework', 'bytes',
+                                     MonitoringClient.OP_SUM)
+      self._monitor.registerActivity('CompressionTime', "Compression time", 'Framework', 'seconds',
+                                     MonitoringClient.OP_SUM)
 
       self._monitor.setComponentExtraParam('DIRACVersion', DIRAC.version)
       self._monitor.setComponentExtraParam('platform', DIRAC.getPlatform())
@@ -329,6 +348,8 @@ class Service(object):
     else:
       pendingQueries = self._threadPool.pendingJobs()
       activeQuereies = self._threadPool.numWorkingThreads()
+    if self._scheduler:
+      pendingQueries += sum(self._scheduler.getStats()['waiting'].itervalues())
 
     self._monitor.addMark('PendingQueries', pendingQueries)
     self._monitor.addMark('ActiveQueries', activeQuereies)
@@ -339,6 +360,14 @@ class Service(object):
   def getConfig(self):
     return self._cfg
 
+  def setEventLoop(self, eventLoop):
+    """ Watch the connections waiting for data with a ServiceEventLoop instead of
+        blocking a thread of the pool on each of them
+
+        :param eventLoop: ServiceEventLoop run by the ServiceReactor
+    """
+    self._eventLoop = eventLoop
+
   # End of initialization functions
 
   def handleConnection(self, clientTransport):
@@ -346,20 +375,176 @@ class Service(object):
       This method may be called by ServiceReactor.
       The method stacks openened connection in a queue, another thread
       read this queue and handle connection.
+      With an event loop, the connection is instead watched by the loop until
+      the request is received and only the action is executed in the thread pool.
 
       :param clientTransport: Object wich describe opened connection (PlainTransport or SSLTransport)
     """
     self._stats['connections'] += 1
     self._monitor.setComponentExtraParam('queries', self._stats['connections'])
+    if self._eventLoop:
+      self.__maxFD = max(self.__maxFD, clientTransport.oSocket.fileno())
+      if clientTransport.bBlockingHandshake:
+        result = self.__queueInThreadPool(self._handshakeInThread, clientTransport)
+        if not result['OK']:
+          gLogger.warn("Cannot queue handshake", result['Message'])
+          clientTransport.close()
+        return
+      startTime = time.time()
+      try:
+        result = clientTransport.handshake()
+      except Exception as e:
+        result = S_ERROR("Exception during handshake: %s" % str(e))
+      if not result['OK']:
+        clientTransport.close()
+        return
+      self.__watchNewConnection(clientTransport, time.time() - startTime)
+      return
     # TODO: remove later
     if useThreadPoolExecutor:
-      self._threadPool.submit(self._processInThread, clientTransport)
+      self._threadPool.submit(self._processInThread, clientTransport, time.time())
     else:
       self._threadPool.generateJobAndQueueIt(self._processInThread,
-                                             args=(clientTransport,))
+                                             args=(clientTransport, time.time()))
+
+  def __queueInThreadPool(self, func, *args):
+    """ Queue a job in the thread pool without blocking the event loop
+
+    :return: S_OK/S_ERROR if the pool queue is full
+    """
+    # TODO: remove later
+    if useThreadPoolExecutor:
+      self._threadPool.submit(func, *args)
+      return S_OK()
+    return self._threadPool.generateJobAndQueueIt(func, args=args, blocking=False)
+
+  # Event loop functions
+
+  def _handshakeInThread(self, clientTransport):
+    """ Do a blocking handshake in a thread and give the connection to the event loop
+
+    :param clientTransport: Object who describe the opened connection (SSLTransport or PlainTransport)
+    """
+    startTime = time.time()
+    try:
+      result = clientTransport.handshake()
+    except Exception as e:  # pylint: disable=broad-except
+      result = S_ERROR("Exception during handshake: %s" % str(e))
+    if not result['OK']:
+      gLogger.error("Handshake failed", "from %s: %s" % (clientTransport.getRemoteAddress(), result['Message']))
+      clientTransport.close()
+      return
+    self.__watchNewConnection(clientTransport, time.time() - startTime)
+
+  def __watchNewConnection(self, clientTransport, handshakeTime):
+    trid = self._transportPool.add(clientTransport)
+    if not trid:
+      return
+    self._transportPool.associateData(trid, 'handshakeTime', handshakeTime)
+    # The authorization adds to the credentials, keep the ones of the handshake for the next requests
+    self._transportPool.associateData(trid, 'handshakeCredentials', dict(clientTransport.getConnectingCredentials()))
+    self._eventLoop.watch(trid, self.__proposalReceived, maxBufferSize=1024)
+
+  def __proposalReceived(self, trid):
+    """ Called in the event loop thread once the proposal has been received.
+        The proposal is checked and, for RPC, the loop waits for the arguments.
+        File transfers and message connections stream data so they are given to the thread pool.
+        For RPC, the client can ask to keep the connection open for its next requests.
+    """
+    clientTransport = self._transportPool.get(trid)
+    handshakeCredentials = self._transportPool.getAssociatedData(trid, 'handshakeCredentials')
+    if clientTransport:
+      # The options negotiated for the previous request on a kept connection do not apply
+      clientTransport.setNegotiatedOptions()
+      if handshakeCredentials is not None:
+        clientTransport.peerCredentials = dict(handshakeCredentials)
+    result = self._receiveAndCheckProposal(trid)
+    if not result['OK']:
+      self._transportPool.sendAndClose(trid, result)
+      return
+    proposalTuple = result['Value']
+    if proposalTuple[1][0] != 'RPC':
+      self.__queueProposal(trid, proposalTuple, False)
+      return
+    keepConnection = self._getProposalOptions(proposalTuple).get('keepConnection', False)
+    transportOptions = self._negotiateTransportOptions(proposalTuple)
+    serverOptions = dict(transportOptions)
+    if keepConnection:
+      serverOptions['keepConnection'] = True
+    # Notify the client we're ready to execute the action
+    result = self._transportPool.send(trid, S_OK(serverOptions) if serverOptions else S_OK())
+    if not result['OK']:
+      self._transportPool.close(trid)
+      return
+    if transportOptions:
+      clientTransport.setNegotiatedOptions(transportOptions)
+    self._eventLoop.watch(trid, self.__queueProposal, args=(proposalTuple, True, keepConnection))
+
+  def __queueProposal(self, trid, proposalTuple, clientNotified, keepConnection=False):
+    """ Queue the execution of a checked proposal in the thread pool, through the priority queues if any
+    """
+    args = (trid, proposalTuple, clientNotified, keepConnection, time.time())
+    if self._scheduler:
+      result = self._scheduler.submit("/".join(proposalTuple[1]), self._processProposalInThread, args,
+                                      self.__rejectProposal)
+    else:
+      result = self.__queueInThreadPool(self._processProposalInThread, *args)
+    if not result['OK']:
+      gLogger.warn("Cannot queue request", "%s: %s" % ("/".join(proposalTuple[1]), result['Message']))
+      self.__rejectProposal(*args)
+
+  def __rejectProposal(self, trid, proposalTuple, clientNotified, keepConnection=False, queuedTime=None):
+    """ Tell the client that the service cannot execute its request now
+    """
+    self._statistics.addRejection("/".join(proposalTuple[1]))
+    if queuedTime and self._scheduler:
+      gLogger.notice("Rejecting request",
+                     "%s waited %.2f secs" % ("/".join(proposalTuple[1]), time.time() - queuedTime))
+    self._transportPool.sendAndClose(trid, S_ERROR("Service %s is too busy, try later" % self._name))
+
+  def _processProposalInThread(self, trid, proposalTuple, clientNotified, keepConnection=False, queuedTime=None):
+    """ Execute in a thread of the pool a proposal checked by the event loop, or queued by priority
+
+    :param int trid: transport ID
+    :param tuple proposalTuple: tuple describing the proposed action
+    :param bool clientNotified: True if the client was told to send the arguments
+    :param bool keepConnection: give the connection back to the event loop after the action
+    :param float queuedTime: time at which the proposal was queued in the thread pool
+    """
+    if queuedTime:
+      # Add to the time the connection waited for the proposal to be read, if any
+      queueTime = self._transportPool.getAssociatedData(trid, 'queueTime') or 0
+      self._transportPool.associateData(trid, 'queueTime', queueTime + time.time() - queuedTime)
+    self._lockManager.lockGlobal()
+    try:
+      monReport = self.__startReportToMonitoring()
+    except Exception:
+      monReport = False
+    try:
+      result = self._instantiateHandler(trid, proposalTuple)
+      if not result['OK']:
+        self._transportPool.sendAndClose(trid, result)
+        return
+      handlerObj = result['Value']
+      if clientNotified:
+        result = self._executeAction(trid, proposalTuple, handlerObj)
+        result['closeTransport'] = not keepConnection
+      else:
+        result = self._processProposal(trid, proposalTuple, handlerObj)
+      if result['closeTransport'] or not result['OK']:
+        if not result['OK']:
+          gLogger.error("Error processing proposal", result['Message'])
+        self._transportPool.close(trid)
+      elif keepConnection:
+        self._eventLoop.watch(trid, self.__proposalReceived, maxBufferSize=1024)
+      return result
+    finally:
+      self._lockManager.unlockGlobal()
+      if monReport:
+        self.__endReportToMonitoring(*monReport)
 
   # Threaded process function
-  def _processInThread(self, clientTransport):
+  def _processInThread(self, clientTransport, queuedTime=None):
     """
     This method handles a RPC, FileTransfer or Connection.
     Connection may be opened via ServiceReactor.__acceptIncomingConnection
@@ -378,20 +563,27 @@ class Service(object):
     - Receive arguments/file/something else (depending on action) in the RequestHandler
     - Executing the action asked by the client
 
+    With priority queues, the action is instead executed in its turn by _processProposalInThread,
+    and the thread is released once the proposal is checked.
+
     :param clientTransport: Object who describe the opened connection (SSLTransport or PlainTransport)
+    :param float queuedTime: time at which the connection was queued in the thread pool
 
     :return: S_OK with "closeTransport" a boolean to indicate if th connection have to be closed
             e.g. after RPC, closeTransport=True
 
     """
+    queueTime = time.time() - queuedTime if queuedTime else None
     self.__maxFD = max(self.__maxFD, clientTransport.oSocket.fileno())
     self._lockManager.lockGlobal()
     try:
-      monReport = self.__startReportToMonitoring()
+      # The execution reports itself if it is queued
+      monReport = self.__startReportToMonitoring() if not self._scheduler else False
     except Exception:
       monReport = False
     try:
       # Handshake
+      startTime = time.time()
       try:
         result = clientTransport.handshake()
         if not result['OK']:
@@ -399,16 +591,22 @@ class Service(object):
           return
       except BaseException:
         return
+      handshakeTime = time.time() - startTime
       # Add to the transport pool
       trid = self._transportPool.add(clientTransport)
       if not trid:
         return
+      self._transportPool.associateData(trid, 'handshakeTime', handshakeTime)
+      self._transportPool.associateData(trid, 'queueTime', queueTime)
       # Receive and check proposal
       result = self._receiveAndCheckProposal(trid)
       if not result['OK']:
         self._transportPool.sendAndClose(trid, result)
         return
       proposalTuple = result['Value']
+      if self._scheduler:
+        self.__queueProposal(trid, proposalTuple, False)
+        return
       # Instantiate handler
       result = self._instantiateHandler(trid, proposalTuple)
       if not result['OK']:
@@ -452,6 +650,38 @@ class Service(object):
     proposalTuple = tuple(tuple(x) if isinstance(x, list) else x for x in serializedProposal)
     return proposalTuple
 
+  @staticmethod
+  def _getProposalOptions(proposalTuple):
+    """ Options sent by the client after the version, see BaseClient._proposeAction
+
+    :param tuple proposalTuple: tuple describing the proposed action
+    :return: dict
+    """
+    if len(proposalTuple) > 4 and isinstance(proposalTuple[4], dict):
+      return proposalTuple[4]
+    return {}
+
+  def _negotiateTransportOptions(self, proposalTuple):
+    """ Choose the codec and the compression of the arguments and the response of a RPC
+        among the ones offered by the client
+
+    :param tuple proposalTuple: tuple describing the proposed action
+    :return: dict with the codec and the compression chosen, empty for DEncode without compression
+    """
+    if proposalTuple[1][0] != 'RPC':
+      return {}
+    clientOptions = self._getProposalOptions(proposalTuple)
+    transportOptions = {}
+    codecs = clientOptions.get('codecs')
+    if BinEncode.BINARY_CODEC_ENABLED and isinstance(codecs, (list, tuple)) and BinEncode.CODEC_NAME in codecs:
+      transportOptions['codec'] = BinEncode.CODEC_NAME
+    compressions = clientOptions.get('compressions')
+    compression = self._cfg.getCompression()
+    if compression and isinstance(compressions, (list, tuple)) and compression in compressions:
+      transportOptions['compression'] = compression
+      transportOptions['compressionThreshold'] = self._cfg.getCompressionThreshold()
+    return transportOptions
+
   def _receiveAndCheckProposal(self, trid):
     clientTransport = self._transportPool.get(trid)
     # Get the peer credentials
@@ -568,10 +798,13 @@ class Service(object):
     return S_OK(handlerInstance)
 
   def _processProposal(self, trid, proposalTuple, handlerObj):
-    # Notify the client we're ready to execute the action
-    retVal = self._transportPool.send(trid, S_OK())
+    # Notify the client we're ready to execute the action, with the codec and compression to use
+    transportOptions = self._negotiateTransportOptions(proposalTuple)
+    retVal = self._transportPool.send(trid, S_OK(transportOptions) if transportOptions else S_OK())
     if not retVal['OK']:
       return retVal
+    if transportOptions:
+      self._transportPool.get(trid).setNegotiatedOptions(transportOptions)
 
     messageConnection = False
     if proposalTuple[1] == ('Connection', 'new'):
@@ -610,7 +843,15 @@ class Service(object):
 
   def _executeAction(self, trid, proposalTuple, handlerObj):
     try:
+      clientTransport = self._transportPool.get(trid)
+      compressionStats = clientTransport.getCompressionStats() if clientTransport else None
+      trafficStats = clientTransport.getTrafficStats() if clientTransport else None
+      startTime = time.time()
       response = handlerObj._rh_executeAction(proposalTuple)
+      executionTime = time.time() - startTime
+      if compressionStats:
+        self.__reportCompression(proposalTuple[1], compressionStats, clientTransport.getCompressionStats())
+      self.__reportActionStatistics(trid, proposalTuple[1], response, executionTime, trafficStats)
       if self.activityMonitoring and response["OK"]:
         self.activityMonitoringReporter.addRecord({
             'timestamp': int(Time.toEpoch()),
@@ -625,6 +866,70 @@ class Service(object):
       gLogger.exception("Exception while executing handler action")
       return S_ERROR("Server error while executing action: %s" % str(e))
 
+  def __reportCompression(self, actionTuple, statsBefore, statsAfter):
+    """ Report the bytes saved and the time spent by the compression of the messages of an action,
+        in total and for the action
+    """
+    if statsAfter['messages'] == statsBefore['messages']:
+      return
+    savedBytes = statsAfter['rawBytes'] - statsBefore['rawBytes'] - \
+        (statsAfter['wireBytes'] - statsBefore['wireBytes'])
+    spentTime = statsAfter['time'] - statsBefore['time']
+    actionName = "_".join(actionTuple)
+    self._monitor.registerActivity("CompressionSavedBytes_%s" % actionName,
+                                   "Bytes saved by compression for %s" % "/".join(actionTuple),
+                                   "Framework", "bytes", MonitoringClient.OP_SUM)
+    self._monitor.registerActivity("CompressionTime_%s" % actionName,
+                                   "Compression time for %s" % "/".join(actionTuple),
+                                   "Framework", "seconds", MonitoringClient.OP_SUM)
+    for activity, value in (("CompressionSavedBytes", savedBytes), ("CompressionTime", spentTime)):
+      self._monitor.addMark(activity, value)
+      self._monitor.addMark("%s_%s" % (activity, actionName), value)
+
+  def __reportActionStatistics(self, trid, actionTuple, response, executionTime, trafficStats):
+    """ Add a call to the statistics of its action, log it if it is slow, and send its times to the monitoring
+        if ReportActionStatistics is enabled.
+        The handshake and queue times are only counted for the first call that follows them.
+    """
+    measures = {'executionTime': executionTime}
+    for measure in ('handshakeTime', 'queueTime'):
+      measures[measure] = self._transportPool.getAssociatedData(trid, measure)
+      self._transportPool.associateData(trid, measure, None)
+    clientTransport = self._transportPool.get(trid)
+    if clientTransport and trafficStats:
+      newTrafficStats = clientTransport.getTrafficStats()
+      measures['requestBytes'] = newTrafficStats['receivedBytes'] - trafficStats['receivedBytes']
+      measures['responseBytes'] = newTrafficStats['sentBytes'] - trafficStats['sentBytes']
+    failed = not response['OK'] or not response['Value'][0]['OK'] or \
+        (len(response['Value']) > 2 and not response['Value'][2])
+    actionName = "/".join(actionTuple)
+    self._statistics.addCall(actionName, failed=failed, **measures)
+
+    slowCallThreshold = self._cfg.getSlowCallThreshold()
+    totalTime = sum(measures[measure] for measure in TIME_MEASURES if measures[measure] is not None)
+    if slowCallThreshold and totalTime > slowCallThreshold:
+      details = ["%s %.3f secs" % (measure, measures[measure])
+                 for measure in TIME_MEASURES if measures[measure] is not None]
+      details += ["%s %s" % (measure, measures[measure]) for measure in ('requestBytes', 'responseBytes')
+                  if measure in measures]
+      gLogger.notice("Slow call", "%s %s (%.2f secs): %s" % (
+          actionName, clientTransport.getFormattedCredentials() if clientTransport else "unknown",
+          totalTime, ", ".join(details)))
+
+    if self.activityMonitoring or not self._cfg.reportActionStatistics():
+      return
+    monitoringName = "_".join(actionTuple)
+    self._monitor.registerActivity("Calls_%s" % monitoringName, "Calls of %s" % actionName,
+                                   "Framework", "calls", MonitoringClient.OP_RATE)
+    self._monitor.addMark("Calls_%s" % monitoringName)
+    for measure in ('queueTime', 'executionTime'):
+      if measures[measure] is None:
+        continue
+      activityName = "%s%s_%s" % (measure[0].upper(), measure[1:], monitoringName)
+      self._monitor.registerActivity(activityName, "%s of %s" % (measure, actionName),
+                                     "Framework", "seconds", MonitoringClient.OP_MEAN)
+      self._monitor.addMark(activityName, measures[measure])
+
   def _mbReceivedMsg(self, trid, msgObj):
     result = self._authorizeProposal(('Message', msgObj.getName()),
                                      trid,
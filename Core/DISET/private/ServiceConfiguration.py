@@ -85,12 +85,78 @@ class ServiceConfiguration:
     except:
       return 15
 
+  def getActionPriorities(self):
+    """ Priority classes of the actions, from the options of the Priorities section,
+        e.g. High = requestJob, RPC/sendHeartBeat (the RPC action type is the default)
+
+    :return: dict action name -> class name
+    """
+    priorities = {}
+    # The first paths take precedence, as for getOption
+    for path in reversed(self.pathList):
+      for className in gConfigurationData.getOptionsFromCFG("%s/Priorities" % path) or []:
+        actions = gConfigurationData.extractOptionFromCFG("%s/Priorities/%s" % (path, className))
+        for actionName in List.fromChar(actions or ""):
+          if "/" not in actionName:
+            actionName = "RPC/%s" % actionName
+          priorities[actionName] = className
+    return priorities
+
+  def getPriorityClassLimit(self, className):
+    """ Maximum number of threads running actions of a priority class, 0 for no limit """
+    try:
+      return int(self.getOption("PriorityLimits/%s" % className))
+    except:
+      return 0
+
+  def getMaxQueueTime(self):
+    """ Seconds after which the queued requests are rejected, 0 for no limit """
+    try:
+      return float(self.getOption("MaxQueueTime"))
+    except:
+      return 0
+
   def getCloneProcesses(self):
     try:
       return int(self.getOption("CloneProcesses"))
     except:
       return 0
 
+  def useEventLoop(self):
+    optionValue = self.getOption("EventLoop")
+    return bool(optionValue) and optionValue.lower() in ("yes", "true", "1")
+
+  def getIdleConnectionTimeout(self):
+    try:
+      return int(self.getOption("IdleConnectionTimeout"))
+    except:
+      return 600
+
+  def getCompression(self):
+    """ Compression offered to the clients for the RPC messages, none by default """
+    optionValue = self.getOption("Compression")
+    if not optionValue or optionValue.lower() in ("no", "false", "none"):
+      return None
+    return optionValue
+
+  def getCompressionThreshold(self):
+    try:
+      return int(self.getOption("CompressionThreshold"))
+    except:
+      return 65536
+
+  def getSlowCallThreshold(self):
+    """ Seconds above which the calls are logged as slow, with the details of their time, 0 to disable """
+    try:
+      return float(self.getOption("SlowCallThreshold"))
+    except:
+      return 10.
+
+  def reportActionStatistics(self):
+    """ Whether the times of each action are sent to the monitoring """
+    optionValue = self.getOption("ReportActionStatistics")
+    return bool(optionValue) and optionValue.lower() in ("yes", "true", "1")
+
   def getPort(self):
     try:
       return int(self.getOption("Port"))
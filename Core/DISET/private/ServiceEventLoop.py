@@ -0,0 +1,220 @@
+""" Event loop multiplexing the connections of the services run by a ServiceReactor
+
+    In the default mode every accepted connection is handed to a thread of the service
+    thread pool, which then blocks on the socket while the client sends its proposal and
+    its arguments. When a service runs with the EventLoop option, the connections waiting
+    for data are instead watched by a single ServiceEventLoop: the data are read without
+    blocking and accumulated in the transport byte stream until a complete DEncoded message
+    is available. Only then the registered callback is invoked, so the threads of the
+    service are only used to execute the actions and idle connections cost a file descriptor.
+
+    The loop runs in the thread of the ServiceReactor, which also gives it the listening
+    sockets to wait on. Other threads can hand a connection back to the loop with watch().
+"""
+
+__RCSID__ = "$Id$"
+
+import os
+import time
+import fcntl
+import errno
+import select
+import threading
+
+from DIRAC import gLogger
+from DIRAC.Core.DISET.private.TransportPool import getGlobalTransportPool
+
+
+class ServiceEventLoop(object):
+  """ poll() based loop watching the listening sockets and the connections waiting for a message
+  """
+
+  def __init__(self, transportPool=None, idleTimeout=600):
+    """ c'tor
+
+        :param transportPool: TransportPool holding the watched transports, the global one by default
+        :param int idleTimeout: seconds after which a connection without traffic is closed
+    """
+    self.log = gLogger.getSubLogger("ServiceEventLoop")
+    if not transportPool:
+      transportPool = getGlobalTransportPool()
+    self.__trPool = transportPool
+    self.__idleTimeout = idleTimeout
+    self.__poller = select.poll()
+    # fd -> socket for the listening sockets
+    self.__listeners = {}
+    # fd -> dict with the trid, callback, args, maxBufferSize and lastActivity of a watched connection
+    self.__watched = {}
+    # Connections added by watch(), registered in the poller by the loop thread
+    self.__pending = []
+    self.__pendingLock = threading.Lock()
+    self.__lastIdleCheck = time.time()
+    # Pipe used to wake the loop up when a connection is added from another thread
+    self.__wakeUpRead, self.__wakeUpWrite = os.pipe()
+    for fd in (self.__wakeUpRead, self.__wakeUpWrite):
+      fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+    self.__poller.register(self.__wakeUpRead, select.POLLIN)
+
+  def getNumConnections(self):
+    """ Number of connections watched by the loop
+    """
+    return len(self.__watched) + len(self.__pending)
+
+  def watch(self, trid, callback, args=(), maxBufferSize=0):
+    """ Watch a connection until a complete message has been received on it.
+        The callback is then called in the loop thread as callback( trid, *args ),
+        the message being available in the transport buffer. The connection is no longer
+        watched once the callback is invoked: the callback has to call watch() again to
+        wait for the next message. Can be called from any thread.
+
+        :param int trid: id of the transport in the transport pool
+        :param callback: function to call when a message is available
+        :param tuple args: extra arguments of the callback
+        :param int maxBufferSize: the connection is closed if more bytes are buffered
+                                  without a complete message, 0 for no limit
+    """
+    with self.__pendingLock:
+      self.__pending.append({'trid': trid,
+                             'callback': callback,
+                             'args': args,
+                             'maxBufferSize': maxBufferSize,
+                             'lastActivity': time.time()})
+    try:
+      os.write(self.__wakeUpWrite, "w")
+    except OSError as e:
+      # A full pipe already wakes the loop up
+      if e.errno != errno.EAGAIN:
+        raise
+
+  def poll(self, listeningSockets, timeout):
+    """ Wait for activity, process the watched connections and return the listening
+        sockets with connections to accept
+
+        :param list listeningSockets: sockets listening for new connections
+        :param int timeout: maximum time to wait in seconds
+        :return: list of listening sockets ready to accept
+    """
+    self.__updateListeners(listeningSockets)
+    # Connections handed back may already hold a complete message in their buffer
+    for fd in self.__registerPending():
+      self.__processConnection(fd, False)
+    try:
+      events = self.__poller.poll(int(timeout * 1000))
+    except select.error as e:
+      if e.args[0] != errno.EINTR:
+        raise
+      events = []
+    readyListeners = []
+    for fd, event in events:
+      if fd == self.__wakeUpRead:
+        self.__drainWakeUp()
+      elif fd in self.__listeners:
+        readyListeners.append(self.__listeners[fd])
+      elif fd in self.__watched:
+        if event & (select.POLLERR | select.POLLNVAL):
+          self.__closeConnection(fd, "Socket error")
+        else:
+          self.__processConnection(fd, True)
+    self.__closeIdleConnections()
+    return readyListeners
+
+  def __updateListeners(self, listeningSockets):
+    """ Register the listening sockets in the poller, the list may change when the
+        server contexts are renewed
+    """
+    listeners = dict((sock.fileno(), sock) for sock in listeningSockets)
+    for fd in set(self.__listeners) - set(listeners):
+      self.__poller.unregister(fd)
+    for fd in set(listeners) - set(self.__listeners):
+      self.__poller.register(fd, select.POLLIN)
+    self.__listeners = listeners
+
+  def __drainWakeUp(self):
+    try:
+      while os.read(self.__wakeUpRead, 4096):
+        pass
+    except OSError as e:
+      if e.errno != errno.EAGAIN:
+        raise
+
+  def __registerPending(self):
+    """ Register the connections added by watch()
+
+        :return: list of the registered file descriptors
+    """
+    with self.__pendingLock:
+      pending = self.__pending
+      self.__pending = []
+    fdList = []
+    for connection in pending:
+      transport = self.__trPool.get(connection['trid'])
+      if not transport:
+        continue
+      try:
+        fd = transport.getSocket().fileno()
+      except Exception as e:
+        self.log.debug("Cannot watch connection", "%s: %s" % (connection['trid'], e))
+        self.__trPool.close(connection['trid'])
+        continue
+      if fd not in self.__watched:
+        self.__poller.register(fd, select.POLLIN)
+      self.__watched[fd] = connection
+      fdList.append(fd)
+    return fdList
+
+  def __unwatch(self, fd):
+    connection = self.__watched.pop(fd)
+    try:
+      self.__poller.unregister(fd)
+    except KeyError:
+      pass
+    return connection
+
+  def __closeConnection(self, fd, reason):
+    connection = self.__unwatch(fd)
+    self.log.debug("Closing connection", "%s: %s" % (connection['trid'], reason))
+    self.__trPool.close(connection['trid'])
+
+  def __processConnection(self, fd, readable):
+    """ Read the available data of a watched connection and invoke its callback when
+        a complete message is buffered
+
+        :param int fd: file descriptor of the connection
+        :param bool readable: True if poll() reported data to read
+    """
+    connection = self.__watched[fd]
+    trid = connection['trid']
+    transport = self.__trPool.get(trid)
+    if not transport:
+      self.__unwatch(fd)
+      return
+    if readable:
+      result = transport.readAvailable()
+      if not result['OK']:
+        self.__closeConnection(fd, result['Message'])
+        return
+      connection['lastActivity'] = time.time()
+    # Keep alives are answered here, they are not messages for the service
+    while transport.isKeepAliveBuffered():
+      result = transport.receiveData(blockAfterKeepAlive=False)
+      if not result['OK']:
+        self.__closeConnection(fd, result['Message'])
+        return
+    if not transport.hasBufferedMessage():
+      if connection['maxBufferSize'] and transport.getBufferedSize() > connection['maxBufferSize']:
+        self.__closeConnection(fd, "Read limit exceeded (%s chars)" % connection['maxBufferSize'])
+      return
+    self.__unwatch(fd)
+    try:
+      connection['callback'](trid, *connection['args'])
+    except Exception as e:
+      self.log.exception("Exception while processing a connection", lException=e)
+      self.__trPool.close(trid)
+
+  def __closeIdleConnections(self):
+    now = time.time()
+    if not self.__idleTimeout or now - self.__lastIdleCheck < 10:
+      return
+    self.__lastIdleCheck = now
+    for fd in [fd for fd in self.__watched if now - self.__watched[fd]['lastActivity'] > self.__idleTimeout]:
+      self.__closeConnection(fd, "Idle for more than %s seconds" % self.__idleTimeout)
@@ -0,0 +1,82 @@
+""" Statistics of the actions served by a Service: number of calls and errors, and histograms of the
+    handshake time, of the time waited in the thread pool queue, of the execution time and of the
+    sizes of the request and of the response, for each action.
+"""
+
+__RCSID__ = "$Id$"
+
+import threading
+
+from DIRAC.Core.Utilities import Time
+from DIRAC.Core.Utilities.Histogram import Histogram
+
+# Measures of the calls, in seconds and in bytes
+TIME_MEASURES = ('handshakeTime', 'queueTime', 'executionTime')
+SIZE_MEASURES = ('requestBytes', 'responseBytes')
+
+
+class ServiceStatistics(object):
+  """ Thread safe statistics of the actions of a service, since its start
+  """
+
+  def __init__(self):
+    self.__lock = threading.Lock()
+    self.__startTime = Time.dateTime()
+    self.__actions = {}
+
+  def __newActionStatistics(self):
+    """ Counters and histograms of an action """
+    actionStats = {'calls': 0, 'errors': 0, 'rejected': 0}
+    for measure in TIME_MEASURES:
+      actionStats[measure] = Histogram(resolution=1e-6)
+    for measure in SIZE_MEASURES:
+      actionStats[measure] = Histogram()
+    return actionStats
+
+  def __getActionStatistics(self, actionName):
+    """ Statistics of an action, created at its first call """
+    actionStats = self.__actions.get(actionName)
+    if actionStats is None:
+      actionStats = self.__actions[actionName] = self.__newActionStatistics()
+    return actionStats
+
+  def addRejection(self, actionName):
+    """ Count a call of an action rejected because the service was too busy
+
+    :param str actionName: name of the action, e.g. RPC/ping
+    """
+    with self.__lock:
+      self.__getActionStatistics(actionName)['rejected'] += 1
+
+  def addCall(self, actionName, failed=False, **measures):
+    """ Count a call of an action
+
+    :param str actionName: name of the action, e.g. RPC/ping
+    :param bool failed: True if the action returned an error or could not be completed
+    :param measures: values of the TIME_MEASURES (seconds) and SIZE_MEASURES (bytes) known for the call,
+                     e.g. there is no handshake for the calls on a kept connection
+    """
+    with self.__lock:
+      actionStats = self.__getActionStatistics(actionName)
+      actionStats['calls'] += 1
+      if failed:
+        actionStats['errors'] += 1
+      for measure, value in measures.iteritems():
+        if value is not None:
+          actionStats[measure].add(value)
+
+  def getStatistics(self):
+    """ Statistics of all the actions called
+
+    :return: dict with the start time of the statistics ('Since') and, for each action name ('Actions'),
+             the counts of calls, errors and rejected calls and the summary of each measure,
+             see Histogram.getSummary
+    """
+    with self.__lock:
+      actions = {}
+      for actionName, actionStats in self.__actions.iteritems():
+        actions[actionName] = {'calls': actionStats['calls'], 'errors': actionStats['errors'],
+                               'rejected': actionStats['rejected']}
+        for measure in TIME_MEASURES + SIZE_MEASURES:
+          actions[actionName][measure] = actionStats[measure].getSummary()
+    return {'Since': self.__startTime, 'Actions': actions}
@@ -21,17 +21,33 @@ Client <- Service        : Close
 __RCSID__ = "$Id$"
 
 import time
+import errno
 import select
+import socket
+import os
+import zlib
 import cStringIO
 from hashlib import md5
 
 from DIRAC.Core.Utilities.ReturnValues import S_ERROR, S_OK
 from DIRAC.FrameworkSystem.Client.Logger import gLogger
 from DIRAC.Core.Utilities import DEncode
+from DIRAC.Core.Utilities import BinEncode
+
+# Codecs which can be negotiated by the clients and services, DEncode is the default
+gCodecs = {BinEncode.CODEC_NAME: BinEncode}
+# Compressions which can be negotiated, applied to the messages above a threshold
+gCompressions = {'zlib': zlib}
+COMPRESSION_LEVEL = 1
+# Maximum size of a decompressed message, when the receiver does not give a smaller limit
+MAX_DECOMPRESSED_SIZE = 1024 * 1024 * 1024
+# Setting this environment variable to 'no' prevents the clients from asking for compression
+COMPRESSION_ENABLED = os.environ.get('DIRAC_USE_COMPRESSION', 'yes').lower() in ('yes', 'true')
 
 
 class BaseTransport(object):
-  """ Invokes DEncode for marshaling/unmarshaling of data calls in transit
+  """ Invokes DEncode, or the codec negotiated for the connection, for marshaling/unmarshaling
+      of data calls in transit. Keep alives are always DEncoded.
   """
 
   bAllowReuseAddress = True
@@ -41,6 +57,8 @@ class BaseTransport(object):
   iListenQueueSize = 128
   iReadTimeout = 600
   keepAliveMagic = "dka"
+  # True if handshake() exchanges data with the peer and may block
+  bBlockingHandshake = False
 
   def __init__(self, stServerAddress, bServerMode=False, **kwargs):
     self.bServerMode = bServerMode
@@ -58,6 +76,11 @@ class BaseTransport(object):
     self.waitingForKeepAlivePong = False
     self.__keepAliveLapse = 0
     self.oSocket = None
+    self.__codec = DEncode
+    self.__compression = None
+    self.__compressionThreshold = 0
+    self.__compressionStats = {'messages': 0, 'rawBytes': 0, 'wireBytes': 0, 'time': 0.}
+    self.__trafficStats = {'sentBytes': 0, 'receivedBytes': 0}
     if 'keepAliveLapse' in kwargs:
       try:
         self.__keepAliveLapse = max(150, int(kwargs['keepAliveLapse']))
@@ -154,16 +177,128 @@ class BaseTransport(object):
     except Exception as e:
       return S_ERROR("Exception while reading from peer: %s" % str(e))
 
+  def _readNonBlocking(self, bufSize=4096):
+    """ Read the data available without blocking, e.g. in the event loop
+
+    :return: S_OK(data), data being None if there is nothing to read yet and '' if the peer closed the connection
+    """
+    try:
+      return S_OK(self.oSocket.recv(bufSize, socket.MSG_DONTWAIT))
+    except socket.error as e:
+      if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+        return S_OK(None)
+      return S_ERROR("Exception while reading from peer: %s" % str(e))
+
+  def _hasPendingData(self):
+    """ Check if data were received and buffered by the transport itself, e.g. decrypted by SSL,
+        as poll() does not report them
+    """
+    return False
+
   def _write(self, buf):
     return S_OK(self.oSocket.send(buf))
 
+  def setCodec(self, codecName=None):
+    """ Set the codec of the messages, once negotiated with the peer
+
+    :param str codecName: name of the codec, DEncode if None
+    :return: S_OK/S_ERROR
+    """
+    if not codecName:
+      self.__codec = DEncode
+    elif codecName in gCodecs:
+      self.__codec = gCodecs[codecName]
+    else:
+      return S_ERROR("Unknown codec %s" % codecName)
+    return S_OK()
+
+  def setCompression(self, compressionName=None, threshold=0):
+    """ Set the compression of the messages, once negotiated with the peer.
+        The messages start then with a flag telling if they are compressed.
+
+    :param str compressionName: name of the compression, no compression if None
+    :param int threshold: size from which the encoded messages are compressed
+    :return: S_OK/S_ERROR
+    """
+    if not compressionName:
+      self.__compression = None
+    elif compressionName in gCompressions:
+      self.__compression = gCompressions[compressionName]
+      self.__compressionThreshold = threshold
+    else:
+      return S_ERROR("Unknown compression %s" % compressionName)
+    return S_OK()
+
+  def setNegotiatedOptions(self, options=None):
+    """ Set the codec and the compression negotiated in the proposal of an action
+
+    :param dict options: options chosen by the service, the defaults if None
+    :return: S_OK/S_ERROR
+    """
+    options = options or {}
+    result = self.setCodec(options.get('codec'))
+    if not result['OK']:
+      return result
+    return self.setCompression(options.get('compression'), options.get('compressionThreshold', 0))
+
+  def getCompressionStats(self):
+    """ Counters of the messages compressed and decompressed by this transport:
+        number of messages, sizes before and after compression, and time spent
+
+    :return: dict
+    """
+    return dict(self.__compressionStats)
+
+  def getTrafficStats(self):
+    """ Bytes of the messages sent and received by this transport, keep alives excluded
+
+    :return: dict
+    """
+    return dict(self.__trafficStats)
+
+  def __compress(self, sCodedData):
+    if len(sCodedData) < self.__compressionThreshold:
+      return 'r' + sCodedData
+    startTime = time.time()
+    compressedData = self.__compression.compress(sCodedData, COMPRESSION_LEVEL)
+    stats = self.__compressionStats
+    stats['time'] += time.time() - startTime
+    stats['messages'] += 1
+    stats['rawBytes'] += len(sCodedData)
+    if len(compressedData) >= len(sCodedData):
+      stats['wireBytes'] += len(sCodedData)
+      return 'r' + sCodedData
+    stats['wireBytes'] += len(compressedData)
+    return 'z' + compressedData
+
+  def __decompress(self, data, maxSize):
+    if data[:1] == 'r':
+      return data[1:]
+    if data[:1] != 'z':
+      raise ValueError("Invalid compression flag")
+    startTime = time.time()
+    decompressor = self.__compression.decompressobj()
+    sCodedData = decompressor.decompress(data[1:], maxSize + 1)
+    if len(sCodedData) > maxSize or decompressor.unconsumed_tail:
+      raise ValueError("Decompressed message larger than %s bytes" % maxSize)
+    stats = self.__compressionStats
+    stats['time'] += time.time() - startTime
+    stats['messages'] += 1
+    stats['rawBytes'] += len(sCodedData)
+    stats['wireBytes'] += len(data) - 1
+    return sCodedData
+
   def sendData(self, uData, prefix=False):
     self.__updateLastActionTimestamp()
-    sCodedData = DEncode.encode(uData)
+    # Messages with a prefix are keep alives
+    sCodedData = DEncode.encode(uData) if prefix else self.__codec.encode(uData)
+    if self.__compression and not prefix:
+      sCodedData = self.__compress(sCodedData)
     if prefix:
       dataToSend = "%s%s:%s" % (prefix, len(sCodedData), sCodedData)
     else:
       dataToSend = "%s:%s" % (len(sCodedData), sCodedData)
+      self.__trafficStats['sentBytes'] += len(dataToSend)
     for index in range(0, len(dataToSend), self.packetSize):
       bytesToSend = min(self.packetSize, len(dataToSend) - index)
       packSentBytes = 0
@@ -219,12 +354,40 @@ class BaseTransport(object):
       # From here it must be a real message!
       # Process the size and remove the msg length from the bytestream
       pkgSize = int(self.byteStream[:iSeparatorPosition])
+      self.__trafficStats['receivedBytes'] += iSeparatorPosition + 1 + pkgSize
       pkgData = self.byteStream[iSeparatorPosition + 1:]
       readSize = len(pkgData)
       if readSize >= pkgSize:
         # If we already have all the data we need
         data = pkgData[:pkgSize]
         self.byteStream = pkgData[pkgSize:]
+      elif hasattr(self.__codec, 'StreamDecoder'):
+        # The message is decoded while it arrives, only the undecoded bytes are kept
+        self.byteStream = ""
+        decoder = self.__codec.StreamDecoder()
+        feed = decoder.feed
+        if self.__compression:
+          feed = _DecompressingFeed(feed, self.__compression, self.__compressionStats,
+                                    maxBufferSize or MAX_DECOMPRESSED_SIZE)
+        try:
+          feed(pkgData)
+          del pkgData
+          while readSize < pkgSize:
+            retVal = self._read(pkgSize - readSize, skipReadyCheck=True)
+            if not retVal['OK']:
+              return retVal
+            if not retVal['Value']:
+              return S_ERROR("Peer closed connection")
+            readSize += len(retVal['Value'])
+            if maxBufferSize and readSize > maxBufferSize:
+              return S_ERROR("Read limit exceeded (%s chars)" % maxBufferSize)
+            feed(retVal['Value'])
+          if not decoder.isDone() or decoder.getRemainder():
+            return S_ERROR("Could not decode received data: message size mismatch")
+          data = decoder.getValue()
+        except ValueError as e:
+          return S_ERROR("Could not decode received data: %s" % str(e))
+        return self.__returnReceived(data, idleReceive)
       else:
         # If we still need to read stuff
         pkgMem = cStringIO.StringIO()
@@ -250,21 +413,90 @@ class BaseTransport(object):
           data = pkgMem.read(pkgSize)
           self.byteStream = pkgMem.read()
       try:
-        data = DEncode.decode(data)[0]
+        if self.__compression:
+          data = self.__decompress(data, maxBufferSize or MAX_DECOMPRESSED_SIZE)
+        data = self.__codec.decode(data)[0]
       except Exception as e:
         return S_ERROR("Could not decode received data: %s" % str(e))
-      if idleReceive:
-        self.receivedMessages.append(data)
-        return S_OK()
-      return data
+      return self.__returnReceived(data, idleReceive)
     except Exception as e:
       gLogger.exception("Network error while receiving data")
       return S_ERROR("Network error while receiving data: %s" % str(e))
 
+  def __returnReceived(self, data, idleReceive):
+    if idleReceive:
+      self.receivedMessages.append(data)
+      return S_OK()
+    return data
+
+  def readAvailable(self):
+    """ Read the data arrived on the socket and append them to the byte stream.
+        Meant to be called when the socket is known to be readable, e.g. by the
+        ServiceEventLoop, so that the messages are framed without blocking: a readable
+        SSL socket may not hold a complete record yet, in which case nothing is read.
+
+    :return: S_OK/S_ERROR
+    """
+    while True:
+      retVal = self._readNonBlocking(16384)
+      if not retVal['OK']:
+        return retVal
+      data = retVal['Value']
+      if data is None:
+        return S_OK()
+      if not data:
+        return S_ERROR("Peer closed connection")
+      self.__updateLastActionTimestamp()
+      self.byteStream += data
+      # The socket is read again when poll() reports it, but not the data already buffered by the transport
+      if not self._hasPendingData():
+        return S_OK()
+
+  def getBufferedSize(self):
+    """ Number of bytes received and not processed yet
+    """
+    return len(self.byteStream)
+
+  def isKeepAliveBuffered(self):
+    """ Check if the byte stream starts with a complete keep alive
+    """
+    keepAliveMagicLen = len(BaseTransport.keepAliveMagic)
+    if self.byteStream.find(BaseTransport.keepAliveMagic, 0, keepAliveMagicLen) != 0:
+      return False
+    return self.__isMessageBuffered(keepAliveMagicLen)
+
+  def hasBufferedMessage(self):
+    """ Check if a complete message has been received, so that receiveData()
+        returns without reading from the socket
+
+    :return: bool
+    """
+    if self.receivedMessages:
+      return True
+    return self.__isMessageBuffered()
+
+  def __isMessageBuffered(self, offset=0):
+    iSeparatorPosition = self.byteStream.find(":", offset, offset + 10)
+    if iSeparatorPosition == -1:
+      # Without separator in the first bytes the message is invalid: let receiveData report it
+      return len(self.byteStream) - offset >= 10
+    try:
+      pkgSize = int(self.byteStream[offset:iSeparatorPosition])
+    except ValueError:
+      return True
+    return len(self.byteStream) - iSeparatorPosition - 1 >= pkgSize
+
   def __processKeepAlive(self, maxBufferSize, blockAfterKeepAlive=True):
     gLogger.debug("Received Keep Alive")
-    # Next message down the stream will be the ka data
-    result = self.receiveData(maxBufferSize, blockAfterKeepAlive=False)
+    # Next message down the stream will be the ka data, always DEncoded, not compressed and not counted
+    codec, compression = self.__codec, self.__compression
+    receivedBytes = self.__trafficStats['receivedBytes']
+    self.__codec, self.__compression = DEncode, None
+    try:
+      result = self.receiveData(maxBufferSize, blockAfterKeepAlive=False)
+    finally:
+      self.__codec, self.__compression = codec, compression
+      self.__trafficStats['receivedBytes'] = receivedBytes
     if not result['OK']:
       gLogger.debug("Error while receiving keep alive: %s" % result['Message'])
       return result
@@ -330,3 +562,41 @@ class BaseTransport(object):
     This method has to be overwritten, if we want to increase the socket timeout.
     """
     pass
+
+
+class _DecompressingFeed(object):
+  """ Decompress the chunks of a message, according to its compression flag,
+      before giving them to a StreamDecoder, at most maxSize decompressed bytes
+  """
+
+  def __init__(self, feed, compression, stats, maxSize=MAX_DECOMPRESSED_SIZE):
+    self.__feed = feed
+    self.__compression = compression
+    self.__stats = stats
+    self.__maxSize = maxSize
+    self.__size = 0
+    self.__decompressor = None
+    self.__flag = None
+
+  def __call__(self, data):
+    if self.__flag is None:
+      if not data:
+        return False
+      self.__flag = data[0]
+      if self.__flag == 'z':
+        self.__decompressor = self.__compression.decompressobj()
+        self.__stats['messages'] += 1
+      elif self.__flag != 'r':
+        raise ValueError("Invalid compression flag")
+      data = data[1:]
+    if self.__flag == 'r':
+      return self.__feed(data)
+    startTime = time.time()
+    sCodedData = self.__decompressor.decompress(data, self.__maxSize - self.__size + 1)
+    self.__size += len(sCodedData)
+    if self.__size > self.__maxSize or self.__decompressor.unconsumed_tail:
+      raise ValueError("Decompressed message larger than %s bytes" % self.__maxSize)
+    self.__stats['time'] += time.time() - startTime
+    self.__stats['rawBytes'] += len(sCodedData)
+    self.__stats['wireBytes'] += len(data)
+    return self.__feed(sCodedData)
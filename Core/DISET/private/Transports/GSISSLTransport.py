@@ -17,6 +17,7 @@ GSI.SSL.set_thread_safe()
 class SSLTransport(BaseTransport):
 
   __readWriteLock = LockRing().getLock()
+  bBlockingHandshake = True
 
   def __init__(self, *args, **kwargs):
     self.__writesDone = 0
@@ -156,6 +157,25 @@ class SSLTransport(BaseTransport):
     finally:
       self.__unlock()
 
+  def _readNonBlocking(self, bufSize=4096):
+    self.__lock()
+    self.oSocket.setblocking(0)
+    try:
+      try:
+        return S_OK(self.oSocket.recv(bufSize))
+      except (GSI.SSL.WantReadError, GSI.SSL.WantWriteError):
+        return S_OK(None)
+      except GSI.SSL.ZeroReturnError:
+        return S_OK("")
+      except Exception as e:
+        return S_ERROR("Exception while reading from peer: %s" % str(e))
+    finally:
+      self.oSocket.settimeout(self.oSocketInfo.infoDict['timeout'])
+      self.__unlock()
+
+  def _hasPendingData(self):
+    return self.oSocket.pending() > 0
+
   def isLocked(self):
     return self.__locked
 
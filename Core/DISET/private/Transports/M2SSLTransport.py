@@ -11,7 +11,8 @@ from M2Crypto import SSL, threading as M2Threading
 
 from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
 from DIRAC.Core.DISET.private.Transports.BaseTransport import BaseTransport
-from DIRAC.Core.DISET.private.Transports.SSL.M2Utils import getM2SSLContext, getM2PeerInfo
+from DIRAC.Core.DISET.private.Transports.SSL.M2Utils import getM2SSLContext, getM2PeerInfo, \
+    getM2CredentialsKey, getM2ClientContext, getM2ClientSession, storeM2ClientSession
 
 # TODO: For now we have to set an environment variable for proxy support in OpenSSL
 # Eventually we may need to add API support for this to M2Crypto...
@@ -46,15 +47,22 @@ class SSLTransport(BaseTransport):
     """ Create an SSLTransport object, parameters are the same
         as for other transports. If ctx is specified (as an instance of
         SSL.Context) then use that rather than creating a new context.
+        Clients reuse the context and the TLS session of the previous
+        connections with the same credentials.
     """
     self.remoteAddress = None
     self.peerCredentials = {}
     self.__timeout = 1
     self.__locked = False  # We don't support locking, so this is always false.
+    self.__credentialsKey = None
 
     self.__ctx = kwargs.pop('ctx', None)
     if not self.__ctx:
-      self.__ctx = getM2SSLContext(**kwargs)
+      if kwargs.get('bServerMode', False):
+        self.__ctx = getM2SSLContext(**kwargs)
+      else:
+        self.__credentialsKey = getM2CredentialsKey(**kwargs)
+        self.__ctx = getM2ClientContext(self.__credentialsKey, **kwargs)
 
     self.__kwargs = kwargs
     BaseTransport.__init__(self, *args, **kwargs)
@@ -89,6 +97,12 @@ class SSLTransport(BaseTransport):
         # set SNI server name since we know it at this point
         self.oSocket.set_tlsext_host_name(host)
 
+        # Resume the session of the previous connection, if the server still knows it
+        if self.__credentialsKey:
+          session = getM2ClientSession(self.stServerAddress, self.__credentialsKey)
+          if session:
+            self.oSocket.set_session(session)
+
         self.oSocket.connect((host, port))
         self.remoteAddress = self.oSocket.getpeername()
 
@@ -128,6 +142,11 @@ class SSLTransport(BaseTransport):
   def close(self):
     """ Close this socket. """
     if self.oSocket:
+      if self.__credentialsKey and self.remoteAddress:
+        try:
+          storeM2ClientSession(self.stServerAddress, self.__credentialsKey, self.oSocket)
+        except Exception:  # pylint: disable=broad-except
+          pass
       # Surprisingly (to me at least), M2Crypto does not close
       # the socket when calling SSL.Connection.close
       # It only does it when the garbage collector kicks in
@@ -191,6 +210,28 @@ class SSLTransport(BaseTransport):
     read = self.oSocket.read(bufSize)
     return S_OK(read)
 
+  def _readNonBlocking(self, bufSize=4096):
+    """ Read the decrypted data available without blocking on an incomplete SSL record.
+
+        :param bufSize: size of the buffer to read
+
+        :returns: S_OK(data read), None if SSL wants more data, '' if the peer closed the connection
+    """
+    self.oSocket.setblocking(0)
+    try:
+      return S_OK(self.oSocket.read(bufSize))
+    except (SSL.SSLError, socket.error) as e:
+      return S_ERROR("Exception while reading from peer: %s" % str(e))
+    finally:
+      self.oSocket.setblocking(1)
+
+  def _hasPendingData(self):
+    """ Returns if decrypted data are waiting in the SSL buffer
+
+        :returns: bool
+    """
+    return self.oSocket.pending() > 0
+
   def isLocked(self):
     """ Returns if this instance is locked.
         Always returns false.
@@ -4,10 +4,12 @@ Utilities for using M2Crypto SSL with DIRAC.
 """
 
 import os
+import time
 from M2Crypto import SSL, m2
 
 from DIRAC.Core.Security import Locations
 from DIRAC.Core.Security.m2crypto.X509Chain import X509Chain
+from DIRAC.Core.Utilities.DictCache import DictCache
 
 # Default ciphers to use if unspecified
 # Cipher line should be as readable as possible, sorry pylint
@@ -15,6 +17,17 @@ from DIRAC.Core.Security.m2crypto.X509Chain import X509Chain
 DEFAULT_SSL_CIPHERS = "AES256-GCM-SHA384:AES256-SHA256:AES256-SHA:CAMELLIA256-SHA:AES128-GCM-SHA256:AES128-SHA256:AES128-SHA:HIGH:MEDIUM:RSA:!3DES:!RC4:!aNULL:!eNULL:!MD5:!SEED:!IDEA"  # noqa
 # Verify depth of peer certs
 VERIFY_DEPTH = 50
+# Seconds during which the TLS sessions can be resumed
+SESSION_TIMEOUT = 600
+# Seconds during which the client contexts are reused
+CONTEXT_CACHE_TIME = 600
+
+# Client contexts by credentials key, client sessions by ( server address, credentials key ),
+# and credentials of the peers by certificate fingerprint
+gClientContexts = DictCache()
+gClientSessions = DictCache()
+gPeerInfoCache = DictCache()
+gLastPurge = time.time()
 
 
 def __loadM2SSLCTXHostcert(ctx):
@@ -127,12 +140,94 @@ def getM2SSLContext(ctx=None, **kwargs):
   ciphers = kwargs.get('sslCiphers', DEFAULT_SSL_CIPHERS)
   ctx.set_cipher_list(ciphers)
 
+  if kwargs.get('bServerMode', False):
+    # Keep the sessions for resumption, also through the renewals of the context.
+    # The session tickets, enabled by default, work with this timeout too.
+    ctx.set_session_cache_mode(m2.SSL_SESS_CACHE_SERVER)  # pylint: disable=no-member
+    ctx.set_session_timeout(SESSION_TIMEOUT)
+
   # log the debug messages
   # ctx.set_info_callback()
 
   return ctx
 
 
+def getM2CredentialsKey(**kwargs):
+  """ Gets a key identifying the credentials and the settings of a client context
+      built from kwargs (see getM2SSLContext). The key changes when the certificate
+      or proxy file is replaced, so that a new proxy is never hidden by a cached
+      context or session.
+
+      Returns a tuple.
+  """
+  if kwargs.get('useCertificates', False):
+    certKeyTuple = Locations.getHostCertificateAndKeyLocation()
+    credLocation = certKeyTuple[0] if certKeyTuple else None
+  else:
+    credLocation = kwargs.get('proxyLocation') or Locations.getProxyLocation()
+  try:
+    credStat = os.stat(credLocation)
+    credStat = (credStat.st_ino, credStat.st_size, credStat.st_mtime)
+  except (TypeError, OSError):
+    credStat = None
+  return (bool(kwargs.get('useCertificates', False)), credLocation, credStat,
+          bool(kwargs.get('skipCACheck', False)), kwargs.get('sslMethod'), kwargs.get('sslCiphers'))
+
+
+def getM2ClientContext(credentialsKey, **kwargs):
+  """ Gets a client context for the credentials described by kwargs,
+      reusing the one created for the same credentials key if any, so that the
+      certificates are not loaded for every connection.
+
+      Returns an M2Crypto.SSL.Context.
+  """
+  ctx = gClientContexts.get(credentialsKey)
+  if not ctx:
+    ctx = getM2SSLContext(**kwargs)
+    __addToCache(gClientContexts, credentialsKey, CONTEXT_CACHE_TIME, ctx)
+  return ctx
+
+
+def getM2ClientSession(serverAddress, credentialsKey):
+  """ Gets the TLS session of the last connection to serverAddress with the same
+      credentials, to be resumed by the next connection.
+
+      Returns an M2Crypto.SSL.Session or None.
+  """
+  return gClientSessions.get((tuple(serverAddress), credentialsKey))
+
+
+def storeM2ClientSession(serverAddress, credentialsKey, conn):
+  """ Keeps the TLS session of the M2 SSL Connection obj "conn" for the next
+      connections to serverAddress with the same credentials. With TLS 1.3 the
+      session is only known after some data was received, so this is meant to
+      be called when closing the connection.
+
+      Returns None.
+  """
+  # Connection.get_session does not take a reference on the session, which is freed with the connection
+  sessionPtr = m2.ssl_get1_session(conn.ssl)  # pylint: disable=no-member
+  if sessionPtr:
+    session = SSL.Session.Session(sessionPtr, 1)
+    __addToCache(gClientSessions, (tuple(serverAddress), credentialsKey), SESSION_TIMEOUT, session)
+
+
+def __addToCache(cache, cKey, validSeconds, value):
+  """ Add an entry to one of the caches, and remove the expired ones once a minute """
+  global gLastPurge
+  cache.add(cKey, validSeconds, value)
+  now = time.time()
+  if now - gLastPurge > 60:
+    gLastPurge = now
+    for cacheToPurge in (gClientContexts, gClientSessions, gPeerInfoCache):
+      cacheToPurge.purgeExpired()
+
+
+def __getPeerCertKey(conn):
+  """ Fingerprint of the certificate of the peer of "conn" """
+  return conn.get_peer_cert().get_fingerprint('sha256')
+
+
 def getM2PeerInfo(conn):
   """ Gets the details of the current peer as a standard dict. The peer
       details are obtained from the supplied M2 SSL Connection obj "conn".
@@ -144,8 +239,34 @@ def getM2PeerInfo(conn):
          isLimitedProxy - Boolean, True if chain ends with limited proxy
          group - String, DIRAC group for this peer, if known
 
+      The peer does not send its chain when it resumes a TLS session, so the
+      details are cached by peer certificate, which was verified with its chain
+      in the full handshake. An entry is kept SESSION_TIMEOUT seconds after the
+      last connection, as long as the sessions it can be resumed with, and
+      secondsLeft is updated.
+
       Returns a dict of details.
   """
+  certKey = __getPeerCertKey(conn)
+  cachedPeer = gPeerInfoCache.get(certKey)
+  if cachedPeer:
+    peer = dict(cachedPeer['peer'])
+    peer['secondsLeft'] = max(0, int(cachedPeer['notAfter'] - time.time()))
+  else:
+    peer = __getM2PeerInfo(conn)
+    # The certificates of the peer chain belong to the connection, the cache needs its own copy
+    cachedChain = X509Chain()
+    pemChain = peer['x509Chain'].dumpAllToString()
+    if not pemChain['OK'] or not cachedChain.loadChainFromString(pemChain['Value'])['OK']:
+      return peer
+    cachedPeer = {'peer': dict(peer, x509Chain=cachedChain), 'notAfter': time.time() + peer.get('secondsLeft', 0)}
+  if peer.get('secondsLeft', 0) > 0:
+    __addToCache(gPeerInfoCache, certKey, min(SESSION_TIMEOUT, peer['secondsLeft']), cachedPeer)
+  return peer
+
+
+def __getM2PeerInfo(conn):
+  """ Computes the details of the peer for getM2PeerInfo """
   chain = X509Chain.generateX509ChainFromSSLConnection(conn)
   creds = chain.getCredentials()
   if not creds['OK']:
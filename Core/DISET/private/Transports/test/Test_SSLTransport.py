@@ -8,12 +8,13 @@ import threading
 from pytest import fixture
 
 
-from DIRAC.Core.Security.test.x509TestUtilities import CERTDIR, USERCERT, getCertOption
+from DIRAC.Core.Security.test.x509TestUtilities import CERTDIR, HOSTCERT, USERCERT, getCertOption
 
 
 from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationData
 from DIRAC.Core.Utilities.CFG import CFG
 from DIRAC.Core.DISET.private.Transports import PlainTransport, GSISSLTransport, M2SSLTransport
+from DIRAC.Core.DISET.private.Transports.SSL import M2Utils
 
 # TODO: Expired hostcert
 # TODO: Expired usercert
@@ -24,7 +25,6 @@ from DIRAC.Core.DISET.private.Transports import PlainTransport, GSISSLTransport,
 # TODO: Missing hostcert
 # TODO: Missing usercert
 # TODO: Missing proxy
-# TODO: Session test?
 # TODO: Reload of CAs?
 
 # Define all the locations
@@ -232,3 +232,56 @@ def test_getRemoteInfo(create_serverAndClient):
     assert peerCreds['x509Chain'].getNumCertsInChain()['Value'] == 2
     assert peerCreds['isProxy'] is True
     assert peerCreds['isLimitedProxy'] is False
+
+
+class ChainRecordingServiceReactor(DummyServiceReactor):
+  """ DummyServiceReactor recording the chains sent by the clients """
+
+  def __init__(self, *args, **kwargs):
+    DummyServiceReactor.__init__(self, *args, **kwargs)
+    self.peerChains = []
+
+  def handleConnection(self, clientTransport):
+    """ Record the chain sent by the client, which is None for resumed sessions """
+    self.peerChains.append(clientTransport.oSocket.get_peer_cert_chain())
+    DummyServiceReactor.handleConnection(self, clientTransport)
+
+
+def test_sessionResumption():
+  """ M2 clients resume the TLS session of their previous connection,
+      and the server reuses the credentials of the full handshake
+  """
+  gConfigurationData.localCFG = CFG()
+  gConfigurationData.remoteCFG = CFG()
+  gConfigurationData.mergedCFG = CFG()
+  gConfigurationData.generateNewVersion()
+  gConfigurationData.setOptionInCFG('/DIRAC/Security/CALocation', caLocation)
+  gConfigurationData.setOptionInCFG('/DIRAC/Security/CertFile', hostCertLocation)
+  gConfigurationData.setOptionInCFG('/DIRAC/Security/KeyFile', hostKeyLocation)
+  for cache in (M2Utils.gClientContexts, M2Utils.gClientSessions, M2Utils.gPeerInfoCache):
+    cache.purgeAll()
+
+  sr = ChainRecordingServiceReactor(M2SSLTransport.SSLTransport, PORT_NUMBER)
+  sr.prepare()
+  peerCredentials = []
+  for _ in xrange(2):
+    server_thread = threading.Thread(target=sr.serve)
+    server_thread.start()
+    clientTransport = M2SSLTransport.SSLTransport(("localhost", PORT_NUMBER), bServerMode=False,
+                                                  useCertificates=True)
+    res = clientTransport.initAsClient()
+    assert res['OK'], res
+    assert ping_server(clientTransport) == MAGIC_ANSWER
+    clientTransport.close()
+    server_thread.join()
+    peerCredentials.append(sr.clientTransport.peerCredentials)
+  sr.closeListeningConnections()
+
+  assert len(M2Utils.gClientSessions.getKeys()) == 1
+  assert sr.peerChains[0] is not None
+  assert sr.peerChains[1] is None
+  assert peerCredentials[1]['DN'] == peerCredentials[0]['DN'] == getCertOption(HOSTCERT, 'subjectDN')
+  # The chain of the resumed session comes from the cache, and outlives the connection of the full handshake
+  numCerts = peerCredentials[0]['x509Chain'].getNumCertsInChain()['Value']
+  assert peerCredentials[1]['x509Chain'].getNumCertsInChain()['Value'] == numCerts
+  assert peerCredentials[1]['x509Chain'].dumpAllToString()['Value'].count('BEGIN CERTIFICATE') == numCerts
@@ -0,0 +1,93 @@
+""" Tests of the ActionScheduler
+"""
+
+import time
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.Core.DISET.private.ActionScheduler import ActionScheduler
+
+
+class FakeThreadPool(object):
+  """ Thread pool keeping the submitted jobs until they are run by the test """
+
+  def __init__(self, full=False):
+    self.jobs = []
+    self.full = full
+
+  def submit(self, func, *args):
+    if self.full:
+      return S_ERROR("Queue is full")
+    self.jobs.append((func, args))
+    return S_OK()
+
+  def runNext(self):
+    func, args = self.jobs.pop(0)
+    func(*args)
+
+
+def test_priorities():
+  """ The waiting jobs are given to the pool by priority class, then in their order of arrival """
+  pool = FakeThreadPool()
+  executed = []
+  scheduler = ActionScheduler(pool.submit, 1, actionPriorities={'RPC/ping': 'High', 'RPC/bulk': 'Low'})
+  for actionName in ('RPC/other', 'RPC/bulk', 'RPC/get', 'RPC/ping'):
+    assert scheduler.submit(actionName, executed.append, (actionName,), None)['OK']
+  # Only one job is given to the pool at a time, the others wait in the scheduler
+  assert len(pool.jobs) == 1
+  assert scheduler.getStats()['waiting'] == {'High': 1, 'Normal': 1, 'Low': 1}
+  while pool.jobs:
+    pool.runNext()
+  assert executed == ['RPC/other', 'RPC/ping', 'RPC/get', 'RPC/bulk']
+  assert scheduler.getStats()['running'] == {'High': 0, 'Normal': 0, 'Low': 0}
+
+
+def test_classLimits():
+  """ A class does not get more running jobs than its limit, leaving the other threads to the others """
+  pool = FakeThreadPool()
+  executed = []
+  scheduler = ActionScheduler(pool.submit, 3, actionPriorities={'RPC/bulk': 'Low'}, classLimits={'Low': 1})
+  for _ in xrange(3):
+    scheduler.submit('RPC/bulk', executed.append, ('RPC/bulk',), None)
+  scheduler.submit('RPC/ping', executed.append, ('RPC/ping',), None)
+  assert len(pool.jobs) == 2
+  assert scheduler.getStats()['running'] == {'High': 0, 'Normal': 1, 'Low': 1}
+  while pool.jobs:
+    pool.runNext()
+  assert executed == ['RPC/bulk', 'RPC/ping', 'RPC/bulk', 'RPC/bulk']
+
+
+def test_maxQueueTime():
+  """ The jobs which waited too long are rejected instead of being executed """
+  pool = FakeThreadPool()
+  executed = []
+  rejected = []
+  scheduler = ActionScheduler(pool.submit, 1, maxQueueTime=0.05)
+  scheduler.submit('RPC/first', executed.append, ('RPC/first',), rejected.append)
+  scheduler.submit('RPC/late', executed.append, ('RPC/late',), rejected.append)
+  time.sleep(0.1)
+  scheduler.submit('RPC/last', executed.append, ('RPC/last',), rejected.append)
+  while pool.jobs:
+    pool.runNext()
+  assert executed == ['RPC/first', 'RPC/last']
+  assert rejected == ['RPC/late']
+  assert scheduler.getStats()['expired'] == 1
+
+
+def test_maxQueued():
+  """ No more jobs are accepted when too many are waiting """
+  pool = FakeThreadPool()
+  scheduler = ActionScheduler(pool.submit, 1, maxQueued=1)
+  assert scheduler.submit('RPC/ping', lambda: None, (), None)['OK']
+  assert scheduler.submit('RPC/ping', lambda: None, (), None)['OK']
+  assert not scheduler.submit('RPC/ping', lambda: None, (), None)['OK']
+  assert scheduler.getStats()['rejected'] == 1
+
+
+def test_fullPool():
+  """ The jobs which cannot be given to the pool are rejected """
+  pool = FakeThreadPool(full=True)
+  rejected = []
+  scheduler = ActionScheduler(pool.submit, 1)
+  assert scheduler.submit('RPC/ping', lambda name: None, ('RPC/ping',), rejected.append)['OK']
+  assert rejected == ['RPC/ping']
+  assert scheduler.getStats()['running']['Normal'] == 0
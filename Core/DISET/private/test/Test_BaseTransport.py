@@ -0,0 +1,171 @@
+""" Tests of the codecs, the compression and the reads of the transports, with plain transports
+"""
+
+# pylint: disable=redefined-outer-name
+
+import os
+import zlib
+import select
+import threading
+
+from pytest import fixture, mark, raises
+
+from DIRAC import S_OK
+from DIRAC.Core.Utilities import BinEncode
+from DIRAC.Core.DISET.private.Transports.PlainTransport import PlainTransport
+from DIRAC.Core.DISET.private.Transports.BaseTransport import _DecompressingFeed
+
+
+@fixture
+def transports():
+  """ Connect a client to a listening plain transport
+
+      :return: client transport, server side transport of the connection
+  """
+  server = PlainTransport(("", 0), bServerMode=True)
+  assert server.initAsServer()['OK']
+  client = PlainTransport(("localhost", server.getSocket().getsockname()[1]))
+  assert client.initAsClient()['OK']
+  serverSide = server.acceptConnection()['Value']
+
+  yield client, serverSide
+
+  client.close()
+  serverSide.close()
+  server.close()
+
+
+def test_codec(transports):
+  """ Messages are sent with the codec of the transport, keep alives with DEncode
+  """
+  client, serverSide = transports
+  assert not client.setCodec('unknown')['OK']
+  assert client.setCodec(BinEncode.CODEC_NAME)['OK']
+  assert serverSide.setCodec(BinEncode.CODEC_NAME)['OK']
+
+  # Larger than the first read, so that it is decoded while it arrives
+  message = S_OK(dict(('/dirac/file_%d' % i, ['SE-1', 'SE-2']) for i in xrange(10000)))
+  sender = threading.Thread(target=client.sendData, args=(message,))
+  sender.start()
+  assert serverSide.receiveData() == message
+  sender.join()
+
+  client.sendKeepAlive(responseId='test')
+  client.sendData(S_OK('small'))
+  assert serverSide.receiveData() == S_OK('small')
+
+  assert client.setCodec()['OK']
+  assert serverSide.setCodec()['OK']
+  client.sendData(S_OK('dencoded'))
+  assert serverSide.receiveData() == S_OK('dencoded')
+
+
+def test_trafficStats(transports):
+  """ The bytes of the messages are counted on both sides, without the keep alives
+  """
+  client, serverSide = transports
+  client.sendData(S_OK('data'))
+  client.sendKeepAlive(responseId='test')
+  client.sendData(S_OK('more data'))
+  assert serverSide.receiveData() == S_OK('data')
+  assert serverSide.receiveData() == S_OK('more data')
+  sentBytes = client.getTrafficStats()['sentBytes']
+  assert sentBytes > len('datamore data')
+  assert serverSide.getTrafficStats() == {'sentBytes': 0, 'receivedBytes': sentBytes}
+
+
+@mark.parametrize('codecName', [None, BinEncode.CODEC_NAME])
+def test_compression(transports, codecName):
+  """ Messages above the threshold are compressed, if it saves bytes
+  """
+  client, serverSide = transports
+  options = {'codec': codecName, 'compression': 'zlib', 'compressionThreshold': 1000}
+  assert not client.setNegotiatedOptions({'compression': 'unknown'})['OK']
+  assert client.setNegotiatedOptions(options)['OK']
+  assert serverSide.setNegotiatedOptions(options)['OK']
+
+  client.sendData(S_OK('small'))
+  assert serverSide.receiveData() == S_OK('small')
+  assert client.getCompressionStats()['messages'] == 0
+
+  message = S_OK(dict(('/dirac/file_%d' % i, ['SE-1', 'SE-2']) for i in xrange(100000)))
+  sender = threading.Thread(target=client.sendData, args=(message,))
+  sender.start()
+  assert serverSide.receiveData() == message
+  sender.join()
+  sentStats = client.getCompressionStats()
+  assert sentStats['messages'] == 1
+  assert sentStats['wireBytes'] < sentStats['rawBytes'] / 5
+  receivedStats = serverSide.getCompressionStats()
+  assert (receivedStats['rawBytes'], receivedStats['wireBytes']) == (sentStats['rawBytes'], sentStats['wireBytes'])
+
+  # Not compressible
+  message = S_OK(os.urandom(100000))
+  client.sendKeepAlive(responseId='test')
+  sender = threading.Thread(target=client.sendData, args=(message,))
+  sender.start()
+  assert serverSide.receiveData() == message
+  sender.join()
+  sentStats = client.getCompressionStats()
+  assert sentStats['messages'] == 2
+  assert sentStats['rawBytes'] - sentStats['wireBytes'] == receivedStats['rawBytes'] - receivedStats['wireBytes']
+
+
+@mark.parametrize('codecName', [None, BinEncode.CODEC_NAME])
+def test_decompressionLimit(transports, codecName):
+  """ The decompressed messages are not larger than the read limit
+  """
+  client, serverSide = transports
+  options = {'codec': codecName, 'compression': 'zlib', 'compressionThreshold': 1000}
+  assert client.setNegotiatedOptions(options)['OK']
+  assert serverSide.setNegotiatedOptions(options)['OK']
+
+  client.sendData(S_OK('0' * 1000000))
+  result = serverSide.receiveData(maxBufferSize=100000)
+  assert not result['OK']
+  assert 'larger than 100000 bytes' in result['Message']
+
+
+def test_decompressingFeed():
+  """ The chunks of a message are decompressed up to the limit
+  """
+  stats = {'messages': 0, 'time': 0., 'rawBytes': 0, 'wireBytes': 0}
+  compressedData = zlib.compress('0' * 2000)
+
+  chunks = []
+  feed = _DecompressingFeed(chunks.append, zlib, stats, maxSize=2000)
+  feed('z' + compressedData[:10])
+  feed(compressedData[10:])
+  assert ''.join(chunks) == '0' * 2000
+
+  feed = _DecompressingFeed(chunks.append, zlib, stats, maxSize=1999)
+  feed('z' + compressedData[:10])
+  with raises(ValueError):
+    feed(compressedData[10:])
+
+
+def test_readAvailable(transports):
+  """ The data available are read without blocking, with the data already buffered by the transport
+  """
+  client, serverSide = transports
+  assert serverSide.readAvailable()['OK']
+  assert serverSide.getBufferedSize() == 0
+
+  client.sendData(S_OK('data'))
+  select.select([serverSide.getSocket()], [], [], 10)
+  assert serverSide.readAvailable()['OK']
+  assert serverSide.hasBufferedMessage()
+  assert serverSide.receiveData() == S_OK('data')
+
+  # As for the data decrypted by SSL, which poll() does not report
+  chunks = ['1:', 'a', 'unread']
+  serverSide._readNonBlocking = lambda bufSize: S_OK(chunks.pop(0))
+  serverSide._hasPendingData = lambda: len(chunks) > 1
+  assert serverSide.readAvailable()['OK']
+  assert serverSide.getBufferedSize() == 3
+  del serverSide._readNonBlocking
+  del serverSide._hasPendingData
+
+  client.close()
+  select.select([serverSide.getSocket()], [], [], 10)
+  assert not serverSide.readAvailable()['OK']
@@ -0,0 +1,85 @@
+""" Tests of the ClientConnectionPool with plain transports
+"""
+
+# pylint: disable=redefined-outer-name
+
+import select
+
+from pytest import fixture
+
+from DIRAC import S_OK
+from DIRAC.Core.DISET.private.TransportPool import TransportPool
+from DIRAC.Core.DISET.private.ClientConnectionPool import ClientConnectionPool
+from DIRAC.Core.DISET.private.Transports.PlainTransport import PlainTransport
+
+KEY = ('dip://localhost:1234/Framework/Dummy', False)
+
+
+@fixture
+def connection():
+  """ Connect a client to a listening plain transport
+
+      :return: transport pool, client trid, server side transport of the connection
+  """
+  server = PlainTransport(("", 0), bServerMode=True)
+  assert server.initAsServer()['OK']
+  client = PlainTransport(("localhost", server.getSocket().getsockname()[1]))
+  assert client.initAsClient()['OK']
+  serverSide = server.acceptConnection()['Value']
+
+  trPool = TransportPool()
+  trid = trPool.add(client)
+
+  yield trPool, trid, serverSide
+
+  serverSide.close()
+  server.close()
+
+
+def test_reuse(connection):
+  """ A released connection is given back for the same key only
+  """
+  trPool, trid, _serverSide = connection
+  connPool = ClientConnectionPool(transportPool=trPool)
+  assert connPool.get(KEY) is None
+
+  connPool.put(KEY, trid)
+  assert connPool.get(('dip://otherhost:1234/Framework/Dummy', False)) is None
+  assert connPool.get(KEY) == (trid, trPool.get(trid))
+  assert connPool.get(KEY) is None
+  assert connPool.getStats() == {'idle': 0, 'reused': 1, 'released': 1, 'discarded': 0}
+
+
+def test_keepAlive(connection):
+  """ Keep alives received while the connection was idle do not prevent its reuse
+  """
+  trPool, trid, serverSide = connection
+  connPool = ClientConnectionPool(transportPool=trPool)
+  connPool.put(KEY, trid)
+  serverSide.sendKeepAlive(responseId='test')
+  select.select([trPool.get(trid).getSocket()], [], [], 5)
+  assert connPool.get(KEY) == (trid, trPool.get(trid))
+
+
+def test_closedConnection(connection):
+  """ Connections closed by the service or with unexpected data are discarded
+  """
+  trPool, trid, serverSide = connection
+  connPool = ClientConnectionPool(transportPool=trPool)
+  connPool.put(KEY, trid)
+  serverSide.sendData(S_OK('late answer'))
+  select.select([trPool.get(trid).getSocket()], [], [], 5)
+  assert connPool.get(KEY) is None
+  assert trPool.get(trid) is None
+  assert connPool.getStats()['discarded'] == 1
+
+
+def test_expiration(connection):
+  """ Idle connections are closed after maxIdleTime
+  """
+  trPool, trid, _serverSide = connection
+  connPool = ClientConnectionPool(transportPool=trPool, maxIdleTime=0)
+  connPool.put(KEY, trid)
+  connPool.clean()
+  assert trPool.get(trid) is None
+  assert connPool.getStats()['idle'] == 0
@@ -0,0 +1,108 @@
+""" Tests of the ServiceEventLoop with plain transports
+"""
+
+# pylint: disable=redefined-outer-name,protected-access
+
+from pytest import fixture
+
+from DIRAC import S_OK
+from DIRAC.Core.Utilities import DEncode
+from DIRAC.Core.DISET.private.TransportPool import TransportPool
+from DIRAC.Core.DISET.private.ServiceEventLoop import ServiceEventLoop
+from DIRAC.Core.DISET.private.Transports.PlainTransport import PlainTransport
+
+
+@fixture
+def connection():
+  """ Accept a client connection through the event loop
+
+      :return: event loop, transport pool, listening socket, client transport, trid, list of the callback calls
+  """
+  server = PlainTransport(("", 0), bServerMode=True)
+  assert server.initAsServer()['OK']
+  serverSocket = server.getSocket()
+  port = serverSocket.getsockname()[1]
+  client = PlainTransport(("localhost", port))
+  assert client.initAsClient()['OK']
+
+  trPool = TransportPool()
+  eventLoop = ServiceEventLoop(transportPool=trPool)
+  assert eventLoop.poll([serverSocket], 5) == [serverSocket]
+  trid = trPool.add(server.acceptConnection()['Value'])
+  calls = []
+
+  yield eventLoop, trPool, serverSocket, client, trid, calls
+
+  client.close()
+  server.close()
+
+
+def test_framing(connection):
+  """ The callback is only called once the whole message has been received
+  """
+  eventLoop, trPool, serverSocket, client, trid, calls = connection
+  eventLoop.watch(trid, lambda trid, tag: calls.append((trid, tag)), args=('proposal',))
+
+  encoded = DEncode.encode(S_OK(('Framework/Dummy', 'ping')))
+  message = "%s:%s" % (len(encoded), encoded)
+  client.oSocket.sendall(message[:5])
+  eventLoop.poll([serverSocket], 1)
+  eventLoop.poll([serverSocket], 1)
+  assert calls == []
+  assert eventLoop.getNumConnections() == 1
+
+  client.oSocket.sendall(message[5:])
+  eventLoop.poll([serverSocket], 1)
+  assert calls == [(trid, 'proposal')]
+  # The message is buffered, receiving it does not need the socket
+  assert trPool.receive(trid)['Value'] == ('Framework/Dummy', 'ping')
+  # The connection is not watched after the callback
+  assert eventLoop.getNumConnections() == 0
+
+
+def test_keepAlive(connection):
+  """ Keep alives are answered by the loop without calling the callback
+  """
+  eventLoop, trPool, serverSocket, client, trid, calls = connection
+  eventLoop.watch(trid, lambda trid: calls.append(trid))
+
+  client.sendKeepAlive(responseId='test')
+  eventLoop.poll([serverSocket], 1)
+  assert calls == []
+
+  client.sendData(S_OK('data'))
+  eventLoop.poll([serverSocket], 1)
+  assert calls == [trid]
+  assert trPool.receive(trid) == S_OK('data')
+
+
+def test_bufferedMessage(connection):
+  """ A connection handed back with a message already buffered is processed at once
+  """
+  eventLoop, trPool, serverSocket, client, trid, calls = connection
+  client.sendData(S_OK('first'))
+  client.sendData(S_OK('second'))
+
+  def callback(trid):
+    calls.append(trPool.receive(trid)['Value'])
+    if len(calls) == 1:
+      eventLoop.watch(trid, callback)
+
+  eventLoop.watch(trid, callback)
+  for _ in range(3):
+    eventLoop.poll([serverSocket], 1)
+  assert calls == ['first', 'second']
+
+
+def test_limits(connection):
+  """ Connections are closed when the buffer limit is exceeded
+  """
+  eventLoop, trPool, serverSocket, client, trid, calls = connection
+  eventLoop.watch(trid, lambda trid: calls.append(trid), maxBufferSize=10)
+  encoded = DEncode.encode(S_OK('x' * 100))
+  client.oSocket.sendall("%s:%s" % (len(encoded), encoded[:50]))
+  for _ in range(3):
+    eventLoop.poll([serverSocket], 1)
+  assert calls == []
+  assert trPool.get(trid) is None
+  assert eventLoop.getNumConnections() == 0
@@ -0,0 +1,49 @@
+""" Tests of the ServiceStatistics
+"""
+
+import threading
+
+from DIRAC.Core.DISET.private.ServiceStatistics import ServiceStatistics
+
+
+def test_addCall():
+  """ The calls are counted by action, with the measures known for each of them """
+  statistics = ServiceStatistics()
+  statistics.addCall('RPC/ping', handshakeTime=0.01, queueTime=0.001, executionTime=0.002,
+                     requestBytes=100, responseBytes=1000)
+  statistics.addCall('RPC/ping', failed=True, handshakeTime=None, queueTime=0.003, executionTime=0.004)
+
+  result = statistics.getStatistics()
+  assert list(result['Actions']) == ['RPC/ping']
+  pingStats = result['Actions']['RPC/ping']
+  assert (pingStats['calls'], pingStats['errors']) == (2, 1)
+  assert pingStats['handshakeTime']['count'] == 1
+  assert pingStats['queueTime']['count'] == 2
+  assert abs(pingStats['executionTime']['max'] - 0.004) < 1e-9
+  assert pingStats['responseBytes']['p50'] == 1000
+
+
+def test_threads():
+  """ The calls of concurrent threads are all counted """
+  statistics = ServiceStatistics()
+
+  def addCalls():
+    for _ in xrange(1000):
+      statistics.addCall('RPC/echo', executionTime=0.001)
+
+  threads = [threading.Thread(target=addCalls) for _ in xrange(4)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  echoStats = statistics.getStatistics()['Actions']['RPC/echo']
+  assert echoStats['calls'] == echoStats['executionTime']['count'] == 4000
+
+
+def test_addRejection():
+  """ The rejected calls are counted apart from the executed ones """
+  statistics = ServiceStatistics()
+  statistics.addRejection('RPC/ping')
+  pingStats = statistics.getStatistics()['Actions']['RPC/ping']
+  assert (pingStats['calls'], pingStats['rejected']) == (0, 1)
+  assert pingStats['executionTime']['count'] == 0
@@ -0,0 +1,482 @@
+"""
+Binary encoding for DIRAC, an alternative to DEncode for the DISET payloads.
+
+Every value starts with a one byte type tag, followed by a fixed size binary
+field for the scalars, or by a 4 bytes length or number of elements:
+
+ i -> int, 8 bytes signed
+ I -> long, length + decimal string
+ f -> float, 8 bytes double
+ T -> True
+ F -> False
+ s -> string, length + bytes
+ u -> unicode, length + utf-8 bytes
+ a -> datetime, year (2 bytes), month, day, hour, minute, second and microsecond (4 bytes)
+ D -> date, year (2 bytes), month and day
+ h -> time, hour, minute, second and microsecond (4 bytes)
+ n -> none
+ l -> list, number of elements + elements
+ t -> tuple, number of elements + elements
+ d -> dictionary, number of items + key and value of each item
+
+Lists of strings and dictionaries with string keys, such as the LFN lists and the
+{ lfn : value } dictionaries of the DIRAC replies, use string tables: the number of strings,
+the struct format of the strings ( e.g. "12s7s" ) and their concatenation, that are decoded with
+a single struct.unpack_from:
+
+ L -> list of strings, table
+ k -> dictionary with string keys, table of the keys + values
+ K -> dictionary with string keys and values, table of the keys + table of the values
+
+The tables of the 'K' dictionaries start with the 'S' tag.
+
+No value needs a terminator or a textual number, so the fields are read in place, and the
+StreamDecoder can decode a value while its bytes arrive, keeping only the undecoded bytes.
+
+The codec is negotiated by the DISET clients and services, see BaseClient._proposeAction.
+"""
+
+__RCSID__ = "$Id$"
+
+import os
+import types
+import struct
+import datetime
+from itertools import izip
+
+from past.builtins import long
+
+# Name of the codec in the DISET negotiation
+CODEC_NAME = "bin"
+# Setting this environment variable to 'no' disables the codec in the clients and services
+BINARY_CODEC_ENABLED = os.environ.get('DIRAC_USE_BINARY_CODEC', 'yes').lower() in ('yes', 'true')
+
+# Containers with less elements are encoded element by element
+TABLE_MIN_SIZE = 8
+
+_INT = struct.Struct('<cq')
+_FLOAT = struct.Struct('<cd')
+_HEADER = struct.Struct('<cI')
+_TABLE = struct.Struct('<cII')
+_DATETIME = struct.Struct('<cHBBBBBI')
+_DATE = struct.Struct('<cHBB')
+_TIME = struct.Struct('<cBBBI')
+_unpackLength = struct.Struct('<I').unpack_from
+_unpackInt = struct.Struct('<q').unpack_from
+_unpackFloat = struct.Struct('<d').unpack_from
+_unpackTable = struct.Struct('<II').unpack_from
+
+_STRING_TYPES = frozenset([types.StringType])
+
+g_bEncodeFunctions = {}
+
+
+def encodeInt(iValue, buf):
+  """ Encoding ints """
+  if -0x8000000000000000 <= iValue <= 0x7fffffffffffffff:
+    buf += _INT.pack('i', iValue)
+  else:
+    encodeLong(iValue, buf)
+
+
+def encodeLong(iValue, buf):
+  """ Encoding longs """
+  sValue = str(iValue)
+  buf += _HEADER.pack('I', len(sValue))
+  buf += sValue
+
+
+def encodeFloat(fValue, buf):
+  """ Encoding floats """
+  buf += _FLOAT.pack('f', fValue)
+
+
+def encodeBool(bValue, buf):
+  """ Encoding booleans """
+  buf += 'T' if bValue else 'F'
+
+
+def encodeString(sValue, buf):
+  """ Encoding strings """
+  buf += _HEADER.pack('s', len(sValue))
+  buf += sValue
+
+
+def encodeUnicode(uValue, buf):
+  """ Encoding unicode strings """
+  sValue = uValue.encode('utf-8')
+  buf += _HEADER.pack('u', len(sValue))
+  buf += sValue
+
+
+def encodeDateTime(oValue, buf):
+  """ Encoding datetime, date and time """
+  if isinstance(oValue, datetime.datetime):
+    if oValue.tzinfo is not None:
+      raise TypeError("Cannot encode datetime with time zone %s" % oValue)
+    buf += _DATETIME.pack('a', oValue.year, oValue.month, oValue.day,
+                          oValue.hour, oValue.minute, oValue.second, oValue.microsecond)
+  elif isinstance(oValue, datetime.date):
+    buf += _DATE.pack('D', oValue.year, oValue.month, oValue.day)
+  else:
+    if oValue.tzinfo is not None:
+      raise TypeError("Cannot encode time with time zone %s" % oValue)
+    buf += _TIME.pack('h', oValue.hour, oValue.minute, oValue.second, oValue.microsecond)
+
+
+def encodeNone(_oValue, buf):
+  """ Encoding None """
+  buf += 'n'
+
+
+def encodeStringTable(tag, sList, buf):
+  """ Encoding a list of strings as a table """
+  fmt = 's'.join(map(str, map(len, sList))) + 's' if sList else ''
+  buf += _TABLE.pack(tag, len(sList), len(fmt))
+  buf += fmt
+  buf += ''.join(sList)
+
+
+def encodeList(lValue, buf):
+  """ Encoding lists """
+  if len(lValue) >= TABLE_MIN_SIZE and _STRING_TYPES.issuperset(map(type, lValue)):
+    encodeStringTable('L', lValue, buf)
+    return
+  buf += _HEADER.pack('l', len(lValue))
+  encodeFunctions = g_bEncodeFunctions
+  for uObject in lValue:
+    encodeFunctions[type(uObject)](uObject, buf)
+
+
+def encodeTuple(tValue, buf):
+  """ Encoding tuples """
+  buf += _HEADER.pack('t', len(tValue))
+  encodeFunctions = g_bEncodeFunctions
+  for uObject in tValue:
+    encodeFunctions[type(uObject)](uObject, buf)
+
+
+def encodeDict(dValue, buf):
+  """ Encoding dictionaries """
+  encodeFunctions = g_bEncodeFunctions
+  if len(dValue) >= TABLE_MIN_SIZE:
+    keys = dValue.keys()
+    if _STRING_TYPES.issuperset(map(type, keys)):
+      # keys() and values() are in the same order
+      values = dValue.values()
+      if _STRING_TYPES.issuperset(map(type, values)):
+        buf += 'K'
+        encodeStringTable('S', keys, buf)
+        encodeStringTable('S', values, buf)
+        return
+      encodeStringTable('k', keys, buf)
+      for value in values:
+        encodeFunctions[type(value)](value, buf)
+      return
+  buf += _HEADER.pack('d', len(dValue))
+  for key, value in dValue.iteritems():
+    encodeFunctions[type(key)](key, buf)
+    encodeFunctions[type(value)](value, buf)
+
+
+g_bEncodeFunctions[types.IntType] = encodeInt
+g_bEncodeFunctions[types.LongType] = encodeLong
+g_bEncodeFunctions[types.FloatType] = encodeFloat
+g_bEncodeFunctions[types.BooleanType] = encodeBool
+g_bEncodeFunctions[types.StringType] = encodeString
+g_bEncodeFunctions[types.UnicodeType] = encodeUnicode
+g_bEncodeFunctions[datetime.datetime] = encodeDateTime
+g_bEncodeFunctions[datetime.date] = encodeDateTime
+g_bEncodeFunctions[datetime.time] = encodeDateTime
+g_bEncodeFunctions[types.NoneType] = encodeNone
+g_bEncodeFunctions[types.ListType] = encodeList
+g_bEncodeFunctions[types.TupleType] = encodeTuple
+g_bEncodeFunctions[types.DictType] = encodeDict
+
+
+def encode(uObject):
+  """ Generic encoding function
+
+      :param uObject: object to encode
+      :return: encoded string
+  """
+  buf = bytearray()
+  g_bEncodeFunctions[type(uObject)](uObject, buf)
+  return str(buf)
+
+
+class IncompleteData(ValueError):
+  """ The data end in the middle of a value """
+
+  def __init__(self, needed):
+    """ :param int needed: position up to which the data are needed to go on """
+    ValueError.__init__(self, "Incomplete data, %d bytes needed" % needed)
+    self.needed = needed
+
+
+def _decodeStringTable(data, i):
+  """ Decode a string table
+
+      :return: ( tuple of strings, end position )
+  """
+  if i + 9 > len(data):
+    raise IncompleteData(i + 9)
+  number, fmtLength = _unpackTable(data, i + 1)
+  i += 9
+  if not number:
+    return (), i
+  if i + fmtLength > len(data):
+    raise IncompleteData(i + fmtLength)
+  fmt = data[i:i + fmtLength]
+  if fmt.translate(None, "0123456789s"):
+    raise ValueError("Invalid string table format")
+  i += fmtLength
+  table = struct.Struct(fmt)
+  if i + table.size > len(data):
+    raise IncompleteData(i + table.size)
+  strings = table.unpack_from(data, i)
+  if len(strings) != number:
+    raise ValueError("Invalid string table size")
+  return strings, i + table.size
+
+
+def _decodeScalar(data, i):
+  """ Decode a value which is not a container
+
+      :return: ( value, end position )
+  """
+  tag = data[i]
+  if tag == 's' or tag == 'u' or tag == 'I':
+    if i + 5 > len(data):
+      raise IncompleteData(i + 5)
+    end = i + 5 + _unpackLength(data, i + 1)[0]
+    if end > len(data):
+      raise IncompleteData(end)
+    value = data[i + 5:end]
+    if tag == 'u':
+      value = value.decode('utf-8')
+    elif tag == 'I':
+      value = long(value)
+    return value, end
+  if tag == 'n':
+    return None, i + 1
+  if tag == 'T':
+    return True, i + 1
+  if tag == 'F':
+    return False, i + 1
+  if tag == 'i':
+    if i + 9 > len(data):
+      raise IncompleteData(i + 9)
+    return _unpackInt(data, i + 1)[0], i + 9
+  if tag == 'f':
+    if i + 9 > len(data):
+      raise IncompleteData(i + 9)
+    return _unpackFloat(data, i + 1)[0], i + 9
+  if tag == 'a':
+    dtStruct, dtType = _DATETIME, datetime.datetime
+  elif tag == 'D':
+    dtStruct, dtType = _DATE, datetime.date
+  elif tag == 'h':
+    dtStruct, dtType = _TIME, datetime.time
+  else:
+    raise ValueError("Unknown type tag %r at position %d" % (tag, i))
+  if i + dtStruct.size > len(data):
+    raise IncompleteData(i + dtStruct.size)
+  return dtType(*dtStruct.unpack_from(data, i)[1:]), i + dtStruct.size
+
+
+def _decode(data, i):
+  """ Decode a value from a complete string
+
+      :return: ( value, end position )
+  """
+  tag = data[i]
+  if tag == 's':
+    end = i + 5 + _unpackLength(data, i + 1)[0]
+    if end > len(data):
+      raise IncompleteData(end)
+    return data[i + 5:end], end
+  if tag == 'l' or tag == 't':
+    if i + 5 > len(data):
+      raise IncompleteData(i + 5)
+    number = _unpackLength(data, i + 1)[0]
+    i += 5
+    lValue = []
+    append = lValue.append
+    for _ in xrange(number):
+      value, i = _decode(data, i)
+      append(value)
+    return (tuple(lValue) if tag == 't' else lValue), i
+  if tag == 'd':
+    if i + 5 > len(data):
+      raise IncompleteData(i + 5)
+    number = _unpackLength(data, i + 1)[0]
+    i += 5
+    dValue = {}
+    for _ in xrange(number):
+      key, i = _decode(data, i)
+      dValue[key], i = _decode(data, i)
+    return dValue, i
+  if tag == 'K':
+    keys, i = _decodeStringTable(data, i + 1)
+    values, i = _decodeStringTable(data, i)
+    if len(keys) != len(values):
+      raise ValueError("Invalid string tables")
+    return dict(izip(keys, values)), i
+  if tag == 'k':
+    keys, i = _decodeStringTable(data, i)
+    values = []
+    append = values.append
+    for _ in keys:
+      value, i = _decode(data, i)
+      append(value)
+    return dict(izip(keys, values)), i
+  if tag == 'L':
+    strings, i = _decodeStringTable(data, i)
+    return list(strings), i
+  return _decodeScalar(data, i)
+
+
+def decode(data):
+  """ Generic decoding function
+
+      :param data: encoded string
+      :return: tuple ( decoded object, number of bytes decoded )
+  """
+  try:
+    return _decode(data, 0)
+  except (IndexError, struct.error):
+    raise IncompleteData(len(data) + 1)
+
+
+class StreamDecoder(object):
+  """ Decode a value from chunks of data, as they arrive.
+
+      Usage::
+
+        decoder = StreamDecoder()
+        while not decoder.feed( chunk ):
+          chunk = ...
+        value = decoder.getValue()
+
+      The containers being decoded are kept in a stack, so the decoding stops at the first
+      incomplete element and resumes with the next chunks. Chunks are accumulated without
+      decoding until the incomplete element can be decoded, and the decoded bytes are dropped.
+  """
+
+  def __init__(self):
+    # Undecoded bytes, and chunks received after them
+    self.__data = ""
+    self.__chunks = []
+    self.__size = 0
+    # Size of the data needed to decode the next element
+    self.__needed = 1
+    # Number of bytes decoded and dropped
+    self.__consumed = 0
+    # Containers being decoded: [ container, remaining elements, tag, dictionary key or keys ]
+    self.__stack = []
+    self.__done = False
+    self.__value = None
+
+  def isDone(self):
+    """ True once a complete value has been decoded """
+    return self.__done
+
+  def getValue(self):
+    """ Decoded value, once isDone() """
+    if not self.__done:
+      raise ValueError("The value is not complete")
+    return self.__value
+
+  def getConsumed(self):
+    """ Number of bytes decoded so far """
+    return self.__consumed
+
+  def getRemainder(self):
+    """ Bytes fed after the end of the decoded value """
+    return "".join([self.__data] + self.__chunks)
+
+  def feed(self, data):
+    """ Decode a new chunk of data
+
+        :param str data: chunk
+        :return: True if the value is complete
+    """
+    self.__chunks.append(data)
+    self.__size += len(data)
+    if self.__done or self.__size < self.__needed:
+      return self.__done
+    data = "".join([self.__data] + self.__chunks)
+    self.__chunks = []
+    try:
+      offset = self.__decode(data)
+    except (IndexError, struct.error):
+      raise ValueError("Invalid data")
+    self.__data = data[offset:]
+    self.__size = len(self.__data)
+    self.__consumed += offset
+    return self.__done
+
+  def __decode(self, data):
+    """ Decode as many elements as possible
+
+        :return: position of the first undecoded byte
+    """
+    stack = self.__stack
+    offset = 0
+    end = len(data)
+    while offset < end:
+      tag = data[offset]
+      try:
+        if tag == 'l' or tag == 't' or tag == 'd':
+          if offset + 5 > end:
+            raise IncompleteData(offset + 5)
+          number = _unpackLength(data, offset + 1)[0]
+          offset += 5
+          if number:
+            stack.append([{} if tag == 'd' else [], number, tag, None])
+            continue
+          value = {} if tag == 'd' else ([] if tag == 'l' else ())
+        elif tag == 'k':
+          # The keys are decoded at once, then the values as the elements of the container
+          keys, offset = _decodeStringTable(data, offset)
+          if keys:
+            stack.append([{}, len(keys), tag, list(reversed(keys))])
+            continue
+          value = {}
+        elif tag == 'L' or tag == 'K':
+          # Tables are decoded when complete
+          value, offset = _decode(data, offset)
+        else:
+          value, offset = _decodeScalar(data, offset)
+      except IncompleteData as e:
+        self.__needed = e.needed - offset
+        return offset
+      # Add the value to its container, closing the completed containers
+      while stack:
+        top = stack[-1]
+        if top[2] == 'd':
+          if top[1] > 0:
+            # The value is the key of the next item
+            top[3] = value
+            top[1] = -top[1]
+            break
+          top[0][top[3]] = value
+          top[1] = -top[1] - 1
+        elif top[2] == 'k':
+          top[0][top[3].pop()] = value
+          top[1] -= 1
+        else:
+          top[0].append(value)
+          top[1] -= 1
+        if top[1]:
+          break
+        stack.pop()
+        value = tuple(top[0]) if top[2] == 't' else top[0]
+      else:
+        self.__value = value
+        self.__done = True
+        self.__needed = 0
+        return offset
+    self.__needed = 1
+    return offset
@@ -123,6 +123,7 @@ EFCERR = 1604
 
 # ## RMS (17XX)
 ERMSUKN = 1700
+ERMSLEASE = 1701
 
 # ## TS (19XX)
 ETSUKN = 1900
@@ -196,6 +197,7 @@ dErrorCode = {
 
     # RMS
     1700: 'ERMSUKN',
+    1701: 'ERMSLEASE',
 
     # Resources and RSS
     2000: 'ERESGEN',
@@ -267,6 +269,7 @@ dStrError = {  # Generic (10XX)
     EFCERR: "FileCatalog error",
     # RMS
     ERMSUKN: "Unknown RMS error",
+    ERMSLEASE: "Lease of the request lost",
 
     # Resources and RSS
     ERESGEN: "Unknown Resource Failure",
@@ -0,0 +1,115 @@
+""" Histogram of positive values, such as latencies or message sizes, in the spirit of HdrHistogram:
+    the values are counted in buckets whose width grows with the values, so that any value is known
+    with a bounded relative error (about 3% with the default precision), whatever its magnitude.
+    Adding a value is cheap and the memory used only depends on the range of the values.
+"""
+
+__RCSID__ = "$Id$"
+
+import math
+
+# Percentiles given in the summaries
+SUMMARY_PERCENTILES = (50, 90, 99, 99.9)
+
+
+class Histogram(object):
+  """ Counts of values in log-linear buckets
+
+      The values are first converted into an integer number of resolution units.
+      Below 2 ** (precisionBits + 1) units each value has its own bucket, above
+      the buckets of each power of 2 are split into 2 ** precisionBits sub-buckets.
+  """
+
+  def __init__(self, resolution=1, precisionBits=5):
+    """ c'tor
+
+    :param resolution: smallest difference between two values, e.g. 1e-6 for latencies in seconds
+    :param int precisionBits: the relative error of the values is below 2 ** -precisionBits
+    """
+    self.__resolution = resolution
+    self.__precisionBits = precisionBits
+    self.__counts = {}
+    self.count = 0
+    self.total = 0
+    self.min = None
+    self.max = None
+
+  def __getIndex(self, units):
+    """ Index of the bucket of a number of units """
+    shift = units.bit_length() - self.__precisionBits - 1
+    if shift <= 0:
+      return units
+    return (shift << self.__precisionBits) + (units >> shift)
+
+  def __getBucketValue(self, index):
+    """ Middle of a bucket, as a value """
+    shift = (index >> self.__precisionBits) - 1
+    if shift <= 0:
+      return index * self.__resolution
+    lowerUnits = (index - (shift << self.__precisionBits)) << shift
+    return (lowerUnits + ((1 << shift) - 1) / 2.) * self.__resolution
+
+  def add(self, value, count=1):
+    """ Count a value
+
+    :param value: positive number, negative ones are counted as 0
+    :param int count: number of times the value was seen
+    """
+    value = max(value, 0)
+    index = self.__getIndex(int(round(value / self.__resolution)))
+    self.__counts[index] = self.__counts.get(index, 0) + count
+    self.count += count
+    self.total += value * count
+    if self.min is None or value < self.min:
+      self.min = value
+    if self.max is None or value > self.max:
+      self.max = value
+
+  def merge(self, histogram):
+    """ Add the counts of another histogram with the same resolution and precision
+
+    :param histogram: Histogram instance
+    """
+    if (histogram.__resolution, histogram.__precisionBits) != (self.__resolution, self.__precisionBits):
+      raise ValueError("Cannot merge histograms with different resolutions or precisions")
+    for index, count in histogram.__counts.iteritems():
+      self.__counts[index] = self.__counts.get(index, 0) + count
+    if histogram.count:
+      self.count += histogram.count
+      self.total += histogram.total
+      self.min = histogram.min if self.min is None else min(self.min, histogram.min)
+      self.max = histogram.max if self.max is None else max(self.max, histogram.max)
+
+  def getBuckets(self):
+    """ Non empty buckets
+
+    :return: list of (value, count), by increasing value
+    """
+    return [(self.__getBucketValue(index), self.__counts[index]) for index in sorted(self.__counts)]
+
+  def getPercentile(self, percentile):
+    """ Value below which are the given percentage of the values
+
+    :param float percentile: between 0 and 100
+    :return: value, None if the histogram is empty
+    """
+    if not self.count:
+      return None
+    rank = max(1, int(math.ceil(self.count * percentile / 100.)))
+    seen = 0
+    for index in sorted(self.__counts):
+      seen += self.__counts[index]
+      if seen >= rank:
+        return min(max(self.__getBucketValue(index), self.min), self.max)
+    return self.max
+
+  def getSummary(self):
+    """ Summary of the values: count, min, max, mean and SUMMARY_PERCENTILES
+
+    :return: dict, the percentiles are under keys p50, p90, p99 and p99.9
+    """
+    summary = {'count': self.count, 'min': self.min, 'max': self.max,
+               'mean': float(self.total) / self.count if self.count else None}
+    for percentile in SUMMARY_PERCENTILES:
+      summary['p%s' % percentile] = self.getPercentile(percentile)
+    return summary
@@ -58,8 +58,8 @@
 
     Gets a connection from the Queue (or open a new one if none is available)
     Returns S_OK with connection in Value or S_ERROR
-    the calling method is responsible for closing this connection once it is no
-    longer needed.
+    the connection stays assigned to the calling thread, which is responsible for
+    giving it back with _releaseConnection() once it is no longer needed.
 
 
 
@@ -150,6 +150,7 @@
 from __future__ import print_function
 import six
 import collections
+import re
 import time
 import threading
 import MySQLdb
@@ -171,6 +172,10 @@ __RCSID__ = "$Id$"
 
 MAXCONNECTRETRY = 10
 
+# Statements starting or ending a transaction or table locks, bound to the connection they are sent on
+HOLDSTATEMENT = re.compile(r'\s*(START\s+TRANSACTION|BEGIN|LOCK\s+TABLES?)\b', re.IGNORECASE)
+RELEASESTATEMENT = re.compile(r'\s*(COMMIT|ROLLBACK(?!\s+(WORK\s+)?TO\b)|UNLOCK\s+TABLES?)\b', re.IGNORECASE)
+
 
 def _checkFields(inFields, inValues):
   """
@@ -188,6 +193,19 @@ def _checkFields(inFields, inValues):
   return S_OK()
 
 
+def _statementHold(cmd):
+  """
+    Check if a statement keeps the connection it is sent on assigned to its thread
+
+    :return: True if it starts a transaction or takes table locks, False if it ends them, None otherwise
+  """
+  if HOLDSTATEMENT.match(cmd):
+    return True
+  if RELEASESTATEMENT.match(cmd):
+    return False
+  return None
+
+
 def _quotedList(fieldList=None):
   """
     Quote a list of MySQL Field Names with "`"
@@ -209,6 +227,13 @@ def _quotedList(fieldList=None):
   return ', '.join(quotedFields)
 
 
+class ConnectionWaitTimeout(Exception):
+  """
+    Raised when no connection of a bounded pool became free in time
+  """
+  pass
+
+
 class MySQL(object):
   """
   Basic multithreaded DIRAC MySQL Client Class
@@ -218,18 +243,43 @@ class MySQL(object):
   class ConnectionPool(object):
     """
     Management of connections per thread
+
+    By default each thread keeps its own connection until it dies or stays idle for graceTime
+    seconds. If maxConnections is set, the pool is bounded: a connection is checked out for
+    each query, update or transaction and checked in afterwards, the threads waiting up to
+    waitTimeout seconds for a free connection. The connections obtained with get() stay assigned
+    to their thread until release() is called, and the ones holding a transaction or table locks
+    until the transaction or the locks end.
+
+    The connections are only pinged if they were not used for pingInterval seconds.
     """
 
-    def __init__(self, host, user, passwd, port=3306, graceTime=600):
+    # Indexes in the per thread assignment lists
+    CONN, DBNAME, LASTUSE, DEPTH, PINNED, INTRANSACTION = range(6)
+
+    def __init__(self, host, user, passwd, port=3306, graceTime=600,
+                 maxConnections=0, waitTimeout=30, pingInterval=60):
       self.__host = host
       self.__user = user
       self.__passwd = passwd
       self.__port = port
       self.__graceTime = graceTime
+      self.__maxConnections = maxConnections
+      self.__waitTimeout = waitTimeout
+      self.__pingInterval = pingInterval
       self.__spares = collections.deque()
       self.__maxSpares = 10
       self.__lastClean = 0
       self.__assigned = {}
+      # Connections being opened in bounded mode, they count in the total
+      self.__opening = 0
+      self.__lock = threading.Condition()
+      self.__stats = {'Created': 0, 'Closed': 0, 'Checkouts': 0, 'Waits': 0, 'Timeouts': 0,
+                      'WaitTime': 0., 'MaxWaitTime': 0., 'PingFailures': 0}
+
+    @property
+    def bounded(self):
+      return self.__maxConnections > 0
 
     @property
     def __thid(self):
@@ -242,8 +292,18 @@ class MySQL(object):
                              passwd=self.__passwd)
 
       self.__execute(conn, "SET AUTOCOMMIT=1")
+      self.__stats['Created'] += 1
       return conn
 
+    def __closeConn(self, conn):
+      self.__stats['Closed'] += 1
+      try:
+        conn.close()
+      except MySQLdb.ProgrammingError as exc:
+        gLogger.warn("ProgrammingError exception while closing MySQL connection: %s" % exc)
+      except BaseException as exc:
+        gLogger.warn("Exception while closing MySQL connection: %s" % exc)
+
     def __execute(self, conn, cmd):
       cursor = conn.cursor()
       res = cursor.execute(cmd)
@@ -252,43 +312,101 @@ class MySQL(object):
       return res
 
     def get(self, dbName, retries=10):
+      """ Get the connection of the current thread. It stays assigned to the thread, so that
+          the following operations of the thread use it, until release() is called as many
+          times as get()
+      """
+      return self.__get(dbName, retries, pin=True)
+
+    def release(self):
+      """ Give back the connection obtained with get(). In bounded mode it goes back
+          to the pool if the thread does not hold it for another reason
+      """
+      thid = self.__thid
+      with self.__lock:
+        data = self.__assigned.get(thid)
+        if data is None:
+          return
+        data[self.PINNED] = max(0, data[self.PINNED] - 1)
+        if self.bounded and self.__isReleasable(data):
+          self.__pop(thid)
+
+    def checkout(self, dbName, retries=10):
+      """ Get a connection for one operation, to be given back with checkin()
+      """
+      return self.__get(dbName, retries, pin=False)
+
+    def checkin(self):
+      """ Give back the connection obtained with checkout(). In bounded mode it goes back
+          to the pool if the thread does not hold it for another reason
+      """
+      thid = self.__thid
+      with self.__lock:
+        data = self.__assigned.get(thid)
+        if data is None:
+          return
+        data[self.DEPTH] = max(0, data[self.DEPTH] - 1)
+        if self.bounded and self.__isReleasable(data):
+          self.__pop(thid)
+
+    def checkLater(self):
+      """ Force a health check of the connection of the current thread the next time it is used,
+          to be called when an operation failed
+      """
+      with self.__lock:
+        data = self.__assigned.get(self.__thid)
+        if data is not None:
+          data[self.LASTUSE] = 0
+
+    def __isReleasable(self, data):
+      return not data[self.DEPTH] and not data[self.PINNED] and not data[self.INTRANSACTION]
+
+    def __get(self, dbName, retries, pin):
       retries = max(0, min(MAXCONNECTRETRY, retries))
       self.clean()
-      return self.__getWithRetry(dbName, retries, retries)
+      return self.__getWithRetry(dbName, retries, retries, pin)
 
-    def __getWithRetry(self, dbName, totalRetries, retriesLeft):
+    def __getWithRetry(self, dbName, totalRetries, retriesLeft, pin):
       sleepTime = 5 * (totalRetries - retriesLeft)
       if sleepTime > 0:
         time.sleep(sleepTime)
       try:
-        conn, lastName, thid = self.__innerGet()
+        conn, lastName, thid, lastUse = self.__innerGet()
+      except ConnectionWaitTimeout as excp:
+        return S_ERROR(DErrno.EMYSQL, "Could not connect: %s" % excp)
       except MySQLdb.MySQLError as excp:
         if retriesLeft > 0:
-          return self.__getWithRetry(dbName, totalRetries, retriesLeft - 1)
+          return self.__getWithRetry(dbName, totalRetries, retriesLeft - 1, pin)
         return S_ERROR(DErrno.EMYSQL, "Could not connect: %s" % excp)
 
-      if not self.__ping(conn):
-        try:
-          self.__assigned.pop(thid)
-        except KeyError:
-          pass
+      if time.time() - lastUse > self.__pingInterval and not self.__ping(conn):
+        self.__stats['PingFailures'] += 1
+        self.__discard(thid)
         if retriesLeft > 0:
-          return self.__getWithRetry(dbName, totalRetries, retriesLeft)
+          return self.__getWithRetry(dbName, totalRetries, retriesLeft, pin)
         return S_ERROR(DErrno.EMYSQL, "Could not connect")
 
       if lastName != dbName:
         try:
           conn.select_db(dbName)
         except MySQLdb.MySQLError as excp:
+          self.__releaseIfUnused(thid)
           if retriesLeft > 0:
-            return self.__getWithRetry(dbName, totalRetries, retriesLeft - 1)
+            return self.__getWithRetry(dbName, totalRetries, retriesLeft - 1, pin)
           return S_ERROR(DErrno.EMYSQL, "Could not select db %s: %s" % (dbName, excp))
-        try:
-          self.__assigned[thid][1] = dbName
-        except KeyError:
+
+      with self.__lock:
+        data = self.__assigned.get(thid)
+        if data is None:
           if retriesLeft > 0:
-            return self.__getWithRetry(dbName, totalRetries, retriesLeft - 1)
+            return self.__getWithRetry(dbName, totalRetries, retriesLeft - 1, pin)
           return S_ERROR(DErrno.EMYSQL, "Could not connect")
+        data[self.DBNAME] = dbName
+        if pin:
+          data[self.PINNED] += 1
+        else:
+          data[self.DEPTH] += 1
+          self.__stats['Checkouts'] += 1
       return S_OK(conn)
 
     def __ping(self, conn):
@@ -299,41 +417,111 @@ class MySQL(object):
         return False
 
     def __innerGet(self):
+      """ Assign a connection to the current thread
+
+          :return: tuple ( connection, selected db name, thread, time of the last use )
+      """
       thid = self.__thid
       now = time.time()
-      if thid in self.__assigned:
-        data = self.__assigned[thid]
-        conn = data[0]
-        data[2] = now
-        return data[0], data[1], thid
-      # Not cached
+      with self.__lock:
+        if thid in self.__assigned:
+          data = self.__assigned[thid]
+          lastUse = data[self.LASTUSE]
+          data[self.LASTUSE] = now
+          return data[self.CONN], data[self.DBNAME], thid, lastUse
+        # Not cached
+        spare = self.__takeSpare()
+        if spare:
+          conn, dbName, lastUse = spare
+          self.__assigned[thid] = [conn, dbName, now, 0, 0, False]
+          return conn, dbName, thid, lastUse
+        self.__opening += 1
+
       try:
-        conn, dbName = self.__spares.pop()
-      except IndexError:
         conn = self.__newConn()
-        dbName = ""
-
-      self.__assigned[thid] = [conn, dbName, now]
-      return conn, dbName, thid
+      finally:
+        with self.__lock:
+          self.__opening -= 1
+          self.__lock.notify()
+      with self.__lock:
+        self.__assigned[thid] = [conn, "", now, 0, 0, False]
+      return conn, "", thid, now
+
+    def __takeSpare(self):
+      """ Take a spare connection, called with the lock held. In bounded mode, wait for
+          a free connection if the pool is full
+
+          :return: tuple ( connection, selected db name, time of the last use ) or None
+                   if a new connection can be opened
+      """
+      if not self.bounded:
+        try:
+          return self.__spares.pop()
+        except IndexError:
+          return None
+
+      start = time.time()
+      waited = False
+      while not self.__spares and len(self.__assigned) + self.__opening >= self.__maxConnections:
+        elapsed = time.time() - start
+        if elapsed >= self.__waitTimeout:
+          self.__stats['Timeouts'] += 1
+          raise ConnectionWaitTimeout("no free connection after %d seconds, %d connections in use" %
+                                      (self.__waitTimeout, len(self.__assigned)))
+        if not waited:
+          waited = True
+          self.__stats['Waits'] += 1
+        self.__lock.wait(self.__waitTimeout - elapsed)
+        # Connections of dead or idle threads can be given back while waiting
+        self.__cleanUnlocked(time.time())
+      if waited:
+        waitTime = time.time() - start
+        self.__stats['WaitTime'] += waitTime
+        self.__stats['MaxWaitTime'] = max(self.__stats['MaxWaitTime'], waitTime)
+      try:
+        return self.__spares.pop()
+      except IndexError:
+        return None
 
     def __pop(self, thid):
+      """ Unassign the connection of a thread, keeping it as spare. Called with the lock held
+      """
       try:
         data = self.__assigned.pop(thid)
-        if len(self.__spares) < self.__maxSpares:
-          self.__spares.append((data[0], data[1]))
-        else:
-          try:
-            data[0].close()
-          except MySQLdb.ProgrammingError as exc:
-            gLogger.warn("ProgrammingError exception while closing MySQL connection: %s" % exc)
-          except BaseException as exc:
-            gLogger.warn("Exception while closing MySQL connection: %s" % exc)
       except KeyError:
-        pass
+        return
+      if self.bounded or len(self.__spares) < self.__maxSpares:
+        self.__spares.append((data[self.CONN], data[self.DBNAME], data[self.LASTUSE]))
+        self.__lock.notify()
+      else:
+        self.__closeConn(data[self.CONN])
+
+    def __discard(self, thid):
+      """ Unassign and close the connection of a thread
+      """
+      with self.__lock:
+        data = self.__assigned.pop(thid, None)
+        if data is not None:
+          self.__closeConn(data[self.CONN])
+          self.__lock.notify()
+
+    def __releaseIfUnused(self, thid):
+      """ Give back a connection that failed before being handed out
+      """
+      if not self.bounded:
+        return
+      with self.__lock:
+        data = self.__assigned.get(thid)
+        if data is not None and self.__isReleasable(data):
+          self.__pop(thid)
 
     def clean(self, now=False):
       if not now:
         now = time.time()
+      with self.__lock:
+        self.__cleanUnlocked(now)
+
+    def __cleanUnlocked(self, now):
       self.__lastClean = now
       for thid in list(self.__assigned):
         if not thid.isAlive():
@@ -342,48 +530,91 @@ class MySQL(object):
           data = self.__assigned[thid]
         except KeyError:
           continue
-        if now - data[2] > self.__graceTime:
+        # In bounded mode, never take back a connection in the middle of an operation
+        if self.bounded and data[self.DEPTH]:
+          continue
+        if now - data[self.LASTUSE] > self.__graceTime:
+          self.__pop(thid)
+      if self.bounded:
+        # Shrink the pool, closing the connections not used for a while
+        while self.__spares and now - self.__spares[0][2] > self.__graceTime:
+          self.__closeConn(self.__spares.popleft()[0])
+
+    def getStats(self):
+      """ Get the usage statistics of the pool
+
+          :return: dict
+      """
+      with self.__lock:
+        stats = dict(self.__stats)
+        stats['InUse'] = len(self.__assigned)
+        stats['Idle'] = len(self.__spares)
+        stats['MaxConnections'] = self.__maxConnections
+      return stats
+
+    def setTransaction(self, flag):
+      """ Flag the connection of the current thread as holding a transaction or table locks or not
+      """
+      thid = self.__thid
+      with self.__lock:
+        data = self.__assigned.get(thid)
+        if data is None:
+          return
+        data[self.INTRANSACTION] = flag
+        if not flag and self.bounded and self.__isReleasable(data):
           self.__pop(thid)
 
     def transactionStart(self, dbName):
-      result = self.get(dbName)
+      result = self.checkout(dbName)
       if not result['OK']:
         return result
       conn = result['Value']
       try:
-        return S_OK(self.__execute(conn, "START TRANSACTION WITH CONSISTENT SNAPSHOT"))
+        result = S_OK(self.__execute(conn, "START TRANSACTION WITH CONSISTENT SNAPSHOT"))
+        self.setTransaction(True)
       except MySQLdb.MySQLError as excp:
-        return S_ERROR(DErrno.EMYSQL, "Could not begin transaction: %s" % excp)
+        result = S_ERROR(DErrno.EMYSQL, "Could not begin transaction: %s" % excp)
+      self.checkin()
+      return result
 
     def transactionCommit(self, dbName):
-      result = self.get(dbName)
+      result = self.checkout(dbName)
       if not result['OK']:
         return result
       conn = result['Value']
       try:
-        result = self.__execute(conn, "COMMIT")
-        return S_OK(result)
+        result = S_OK(self.__execute(conn, "COMMIT"))
       except MySQLdb.MySQLError as excp:
-        return S_ERROR(DErrno.EMYSQL, "Could not commit transaction: %s" % excp)
+        result = S_ERROR(DErrno.EMYSQL, "Could not commit transaction: %s" % excp)
+      self.setTransaction(False)
+      self.checkin()
+      return result
 
     def transactionRollback(self, dbName):
-      result = self.get(dbName)
+      result = self.checkout(dbName)
       if not result['OK']:
         return result
       conn = result['Value']
       try:
-        result = self.__execute(conn, "ROLLBACK")
-        return S_OK(result)
+        result = S_OK(self.__execute(conn, "ROLLBACK"))
       except MySQLdb.MySQLError as excp:
-        return S_ERROR(DErrno.EMYSQL, "Could not rollback transaction: %s" % excp)
+        result = S_ERROR(DErrno.EMYSQL, "Could not rollback transaction: %s" % excp)
+      self.setTransaction(False)
+      self.checkin()
+      return result
 
   __connectionPools = {}
 
-  def __init__(self, hostName='localhost', userName='dirac', passwd='dirac', dbName='', port=3306, debug=False):
+  def __init__(self, hostName='localhost', userName='dirac', passwd='dirac', dbName='', port=3306, debug=False,
+               maxConnections=0, connectionWaitTimeout=30):
     """
     set MySQL connection parameters and try to connect
 
     :param debug: unused
+    :param int maxConnections: if > 0, size of the bounded connection pool, shared by the
+                               instances connecting to the same database with the same credentials
+                               and the same maxConnections
+    :param int connectionWaitTimeout: maximum time to wait for a free connection of a bounded pool
     """
     global gInstancesCount
     gInstancesCount += 1
@@ -404,9 +635,13 @@ class MySQL(object):
     self.__dbName = str(dbName)
     self.__port = port
     cKey = (self.__hostName, self.__userName, self.__passwd, self.__port)
-    if cKey not in MySQL.__connectionPools:
-      MySQL.__connectionPools[cKey] = MySQL.ConnectionPool(*cKey)
-    self.__connectionPool = MySQL.__connectionPools[cKey]
+    # The connections of a bounded pool are not switched between databases
+    pKey = cKey + ((self.__dbName, maxConnections) if maxConnections > 0 else ())
+    if pKey not in MySQL.__connectionPools:
+      MySQL.__connectionPools[pKey] = MySQL.ConnectionPool(*cKey,
+                                                           maxConnections=maxConnections,
+                                                           waitTimeout=connectionWaitTimeout)
+    self.__connectionPool = MySQL.__connectionPools[pKey]
 
     self.__initialized = True
     result = self._connect()
@@ -456,16 +691,38 @@ class MySQL(object):
     It also includes quotation marks " around the given string
     """
 
-    retDict = self._getConnection()
+    try:
+      myString = str(myString)
+    except ValueError:
+      return S_ERROR(DErrno.EMYSQL, "Cannot escape value!")
+
+    # SQL time functions are passed as they are
+    retDict = self.__sqlTimeFunction(myString)
+    if retDict is not None:
+      return retDict
+
+    retDict = self.__checkoutConnection()
     if not retDict['OK']:
       return retDict
     connection = retDict['Value']
 
     try:
-      myString = str(myString)
-    except ValueError:
-      return S_ERROR(DErrno.EMYSQL, "Cannot escape value!")
+      escape_string = connection.escape_string(str(myString))
+      # self.log.debug('__escape_string: returns', '"%s"' % escape_string)
+      retDict = S_OK('"%s"' % escape_string)
+    except BaseException as x:
+      # self.log.debug('__escape_string: Could not escape string', '"%s"' % myString)
+      retDict = self._except('__escape_string', x, 'Could not escape string')
+    self.__connectionPool.checkin()
+    return retDict
+
+  def __sqlTimeFunction(self, myString):
+    """
+    Check if the string is one of the SQL time functions accepted in place of a value:
+    UTC_TIMESTAMP(), TIMESTAMPDIFF(...) or TIMESTAMPADD(...)
 
+    :return: S_OK( myString ) for a valid function, S_ERROR for an invalid one, None otherwise
+    """
     timeUnits = ['MICROSECOND', 'SECOND', 'MINUTE', 'HOUR', 'DAY', 'WEEK', 'MONTH', 'QUARTER', 'YEAR']
 
     try:
@@ -483,13 +740,10 @@ class MySQL(object):
                 return S_OK(myString)
           # self.log.debug('__escape_string: Could not escape string', '"%s"' % myString)
           return S_ERROR(DErrno.EMYSQL, '__escape_string: Could not escape string')
-
-      escape_string = connection.escape_string(str(myString))
-      # self.log.debug('__escape_string: returns', '"%s"' % escape_string)
-      return S_OK('"%s"' % escape_string)
     except BaseException as x:
       # self.log.debug('__escape_string: Could not escape string', '"%s"' % myString)
       return self._except('__escape_string', x, 'Could not escape string')
+    return None
 
   def __checkTable(self, tableName, force=False):
 
@@ -555,6 +809,61 @@ class MySQL(object):
         inEscapeValues.append(retDict['Value'])
     return S_OK(inEscapeValues)
 
+  def _parameterValues(self, inValues, args):
+    """
+    Same as _escapeValues, but the values are given as %s placeholders and appended to args,
+    to be passed with the command to _query/_update. The SQL time functions accepted by
+    _escapeString are kept in the command.
+
+    :param list inValues: values
+    :param list args: list of parameters, extended in place
+    :return: S_OK( list of placeholders )
+    """
+    placeholders = []
+
+    if not inValues:
+      return S_OK(placeholders)
+
+    for value in inValues:
+      if isinstance(value, (tuple, list)):
+        tuplePlaceholders = []
+        for val in value:
+          retDict = self.__parameter(val, args)
+          if not retDict['OK']:
+            return retDict
+          tuplePlaceholders.append(retDict['Value'])
+        placeholders.append('(' + ', '.join(tuplePlaceholders) + ')')
+      elif isinstance(value, bool):
+        placeholders.append(str(value))
+      else:
+        retDict = self.__parameter(value, args)
+        if not retDict['OK']:
+          return retDict
+        placeholders.append(retDict['Value'])
+    return S_OK(placeholders)
+
+  def __parameter(self, value, args):
+    """
+    Placeholder for a single value, converted to a string as done by _escapeString
+    """
+    try:
+      value = str(value)
+    except ValueError:
+      return S_ERROR(DErrno.EMYSQL, "Cannot escape value!")
+    retDict = self.__sqlTimeFunction(value)
+    if retDict is not None:
+      return retDict
+    args.append(value)
+    return S_OK('%s')
+
+  def __sqlValues(self, inValues, args=None):
+    """
+    Escaped values if args is None, placeholders otherwise
+    """
+    if args is None:
+      return self._escapeValues(inValues)
+    return self._parameterValues(inValues, args)
+
   def _safeCmd(self, command):
     """ Just replaces password, if visible, with *********
     """
@@ -576,17 +885,21 @@ class MySQL(object):
       return S_OK()
 
     # Test the connection to the DB
-    retDict = self._getConnection()
+    retDict = self.__checkoutConnection()
     if not retDict['OK']:
       return retDict
+    self.__connectionPool.checkin()
     self._connected = True
     return S_OK()
 
-  def _query(self, cmd, conn=None, debug=False):
+  def _query(self, cmd, conn=None, debug=False, args=None):
     """
     execute MySQL query command
 
+    :param conn: connection obtained with _getConnection(), it is the one assigned to the thread
     :param debug: unused
+    :param args: optional parameters, substituted by the driver for the %s placeholders
+                 of the command (if there are any, a literal % must be written %%)
 
     return S_OK structure with fetchall result as tuple
     it returns an empty tuple if no matching rows are found
@@ -595,14 +908,14 @@ class MySQL(object):
 
     # self.logger.debug('_query: %s' % self._safeCmd(cmd))
 
-    retDict = self._getConnection()
+    retDict = self.__checkoutConnection()
     if not retDict['OK']:
       return retDict
     connection = retDict['Value']
 
     try:
       cursor = connection.cursor()
-      if cursor.execute(cmd):
+      if cursor.execute(cmd, args or None):
         res = cursor.fetchall()
       else:
         res = ()
@@ -618,18 +931,24 @@ class MySQL(object):
     except BaseException as x:
       # self.log.debug('_query: %s' % self._safeCmd(cmd))
       retDict = self._except('_query', x, 'Execution failed.')
+      self.__checkLater(x)
+    self.__holdForStatement(cmd, retDict['OK'])
 
     try:
       cursor.close()
     except BaseException:
       pass
+    self.__connectionPool.checkin()
 
     return retDict
 
-  def _update(self, cmd, conn=None, debug=False):
+  def _update(self, cmd, conn=None, debug=False, args=None):
     """ execute MySQL update command
 
+        :param conn: connection obtained with _getConnection(), it is the one assigned to the thread
         :param debug: unused
+        :param args: optional parameters, substituted by the driver for the %s placeholders
+                     of the command (if there are any, a literal % must be written %%)
 
         return S_OK with number of updated registers upon success
         return S_ERROR upon error
@@ -637,14 +956,14 @@ class MySQL(object):
 
     # self.logger.debug('_update: %s' % self._safeCmd(cmd))
 
-    retDict = self._getConnection()
+    retDict = self.__checkoutConnection()
     if not retDict['OK']:
       return retDict
     connection = retDict['Value']
 
     try:
       cursor = connection.cursor()
-      res = cursor.execute(cmd)
+      res = cursor.execute(cmd, args or None)
       # connection.commit()
       # self.log.debug('_update:', res)
       retDict = S_OK(res)
@@ -653,11 +972,50 @@ class MySQL(object):
     except Exception as x:
       # self.log.debug('_update: %s: %s' % (self._safeCmd(cmd), str(x)))
       retDict = self._except('_update', x, 'Execution failed.')
+      self.__checkLater(x)
+    self.__holdForStatement(cmd, retDict['OK'])
 
     try:
       cursor.close()
     except Exception:
       pass
+    self.__connectionPool.checkin()
+
+    return retDict
+
+  def _updatemany(self, cmd, data, conn=None):
+    """ execute MySQL update command once for each set of parameters,
+        INSERT/REPLACE ... VALUES commands are sent by the driver as a single multi-row statement
+
+        :param str cmd: command with %s placeholders (a literal % must be written %%)
+        :param list data: list of parameter sequences
+
+        return S_OK with number of updated registers upon success
+        return S_ERROR upon error
+    """
+    if not data:
+      return S_OK(0)
+
+    retDict = self.__checkoutConnection()
+    if not retDict['OK']:
+      return retDict
+    connection = retDict['Value']
+
+    try:
+      cursor = connection.cursor()
+      res = cursor.executemany(cmd, data)
+      retDict = S_OK(res)
+      if cursor.lastrowid:
+        retDict['lastRowId'] = cursor.lastrowid
+    except Exception as x:
+      retDict = self._except('_updatemany', x, 'Execution failed.')
+      self.__checkLater(x)
+
+    try:
+      cursor.close()
+    except Exception:
+      pass
+    self.__connectionPool.checkin()
 
     return retDict
 
@@ -666,7 +1024,7 @@ class MySQL(object):
 
     :param self: self reference
     :param list cmdList: list of queries to be executed within the transaction
-    :param MySQLDB.Connection conn: connection
+    :param MySQLDB.Connection conn: unused, a connection is checked out for the transaction
 
     :return: S_OK( [ ( cmd1, ret1 ), ... ] ) or S_ERROR
     """
@@ -674,12 +1032,10 @@ class MySQL(object):
       return S_ERROR(DErrno.EMYSQL, "_transaction: wrong type (%s) for cmdList" % type(cmdList))
 
     # # get connection
-    connection = conn
-    if not connection:
-      retDict = self._getConnection()
-      if not retDict['OK']:
-        return retDict
-      connection = retDict['Value']
+    retDict = self.__checkoutConnection()
+    if not retDict['OK']:
+      return retDict
+    connection = retDict['Value']
 
     # # list with cmds and their results
     cmdRet = []
@@ -692,9 +1048,12 @@ class MySQL(object):
       self.logger.exception(error)
       # # rollback, put back connection to the pool
       connection.rollback()
+      self.__checkLater(error)
+      self.__connectionPool.checkin()
       return S_ERROR(DErrno.EMYSQL, error)
     # # close cursor, put back connection to the pool
     cursor.close()
+    self.__connectionPool.checkin()
     return S_OK(cmdRet)
 
   def _createViews(self, viewsDict, force=False):
@@ -936,6 +1295,8 @@ class MySQL(object):
         Try the Queue, if it is empty add a newConnection to the Queue and retry
         it will retry MAXCONNECTRETRY to open a new connection and will return
         an error if it fails.
+        The connection stays assigned to the thread, all its operations use it,
+        until _releaseConnection() is called.
 
         :param int retries: Number of time it will retry to open a connection
     """
@@ -948,6 +1309,46 @@ class MySQL(object):
 
     return self.__connectionPool.get(self.__dbName, retries)
 
+  def _releaseConnection(self):
+    """ Give back the connection obtained with _getConnection(), with a bounded pool
+        it can then be used by the other threads
+    """
+    self.__connectionPool.release()
+
+  def __checkoutConnection(self, retries=MAXCONNECTRETRY):
+    """ Get a connection for a single operation, it must be given back with
+        self.__connectionPool.checkin() once the operation is done
+    """
+    if not self.__initialized:
+      error = 'DB not properly initialized'
+      gLogger.error(error)
+      return S_ERROR(DErrno.EMYSQL, error)
+
+    return self.__connectionPool.checkout(self.__dbName, retries)
+
+  def __holdForStatement(self, cmd, succeeded):
+    """ Keep the connection assigned to the thread from the start of a transaction or of table locks
+        sent as statements until their end, the following statements of the thread must use it
+    """
+    hold = _statementHold(cmd)
+    if hold is False or (hold and succeeded):
+      self.__connectionPool.setTransaction(hold)
+
+  def __checkLater(self, exc):
+    """ Have the connection checked before its next use if the error may come from it
+    """
+    if isinstance(exc, MySQLdb.OperationalError):
+      self.__connectionPool.checkLater()
+
+  def getConnectionPoolStats(self):
+    """ Get the usage statistics of the connection pool used by this instance
+
+        :return: S_OK( dict ) with the numbers of connections Created, Closed, InUse and Idle,
+                 the number of Checkouts, Waits and Timeouts, the total and maximum WaitTime
+                 and the MaxConnections of the pool (0 if not bounded)
+    """
+    return S_OK(self.__connectionPool.getStats())
+
 ########################################################################################
 #
 #  Transaction functions
@@ -980,14 +1381,15 @@ class MySQL(object):
       # self.log.debug('countEntries:', error)
       return S_ERROR(DErrno.EMYSQL, error)
 
+    args = []
     try:
       cond = self.buildCondition(condDict=condDict, older=older, newer=newer, timeStamp=timeStamp,
-                                 greater=greater, smaller=smaller)
+                                 greater=greater, smaller=smaller, args=args)
     except Exception as x:
       return S_ERROR(DErrno.EMYSQL, x)
 
     cmd = 'SELECT COUNT(*) FROM %s %s' % (table, cond)
-    res = self._query(cmd, connection)
+    res = self._query(cmd, connection, args=args)
     if not res['OK']:
       return res
 
@@ -1012,14 +1414,15 @@ class MySQL(object):
       # self.log.debug('getCounters:', error)
       return S_ERROR(DErrno.EMYSQL, error)
 
+    args = []
     try:
       cond = self.buildCondition(condDict=condDict, older=older, newer=newer, timeStamp=timeStamp,
-                                 greater=greater, smaller=smaller)
+                                 greater=greater, smaller=smaller, args=args)
     except Exception as x:
       return S_ERROR(DErrno.EMYSQL, x)
 
     cmd = 'SELECT %s, COUNT(*) FROM %s %s GROUP BY %s ORDER BY %s' % (attrNames, table, cond, attrNames, attrNames)
-    res = self._query(cmd, connection)
+    res = self._query(cmd, connection, args=args)
     if not res['OK']:
       return res
 
@@ -1051,14 +1454,15 @@ class MySQL(object):
       # self.log.debug('getDistinctAttributeValues:', error)
       return S_ERROR(DErrno.EMYSQL, error)
 
+    args = []
     try:
       cond = self.buildCondition(condDict=condDict, older=older, newer=newer, timeStamp=timeStamp,
-                                 greater=greater, smaller=smaller)
+                                 greater=greater, smaller=smaller, args=args)
     except Exception as exc:
       return S_ERROR(DErrno.EMYSQL, exc)
 
     cmd = 'SELECT  DISTINCT( %s ) FROM %s %s ORDER BY %s' % (attributeName, table, cond, attributeName)
-    res = self._query(cmd, connection)
+    res = self._query(cmd, connection, args=args)
     if not res['OK']:
       return res
     attr_list = [x[0] for x in res['Value']]
@@ -1067,13 +1471,15 @@ class MySQL(object):
 #############################################################################
   def buildCondition(self, condDict=None, older=None, newer=None,
                      timeStamp=None, orderAttribute=None, limit=False,
-                     greater=None, smaller=None, offset=None):
+                     greater=None, smaller=None, offset=None, args=None):
     """ Build SQL condition statement from provided condDict and other extra check on
         a specified time stamp.
         The conditions dictionary specifies for each attribute one or a List of possible
         values
         greater and smaller are dictionaries in which the keys are the names of the fields,
         that are requested to be >= or < than the corresponding value.
+        If args is a list, the values are not escaped in the condition but given as %s
+        placeholders and appended to args, to be passed to _query/_update with the command.
         For compatibility with current usage it uses Exceptions to exit in case of
         invalid arguments
     """
@@ -1091,7 +1497,7 @@ class MySQL(object):
           # self.log.debug('buildCondition:', error)
           raise Exception(error)
         if isinstance(attrValue, list):
-          retDict = self._escapeValues(attrValue)
+          retDict = self.__sqlValues(attrValue, args)
           if not retDict['OK']:
             # self.log.debug('buildCondition:', retDict['Message'])
             raise Exception(retDict['Message'])
@@ -1104,7 +1510,7 @@ class MySQL(object):
                                                  multiValue)
             conjunction = "AND"
         else:
-          retDict = self._escapeValues([attrValue])
+          retDict = self.__sqlValues([attrValue], args)
           if not retDict['OK']:
             # self.log.debug('buildCondition:', retDict['Message'])
             raise Exception(retDict['Message'])
@@ -1123,7 +1529,7 @@ class MySQL(object):
         # self.log.debug('buildCondition:', error)
         raise Exception(error)
       if newer:
-        retDict = self._escapeValues([newer])
+        retDict = self.__sqlValues([newer], args)
         if not retDict['OK']:
           # self.log.debug('buildCondition:', retDict['Message'])
           raise Exception(retDict['Message'])
@@ -1135,7 +1541,7 @@ class MySQL(object):
                                            escapeInValue)
           conjunction = "AND"
       if older:
-        retDict = self._escapeValues([older])
+        retDict = self.__sqlValues([older], args)
         if not retDict['OK']:
           # self.log.debug('buildCondition:', retDict['Message'])
           raise Exception(retDict['Message'])
@@ -1154,7 +1560,7 @@ class MySQL(object):
           # self.log.debug('buildCondition:', error)
           raise Exception(error)
 
-        retDict = self._escapeValues([attrValue])
+        retDict = self.__sqlValues([attrValue], args)
         if not retDict['OK']:
           # self.log.debug('buildCondition:', retDict['Message'])
           raise Exception(retDict['Message'])
@@ -1174,7 +1580,7 @@ class MySQL(object):
           # self.log.debug('buildCondition:', error)
           raise Exception(error)
 
-        retDict = self._escapeValues([attrValue])
+        retDict = self.__sqlValues([attrValue], args)
         if not retDict['OK']:
           # self.log.debug('buildCondition:', retDict['Message'])
           raise Exception(retDict['Message'])
@@ -1260,6 +1666,7 @@ class MySQL(object):
     if condDict is None:
       condDict = {}
 
+    args = []
     try:
       try:
         mylimit = limit[0]
@@ -1269,12 +1676,12 @@ class MySQL(object):
         myoffset = None
       condition = self.buildCondition(condDict=condDict, older=older, newer=newer,
                                       timeStamp=timeStamp, orderAttribute=orderAttribute, limit=mylimit,
-                                      greater=greater, smaller=smaller, offset=myoffset)
+                                      greater=greater, smaller=smaller, offset=myoffset, args=args)
     except Exception as x:
       return S_ERROR(DErrno.EMYSQL, x)
 
     return self._query('SELECT %s FROM %s %s' %
-                       (quotedOutFields, table, condition), conn)
+                       (quotedOutFields, table, condition), conn, args=args)
 
 #############################################################################
   def deleteEntries(self, tableName,
@@ -1297,14 +1704,15 @@ class MySQL(object):
 
     # self.log.debug('deleteEntries:', 'deleting rows from table %s.' % table)
 
+    args = []
     try:
       condition = self.buildCondition(condDict=condDict, older=older, newer=newer,
                                       timeStamp=timeStamp, orderAttribute=orderAttribute, limit=limit,
-                                      greater=greater, smaller=smaller)
+                                      greater=greater, smaller=smaller, args=args)
     except Exception as x:
       return S_ERROR(DErrno.EMYSQL, x)
 
-    return self._update('DELETE FROM %s %s' % (table, condition), conn)
+    return self._update('DELETE FROM %s %s' % (table, condition), conn, args=args)
 
 #############################################################################
   def updateFields(self, tableName, updateFields=None, updateValues=None,
@@ -1355,7 +1763,8 @@ class MySQL(object):
         # self.log.debug('updateFields:', error)
         return S_ERROR(DErrno.EMYSQL, error)
 
-    updateValues = self._escapeValues(updateValues)
+    args = []
+    updateValues = self._parameterValues(updateValues, args)
     if not updateValues['OK']:
       # self.log.debug('updateFields:', updateValues['Message'])
       return updateValues
@@ -1366,7 +1775,7 @@ class MySQL(object):
     try:
       condition = self.buildCondition(condDict=condDict, older=older, newer=newer,
                                       timeStamp=timeStamp, orderAttribute=orderAttribute, limit=limit,
-                                      greater=greater, smaller=smaller)
+                                      greater=greater, smaller=smaller, args=args)
     except Exception as x:
       return S_ERROR(DErrno.EMYSQL, x)
 
@@ -1374,7 +1783,7 @@ class MySQL(object):
                                           updateValues[k]) for k in range(len(updateFields))])
 
     return self._update('UPDATE %s SET %s %s' %
-                        (table, updateString, condition), conn)
+                        (table, updateString, condition), conn, args=args)
 
 #############################################################################
   def insertFields(self, tableName, inFields=None, inValues=None, conn=None, inDict=None):
@@ -1419,7 +1828,8 @@ class MySQL(object):
 
     inFieldString = '(  %s )' % inFieldString
 
-    retDict = self._escapeValues(inValues)
+    args = []
+    retDict = self._parameterValues(inValues, args)
     if not retDict['OK']:
       # self.log.debug('insertFields:', retDict['Message'])
       return retDict
@@ -1430,10 +1840,40 @@ class MySQL(object):
     #               % (inFieldString, table))
 
     return self._update('INSERT INTO %s %s VALUES %s' %
-                        (table, inFieldString, inValueString), conn)
+                        (table, inFieldString, inValueString), conn, args=args)
+
+  def insertManyFields(self, tableName, inFields, inValuesList, conn=None):
+    """
+      Insert several rows in "tableName" assigning to the fields "inFields" the values
+      of each element of "inValuesList", with a single multi-row INSERT statement.
+      The values are converted to strings as in insertFields, but SQL functions such
+      as UTC_TIMESTAMP() are not interpreted.
+
+      :return: S_OK( number of inserted rows ) / S_ERROR
+    """
+    table = _quotedList([tableName])
+    if not table:
+      return S_ERROR(DErrno.EMYSQL, 'Invalid tableName argument')
+
+    inFieldString = _quotedList(inFields)
+    if inFieldString is None:
+      return S_ERROR(DErrno.EMYSQL, 'Invalid inFields arguments')
+
+    data = []
+    for inValues in inValuesList:
+      retDict = _checkFields(inFields, inValues)
+      if not retDict['OK']:
+        return retDict
+      try:
+        data.append([str(value) for value in inValues])
+      except ValueError:
+        return S_ERROR(DErrno.EMYSQL, "Cannot escape value!")
+
+    return self._updatemany('INSERT INTO %s (  %s ) VALUES (  %s )' %
+                            (table, inFieldString, ', '.join(['%s'] * len(inFields))), data, conn)
 
   def executeStoredProcedure(self, packageName, parameters, outputIds):
-    conDict = self._getConnection()
+    conDict = self.__checkoutConnection()
     if not conDict['OK']:
       return conDict
 
@@ -1455,11 +1895,12 @@ class MySQL(object):
       cursor.close()
     except Exception:
       pass
+    self.__connectionPool.checkin()
     return retDict
 
   # For the procedures that execute a select without storing the result
   def executeStoredProcedureWithCursor(self, packageName, parameters):
-    conDict = self._getConnection()
+    conDict = self.__checkoutConnection()
     if not conDict['OK']:
       return conDict
 
@@ -1479,5 +1920,6 @@ class MySQL(object):
       cursor.close()
     except Exception:
       pass
+    self.__connectionPool.checkin()
 
     return retDict
@@ -0,0 +1,83 @@
+""" Tests of the binary codec specific features: string tables and incremental decoding.
+    The round trips of all the types are tested with the other codecs in Test_Encode.
+"""
+
+import datetime
+
+from hypothesis import given
+from hypothesis.strategies import integers, lists, recursive, binary, text, booleans, none, dictionaries, tuples
+
+from pytest import mark, raises
+
+from DIRAC.Core.Utilities.BinEncode import encode, decode, StreamDecoder, IncompleteData, TABLE_MIN_SIZE
+parametrize = mark.parametrize
+
+# Strings as keys and values, so that the dictionaries and lists use string tables
+stringStrategy = recursive(
+    none() | booleans() | integers() | binary() | text(),
+    lambda x: lists(x) | lists(binary(), min_size=TABLE_MIN_SIZE) | tuples(x) |
+    dictionaries(binary(), x) | dictionaries(binary(), binary(), min_size=TABLE_MIN_SIZE))
+
+
+def streamDecode(encodedData, chunkSize):
+  """ Decode the data fed by chunks of chunkSize bytes """
+  decoder = StreamDecoder()
+  for index in xrange(0, len(encodedData), chunkSize):
+    assert not decoder.isDone()
+    decoder.feed(encodedData[index:index + chunkSize])
+  assert decoder.isDone()
+  assert decoder.getConsumed() == len(encodedData)
+  return decoder.getValue()
+
+
+@given(data=stringStrategy)
+def test_stringTables(data):
+  """ Test the structures with strings """
+  encodedData = encode(data)
+  assert decode(encodedData) == (data, len(encodedData))
+
+
+@given(data=stringStrategy, chunkSize=integers(min_value=1, max_value=64))
+def test_streamDecoder(data, chunkSize):
+  """ The stream decoder gives the same value whatever the chunks """
+  assert streamDecode(encode(data), chunkSize) == data
+
+
+def test_replicas():
+  """ Typical reply of the file catalog, with the remainder of the stream
+  """
+  lfns = ['/dirac/file_%d' % i for i in xrange(1000)]
+  data = {'OK': True,
+          'Value': {'Successful': dict((lfn, {'SE-1': 'root://se1' + lfn, 'SE-2': 'root://se2' + lfn}) for lfn in lfns),
+                    'Failed': dict((lfn, 'No such file') for lfn in lfns[:10])},
+          'Time': datetime.datetime(2019, 1, 1, 10, 0, 0, 12)}
+  encodedData = encode(data)
+  assert decode(encodedData)[0] == data
+
+  decoder = StreamDecoder()
+  assert not decoder.feed(encodedData[:1000])
+  # Only the undecoded bytes are kept
+  assert decoder.getConsumed() > 0
+  assert decoder.feed(encodedData[1000:] + 'next')
+  assert decoder.getValue() == data
+  assert decoder.getRemainder() == 'next'
+  with raises(ValueError):
+    StreamDecoder().getValue()
+
+
+@parametrize('data', ['s', [1, 2], {'a': 1}, ['a%s' % i for i in range(10)], dict.fromkeys('abcdefghij', 'v')])
+def test_incompleteData(data):
+  """ Truncated data are reported as incomplete """
+  encodedData = encode(data)
+  for end in xrange(1, len(encodedData)):
+    with raises(IncompleteData):
+      decode(encodedData[:end])
+
+
+def test_invalidData():
+  """ Unknown tags and invalid string tables are rejected """
+  with raises(ValueError):
+    decode('x')
+  encodedData = encode(['a%s' % i for i in range(10)])
+  with raises(ValueError):
+    decode(encodedData.replace('2s', '2q', 1))
@@ -1,5 +1,5 @@
 """ Test Encoding function of DIRAC
-It contains tests for DISET and JSON.
+It contains tests for DISET, the binary DISET codec and JSON.
 Some tests can be passed by both, while some can only be passed by one.
 
 Typically, we know JSON cannot serialize tuples, or integers as dictionary keys.
@@ -14,6 +14,7 @@ import sys
 
 
 from DIRAC.Core.Utilities.DEncode import encode as disetEncode, decode as disetDecode, g_dEncodeFunctions
+from DIRAC.Core.Utilities.BinEncode import encode as binEncode, decode as binDecode
 from DIRAC.Core.Utilities.JEncode import encode as jsonEncode, decode as jsonDecode, JSerializable
 
 from hypothesis import given
@@ -30,8 +31,9 @@ parametrize = mark.parametrize
 
 disetTuple = (disetEncode, disetDecode)
 jsonTuple = (jsonEncode, jsonDecode)
+binTuple = (binEncode, binDecode)
 
-enc_dec_imp = (disetTuple, jsonTuple)
+enc_dec_imp = (disetTuple, jsonTuple, binTuple)
 
 
 def myDatetimes():
@@ -120,7 +122,7 @@ def test_BaseType_DateTime(enc_dec, data):
 
 
 # Json does not serialize keys as integers but as string
-@parametrize('enc_dec', [disetTuple])
+@parametrize('enc_dec', [disetTuple, binTuple])
 @given(data=dictionaries(integers(), integers()))
 def test_BaseType_Dict(enc_dec, data):
   """ Test for basic dict"""
@@ -177,7 +179,7 @@ def test_BaseType_String(enc_dec, data):
 
 
 # Tuple are not serialized in JSON
-@parametrize('enc_dec', [disetTuple])
+@parametrize('enc_dec', [disetTuple, binTuple])
 @given(data=tuples(integers()))
 def test_BaseType_Tuple(enc_dec, data):
   """ Test basic tuple """
@@ -192,7 +194,7 @@ def test_BaseType_Unicode(enc_dec, data):
 
 
 # Json will not pass this because of tuples and integers as dict keys
-@parametrize('enc_dec', [disetTuple])
+@parametrize('enc_dec', [disetTuple, binTuple])
 @given(data=nestedStrategy)
 def test_nestedStructure(enc_dec, data):
   """ Test nested structure """
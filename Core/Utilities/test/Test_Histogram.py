@@ -0,0 +1,50 @@
+""" Tests of the Histogram
+"""
+
+import random
+
+from pytest import mark, raises
+
+from DIRAC.Core.Utilities.Histogram import Histogram
+parametrize = mark.parametrize
+
+
+@parametrize('resolution, values', [(1, range(1000)),
+                                    (1, [random.randint(0, 10 ** 9) for _ in xrange(10000)]),
+                                    (1e-6, [random.expovariate(10) for _ in xrange(10000)])])
+def test_percentiles(resolution, values):
+  """ The percentiles are known within the precision """
+  histogram = Histogram(resolution=resolution)
+  for value in values:
+    histogram.add(value)
+  values.sort()
+  for percentile in (1, 50, 90, 99, 99.9, 100):
+    exactValue = values[max(0, int(len(values) * percentile / 100.) - 1)]
+    assert abs(histogram.getPercentile(percentile) - exactValue) <= exactValue / 32. + resolution
+  summary = histogram.getSummary()
+  assert summary['count'] == len(values)
+  assert (summary['min'], summary['max']) == (values[0], values[-1])
+  assert abs(summary['mean'] - sum(values) / float(len(values))) < 1e-6 * summary['max']
+  assert sum(count for _value, count in histogram.getBuckets()) == len(values)
+  # The buckets only depend on the range of the values
+  assert len(histogram.getBuckets()) < 64 * 32
+
+
+def test_merge():
+  """ Merged histograms are the histogram of all the values """
+  histograms = [Histogram(), Histogram(), Histogram()]
+  for value in xrange(100):
+    histograms[value % 2].add(value)
+    histograms[2].add(value)
+  histograms[0].merge(histograms[1])
+  histograms[0].merge(Histogram())
+  assert histograms[0].getSummary() == histograms[2].getSummary()
+  assert histograms[0].getBuckets() == histograms[2].getBuckets()
+  with raises(ValueError):
+    histograms[0].merge(Histogram(resolution=1e-3))
+
+
+def test_empty():
+  """ Nothing to summarize """
+  assert Histogram().getSummary() == {'count': 0, 'min': None, 'max': None, 'mean': None,
+                                      'p50': None, 'p90': None, 'p99': None, 'p99.9': None}
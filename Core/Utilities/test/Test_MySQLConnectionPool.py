@@ -0,0 +1,143 @@
+""" Unit tests of the connection pool of the MySQL base class
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+import threading
+import unittest
+from mock import MagicMock, patch
+
+from DIRAC.Core.Utilities.MySQL import MySQL
+
+MODULE_NAME = "DIRAC.Core.Utilities.MySQL"
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+  def setUp(self):
+    patcher = patch(MODULE_NAME + ".MySQLdb.connect", side_effect=lambda **kwargs: MagicMock())
+    self.connect = patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def test_perThread(self):
+    pool = MySQL.ConnectionPool('host', 'user', 'passwd')
+    first = pool.checkout('db')['Value']
+    pool.checkin()
+    # The connection stays assigned to the thread
+    self.assertIs(pool.checkout('db')['Value'], first)
+    pool.checkin()
+    self.assertEqual(pool.getStats()['InUse'], 1)
+    self.assertEqual(pool.getStats()['Created'], 1)
+
+  def test_bounded(self):
+    pool = MySQL.ConnectionPool('host', 'user', 'passwd', maxConnections=1, waitTimeout=0.1)
+    first = pool.checkout('db')['Value']
+    self.assertEqual(pool.getStats()['InUse'], 1)
+
+    # A second thread can not get a connection while the first one holds it
+    results = []
+    thread = threading.Thread(target=lambda: results.append(pool.checkout('db')))
+    thread.start()
+    thread.join()
+    self.assertFalse(results[0]['OK'])
+    self.assertEqual(pool.getStats()['Timeouts'], 1)
+
+    pool.checkin()
+    stats = pool.getStats()
+    self.assertEqual((stats['InUse'], stats['Idle']), (0, 1))
+
+    # Once given back, the connection is reused by the other threads
+    results = []
+
+    def useConnection():
+      results.append(pool.checkout('db'))
+      pool.checkin()
+    thread = threading.Thread(target=useConnection)
+    thread.start()
+    thread.join()
+    self.assertIs(results[0]['Value'], first)
+    self.assertEqual(pool.getStats()['Created'], 1)
+
+  def test_boundedGet(self):
+    pool = MySQL.ConnectionPool('host', 'user', 'passwd', maxConnections=1, waitTimeout=0.1)
+    first = pool.get('db')['Value']
+    # The connection is kept by the thread, the following operations use it
+    self.assertIs(pool.checkout('db')['Value'], first)
+    pool.checkin()
+    self.assertEqual(pool.getStats()['InUse'], 1)
+    results = []
+
+    def useConnection():
+      results.append(pool.checkout('db'))
+      pool.checkin()
+    thread = threading.Thread(target=useConnection)
+    thread.start()
+    thread.join()
+    self.assertFalse(results[0]['OK'])
+
+    # Once released, another thread can use it
+    pool.release()
+    self.assertEqual(pool.getStats()['InUse'], 0)
+    results = []
+    thread = threading.Thread(target=useConnection)
+    thread.start()
+    thread.join()
+    self.assertIs(results[0]['Value'], first)
+
+  def test_poolPerDatabase(self):
+    firstDB = MySQL('host', 'user', 'passwd', 'FirstDB', maxConnections=2)
+    secondDB = MySQL('host', 'user', 'passwd', 'SecondDB', maxConnections=5)
+    self.assertEqual(firstDB.getConnectionPoolStats()['Value']['MaxConnections'], 2)
+    self.assertEqual(secondDB.getConnectionPoolStats()['Value']['MaxConnections'], 5)
+
+  def test_boundedTransaction(self):
+    pool = MySQL.ConnectionPool('host', 'user', 'passwd', maxConnections=2)
+    self.assertTrue(pool.transactionStart('db')['OK'])
+    # The connection is kept by the thread until the end of the transaction
+    conn = pool.checkout('db')['Value']
+    pool.checkin()
+    self.assertEqual(pool.getStats()['InUse'], 1)
+    self.assertTrue(pool.transactionCommit('db')['OK'])
+    self.assertEqual(pool.getStats()['InUse'], 0)
+    conn.cursor.return_value.execute.assert_any_call("COMMIT")
+
+  def test_boundedStatements(self):
+    db = MySQL('host', 'user', 'passwd', 'StatementDB', maxConnections=2)
+    # Transactions and table locks sent as statements keep the connection until they end
+    for start, end in (("START TRANSACTION", "COMMIT"), ("LOCK TABLES t WRITE", "UNLOCK TABLES"),
+                       (" START TRANSACTION; ", "ROLLBACK;")):
+      self.assertTrue(db._query(start)['OK'])
+      self.assertEqual(db.getConnectionPoolStats()['Value']['InUse'], 1)
+      self.assertTrue(db._update("UPDATE t SET a=1")['OK'])
+      self.assertEqual(db.getConnectionPoolStats()['Value']['InUse'], 1)
+      self.assertTrue(db._query(end)['OK'])
+      self.assertEqual(db.getConnectionPoolStats()['Value']['InUse'], 0)
+
+  def test_boundedGetConnection(self):
+    db = MySQL('host', 'user', 'passwd', 'GetConnectionDB', maxConnections=2)
+    conn = db._getConnection()['Value']
+    # Nested uses of the connection keep it until the last release
+    self.assertIs(db._getConnection()['Value'], conn)
+    db._query("SELECT 1", conn=conn)
+    db._releaseConnection()
+    self.assertEqual(db.getConnectionPoolStats()['Value']['InUse'], 1)
+    db._releaseConnection()
+    self.assertEqual(db.getConnectionPoolStats()['Value']['InUse'], 0)
+
+  def test_ping(self):
+    pool = MySQL.ConnectionPool('host', 'user', 'passwd', pingInterval=60)
+    conn = pool.checkout('db')['Value']
+    pool.checkin()
+    pool.checkout('db')
+    pool.checkin()
+    conn.ping.assert_not_called()
+    # After a failure the connection is checked before being used again
+    pool.checkLater()
+    pool.checkout('db')
+    pool.checkin()
+    conn.ping.assert_called_once_with(True)
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase(ConnectionPoolTest)
+  unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,67 @@
+""" Unit tests of the parameterised commands of the MySQL base class
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+import unittest
+from mock import MagicMock, patch
+
+from DIRAC import S_OK
+from DIRAC.Core.Utilities.MySQL import MySQL
+
+MODULE_NAME = "DIRAC.Core.Utilities.MySQL"
+
+
+class MySQLParametersTest(unittest.TestCase):
+
+  def setUp(self):
+    with patch(MODULE_NAME + ".MySQLdb.connect", new=lambda **kwargs: MagicMock()):
+      self.db = MySQL(dbName='TestDB')
+    self.db._update = MagicMock(return_value=S_OK(1))
+    self.db._query = MagicMock(return_value=S_OK(()))
+    self.db._updatemany = MagicMock(return_value=S_OK(2))
+
+  def test_buildCondition(self):
+    args = []
+    cond = self.db.buildCondition(condDict={'Status': ['Done', 'Failed'], 'Site': 'Site1'},
+                                  newer='UTC_TIMESTAMP()', timeStamp='LastUpdate',
+                                  orderAttribute='JobID:DESC', limit=10, args=args)
+    self.assertIn('`Status` IN ( %s, %s )', cond)
+    self.assertIn('`Site` = %s', cond)
+    # SQL functions are kept in the command
+    self.assertIn('`LastUpdate` >= UTC_TIMESTAMP()', cond)
+    self.assertTrue(cond.endswith('ORDER BY `JobID` DESC LIMIT 10'))
+    self.assertEqual(sorted(args), ['Done', 'Failed', 'Site1'])
+
+  def test_getFields(self):
+    self.assertTrue(self.db.getFields('Jobs', ['JobID'], condDict={'Owner': "o'wner"})['OK'])
+    cmd = self.db._query.call_args[0][0]
+    self.assertEqual(cmd.split(), ['SELECT', '`JobID`', 'FROM', '`Jobs`', 'WHERE', '`Owner`', '=', '%s'])
+    self.assertEqual(self.db._query.call_args[1]['args'], ["o'wner"])
+
+  def test_insertFields(self):
+    self.assertTrue(self.db.insertFields('Jobs', ['JobID', 'Owner', 'LastUpdate'],
+                                         [1, 'owner', 'UTC_TIMESTAMP()'])['OK'])
+    cmd = self.db._update.call_args[0][0]
+    self.assertIn('VALUES (  %s, %s, UTC_TIMESTAMP() )', cmd)
+    self.assertEqual(self.db._update.call_args[1]['args'], ['1', 'owner'])
+
+  def test_updateFields(self):
+    self.assertTrue(self.db.updateFields('Jobs', ['Status'], ['Done'], condDict={'JobID': [1, 2]})['OK'])
+    cmd = self.db._update.call_args[0][0]
+    self.assertIn('SET `Status` = %s', cmd)
+    self.assertIn('`JobID` IN ( %s, %s )', cmd)
+    self.assertEqual(self.db._update.call_args[1]['args'], ['Done', '1', '2'])
+
+  def test_insertManyFields(self):
+    result = self.db.insertManyFields('Jobs', ['JobID', 'Owner'], [(1, 'owner1'), (2, 'owner2')])
+    self.assertTrue(result['OK'])
+    cmd, data = self.db._updatemany.call_args[0][:2]
+    self.assertEqual(cmd, 'INSERT INTO `Jobs` (  `JobID`, `Owner` ) VALUES (  %s, %s )')
+    self.assertEqual(data, [['1', 'owner1'], ['2', 'owner2']])
+    self.assertFalse(self.db.insertManyFields('Jobs', ['JobID', 'Owner'], [(1,)])['OK'])
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase(MySQLParametersTest)
+  unittest.TextTestRunner(verbosity=2).run(suite)
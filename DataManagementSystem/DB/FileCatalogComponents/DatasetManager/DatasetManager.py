@@ -1,13 +1,51 @@
 """ DIRAC FileCatalog plug-in class to manage dynamic datasets defined by a metadata query
+
+    The files of the dynamic datasets are materialised in the FC_MetaDatasetDynamicFiles table, with
+    their summary ( number of files, total size and hash ) in the FC_MetaDatasetState table. The
+    FileCatalogDB records the IDs of the files changed by the write operations in the
+    FC_MetaDatasetChanges table while dynamic datasets exist, and the datasets are refreshed by
+    evaluating their metadata query on the files changed since their last refresh only. A change of
+    all the files ( FileID 0 ), e.g. of the metadata of a directory, makes the datasets evaluate
+    their query again in full.
+
+    The change IDs are taken from the FC_MetaDatasetSequence table in the transaction recording the
+    change, so that they are given in the order of the commits: all the changes up to the last
+    committed change ID are visible. The changes are purged periodically, and the datasets whose
+    changes were purged before their refresh evaluate their query again in full.
 """
 
 __RCSID__ = "$Id$"
 
 import hashlib
 import os
+import time
 
 from DIRAC import S_OK, S_ERROR, gLogger
-from DIRAC.Core.Utilities.List import stringListToString
+from DIRAC.Core.Utilities.List import stringListToString, intListToString, breakListIntoChunks
+
+# FileID of the changes of all the files
+ALL_FILES = 0
+# Period of the check for dynamic datasets, the changes are only recorded if there are some
+DATASET_CHECK_TIME = 60
+# Number of changes kept for the datasets not refreshed for a long time
+MAX_PENDING_CHANGES = 100000
+
+def getLFNHash( lfn ):
+  """ Hash of an LFN, as two 64 bits integers: the hash of a dataset is the exclusive or of the hashes
+      of its LFNs, so that it does not depend on their order and can be updated file by file
+  """
+  digest = hashlib.md5( lfn ).hexdigest()
+  return int( digest[:16], 16 ), int( digest[16:], 16 )
+
+def getDatasetHash( lfnList ):
+  """ Hash of a dataset made of the given LFNs
+  """
+  hashHigh = hashLow = 0
+  for lfn in lfnList:
+    lfnHigh, lfnLow = getLFNHash( lfn )
+    hashHigh ^= lfnHigh
+    hashLow ^= lfnLow
+  return '%016X%016X' % ( hashHigh, hashLow )
 
 class DatasetManager( object ):
 
@@ -42,9 +80,45 @@ class DatasetManager( object ):
                                                  },
                                        "PrimaryKey": "DatasetID",
                                      }
+  _tables["FC_MetaDatasetChanges"] = { "Fields": {
+                                                  "ChangeID": "BIGINT UNSIGNED NOT NULL",
+                                                  "FileID": "INT NOT NULL"
+                                                 },
+                                       "PrimaryKey": [ "ChangeID", "FileID" ]
+                                     }
+  _tables["FC_MetaDatasetSequence"] = { "Fields": {
+                                                   "SequenceID": "TINYINT UNSIGNED NOT NULL",
+                                                   "LastChangeID": "BIGINT UNSIGNED NOT NULL DEFAULT 0",
+                                                   "PurgedChangeID": "BIGINT UNSIGNED NOT NULL DEFAULT 0"
+                                                  },
+                                        "PrimaryKey": "SequenceID"
+                                      }
+  _tables["FC_MetaDatasetState"] = { "Fields": {
+                                                "DatasetID": "INT NOT NULL",
+                                                "LastChangeID": "BIGINT UNSIGNED NOT NULL DEFAULT 0",
+                                                "NumberOfFiles": "INT NOT NULL DEFAULT 0",
+                                                "TotalSize": "BIGINT NOT NULL DEFAULT 0",
+                                                "HashHigh": "BIGINT UNSIGNED NOT NULL DEFAULT 0",
+                                                "HashLow": "BIGINT UNSIGNED NOT NULL DEFAULT 0",
+                                                "CreationDate": "DATETIME",
+                                                "Validated": "TINYINT NOT NULL DEFAULT 0"
+                                               },
+                                     "PrimaryKey": "DatasetID"
+                                   }
+  _tables["FC_MetaDatasetDynamicFiles"] = { "Fields": {
+                                                       "DatasetID": "INT NOT NULL",
+                                                       "FileID": "INT NOT NULL",
+                                                       "Size": "BIGINT UNSIGNED NOT NULL DEFAULT 0",
+                                                       "HashHigh": "BIGINT UNSIGNED NOT NULL DEFAULT 0",
+                                                       "HashLow": "BIGINT UNSIGNED NOT NULL DEFAULT 0"
+                                                      },
+                                            "PrimaryKey": [ "DatasetID", "FileID" ]
+                                          }
 
   def __init__( self, database = None ):
     self.db = None
+    self.__dynamicDatasets = True
+    self.__lastCheck = 0
     if database is not None:
       self.setDatabase( database )
 
@@ -65,9 +139,13 @@ class DatasetManager( object ):
     result = self.db._createTables( tablesToCreate )
     if not result['OK']:
       gLogger.error( "Failed to create tables", str( self._tables.keys() ) )
+      return result
     elif result['Value']:
       gLogger.info( "Tables created: %s" % ','.join( result['Value'] ) )  
-    return result
+
+    req = "INSERT IGNORE INTO FC_MetaDatasetSequence (SequenceID,LastChangeID,PurgedChangeID) "
+    req += "SELECT 1, IFNULL(MAX(ChangeID),0), 0 FROM FC_MetaDatasetChanges"
+    return self.db._update( req )
 
   def _getConnection( self, connection=False ):
     if connection:
@@ -92,6 +170,8 @@ class DatasetManager( object ):
     failed = dict()
     successful = dict()
 
+    # Record the changes from now on in this service
+    self.__dynamicDatasets = True
     for datasetName, metaQuery in datasets.iteritems():
       result = self.__addDataset( datasetName, metaQuery, credDict, uid, gid )
       if result['OK']:
@@ -103,12 +183,18 @@ class DatasetManager( object ):
 
   def __addDataset( self, datasetName, metaQuery, credDict, uid, gid ):
 
+    # The changes done while the query is evaluated are applied at the first refresh
+    result = self.__getChangeSequence()
+    if not result['OK']:
+      return result
+    lastChangeID = result['Value'][0]
     result = self.__getMetaQueryParameters( metaQuery, credDict )
     if not result['OK']:
       return result
-    totalSize = result['Value']['TotalSize']
-    datasetHash = result['Value']['DatasetHash']
-    numberOfFiles = result['Value']['NumberOfFiles']
+    queryParameters = result['Value']
+    totalSize = queryParameters['TotalSize']
+    datasetHash = queryParameters['DatasetHash']
+    numberOfFiles = queryParameters['NumberOfFiles']
 
     result = self.db.fileManager._getStatusInt( 'Dynamic' )
     if not result['OK']:
@@ -151,6 +237,11 @@ class DatasetManager( object ):
       else:
         return result
     datasetID = result['lastRowId']
+
+    result = self.__materialiseDataset( datasetID, queryParameters, lastChangeID )
+    if not result['OK']:
+      # It will be materialised at its first use
+      gLogger.warn( 'Failed to materialise the dataset', '%s: %s' % ( datasetName, result['Message'] ) )
     return S_OK( datasetID )
   
   def _getDatasetDirectories( self, datasets ):
@@ -309,8 +400,10 @@ class DatasetManager( object ):
       
     return S_OK( {'Successful':successful, 'Failed':failed} )  
 
-  def __getMetaQueryParameters( self, metaQuery, credDict ):
-    """ Get parameters ( hash, total size, number of files ) for the given metaquery
+  def __findDatasetFiles( self, metaQuery, credDict, fileIDs = None ):
+    """ Find the files of the given metaquery, among the given files if any
+
+    :return: S_OK/S_ERROR, Value - ID:LFN dictionary of the files, FileSizes - ID:size dictionary
     """
     findMetaQuery = dict( metaQuery )
 
@@ -319,30 +412,281 @@ class DatasetManager( object ):
       path = findMetaQuery['Path']
       findMetaQuery.pop( 'Path' )
 
-    result = self.db.fmeta.findFilesByMetadata(findMetaQuery, path, credDict)
+    result = self.db.fmeta.findFilesByMetadata( findMetaQuery, path, credDict, fileIDs = fileIDs )
     if not result['OK']:
       return S_ERROR( 'Failed to apply the metaQuery' )
+    idLfnDict = result['Value']
 
+    fileSizes = {}
+    if idLfnDict:
+      result = self.db.fileManager.getFileSize( idLfnDict.values() )
+      if result['OK']:
+        fileSizes = dict( ( fileID, result['Value']['Successful'].get( lfn, 0 ) )
+                          for fileID, lfn in idLfnDict.iteritems() )
+
+    result = S_OK( idLfnDict )
+    result['FileSizes'] = fileSizes
+    return result
+
+  def __getMetaQueryParameters( self, metaQuery, credDict ):
+    """ Get parameters ( hash, total size, number of files ) for the given metaquery
+    """
+    result = self.__findDatasetFiles( metaQuery, credDict )
+    if not result['OK']:
+      return result
     idLfnDict = result['Value']
+    fileSizes = result['FileSizes']
+
     lfnIDList = idLfnDict.keys()
     lfnList = idLfnDict.values()
     lfnList.sort()
-    myMd5 = hashlib.md5()
-    myMd5.update( str( lfnList ) )
-    datasetHash = myMd5.hexdigest().upper()
-    numberOfFiles = len( lfnList )
-    result = self.db.fileManager.getFileSize( lfnList )
-    totalSize = 0
-    if result['OK']:
-      totalSize = result['TotalSize']
 
-    result = S_OK( { 'DatasetHash': datasetHash,
-                     'NumberOfFiles': numberOfFiles,
-                     'TotalSize': totalSize,
+    result = S_OK( { 'DatasetHash': getDatasetHash( lfnList ),
+                     'NumberOfFiles': len( lfnList ),
+                     'TotalSize': sum( fileSizes.values() ),
                      'LFNList': lfnList,
-                     'LFNIDList': lfnIDList } )
+                     'LFNIDList': lfnIDList,
+                     'IDLFNDict': idLfnDict,
+                     'FileSizes': fileSizes } )
     return result
 
+  #########################################################################
+  #
+  #  Materialised dynamic datasets
+  #
+
+  def _hasDynamicDatasets( self ):
+    """ Check if there are dynamic datasets, i.e. if the changes must be recorded. The check is done
+        every DATASET_CHECK_TIME seconds, together with the purge of the changes
+    """
+    now = time.time()
+    if now - self.__lastCheck < DATASET_CHECK_TIME:
+      return self.__dynamicDatasets
+    self.__lastCheck = now
+
+    result = self.db.fileManager._getStatusInt( 'Dynamic' )
+    if result['OK']:
+      result = self.db._query( "SELECT COUNT(*) FROM FC_MetaDatasets WHERE Status=%d" % result['Value'] )
+    if not result['OK']:
+      # Rather record useless changes than miss some
+      gLogger.warn( 'Failed to check for dynamic datasets', result['Message'] )
+      self.__dynamicDatasets = True
+    else:
+      self.__dynamicDatasets = bool( result['Value'] and result['Value'][0][0] )
+
+    result = self.__purgeChanges()
+    if not result['OK']:
+      gLogger.warn( 'Failed to purge the changes of the datasets', result['Message'] )
+    return self.__dynamicDatasets
+
+  def _recordChanges( self, fileIDs ):
+    """ Record that the given files were added, removed or changed, for the refresh of the dynamic datasets.
+        The change ID is incremented in the transaction inserting the change, so that the change IDs are
+        committed in order
+
+    :param list fileIDs: IDs of the files, ALL_FILES for a change of all the files
+    """
+    if not fileIDs:
+      return S_OK()
+    values = ','.join( '(LAST_INSERT_ID(),%d)' % fileID for fileID in set( fileIDs ) )
+    return self.db._transaction( [ "START TRANSACTION",
+                                   "UPDATE FC_MetaDatasetSequence SET LastChangeID=LAST_INSERT_ID(LastChangeID+1)",
+                                   "INSERT INTO FC_MetaDatasetChanges (ChangeID,FileID) VALUES %s" % values ] )
+
+  def __getChangeSequence( self ):
+    """ ID of the last committed change and ID up to which the changes were purged
+
+    :return: S_OK/S_ERROR, Value - tuple ( LastChangeID, PurgedChangeID )
+    """
+    result = self.db._query( "SELECT LastChangeID, PurgedChangeID FROM FC_MetaDatasetSequence WHERE SequenceID=1" )
+    if not result['OK']:
+      return result
+    if not result['Value']:
+      return S_OK( ( 0, 0 ) )
+    return S_OK( ( int( result['Value'][0][0] ), int( result['Value'][0][1] ) ) )
+
+  def __dropMaterialisation( self, datasetID ):
+    """ Forget the materialised files of a dataset
+    """
+    for table in [ "FC_MetaDatasetState", "FC_MetaDatasetDynamicFiles" ]:
+      result = self.db._update( "DELETE FROM %s WHERE DatasetID=%d" % ( table, datasetID ) )
+      if not result['OK']:
+        return result
+    return S_OK()
+
+  def __insertDynamicFiles( self, datasetID, idLfnDict, fileSizes ):
+    """ Add files to the materialised files of a dataset
+
+    :return: S_OK/S_ERROR, Value - tuple of the changes of the number of files, total size and hash
+    """
+    numberOfFiles = totalSize = hashHigh = hashLow = 0
+    valueList = []
+    for fileID, lfn in idLfnDict.iteritems():
+      lfnHigh, lfnLow = getLFNHash( lfn )
+      size = fileSizes.get( fileID, 0 )
+      valueList.append( '(%d,%d,%d,%d,%d)' % ( datasetID, fileID, size, lfnHigh, lfnLow ) )
+      numberOfFiles += 1
+      totalSize += size
+      hashHigh ^= lfnHigh
+      hashLow ^= lfnLow
+    for values in breakListIntoChunks( valueList, 1000 ):
+      req = "INSERT IGNORE INTO FC_MetaDatasetDynamicFiles (DatasetID,FileID,Size,HashHigh,HashLow) VALUES %s"
+      result = self.db._update( req % ','.join( values ) )
+      if not result['OK']:
+        return result
+    return S_OK( ( numberOfFiles, totalSize, hashHigh, hashLow ) )
+
+  def __materialiseDataset( self, datasetID, queryParameters, lastChangeID ):
+    """ Store the files of a dataset, as found by its metaquery
+
+    :param dict queryParameters: result of __getMetaQueryParameters
+    :param int lastChangeID: ID of the last change recorded before the metaquery was evaluated
+    """
+    result = self.db._update( "DELETE FROM FC_MetaDatasetDynamicFiles WHERE DatasetID=%d" % datasetID )
+    if not result['OK']:
+      return result
+    result = self.__insertDynamicFiles( datasetID, queryParameters['IDLFNDict'], queryParameters['FileSizes'] )
+    if not result['OK']:
+      return result
+    numberOfFiles, totalSize, hashHigh, hashLow = result['Value']
+    # The changes of the services which did not know yet about the dataset when it was created may be
+    # missing: the dataset is only refreshed incrementally after a full evaluation done late enough
+    req = "INSERT INTO FC_MetaDatasetState "
+    req += "(DatasetID,LastChangeID,NumberOfFiles,TotalSize,HashHigh,HashLow,CreationDate,Validated) "
+    req += "VALUES (%d,%d,%d,%d,%d,%d,UTC_TIMESTAMP(),0) " % ( datasetID, lastChangeID, numberOfFiles,
+                                                               totalSize, hashHigh, hashLow )
+    req += "ON DUPLICATE KEY UPDATE LastChangeID=VALUES(LastChangeID), NumberOfFiles=VALUES(NumberOfFiles), "
+    req += "TotalSize=VALUES(TotalSize), HashHigh=VALUES(HashHigh), HashLow=VALUES(HashLow), "
+    req += "Validated=CreationDate < UTC_TIMESTAMP() - INTERVAL %d SECOND" % ( 2 * DATASET_CHECK_TIME )
+    return self.db._update( req )
+
+  def __refreshDataset( self, datasetID, metaQuery, credDict ):
+    """ Bring the materialised files of a dynamic dataset up to date: the metaquery is evaluated
+        on the files changed since the last refresh only, or in full if the dataset is not materialised,
+        not validated yet or if its changes were purged
+    """
+    result = self.db._query( "SELECT LastChangeID, Validated FROM FC_MetaDatasetState WHERE DatasetID=%d" % datasetID )
+    if not result['OK']:
+      return result
+    materialised = bool( result['Value'] )
+    lastChangeID = int( result['Value'][0][0] ) if materialised else 0
+    validated = materialised and bool( result['Value'][0][1] )
+
+    # Only the changes up to the last committed change ID are all visible
+    result = self.__getChangeSequence()
+    if not result['OK']:
+      return result
+    newChangeID = result['Value'][0]
+    fileIDs = set()
+    if validated and newChangeID > lastChangeID:
+      req = "SELECT FileID FROM FC_MetaDatasetChanges WHERE ChangeID > %d AND ChangeID <= %d"
+      result = self.db._query( req % ( lastChangeID, newChangeID ) )
+      if not result['OK']:
+        return result
+      fileIDs = set( row[0] for row in result['Value'] )
+      # The purge advances PurgedChangeID before deleting the changes
+      result = self.__getChangeSequence()
+      if not result['OK']:
+        return result
+      validated = lastChangeID >= result['Value'][1]
+    if validated and newChangeID == lastChangeID:
+      return S_OK()
+
+    if materialised and newChangeID > lastChangeID:
+      # Claim the changes, so that they are applied only once by concurrent refreshes
+      req = "UPDATE FC_MetaDatasetState SET LastChangeID=%d WHERE DatasetID=%d AND LastChangeID=%d"
+      result = self.db._update( req % ( newChangeID, datasetID, lastChangeID ) )
+      if not result['OK']:
+        return result
+      if not result['Value']:
+        return S_OK()
+
+    if validated and ALL_FILES not in fileIDs:
+      result = self.__applyChanges( datasetID, metaQuery, credDict, list( fileIDs ) )
+    else:
+      result = self.__getMetaQueryParameters( metaQuery, credDict )
+      if result['OK']:
+        result = self.__materialiseDataset( datasetID, result['Value'], newChangeID )
+    if not result['OK']:
+      # The dataset will be materialised again at its next use
+      self.__dropMaterialisation( datasetID )
+    return result
+
+  def __applyChanges( self, datasetID, metaQuery, credDict, fileIDs ):
+    """ Update the materialised files of a dataset for the given changed files
+    """
+    result = self.__findDatasetFiles( metaQuery, credDict, fileIDs = fileIDs )
+    if not result['OK']:
+      return result
+    idLfnDict = result['Value']
+    fileSizes = result['FileSizes']
+
+    fileString = intListToString( fileIDs )
+    req = "SELECT Size, HashHigh, HashLow FROM FC_MetaDatasetDynamicFiles WHERE DatasetID=%d AND FileID IN (%s)"
+    result = self.db._query( req % ( datasetID, fileString ) )
+    if not result['OK']:
+      return result
+    numberOfFiles = -len( result['Value'] )
+    totalSize = -sum( int( row[0] ) for row in result['Value'] )
+    hashHigh = hashLow = 0
+    for _size, fileHigh, fileLow in result['Value']:
+      hashHigh ^= int( fileHigh )
+      hashLow ^= int( fileLow )
+    req = "DELETE FROM FC_MetaDatasetDynamicFiles WHERE DatasetID=%d AND FileID IN (%s)"
+    result = self.db._update( req % ( datasetID, fileString ) )
+    if not result['OK']:
+      return result
+
+    result = self.__insertDynamicFiles( datasetID, idLfnDict, fileSizes )
+    if not result['OK']:
+      return result
+    numberOfFiles += result['Value'][0]
+    totalSize += result['Value'][1]
+    hashHigh ^= result['Value'][2]
+    hashLow ^= result['Value'][3]
+
+    req = "UPDATE FC_MetaDatasetState SET NumberOfFiles=NumberOfFiles+(%d), TotalSize=TotalSize+(%d), "
+    req += "HashHigh=HashHigh^%d, HashLow=HashLow^%d WHERE DatasetID=%d"
+    return self.db._update( req % ( numberOfFiles, totalSize, hashHigh, hashLow, datasetID ) )
+
+  def __purgeChanges( self ):
+    """ Remove the changes applied to all the materialised datasets, keeping at most MAX_PENDING_CHANGES
+        for the datasets not refreshed for a long time: these evaluate their query in full at their next use
+    """
+    result = self.__getChangeSequence()
+    if not result['OK']:
+      return result
+    lastChangeID, purgedChangeID = result['Value']
+    result = self.db._query( "SELECT MIN(LastChangeID) FROM FC_MetaDatasetState" )
+    if not result['OK']:
+      return result
+    purgeID = lastChangeID
+    if result['Value'] and result['Value'][0][0] is not None:
+      purgeID = max( min( int( result['Value'][0][0] ), lastChangeID ), lastChangeID - MAX_PENDING_CHANGES )
+    if purgeID <= purgedChangeID:
+      return S_OK()
+    result = self.db._update( "UPDATE FC_MetaDatasetSequence SET PurgedChangeID=GREATEST(PurgedChangeID,%d)" % purgeID )
+    if not result['OK']:
+      return result
+    return self.db._update( "DELETE FROM FC_MetaDatasetChanges WHERE ChangeID <= %d" % purgeID )
+
+  def __getDynamicDatasetSummary( self, datasetID, metaQuery, credDict ):
+    """ Number of files, total size and hash of the materialised files of a dynamic dataset, after its refresh
+    """
+    result = self.__refreshDataset( datasetID, metaQuery, credDict )
+    if not result['OK']:
+      return result
+    req = "SELECT NumberOfFiles, TotalSize, HashHigh, HashLow FROM FC_MetaDatasetState WHERE DatasetID=%d"
+    result = self.db._query( req % datasetID )
+    if not result['OK']:
+      return result
+    if not result['Value']:
+      return S_ERROR( 'Dataset %d is not materialised' % datasetID )
+    numberOfFiles, totalSize, hashHigh, hashLow = result['Value'][0]
+    return S_OK( { 'NumberOfFiles': int( numberOfFiles ),
+                   'TotalSize': int( totalSize ),
+                   'DatasetHash': '%016X%016X' % ( int( hashHigh ), int( hashLow ) ) } )
+
   def removeDataset( self, datasets, credDict ):
     """ Remove the requested datasets
 
@@ -375,7 +719,8 @@ class DatasetManager( object ):
       return S_OK( 'Dataset %s does not exist' % datasetName  )
     datasetID = result['Value'][0][0]
 
-    for table in ["FC_MetaDatasetFiles","FC_MetaDatasets","FC_DatasetAnnotations"]:
+    for table in ["FC_MetaDatasetFiles","FC_MetaDatasets","FC_DatasetAnnotations",
+                  "FC_MetaDatasetState","FC_MetaDatasetDynamicFiles"]:
       req = "DELETE FROM %s WHERE DatasetID=%s" % (table, datasetID)
       result = self.db._update( req )
 
@@ -402,7 +747,7 @@ class DatasetManager( object ):
   def __checkDataset( self, datasetName, credDict ):
     """ Check that the dataset parameters correspond to the actual state
     """
-    req = "SELECT MetaQuery,DatasetHash,TotalSize,NumberOfFiles FROM FC_MetaDatasets"
+    req = "SELECT MetaQuery,DatasetHash,TotalSize,NumberOfFiles,DatasetID,Status FROM FC_MetaDatasets"
     req += " WHERE DatasetName='%s'" % datasetName
     result = self.db._query( req )
     if not result['OK']:
@@ -415,8 +760,15 @@ class DatasetManager( object ):
     datasetHashOld = row[1]
     totalSizeOld = int( row[2] )
     numberOfFilesOld = int( row[3] )
+    datasetID = int( row[4] )
 
-    result = self.__getMetaQueryParameters( metaQuery, credDict )
+    result = self.db.fileManager._getIntStatus( int( row[5] ) )
+    if not result['OK']:
+      return result
+    if result['Value'] == 'Dynamic':
+      result = self.__getDynamicDatasetSummary( datasetID, metaQuery, credDict )
+    else:
+      result = self.__getMetaQueryParameters( metaQuery, credDict )
     if not result['OK']:
       return result
     totalSize = result['Value']['TotalSize']
@@ -685,13 +1037,24 @@ class DatasetManager( object ):
       return S_ERROR( 'Unknown MetaDataset ID %d' % datasetID )
 
     metaQuery = eval( result['Value'][0][0] )
-    result = self.__getMetaQueryParameters( metaQuery, credDict )
+    result = self.__refreshDataset( datasetID, metaQuery, credDict )
     if not result['OK']:
       return result
 
-    lfnList = result['Value']['LFNList']
-    finalResult = S_OK(lfnList)
-    finalResult['FileIDList'] = result['Value']['LFNIDList']
+    req = "SELECT FileID FROM FC_MetaDatasetDynamicFiles WHERE DatasetID=%d" % datasetID
+    result = self.db._query( req )
+    if not result['OK']:
+      return result
+    fileIDList = [ row[0] for row in result['Value'] ]
+    lfnDict = {}
+    if fileIDList:
+      result = self.db.fileManager._getFileLFNs( fileIDList )
+      if not result['OK']:
+        return result
+      lfnDict = result['Value']['Successful']
+
+    finalResult = S_OK( sorted( lfnDict.values() ) )
+    finalResult['FileIDList'] = lfnDict.keys()
     return finalResult
 
   def __getFrozenDatasetFiles( self, datasetID, credDict ):
@@ -774,25 +1137,25 @@ class DatasetManager( object ):
       return S_OK()
 
     datasetID = result['Value']['DatasetID']
+    result = self.__refreshDataset( datasetID, result['Value']['MetaQuery'], credDict )
+    if not result['OK']:
+      return result
+
     req = "DELETE FROM FC_MetaDatasetFiles WHERE DatasetID=%d" % datasetID
     result = self.db._update( req )
 
-    result = self.__getDynamicDatasetFiles( datasetID, credDict )
-
-    if not result['OK']:
-      return result
-    fileIDList = result['FileIDList']
-    valueList = []
-    for fileID in fileIDList:
-      valueList.append( '(%d,%d)' % (datasetID,fileID) )
-    valueString = ','.join( valueList )
-    req = "INSERT INTO FC_MetaDatasetFiles (DatasetID,FileID) VALUES %s" % valueString
+    # The snapshot is the materialised files of the dataset
+    req = "INSERT INTO FC_MetaDatasetFiles (DatasetID,FileID) "
+    req += "SELECT DatasetID,FileID FROM FC_MetaDatasetDynamicFiles WHERE DatasetID=%d" % datasetID
     result = self.db._update( req )
     if not result['OK']:
       return result
 
     result = self.setDatasetStatus( datasetName, 'Frozen' )
-    return result
+    if not result['OK']:
+      return result
+    # A frozen dataset does not follow the changes any more
+    return self.__dropMaterialisation( datasetID )
 
   def releaseDataset( self, datasets, credDict ):
     """ Unfreeze datasets
@@ -827,6 +1190,7 @@ class DatasetManager( object ):
     req = "DELETE FROM FC_MetaDatasetFiles WHERE DatasetID=%d" % datasetID
     result = self.db._update( req )
 
+    self.__dynamicDatasets = True
     result = self.setDatasetStatus( datasetName, 'Dynamic' )
     return result
 
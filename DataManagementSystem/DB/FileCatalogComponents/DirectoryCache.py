@@ -0,0 +1,139 @@
+""" DIRAC FileCatalog cache of the directory entries shared by the catalog components
+
+    The directory IDs, paths, parents and permissions are read again and again while serving
+    a single request, e.g. by the security manager, the file manager and the metadata queries.
+    They are kept here, in a thread safe cache bounded in size (least recently used entries are
+    dropped first) and in time, as other catalog services may change the same directories.
+"""
+
+__RCSID__ = "$Id$"
+
+import time
+import threading
+from collections import OrderedDict
+
+# Fields of a directory entry, besides its DirID and path
+ENTRY_FIELDS = ('Level', 'Parent', 'PathIDs', 'Permissions')
+
+
+class DirectoryCache(object):
+  """ LRU cache of the directory entries, indexed by DirID and by path
+  """
+
+  def __init__(self, maxSize=50000, lifeTime=60):
+    """ c'tor
+
+    :param int maxSize: maximum number of directories in the cache, 0 to disable it
+    :param int lifeTime: seconds after which the entries are read again from the database
+    """
+    self.maxSize = maxSize
+    self.lifeTime = lifeTime
+    self.__lock = threading.Lock()
+    # DirID -> entry dict, from the least recently used to the most recently used
+    self.__entries = OrderedDict()
+    # path -> DirID
+    self.__dirIDs = {}
+    self.__hits = 0
+    self.__misses = 0
+    self.__evictions = 0
+
+  def __getEntry(self, dirID):
+    """ Valid entry of a directory, marked as the most recently used, or None """
+    entry = self.__entries.pop(dirID, None)
+    if entry is None:
+      return None
+    if entry['Expires'] < time.time():
+      self.__removeEntry(dirID, entry)
+      return None
+    self.__entries[dirID] = entry
+    return entry
+
+  def __removeEntry(self, dirID, entry):
+    """ Forget an entry, already removed from the LRU list """
+    if entry.get('Path') is not None and self.__dirIDs.get(entry['Path']) == dirID:
+      del self.__dirIDs[entry['Path']]
+
+  def get(self, dirPathOrID, *fields):
+    """ Fields of a directory entry
+
+    :param dirPathOrID: normalised directory path or DirID
+    :param fields: 'DirID', 'Path' or ENTRY_FIELDS
+    :return: value of the field, or tuple of the values if several fields are asked,
+             None if any of them is not in the cache
+    """
+    if not self.maxSize:
+      return None
+    with self.__lock:
+      dirID = self.__dirIDs.get(dirPathOrID) if isinstance(dirPathOrID, basestring) else dirPathOrID
+      entry = self.__getEntry(dirID) if dirID is not None else None
+      if entry is None or any(entry.get(field) is None for field in fields):
+        self.__misses += 1
+        return None
+      self.__hits += 1
+      if len(fields) == 1:
+        return entry[fields[0]]
+      return tuple(entry[field] for field in fields)
+
+  def add(self, dirID, path=None, **fields):
+    """ Add or update a directory entry
+
+    :param int dirID: DirID
+    :param str path: normalised directory path, if known
+    :param fields: values of ENTRY_FIELDS
+    """
+    if not self.maxSize or not dirID:
+      return
+    with self.__lock:
+      entry = self.__getEntry(dirID)
+      if entry is None:
+        entry = {'DirID': dirID, 'Expires': time.time() + self.lifeTime}
+        self.__entries[dirID] = entry
+        while len(self.__entries) > self.maxSize:
+          self.__removeEntry(*self.__entries.popitem(last=False))
+          self.__evictions += 1
+      if path is not None:
+        entry['Path'] = path
+        self.__dirIDs[path] = dirID
+      entry.update(fields)
+
+  def invalidate(self, dirPathOrID):
+    """ Forget a directory, e.g. after its removal
+
+    :param dirPathOrID: normalised directory path or DirID
+    """
+    with self.__lock:
+      if isinstance(dirPathOrID, basestring):
+        dirID = self.__dirIDs.pop(dirPathOrID, None)
+      else:
+        dirID = dirPathOrID
+      entry = self.__entries.pop(dirID, None)
+      if entry is not None:
+        self.__removeEntry(dirID, entry)
+
+  def clear(self, fields=None):
+    """ Forget some fields of all the directories, e.g. the permissions after a change
+        of owner or mode of a directory tree, or all the entries
+
+    :param list fields: fields to forget, all the entries if None
+    """
+    with self.__lock:
+      if fields is None:
+        self.__entries.clear()
+        self.__dirIDs.clear()
+        return
+      for entry in self.__entries.itervalues():
+        for field in fields:
+          entry.pop(field, None)
+
+  def getCounters(self):
+    """ Counters of the cache usage, for the catalog counters
+
+    :return: dict
+    """
+    with self.__lock:
+      lookups = self.__hits + self.__misses
+      return {'Directory Cache Size': len(self.__entries),
+              'Directory Cache Hits': self.__hits,
+              'Directory Cache Misses': self.__misses,
+              'Directory Cache Evictions': self.__evictions,
+              'Directory Cache Hit Rate (%)': round(100. * self.__hits / lookups, 1) if lookups else 0}
@@ -32,7 +32,14 @@ class DirectoryLevelTree(DirectoryTreeBase):
     """  Find directory ID for the given path
     """
 
-    dpath = self.db._escapeString(os.path.normpath(path))
+    path = os.path.normpath(path)
+    cached = self.db.dirCache.get(path, 'DirID', 'Level')
+    if cached:
+      res = S_OK(cached[0])
+      res['Level'] = cached[1]
+      return res
+
+    dpath = self.db._escapeString(path)
     if not dpath['OK']:
       return dpath
     dpath = dpath['Value']
@@ -44,27 +51,37 @@ class DirectoryLevelTree(DirectoryTreeBase):
     if not result['Value']:
       return S_OK('')
 
-    res = S_OK(result['Value'][0][0])
-    res['Level'] = result['Value'][0][1]
+    dirID, level = result['Value'][0]
+    self.db.dirCache.add(dirID, path, Level=level)
+    res = S_OK(dirID)
+    res['Level'] = level
     return res
 
   def findDirs(self, paths, connection=False):
     """ Find DirIDs for the given path list
     """
+    dirDict = {}
     dpathList = []
     for path in paths:
-      dpath = self.db._escapeString(os.path.normpath(path))
+      path = os.path.normpath(path)
+      dirID = self.db.dirCache.get(path, 'DirID')
+      if dirID:
+        dirDict[path] = dirID
+        continue
+      dpath = self.db._escapeString(path)
       if not dpath['OK']:
         return dpath
       dpathList.append(dpath['Value'])
+    if not dpathList:
+      return S_OK(dirDict)
     dpaths = ','.join(dpathList)
-    req = "SELECT DirName,DirID from FC_DirectoryLevelTree WHERE DirName in (%s)" % dpaths
+    req = "SELECT DirName,DirID,Level from FC_DirectoryLevelTree WHERE DirName in (%s)" % dpaths
     result = self.db._query(req, connection)
     if not result['OK']:
       return result
-    dirDict = {}
-    for dirName, dirID in result['Value']:
+    for dirName, dirID, level in result['Value']:
       dirDict[dirName] = dirID
+      self.db.dirCache.add(dirID, dirName, Level=level)
 
     return S_OK(dirDict)
 
@@ -83,6 +100,7 @@ class DirectoryLevelTree(DirectoryTreeBase):
     dirID = result['Value']
     req = "DELETE FROM FC_DirectoryLevelTree WHERE DirID=%d" % dirID
     result = self.db._update(req)
+    self.db.dirCache.invalidate(dirID)
     result['DirID'] = dirID
     return result
 
@@ -151,8 +169,18 @@ class DirectoryLevelTree(DirectoryTreeBase):
         values.append(epathList[i - 1])
 
     result = self.db._getConnection()
+    if not result['OK']:
+      return result
     conn = result['Value']
-    # result = self.db._query("LOCK TABLES FC_DirectoryLevelTree WRITE; ",conn)
+    try:
+      result = self.__insertDir(path, level, parentDirID, names, values, conn)
+    finally:
+      self.db._releaseConnection()
+    return result
+
+  def __insertDir(self, path, level, parentDirID, names, values, conn):
+    """ Insert the new directory and set its path number, all on the given connection
+    """
     result = self.db.insertFields('FC_DirectoryLevelTree', names, values, conn)
     if not result['OK']:
       # resUnlock = self.db._query("UNLOCK TABLES;",conn)
@@ -168,6 +196,7 @@ class DirectoryLevelTree(DirectoryTreeBase):
       else:
         return result
     dirID = result['lastRowId']
+    self.db.dirCache.add(dirID, os.path.normpath(path), Level=level, Parent=parentDirID)
 
     # Update the path number
     if parentDirID:
@@ -225,6 +254,10 @@ class DirectoryLevelTree(DirectoryTreeBase):
     if dirID == 0:
       return S_ERROR('Root directory ID given')
 
+    parentID = self.db.dirCache.get(dirID, 'Parent')
+    if parentID is not None:
+      return S_OK(parentID)
+
     req = "SELECT Parent FROM FC_DirectoryLevelTree WHERE DirID=%d" % dirID
     result = self.db._query(req)
     if not result['OK']:
@@ -232,19 +265,27 @@ class DirectoryLevelTree(DirectoryTreeBase):
     if not result['Value']:
       return S_ERROR('No parent found')
 
-    return S_OK(result['Value'][0][0])
+    parentID = result['Value'][0][0]
+    self.db.dirCache.add(dirID, Parent=parentID)
+    return S_OK(parentID)
 
   def getDirectoryPath(self, dirID):
     """ Get directory name by directory ID
     """
-    req = "SELECT DirName FROM FC_DirectoryLevelTree WHERE DirID=%d" % int(dirID)
+    dirPath = self.db.dirCache.get(int(dirID), 'Path')
+    if dirPath:
+      return S_OK(dirPath)
+
+    req = "SELECT DirName,Level FROM FC_DirectoryLevelTree WHERE DirID=%d" % int(dirID)
     result = self.db._query(req)
     if not result['OK']:
       return result
     if not result['Value']:
       return S_ERROR('Directory with id %d not found' % int(dirID))
 
-    return S_OK(result['Value'][0][0])
+    dirPath, level = result['Value'][0]
+    self.db.dirCache.add(int(dirID), dirPath, Level=level)
+    return S_OK(dirPath)
 
   def getDirectoryPaths(self, dirIDList):
     """ Get directory name by directory ID list
@@ -256,17 +297,28 @@ class DirectoryLevelTree(DirectoryTreeBase):
     if not dirs:
       return S_OK({})
 
-    dirListString = ','.join([str(d) for d in dirs])
-    req = "SELECT DirID,DirName FROM FC_DirectoryLevelTree WHERE DirID in ( %s )" % dirListString
+    resultDict = {}
+    missingDirs = []
+    for dirID in dirs:
+      dirPath = self.db.dirCache.get(int(dirID), 'Path')
+      if dirPath:
+        resultDict[int(dirID)] = dirPath
+      else:
+        missingDirs.append(dirID)
+    if not missingDirs:
+      return S_OK(resultDict)
+
+    dirListString = ','.join([str(d) for d in missingDirs])
+    req = "SELECT DirID,DirName,Level FROM FC_DirectoryLevelTree WHERE DirID in ( %s )" % dirListString
     result = self.db._query(req)
     if not result['OK']:
       return result
-    if not result['Value']:
+    if not result['Value'] and not resultDict:
       return S_ERROR('Directories not found: %s' % dirListString)
 
-    resultDict = {}
-    for row in result['Value']:
-      resultDict[int(row[0])] = row[1]
+    for dirID, dirPath, level in result['Value']:
+      resultDict[int(dirID)] = dirPath
+      self.db.dirCache.add(int(dirID), dirPath, Level=level)
 
     return S_OK(resultDict)
 
@@ -285,6 +337,10 @@ class DirectoryLevelTree(DirectoryTreeBase):
         specified by its path
     """
 
+    pathIDs = self.db.dirCache.get(os.path.normpath(path), 'PathIDs')
+    if pathIDs:
+      return S_OK(list(pathIDs))
+
     elements = path.split('/')
     pelements = []
     dPath = ''
@@ -294,14 +350,18 @@ class DirectoryLevelTree(DirectoryTreeBase):
     pelements.append('/')
 
     pathString = ["'" + p + "'" for p in pelements]
-    req = "SELECT DirID FROM FC_DirectoryLevelTree WHERE DirName in (%s) ORDER BY DirID" % ','.join(pathString)
+    req = "SELECT DirID,DirName FROM FC_DirectoryLevelTree WHERE DirName in (%s) ORDER BY DirID" % ','.join(pathString)
     result = self.db._query(req)
     if not result['OK']:
       return result
     if not result['Value']:
       return S_ERROR('Directory %s not found' % path)
 
-    return S_OK([x[0] for x in result['Value']])
+    pathIDs = [x[0] for x in result['Value']]
+    dirIDs = dict((dirName, dirID) for dirID, dirName in result['Value'])
+    # Only the complete parent chain of an existing directory is kept
+    self.db.dirCache.add(dirIDs.get(os.path.normpath(path)), PathIDs=tuple(pathIDs))
+    return S_OK(pathIDs)
 
   def getPathIDsByID_old(self, dirID):
     """ Get IDs of all the directories in the parent hierarchy for a directory
@@ -320,6 +380,10 @@ class DirectoryLevelTree(DirectoryTreeBase):
     """ Get IDs of all the directories in the parent hierarchy for a directory
         specified by its ID
     """
+    pathIDs = self.db.dirCache.get(dirID, 'PathIDs')
+    if pathIDs:
+      return S_OK(list(pathIDs))
+
     result = self.__getNumericPath(dirID)
     if not result['OK']:
       return result
@@ -340,7 +404,9 @@ class DirectoryLevelTree(DirectoryTreeBase):
     if not result['Value']:
       return S_ERROR('No result for the path of Directory with ID %d' % dirID)
 
-    return S_OK([x[1] for x in result['Value']] + [dirID])
+    pathIDs = [x[1] for x in result['Value']] + [dirID]
+    self.db.dirCache.add(dirID, PathIDs=tuple(pathIDs))
+    return S_OK(pathIDs)
 
   def getChildren(self, path, connection=False):
     """ Get child directory IDs for the given directory
@@ -461,6 +527,8 @@ class DirectoryLevelTree(DirectoryTreeBase):
   def recoverOrphanDirectories(self, credDict):
     """ Recover orphan directories
     """
+    # The DirIDs and parents of the directories are changed
+    self.db.dirCache.clear()
     # Find out orphan directories
     treeTable = 'FC_DirectoryLevelTree'
     req = "SELECT DirID,Parent,Level FROM %s WHERE Parent NOT IN ( SELECT DirID from %s )" % (treeTable, treeTable)
@@ -527,10 +595,13 @@ class DirectoryLevelTree(DirectoryTreeBase):
       result = self.db._query("LOCK TABLES FC_DirectoryLevelTree WRITE", connection)
       if not result['OK']:
         resUnlock = self.db._query("UNLOCK TABLES", connection)
+        self.db._releaseConnection()
         return result
       result = self.__rebuildLevelIndexes(parentID, connection)
       resUnlock = self.db._query("UNLOCK TABLES", connection)
+      self.db._releaseConnection()
 
+    self.db.dirCache.clear()
     return S_OK()
 
   def _getConnection(self, connection=False):
@@ -10,6 +10,8 @@ import stat
 
 from DIRAC import S_OK, S_ERROR, gLogger
 from DIRAC.DataManagementSystem.DB.FileCatalogComponents.Utilities import getIDSelectString
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.FileManager.FileManagerBase import BULK_CHUNK_SIZE
+from DIRAC.Core.Utilities.List import breakListIntoChunks
 
 DEBUG = 0
 
@@ -275,6 +277,7 @@ class DirectoryTreeBase(object):
       if not result['OK']:
         failed[dir] = result['Message']
       else:
+        self.db.dirCache.invalidate(os.path.normpath(dir))
         successful[dir] = result
     return S_OK({'Successful': successful, 'Failed': failed})
 
@@ -359,6 +362,9 @@ class DirectoryTreeBase(object):
           "ModificationDate=UTC_TIMESTAMP() WHERE DirID IN ( %s )" % \
           (pname, pvalue, dirIDString)
     result = self.db._update(req)
+    if pname in ('UID', 'GID', 'Mode'):
+      # The directories may be given by a selection, e.g. of a whole tree
+      self.db.dirCache.clear(['Permissions'])
     return result
 
 #####################################################################
@@ -516,7 +522,12 @@ class DirectoryTreeBase(object):
       return result
     uid, gid = result['Value']
 
-    result = self.getDirectoryParameters(path)
+    result = self.__getDirID(path)
+    if result['OK']:
+      permissions = self.db.dirCache.get(result['Value'], 'Permissions')
+      if permissions:
+        return S_OK(self.__getPermissionsDict(uid, gid, *permissions))
+      result = self.getDirectoryParameters(result['Value'])
     if not result['OK']:
       if "not found" in result['Message'] or "not exist" in result['Message']:
         # If the directory does not exist, check the nearest parent for the permissions
@@ -539,7 +550,13 @@ class DirectoryTreeBase(object):
     dUid = result['Value']['UID']
     dGid = result['Value']['GID']
     mode = result['Value']['Mode']
+    self.db.dirCache.add(result['Value']['DirID'], Permissions=(dUid, dGid, mode))
 
+    return S_OK(self.__getPermissionsDict(uid, gid, dUid, dGid, mode))
+
+  def __getPermissionsDict(self, uid, gid, dUid, dGid, mode):
+    """ Permissions of a user/group on a directory with the given owner, group and mode
+    """
     owner = uid == dUid
     group = gid == dGid
 
@@ -559,7 +576,7 @@ class DirectoryTreeBase(object):
         or (group and mode & stat.S_IXGRP > 0)\
         or mode & stat.S_IXOTH > 0
 
-    return S_OK(resultDict)
+    return resultDict
 
   def getFileIDsInDirectoryWithLimits(self, dirID, credDict, startItem=1, maxItems=25):
     """ Get file IDs for the given directory
@@ -682,6 +699,74 @@ class DirectoryTreeBase(object):
 
     return S_OK(pathDict)
 
+  def iterateDirectoryContents(self, path, details=False, chunkSize=BULK_CHUNK_SIZE):
+    """ Get contents of a given directory by chunks, for the directories too large to be listed at once:
+        the subdirectories and the datasets first, then the files
+
+        :param str path: directory path
+        :param bool details: if True, the parameters of the subdirectories and the replicas of the files are returned
+        :param int chunkSize: maximum number of subdirectories or files of a chunk
+        :return: S_OK with a generator of S_OK with the 'Files', 'SubDirs', 'Links' and 'Datasets' of each chunk,
+                 stopping at the first error, given as S_ERROR; S_ERROR if the directory does not exist
+    """
+    result = self.findDir(path)
+    if not result['OK']:
+      return result
+    if not result['Value']:
+      return S_ERROR('Directory does not exist: %s' % path)
+    return S_OK(self.__iterateDirectoryContents(path, result['Value'], details, chunkSize))
+
+  def __iterateDirectoryContents(self, path, directoryID, details, chunkSize):
+    """ Generator of iterateDirectoryContents """
+    result = self.getChildren(path)
+    if not result['OK']:
+      yield result
+      return
+    for dirIDs in breakListIntoChunks(result['Value'], chunkSize):
+      directories = {}
+      for dirID in dirIDs:
+        result = self.getDirectoryPath(dirID)
+        if not result['OK']:
+          yield result
+          return
+        dirName = result['Value']
+        if details:
+          result = self.getDirectoryParameters(dirID)
+          directories[dirName] = result['Value'] if result['OK'] else False
+        else:
+          directories[dirName] = True
+      yield S_OK({'Files': {}, 'SubDirs': directories, 'Links': {}, 'Datasets': {}})
+
+    result = self.db.datasetManager.getDatasetsInDirectory(directoryID, verbose=details)
+    if not result['OK']:
+      yield result
+      return
+    if result['Value']:
+      yield S_OK({'Files': {}, 'SubDirs': {}, 'Links': {}, 'Datasets': result['Value']})
+
+    for result in self.db.fileManager.iterateFilesInDirectory(directoryID, verbose=details, chunkSize=chunkSize):
+      if not result['OK']:
+        yield result
+        return
+      yield S_OK({'Files': result['Value'], 'SubDirs': {}, 'Links': {}, 'Datasets': {}})
+
+  def iterateDirectoryReplicas(self, path, allStatus=False, chunkSize=BULK_CHUNK_SIZE):
+    """ Get replicas for files in the given directory by chunks
+
+        :param str path: directory path
+        :param bool allStatus: if False, only the visible files and replicas are returned
+        :param int chunkSize: maximum number of files of a chunk
+        :return: S_OK with a generator of S_OK with the replicas of the files of each chunk,
+                 stopping at the first error, given as S_ERROR; S_ERROR if the directory does not exist
+    """
+    result = self.findDir(path)
+    if not result['OK']:
+      return result
+    if not result['Value']:
+      return S_ERROR('Directory does not exist: %s' % path)
+    return S_OK(self.db.fileManager.iterateDirectoryReplicas(result['Value'], allStatus=allStatus,
+                                                             chunkSize=chunkSize))
+
   def listDirectory(self, lfns, verbose=False):
     """ Get the directory listing
     """
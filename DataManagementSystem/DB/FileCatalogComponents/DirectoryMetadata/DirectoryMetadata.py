@@ -7,6 +7,7 @@ __RCSID__ = "$Id$"
 
 import six
 import os
+import time
 from DIRAC import S_OK, S_ERROR
 from DIRAC.Core.Utilities.Time import queryTime
 
@@ -72,6 +73,7 @@ class DirectoryMetadata(object):
       return result
 
     metadataID = result['lastRowId']
+    self.db.metaStats.clear()
     result = self.__transformMetaParameterToData(pName)
     if not result['OK']:
       return result
@@ -89,6 +91,7 @@ class DirectoryMetadata(object):
 
     req = "DROP TABLE FC_Meta_%s" % pName
     result = self.db._update(req)
+    self.db.metaStats.clear()
     error = ''
     if not result['OK']:
       error = result["Message"]
@@ -667,7 +670,8 @@ class DirectoryMetadata(object):
         :param str path: starting directory path
         :param dict credDict: client credential dictionary
 
-        :return: S_OK/S_ERROR, Value list of selected directory IDs
+        :return: S_OK/S_ERROR, Value list of selected directory IDs, Plan - list of the metadata
+                 queried, in their order, with their estimated and found numbers of directories
     """
 
     pathDirList = []
@@ -688,6 +692,7 @@ class DirectoryMetadata(object):
     metaDict = result['Value']
 
     # Now check the meta data for the requested directory and its parents
+    plan = []
     finalMetaDict = dict(metaDict)
     for meta in metaDict:
       result = self.__checkDirsForMetadata(meta, metaDict[meta], pathString)
@@ -705,25 +710,32 @@ class DirectoryMetadata(object):
         if not result['OK']:
           return result
         pathSelection = result['Value']
-      dirList = []
-      first = True
+      # The most selective metadata are queried first, and the others only if directories are left
+      totalDirs = self.db.metaStats.getTableRows(self.db.dtree.getTreeTable())
+      estimates = []
       for meta, value in finalMetaDict.iteritems():
+        estimate = self.db.metaStats.estimateRows('FC_Meta_%s' % meta, value, totalDirs)
+        estimates.append((estimate is None, estimate, meta))
+      estimates.sort()
+      dirSet = None
+      for _unknown, estimate, meta in estimates:
+        value = finalMetaDict[meta]
+        start = time.time()
         if value == "Missing":
           result = self.__findSubdirMissingMeta(meta, pathSelection)
         else:
           result = self.__findSubdirByMeta(meta, value, pathSelection)
         if not result['OK']:
           return result
-        mList = result['Value']
-        if first:
-          dirList = mList
-          first = False
+        plan.append({'Metadata': meta, 'Estimate': estimate,
+                     'Found': len(result['Value']), 'Time': time.time() - start})
+        if dirSet is None:
+          dirSet = set(result['Value'])
         else:
-          newList = []
-          for d in dirList:
-            if d in mList:
-              newList.append(d)
-          dirList = newList
+          dirSet &= set(result['Value'])
+        if not dirSet:
+          break
+      dirList = list(dirSet)
     else:
       if pathDirID:
         result = self.db.dtree.getSubdirectoriesByID(pathDirID, includeParent=True)
@@ -750,6 +762,7 @@ class DirectoryMetadata(object):
       result['Selection'] = 'None'
     else:
       result['Selection'] = 'All'
+    result['Plan'] = plan
 
     return result
 
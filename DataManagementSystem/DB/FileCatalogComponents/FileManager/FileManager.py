@@ -6,7 +6,8 @@ __RCSID__ = "$Id$"
 import os
 
 from DIRAC import S_OK, S_ERROR, gLogger
-from DIRAC.DataManagementSystem.DB.FileCatalogComponents.FileManager.FileManagerBase import FileManagerBase
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.FileManager.FileManagerBase import FileManagerBase, \
+    BULK_CHUNK_SIZE
 from DIRAC.Core.Utilities.List import stringListToString, \
     intListToString, \
     breakListIntoChunks
@@ -67,17 +68,20 @@ class FileManager(FileManagerBase):
           failed[fname] = 'No such file or directory'
     return S_OK({"Successful": successful, "Failed": failed})
 
-  def _findFileIDs(self, lfns, connection=False):
+  def _findFileIDs(self, lfns, connection=False, directoryIDs=None):
     """ Find lfn <-> FileID correspondence
+
+        :param dict directoryIDs: IDs of the directories of the lfns by path, if already known
     """
     connection = self._getConnection(connection)
     dirDict = self._getFileDirectories(lfns)
     failed = {}
     successful = {}
-    result = self.db.dtree.findDirs(dirDict.keys())
-    if not result['OK']:
-      return result
-    directoryIDs = result['Value']
+    if directoryIDs is None:
+      result = self.db.dtree.findDirs(dirDict.keys())
+      if not result['OK']:
+        return result
+      directoryIDs = result['Value']
     directoryPaths = {}
 
     for dirPath in dirDict:
@@ -88,7 +92,7 @@ class FileManager(FileManagerBase):
           failed[fname] = 'No such file or directory'
       else:
         directoryPaths[directoryIDs[dirPath]] = dirPath
-    directoryIDList = directoryIDs.keys()
+    directoryIDList = [dirPath for dirPath in dirDict if dirPath in directoryIDs]
     for dirIDs in breakListIntoChunks(directoryIDList, 1000):
 
       wheres = []
@@ -816,3 +820,28 @@ class FileManager(FileManagerBase):
 
     result = self.db._query(req, connection)
     return result
+
+  def _getSEDumpChunk(self, seID, afterFileID=0, limit=BULK_CHUNK_SIZE):
+    """ Files at a given SE, together with checksum and size, by increasing FileID
+
+        :param int seID: ID of the StorageElement
+        :param int afterFileID: only the files with a larger FileID are returned
+        :param int limit: maximum number of files
+        :returns: S_OK with list of tuples (fileID, lfn, checksum, size)
+    """
+    req = "SELECT F.FileID,F.DirID,F.FileName,FI.Checksum,F.Size FROM FC_Replicas as R"
+    req += " JOIN FC_Files as F ON F.FileID=R.FileID LEFT JOIN FC_FileInfo as FI ON FI.FileID=R.FileID"
+    req += " WHERE R.SEID=%d AND R.FileID>%d ORDER BY R.FileID LIMIT %d" % (seID, afterFileID, limit)
+    result = self.db._query(req)
+    if not result['OK']:
+      return result
+    rows = result['Value']
+    if not rows:
+      return S_OK([])
+
+    result = self.db.dtree.getDirectoryPaths(list(set(row[1] for row in rows)))
+    if not result['OK']:
+      return result
+    dirPaths = result['Value']
+    return S_OK([(fileID, os.path.join(dirPaths.get(dirID, ''), fileName), checksum, size)
+                 for fileID, dirID, fileName, checksum, size in rows])
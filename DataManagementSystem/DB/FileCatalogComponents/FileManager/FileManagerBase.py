@@ -10,9 +10,12 @@ import os
 import stat
 
 from DIRAC import S_OK, S_ERROR, gLogger
-from DIRAC.Core.Utilities.List import intListToString
+from DIRAC.Core.Utilities.List import intListToString, breakListIntoChunks
 from DIRAC.Core.Utilities.Pfn import pfnunparse
 
+# Maximum number of LFNs resolved together by the bulk read methods
+BULK_CHUNK_SIZE = 1000
+
 
 class FileManagerBase(object):
   """ Base class for all the specific File Managers
@@ -162,12 +165,34 @@ class FileManagerBase(object):
     """
     return S_ERROR("To be implemented on derived class")
 
-  def _findFileIDs(self, lfns, connection=False):
-    """ To be implemented on derived class
+  def _findFileIDs(self, lfns, connection=False, directoryIDs=None):
+    """ To be implemented on derived class, done through _getDirectoryFiles by default
     Should return following the successful/failed convention
-    Successful is a dictionary with keys the lfn, and values the FileID"""
+    Successful is a dictionary with keys the lfn, and values the FileID, whatever the status of the file
 
-    return S_ERROR("To be implemented on derived class")
+    :param dict directoryIDs: IDs of the directories of the lfns by path, if already known"""
+
+    connection = self._getConnection(connection)
+    dirDict = self._getFileDirectories(lfns)
+    if directoryIDs is None:
+      result = self.db.dtree.findDirs(dirDict.keys(), connection)
+      if not result['OK']:
+        return result
+      directoryIDs = result['Value']
+
+    successful = {}
+    for dirPath, fileNames in dirDict.iteritems():
+      if dirPath not in directoryIDs:
+        continue
+      res = self._getDirectoryFiles(directoryIDs[dirPath], fileNames, ['FileID'], allStatus=True,
+                                    connection=connection)
+      if not res['OK']:
+        return res
+      for fileName, fileDict in res['Value'].iteritems():
+        successful[os.path.join(dirPath, fileName)] = fileDict['FileID']
+
+    failed = dict((lfn, 'No such file or directory') for lfn in lfns if lfn not in successful)
+    return S_OK({'Successful': successful, 'Failed': failed})
 
   def _getDirectoryReplicas(self, dirID, allStatus=False, connection=False):
     """ To be implemented on derived class
@@ -851,13 +876,13 @@ class FileManagerBase(object):
   def exists(self, lfns, connection=False):
     """ Determine whether a file exists in the catalog """
     connection = self._getConnection(connection)
-    res = self._findFiles(lfns, allStatus=True, connection=connection)
-    if not res['OK']:
-      return res
-    successful = res['Value']['Successful']
-    origFailed = res['Value']['Failed']
-    for lfn in successful:
-      successful[lfn] = lfn
+    successful = {}
+    origFailed = {}
+    for res in self._iterateFileIDs(lfns, connection=connection):
+      if not res['OK']:
+        return res
+      successful.update((lfn, lfn) for lfn in res['Value']['Successful'])
+      origFailed.update(res['Value']['Failed'])
     failed = {}
 
     if self.db.uniqueGUID:
@@ -995,22 +1020,71 @@ class FileManagerBase(object):
     """ Get file replicas from the catalog """
     connection = self._getConnection(connection)
 
-    # Get FileID <-> LFN correspondence first
-    res = self._findFileIDs(lfns, connection=connection)
-    if not res['OK']:
-      return res
-    failed = res['Value']['Failed']
-    fileIDLFNs = {}
-    for lfn, fileID in res['Value']['Successful'].iteritems():
-      fileIDLFNs[fileID] = lfn
-
-    result = self.__getReplicasForIDs(fileIDLFNs, allStatus, connection)
-    if not result['OK']:
-      return result
-    replicas = result['Value']
+    replicas = {}
+    failed = {}
+    for result in self._iterateReplicas(lfns, allStatus, connection=connection):
+      if not result['OK']:
+        return result
+      replicas.update(result['Value']['Successful'])
+      failed.update(result['Value']['Failed'])
 
     return S_OK({"Successful": replicas, 'Failed': failed})
 
+  def _iterateFileIDs(self, lfns, connection=False):
+    """ Find the FileIDs of many LFNs, by chunks of at most BULK_CHUNK_SIZE LFNs of the same directories,
+        so that the queries and the intermediate results stay bounded whatever the number of LFNs.
+        All the directories are resolved first, in one pass, and the LFNs of the missing ones fail at once:
+        the chunks are then looked up with the directory IDs already found.
+
+        :param lfns: list of LFNs, or dictionary with LFNs as keys
+        :return: generator of S_OK with the Successful (lfn: FileID) and Failed dictionaries of each chunk,
+                 stopping at the first error, given as S_ERROR
+    """
+    connection = self._getConnection(connection)
+    dirDict = self._getFileDirectories(lfns)
+    directoryIDs = {}
+    for dirPaths in breakListIntoChunks(dirDict.keys(), BULK_CHUNK_SIZE):
+      result = self.db.dtree.findDirs(dirPaths, connection)
+      if not result['OK']:
+        yield result
+        return
+      directoryIDs.update(result['Value'])
+
+    failed = {}
+    foundLfns = []
+    for dirPath in sorted(dirDict):
+      for fileName in dirDict[dirPath]:
+        lfn = '%s/%s' % (dirPath, fileName)
+        lfn = lfn.replace('//', '/')
+        if dirPath in directoryIDs:
+          foundLfns.append(lfn)
+        else:
+          failed[lfn] = 'No such file or directory'
+    if failed:
+      yield S_OK({'Successful': {}, 'Failed': failed})
+
+    for lfnChunk in breakListIntoChunks(foundLfns, BULK_CHUNK_SIZE):
+      yield self._findFileIDs(lfnChunk, connection=connection, directoryIDs=directoryIDs)
+
+  def _iterateReplicas(self, lfns, allStatus, connection=False):
+    """ Get the replicas of many LFNs, by chunks of at most BULK_CHUNK_SIZE LFNs, see _iterateFileIDs
+
+        :param lfns: list of LFNs, or dictionary with LFNs as keys
+        :param bool allStatus: if False, only the visible replicas are returned
+        :return: generator of S_OK with the Successful (lfn: {se: pfn}) and Failed dictionaries of each chunk,
+                 stopping at the first error, given as S_ERROR
+    """
+    for result in self._iterateFileIDs(lfns, connection=connection):
+      if not result['OK']:
+        yield result
+        return
+      fileIDLFNs = dict((fileID, lfn) for lfn, fileID in result['Value']['Successful'].iteritems())
+      res = self.__getReplicasForIDs(fileIDLFNs, allStatus, connection)
+      if not res['OK']:
+        yield res
+        return
+      yield S_OK({'Successful': res['Value'], 'Failed': result['Value']['Failed']})
+
   def getReplicasByMetadata(self, metaDict, path, allStatus, credDict, connection=False):
     """ Get file replicas for files corresponding to the given metadata """
     connection = self._getConnection(connection)
@@ -1062,18 +1136,25 @@ class FileManagerBase(object):
   #
 
   def _getStatusInt(self, status, connection=False):
+    # The statuses are never changed once inserted
+    for statusID, statusName in self.statusDict.items():
+      if statusName == status:
+        return S_OK(statusID)
     connection = self._getConnection(connection)
     req = "SELECT StatusID FROM FC_Statuses WHERE Status = '%s';" % status
     res = self.db._query(req, connection)
     if not res['OK']:
       return res
     if res['Value']:
-      return S_OK(res['Value'][0][0])
-    req = "INSERT INTO FC_Statuses (Status) VALUES ('%s');" % status
-    res = self.db._update(req, connection)
-    if not res['OK']:
-      return res
-    return S_OK(res['lastRowId'])
+      statusID = res['Value'][0][0]
+    else:
+      req = "INSERT INTO FC_Statuses (Status) VALUES ('%s');" % status
+      res = self.db._update(req, connection)
+      if not res['OK']:
+        return res
+      statusID = res['lastRowId']
+    self.statusDict[int(statusID)] = status
+    return S_OK(statusID)
 
   def _getIntStatus(self, statusID, connection=False):
     if statusID in self.statusDict:
@@ -1103,13 +1184,18 @@ class FileManagerBase(object):
 
   def getFilesInDirectory(self, dirID, verbose=False, connection=False):
     connection = self._getConnection(connection)
+    return self.__getFilesInDirectory(dirID, [], verbose, connection)
+
+  def __getFilesInDirectory(self, dirID, fileNames, verbose, connection):
+    """ Metadata, and replicas if verbose, of the given files of a directory, of all its files if fileNames is empty
+    """
     files = {}
-    res = self._getDirectoryFiles(dirID, [], ['FileID', 'Size', 'GUID',
-                                              'Checksum', 'ChecksumType',
-                                              'Type', 'UID',
-                                              'GID', 'CreationDate',
-                                              'ModificationDate', 'Mode',
-                                              'Status'], connection=connection)
+    res = self._getDirectoryFiles(dirID, fileNames, ['FileID', 'Size', 'GUID',
+                                                     'Checksum', 'ChecksumType',
+                                                     'Type', 'UID',
+                                                     'GID', 'CreationDate',
+                                                     'ModificationDate', 'Mode',
+                                                     'Status'], connection=connection)
     if not res['OK']:
       return res
     if not res['Value']:
@@ -1130,6 +1216,86 @@ class FileManagerBase(object):
 
     return S_OK(files)
 
+  def _getDirectoryFileNames(self, dirID, afterName='', limit=BULK_CHUNK_SIZE, connection=False):
+    """ Names of the files of a directory, in their order in the (DirID, FileName) index of FC_Files
+
+        :param int dirID: ID of the directory
+        :param str afterName: only the names following this one are returned
+        :param int limit: maximum number of names
+        :return: S_OK(list of file names)/S_ERROR
+    """
+    result = self.db._escapeString(afterName)
+    if not result['OK']:
+      return result
+    req = "SELECT FileName FROM FC_Files WHERE DirID=%d AND FileName > %s ORDER BY FileName LIMIT %d" % \
+          (dirID, result['Value'], limit)
+    result = self.db._query(req, connection)
+    if not result['OK']:
+      return result
+    return S_OK([row[0] for row in result['Value']])
+
+  def _iterateDirectoryFileNames(self, dirID, chunkSize=BULK_CHUNK_SIZE, connection=False):
+    """ Names of the files of a directory by chunks, each read with its own query from the last name
+        of the previous chunk, so that no query returns more than chunkSize rows
+
+        :return: generator of S_OK(list of at most chunkSize names), stopping at the first error given as S_ERROR
+    """
+    lastName = ''
+    while True:
+      result = self._getDirectoryFileNames(dirID, lastName, chunkSize, connection=connection)
+      if not result['OK']:
+        yield result
+        return
+      fileNames = result['Value']
+      if fileNames:
+        yield result
+      if len(fileNames) < chunkSize:
+        return
+      lastName = fileNames[-1]
+
+  def iterateFilesInDirectory(self, dirID, verbose=False, chunkSize=BULK_CHUNK_SIZE, connection=False):
+    """ Contents of a directory by chunks, for the directories too large to be listed at once.
+        Unless a connection is given, each chunk is read with a connection of the pool, so that
+        a paused iteration does not hold one.
+
+        :param int dirID: ID of the directory
+        :param bool verbose: if True, the replicas of the files are returned too
+        :param int chunkSize: maximum number of files of a chunk
+        :return: generator of S_OK with the files of each chunk, as returned by getFilesInDirectory,
+                 stopping at the first error, given as S_ERROR
+    """
+    for result in self._iterateDirectoryFileNames(dirID, chunkSize, connection=connection):
+      if result['OK']:
+        result = self.__getFilesInDirectory(dirID, result['Value'], verbose, connection)
+      if not result['OK']:
+        yield result
+        return
+      if result['Value']:
+        yield result
+
+  def iterateDirectoryReplicas(self, dirID, allStatus=False, chunkSize=BULK_CHUNK_SIZE, connection=False):
+    """ Replicas of the files of a directory by chunks, see iterateFilesInDirectory
+
+        :param int dirID: ID of the directory
+        :param bool allStatus: if False, only the visible files and replicas are returned
+        :param int chunkSize: maximum number of files of a chunk
+        :return: generator of S_OK with the replicas of each chunk, as returned by getDirectoryReplicas,
+                 stopping at the first error, given as S_ERROR
+    """
+    for result in self._iterateDirectoryFileNames(dirID, chunkSize, connection=connection):
+      if result['OK']:
+        result = self._getDirectoryFiles(dirID, result['Value'], ['FileID'], allStatus=allStatus, connection=connection)
+      if result['OK'] and result['Value']:
+        fileIDNames = dict((fileDict['FileID'], fileName) for fileName, fileDict in result['Value'].iteritems())
+        result = self.__getReplicasForIDs(fileIDNames, allStatus, connection)
+      if not result['OK']:
+        yield result
+        return
+      # Files without (visible) replicas are not listed, as in getDirectoryReplicas
+      replicas = dict((fileName, seDict) for fileName, seDict in result['Value'].iteritems() if seDict)
+      if replicas:
+        yield S_OK(replicas)
+
   def getDirectoryReplicas(self, dirID, path, allStatus=False, connection=False):
     """ Get the replicas for all the Files in the given Directory
 
@@ -1317,6 +1483,44 @@ class FileManagerBase(object):
     """
     return self._setFileParameter(path, 'Mode', mode)
 
+  def _getSEDumpChunk(self, seID, afterFileID=0, limit=BULK_CHUNK_SIZE):
+    """ To be implemented on derived class
+
+        :param int seID: ID of the StorageElement
+        :param int afterFileID: only the files with a larger FileID are returned
+        :param int limit: maximum number of files
+        :returns: S_OK with list of tuples (fileID, lfn, checksum, size), by increasing FileID
+    """
+    return S_ERROR("To be implemented on derived class")
+
+  def iterateSEDump(self, seName, chunkSize=BULK_CHUNK_SIZE):
+    """ Files at a given SE by chunks, each read with its own query from the last FileID of the
+        previous chunk, so that dumping a large SE does not need one huge result set
+
+        :param seName: name of the StorageElement
+        :param int chunkSize: maximum number of files of a chunk
+        :returns: generator of S_OK with list of tuples (lfn, checksum, size),
+                  stopping at the first error, given as S_ERROR
+    """
+    res = self.db.seManager.findSE(seName)
+    if not res['OK']:
+      yield res
+      return
+    seID = res['Value']
+
+    lastFileID = 0
+    while True:
+      res = self._getSEDumpChunk(seID, lastFileID, chunkSize)
+      if not res['OK']:
+        yield res
+        return
+      rows = res['Value']
+      if rows:
+        yield S_OK([row[1:] for row in rows])
+      if len(rows) < chunkSize:
+        return
+      lastFileID = rows[-1][0]
+
   def getSEDump(self, seName):
     """
          Return all the files at a given SE, together with checksum and size
@@ -1325,4 +1529,9 @@ class FileManagerBase(object):
 
         :returns: S_OK with list of tuples (lfn, checksum, size)
     """
-    return S_ERROR("To be implemented on derived class")
+    files = []
+    for res in self.iterateSEDump(seName):
+      if not res['OK']:
+        return res
+      files.extend(res['Value'])
+    return S_OK(files)
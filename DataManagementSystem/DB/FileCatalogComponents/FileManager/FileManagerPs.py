@@ -8,7 +8,8 @@ import os
 import datetime
 
 from DIRAC import S_OK, S_ERROR
-from DIRAC.DataManagementSystem.DB.FileCatalogComponents.FileManager.FileManagerBase import FileManagerBase
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.FileManager.FileManagerBase import FileManagerBase, \
+    BULK_CHUNK_SIZE
 from DIRAC.Core.Utilities.List import stringListToString, \
     intListToString, \
     breakListIntoChunks
@@ -61,8 +62,10 @@ class FileManagerPs(FileManagerBase):
 
     return S_OK({"Successful": successful, "Failed": failed})
 
-  def _findFileIDs(self, lfns, connection=False):
+  def _findFileIDs(self, lfns, connection=False, directoryIDs=None):
     """ Find lfn <-> FileID correspondence
+
+        :param dict directoryIDs: IDs of the directories of the lfns by path, if already known
     """
     connection = self._getConnection(connection)
     failed = {}
@@ -90,13 +93,17 @@ class FileManagerPs(FileManagerBase):
       filesInDirDict = self._getFileDirectories(lfns)
 
       # We get the directory ids
-      result = self.db.dtree.findDirs(filesInDirDict.keys())
-      if not result['OK']:
-        return result
-      directoryPathToIds = result['Value']
+      directoryPathToIds = directoryIDs
+      if directoryPathToIds is None:
+        result = self.db.dtree.findDirs(filesInDirDict.keys())
+        if not result['OK']:
+          return result
+        directoryPathToIds = result['Value']
 
       # For each directory, we get the file ids of the files we want
-      for dirPath in directoryPathToIds:
+      for dirPath in filesInDirDict:
+        if dirPath not in directoryPathToIds:
+          continue
         fileNames = filesInDirDict[dirPath]
         dirID = directoryPathToIds[dirPath]
 
@@ -936,3 +943,15 @@ class FileManagerPs(FileManagerBase):
     seID = res['Value']
 
     return self.db.executeStoredProcedureWithCursor('ps_get_se_dump', (seID,))
+
+  def _getSEDumpChunk(self, seID, afterFileID=0, limit=BULK_CHUNK_SIZE):
+    """
+         Return the files at a given SE, together with checksum and size, by increasing FileID
+
+        :param int seID: ID of the StorageElement
+        :param int afterFileID: only the files with a larger FileID are returned
+        :param int limit: maximum number of files
+
+        :returns: S_OK with list of tuples (fileID, lfn, checksum, size)
+    """
+    return self.db.executeStoredProcedureWithCursor('ps_get_se_dump_chunk', (seID, afterFileID, limit))
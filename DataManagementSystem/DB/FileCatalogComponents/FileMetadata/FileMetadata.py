@@ -4,12 +4,18 @@
 __RCSID__ = "$Id$"
 
 import six
+import time
 from DIRAC import S_OK, S_ERROR
 from DIRAC.Core.Utilities.Time import queryTime
-from DIRAC.Core.Utilities.List import intListToString
+from DIRAC.Core.Utilities.List import intListToString, breakListIntoChunks
 from DIRAC.DataManagementSystem.Client.MetaQuery import FILE_STANDARD_METAKEYS, \
     FILES_TABLE_METAKEYS, \
     FILEINFO_TABLE_METAKEYS
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.FileManager.FileManagerBase import BULK_CHUNK_SIZE
+
+# Strategies of the file metadata queries: automatic choice, selection of the files of the directories
+# first, or selection of the files from the most selective metadata table first
+FILE_QUERY_STRATEGIES = ('Auto', 'DirectoryFirst', 'FileFirst')
 
 
 class FileMetadata(object):
@@ -68,6 +74,7 @@ class FileMetadata(object):
       return result
 
     metadataID = result['lastRowId']
+    self.db.metaStats.clear()
     result = self.__transformMetaParameterToData(pName)
     if not result['OK']:
       return result
@@ -85,6 +92,7 @@ class FileMetadata(object):
 
     req = "DROP TABLE FC_FileMeta_%s" % pName
     result = self.db._update(req)
+    self.db.metaStats.clear()
     error = ''
     if not result['OK']:
       error = result["Message"]
@@ -454,7 +462,7 @@ class FileMetadata(object):
         result = self.db._escapeValues(value)
         if not result['OK']:
           return result
-        query = '( $s )' % ', '.join(result['Value'])
+        query = '( %s )' % ', '.join(result['Value'])
         queryList.append(('IN', query))
     elif isinstance(value, dict):
       for operation, operand in value.iteritems():
@@ -594,14 +602,21 @@ class FileMetadata(object):
 
     return S_OK(resultList)
 
-  def __findFilesByMetadata(self, metaDict, dirList, credDict):
+  def __findFilesByMetadata(self, metaDict, dirList, credDict, strategy='Auto', fileIDs=None):
     """ Find a list of file IDs meeting the metaDict requirements and belonging
         to directories in dirList
 
+        The metadata tables are joined from the most selective one, according to the statistics
+        of the tables, and the files are either selected in the directories first (DirectoryFirst)
+        or from the most selective metadata table first (FileFirst), their directories being
+        checked afterwards, whichever is expected to read less rows.
+
         :param dict metaDict: dictionary with the file metadata
         :param list dirList: list of directories to look into
+        :param str strategy: Auto, DirectoryFirst or FileFirst
+        :param list fileIDs: IDs of the files to select from, all the files if None
 
-        :return: S_OK/S_ERROR, Value - list of IDs of found files
+        :return: S_OK/S_ERROR, Value - list of IDs of found files, Plan - description of the query plan
     """
     # 1.- classify Metadata keys
     storageElements = None
@@ -620,7 +635,6 @@ class FileMetadata(object):
         userMetaDict[meta] = value
 
     tablesAndConditions = []
-    leftJoinTables = []
     # 2.- standard search
     if standardMetaDict:
       result = self.__buildStandardMetaQuery(standardMetaDict)
@@ -641,58 +655,108 @@ class FileMetadata(object):
         return result
       tablesAndConditions.extend(result['Value'])
 
-    query = 'SELECT F.FileID FROM FC_Files F '
-    conditions = []
-    tables = []
-
-    if dirList:
-      dirString = intListToString(dirList)
-      conditions.append("F.DirID in (%s)" % dirString)
-
-    counter = 0
+    # 5.- estimate the number of files selected by each joined table
+    stats = self.db.metaStats
+    totalFiles = stats.getTableRows('FC_Files')
+    fileConditions = []
+    joinFileInfo = False
+    joinConditions = {}
     for table, condition in tablesAndConditions:
       if table == 'FC_FileInfo':
-        query += 'INNER JOIN FC_FileInfo FI USING( FileID ) '
-        condition = condition.replace('%%', '%')
+        joinFileInfo = True
+        fileConditions.append(condition.replace('%%', '%'))
       elif table == 'FC_Files':
-        condition = condition.replace('%%', '%')
+        fileConditions.append(condition.replace('%%', '%'))
       else:
-        counter += 1
-        if table in leftJoinTables:
-          tables.append('LEFT JOIN %s M%d USING( FileID )' % (table, counter))
-        else:
-          tables.append('INNER JOIN %s M%d USING( FileID )' % (table, counter))
-        table = 'M%d' % counter
-        condition = condition % table
-      conditions.append(condition)
+        joinConditions.setdefault(table, []).append(condition)
+    joins = []
+    for table in joinConditions:
+      if table == 'FC_Replicas':
+        replicas = stats.getTableRows(table)
+        estimate = replicas * len(storageElements) / max(len(self.db.seNames), 1) if replicas is not None else None
+      else:
+        estimate = stats.estimateRows(table, userMetaDict[table[len('FC_FileMeta_'):]], totalFiles)
+      joins.append((estimate, table))
+    planned = all(estimate is not None for estimate, _table in joins)
+    if planned:
+      joins.sort()
+    innerJoins = [join for join in joins if join[1] not in leftJoinTables]
+    outerJoins = [join for join in joins if join[1] in leftJoinTables]
+
+    # 6.- choose where to start from
+    dirFiles = stats.estimateDirectoryFiles(len(dirList)) if dirList else None
+    if strategy == 'Auto':
+      strategy = 'DirectoryFirst'
+      # The given files are better read first, by their primary key
+      if fileIDs is None and planned and innerJoins and (dirFiles is None or innerJoins[0][0] < dirFiles):
+        strategy = 'FileFirst'
+    elif strategy == 'FileFirst' and not innerJoins:
+      strategy = 'DirectoryFirst'
+
+    joinTables = []
+    conditions = []
+    for counter, (_estimate, table) in enumerate(innerJoins + outerJoins, 1):
+      alias = 'M%d' % counter
+      joinType = 'LEFT' if table in leftJoinTables else 'INNER'
+      joinTables.append('%s JOIN %s %s USING( FileID )' % (joinType, table, alias))
+      conditions.extend(condition % alias for condition in joinConditions[table])
+    conditions.extend(fileConditions)
+    if fileIDs is not None:
+      conditions.append('F.FileID IN (%s)' % intListToString(fileIDs))
+
+    fileTables = ['FC_Files F']
+    if joinFileInfo:
+      fileTables.append('INNER JOIN FC_FileInfo FI USING( FileID )')
+    if strategy == 'FileFirst':
+      # The most selective table is read first, then the files are joined, and their directories checked
+      firstTable, firstAlias = joinTables[0].split()[2:4]
+      fileTables[0] = 'INNER JOIN FC_Files F USING( FileID )'
+      tables = ['%s %s' % (firstTable, firstAlias)] + joinTables[1:len(innerJoins)] + fileTables + \
+          joinTables[len(innerJoins):]
+      query = 'SELECT STRAIGHT_JOIN F.FileID, F.DirID FROM %s' % ' '.join(tables)
+      dirCondition = ''
+    else:
+      tables = fileTables + joinTables
+      query = 'SELECT %sF.FileID FROM %s' % ('STRAIGHT_JOIN ' if planned and joinTables else '', ' '.join(tables))
+      dirCondition = "F.DirID in (%s)" % intListToString(dirList) if dirList else ''
+      if dirCondition:
+        conditions.insert(0, dirCondition)
 
-    query += ' '.join(tables)
     if conditions:
       query += ' WHERE %s' % ' AND '.join(conditions)
 
+    plan = {'Strategy': strategy,
+            'Joins': [(table, estimate) for estimate, table in innerJoins + outerJoins],
+            'DirectoryFiles': dirFiles,
+            'Query': query.replace(dirCondition, 'F.DirID in (<%d directories>)' % len(dirList))
+            if dirCondition else query}
+
     result = self.db._query(query)
     if not result['OK']:
       return result
-    if not result['Value']:
-      return S_OK([])
 
-#     fileList = [ row[0] for row in result['Value' ] ]
-    fileList = []
-    for row in result['Value']:
-      fileID = row[0]
-      fileList.append(fileID)
+    if strategy == 'FileFirst' and dirList:
+      dirSet = set(dirList)
+      fileList = [fileID for fileID, dirID in result['Value'] if dirID in dirSet]
+    else:
+      fileList = [row[0] for row in result['Value']]
 
-    return S_OK(fileList)
+    result = S_OK(fileList)
+    result['Plan'] = plan
+    return result
 
-  @queryTime
-  def findFilesByMetadata(self, metaDict, path, credDict):
-    """ Find Files satisfying the given metadata
+  def __selectFiles(self, metaDict, path, credDict, strategy='Auto', fileIDs=None):
+    """ Select the files satisfying the given metadata
 
         :param dict metaDict: dictionary with the metaquery parameters
         :param str path: Path to search into
         :param dict credDict: Dictionary with the user credentials
+        :param str strategy: strategy of the file metadata query, see __findFilesByMetadata
+        :param list fileIDs: IDs of the files to select from, all the files if None
 
-        :return: S_OK/S_ERROR, Value ID:LFN dictionary of selected files
+        :return: S_OK/S_ERROR, Value tuple with the list of IDs of the selected files and the list of IDs
+                 of the directories all the files of which are selected, Plan - plans and times of the
+                 directory and file queries
     """
     if not path:
       path = '/'
@@ -703,6 +767,10 @@ class FileMetadata(object):
       return result
     dirList = result['Value']
     dirFlag = result['Selection']
+    plan = {'Directories': {'Selection': dirFlag,
+                            'Plan': result.get('Plan', []),
+                            'Found': len(dirList),
+                            'Time': result.get('QueryTime')}}
 
     # 2.- Get known file metadata fields
 #     fileMetaDict = {}
@@ -712,9 +780,6 @@ class FileMetadata(object):
     fileMetaKeys = list(result['Value']) + list(FILE_STANDARD_METAKEYS)
     fileMetaDict = dict(item for item in metaDict.iteritems() if item[0] in fileMetaKeys)
 
-    fileList = []
-    idLfnDict = {}
-
     if dirFlag != 'None':
       # None means that no Directory satisfies the given query, thus the search is empty
       if dirFlag == 'All':
@@ -723,20 +788,61 @@ class FileMetadata(object):
 
       if fileMetaDict:
         # 3.- Do search in File Metadata
-        result = self.__findFilesByMetadata(fileMetaDict, dirList, credDict)
+        start = time.time()
+        result = self.__findFilesByMetadata(fileMetaDict, dirList, credDict, strategy=strategy, fileIDs=fileIDs)
         if not result['OK']:
           return result
-        fileList = result['Value']
-      elif dirList:
-        # 4.- if not File Metadata, return the list of files in given directories
-        result = self.db.dtree.getFileLFNsInDirectoryByDirectory(dirList, credDict)
+        plan['Files'] = dict(result['Plan'], Found=len(result['Value']), Time=time.time() - start)
+        result = S_OK((result['Value'], []))
+        result['Plan'] = plan
+        return result
+      elif dirList and fileIDs is not None:
+        # 4.- if not File Metadata, the given files which are in the given directories
+        req = "SELECT FileID FROM FC_Files WHERE FileID IN (%s) AND DirID IN (%s)" % (intListToString(fileIDs),
+                                                                                     intListToString(dirList))
+        result = self.db._query(req)
         if not result['OK']:
           return result
-        return S_OK(result['Value']['IDLFNDict'])
-      else:
-        # if there is no File Metadata and no Dir Metadata, return an empty list
-        idLfnDict = {}
+        result = S_OK(([row[0] for row in result['Value']], []))
+        result['Plan'] = plan
+        return result
+      elif dirList:
+        # 4.- if not File Metadata, all the files in given directories
+        result = S_OK(([], dirList))
+        result['Plan'] = plan
+        return result
 
+    # if there is no File Metadata and no Dir Metadata, return an empty list
+    result = S_OK(([], []))
+    result['Plan'] = plan
+    return result
+
+  @queryTime
+  def findFilesByMetadata(self, metaDict, path, credDict, fileIDs=None):
+    """ Find Files satisfying the given metadata
+
+        :param dict metaDict: dictionary with the metaquery parameters
+        :param str path: Path to search into
+        :param dict credDict: Dictionary with the user credentials
+        :param list fileIDs: IDs of the files to select from, e.g. the files changed since the last
+                             query, all the files if None
+
+        :return: S_OK/S_ERROR, Value ID:LFN dictionary of selected files
+    """
+    if fileIDs is not None and not fileIDs:
+      return S_OK({})
+    result = self.__selectFiles(metaDict, path, credDict, fileIDs=fileIDs)
+    if not result['OK']:
+      return result
+    fileList, dirList = result['Value']
+
+    if dirList:
+      result = self.db.dtree.getFileLFNsInDirectoryByDirectory(dirList, credDict)
+      if not result['OK']:
+        return result
+      return S_OK(result['Value']['IDLFNDict'])
+
+    idLfnDict = {}
     if fileList:
       # 5.- get the LFN
       result = self.db.fileManager._getFileLFNs(fileList)
@@ -745,3 +851,84 @@ class FileMetadata(object):
       idLfnDict = result['Value']['Successful']
 
     return S_OK(idLfnDict)
+
+  def explainFindFilesByMetadata(self, metaDict, path, credDict, strategy='Auto'):
+    """ Execute the selection of the files of findFilesByMetadata, and describe how it was done:
+        the metadata of the directories, in the order they were queried, with their estimated and
+        actual numbers of directories, then the strategy, the order of the joins of the file
+        metadata tables with their estimated numbers of files, and the SQL query
+
+        :param dict metaDict: dictionary with the metaquery parameters
+        :param str path: Path to search into
+        :param dict credDict: Dictionary with the user credentials
+        :param str strategy: Auto, DirectoryFirst or FileFirst, to compare the strategies
+
+        :return: S_OK/S_ERROR, Value dictionary with the Plan, the numbers of selected Files and
+                 Directories, and the total Time of the selection
+    """
+    if strategy not in FILE_QUERY_STRATEGIES:
+      return S_ERROR('Unknown strategy %s, should be one of %s' % (strategy, ', '.join(FILE_QUERY_STRATEGIES)))
+    start = time.time()
+    result = self.__selectFiles(metaDict, path, credDict, strategy=strategy)
+    if not result['OK']:
+      return result
+    fileList, dirList = result['Value']
+    return S_OK({'Plan': result['Plan'],
+                 'Files': len(fileList),
+                 'Directories': len(dirList),
+                 'Time': time.time() - start})
+
+  def iterateFilesByMetadata(self, metaDict, path, credDict, chunkSize=BULK_CHUNK_SIZE):
+    """ Find Files satisfying the given metadata, by chunks: the selection is done at once,
+        but the LFNs of the selected files are only built chunk by chunk, for the large selections
+
+        :param dict metaDict: dictionary with the metaquery parameters
+        :param str path: Path to search into
+        :param dict credDict: Dictionary with the user credentials
+        :param int chunkSize: number of files of a chunk
+
+        :return: S_OK/S_ERROR, Value generator of S_OK with ID:LFN dictionaries of selected files,
+                 stopping at the first error, given as S_ERROR
+    """
+    result = self.__selectFiles(metaDict, path, credDict)
+    if not result['OK']:
+      return result
+    fileList, dirList = result['Value']
+
+    if dirList:
+      return S_OK(self.__iterateDirectoryFileLFNs(dirList, chunkSize))
+    return S_OK(self.__iterateFileLFNs(fileList, chunkSize))
+
+  def __iterateFileLFNs(self, fileList, chunkSize):
+    """ ID:LFN dictionaries of the given files, by chunks """
+    for fileIDs in breakListIntoChunks(fileList, chunkSize):
+      result = self.db.fileManager._getFileLFNs(fileIDs)
+      if not result['OK']:
+        yield result
+        return
+      yield S_OK(result['Value']['Successful'])
+
+  def __iterateDirectoryFileLFNs(self, dirList, chunkSize):
+    """ ID:LFN dictionaries of all the files of the given directories, by chunks of about chunkSize files,
+        even for the directories with many files
+    """
+    idLfnDict = {}
+    for dirID in dirList:
+      result = self.db.dtree.getDirectoryPath(dirID)
+      if not result['OK']:
+        yield result
+        return
+      dirPath = result['Value']
+      for result in self.db.fileManager._iterateDirectoryFileNames(dirID, chunkSize):
+        if result['OK']:
+          result = self.db.fileManager._getDirectoryFiles(dirID, result['Value'], ['FileID'], allStatus=True)
+        if not result['OK']:
+          yield result
+          return
+        for fileName, fileDict in result['Value'].iteritems():
+          idLfnDict[fileDict['FileID']] = dirPath + '/' + fileName
+        if len(idLfnDict) >= chunkSize:
+          yield S_OK(idLfnDict)
+          idLfnDict = {}
+    if idLfnDict:
+      yield S_OK(idLfnDict)
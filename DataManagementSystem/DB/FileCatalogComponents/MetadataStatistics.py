@@ -0,0 +1,153 @@
+""" DIRAC FileCatalog cardinality statistics of the catalog tables, used to plan the metadata queries
+
+    The number of rows of the tables and the number of distinct values of the metadata fields give
+    an estimate of the number of directories or files selected by a metadata condition, assuming
+    uniformly distributed values. They are read from the database at their first use, and read
+    again after lifeTime seconds.
+"""
+
+__RCSID__ = "$Id$"
+
+import time
+import threading
+
+from DIRAC import gLogger
+
+# Fraction of the rows assumed to be selected by a range or a wildcard condition
+RANGE_SELECTIVITY = 1. / 3
+
+
+class MetadataStatistics(object):
+  """ Cache of the numbers of rows of the tables and of the distinct values of the metadata tables
+  """
+
+  def __init__(self, database=None, lifeTime=600):
+    """ c'tor
+
+    :param database: FileCatalogDB
+    :param int lifeTime: seconds after which the statistics are read again from the database
+    """
+    self.db = database
+    self.lifeTime = lifeTime
+    self.__lock = threading.Lock()
+    # table -> number of rows, and the time they were read
+    self.__tableRows = {}
+    self.__tableRowsTime = 0
+    # table -> (number of distinct values, time it was read)
+    self.__distinctValues = {}
+
+  def setDatabase(self, database):
+    self.db = database
+
+  def getTableRows(self, table):
+    """ Estimated number of rows of a table, as given by the information schema of the database
+
+    :param str table: table name
+    :return: number of rows, None if it is not known
+    """
+    with self.__lock:
+      if time.time() - self.__tableRowsTime < self.lifeTime:
+        return self.__tableRows.get(table)
+
+    req = "SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()"
+    result = self.db._query(req)
+    if not result['OK']:
+      gLogger.warn("Failed to get the number of rows of the tables", result['Message'])
+      return None
+    with self.__lock:
+      self.__tableRows = dict((name, int(rows or 0)) for name, rows in result['Value'])
+      self.__tableRowsTime = time.time()
+      return self.__tableRows.get(table)
+
+  def getDistinctValues(self, table):
+    """ Number of distinct values of a metadata table
+
+    :param str table: FC_Meta_<name> or FC_FileMeta_<name> table
+    :return: number of values, None if it is not known
+    """
+    with self.__lock:
+      distinctValues, readTime = self.__distinctValues.get(table, (None, 0))
+      if time.time() - readTime < self.lifeTime:
+        return distinctValues
+
+    # The Value column is indexed, so that the values are counted from the index
+    result = self.db._query("SELECT COUNT(DISTINCT Value) FROM %s" % table)
+    if not result['OK']:
+      gLogger.warn("Failed to count the values of a metadata table", "%s: %s" % (table, result['Message']))
+      return None
+    distinctValues = int(result['Value'][0][0]) if result['Value'] else 0
+    with self.__lock:
+      self.__distinctValues[table] = (distinctValues, time.time())
+    return distinctValues
+
+  def clear(self, table=None):
+    """ Forget the statistics, e.g. after a metadata field was added or removed
+
+    :param str table: table of which the distinct values are forgotten, all the statistics if None
+    """
+    with self.__lock:
+      if table is not None:
+        self.__distinctValues.pop(table, None)
+        return
+      self.__tableRows = {}
+      self.__tableRowsTime = 0
+      self.__distinctValues = {}
+
+  @staticmethod
+  def getSelectivity(value, distinctValues):
+    """ Fraction of the rows of a metadata table selected by a value of a metadata query
+
+    :param value: value of the metadata query, e.g. 12, 'abc*', [1, 2] or {'>': 3, '<': 8}
+    :param int distinctValues: number of distinct values of the metadata field
+    :return: float between 0 and 1
+    """
+    equality = 1. / max(distinctValues, 1)
+    if isinstance(value, dict):
+      selectivity = 1.
+      for operation, operand in value.iteritems():
+        nValues = len(operand) if isinstance(operand, list) else 1
+        if operation in ['>', '<', '>=', '<=']:
+          selectivity *= RANGE_SELECTIVITY
+        elif operation in ['in', '=']:
+          selectivity *= min(1., nValues * equality)
+        elif operation in ['nin', '!=']:
+          selectivity *= max(0., 1. - nValues * equality)
+      return selectivity
+    if isinstance(value, list):
+      return min(1., len(value) * equality) if value else 1.
+    if isinstance(value, basestring):
+      if not value or value.lower() == 'any':
+        return 1.
+      if '*' in value or '?' in value:
+        return RANGE_SELECTIVITY
+    return equality
+
+  def estimateRows(self, table, value, totalRows=None):
+    """ Estimated number of rows of a metadata table selected by a value of a metadata query
+
+    :param str table: FC_Meta_<name> or FC_FileMeta_<name> table
+    :param value: value of the metadata query
+    :param int totalRows: number of directories or files, for the 'Missing' value
+    :return: number of rows, None if the statistics are not available
+    """
+    rows = self.getTableRows(table)
+    if rows is None:
+      return None
+    if isinstance(value, basestring) and value.lower() == 'missing':
+      return max(totalRows - rows, 0) if totalRows is not None else None
+    distinctValues = self.getDistinctValues(table)
+    if distinctValues is None:
+      return rows
+    return int(rows * self.getSelectivity(value, distinctValues))
+
+  def estimateDirectoryFiles(self, nDirectories):
+    """ Estimated number of files in a number of directories, from the mean number of files by directory
+
+    :param int nDirectories: number of directories
+    :return: number of files, None if the statistics are not available
+    """
+    files = self.getTableRows('FC_Files')
+    directories = self.getTableRows(self.db.dtree.getTreeTable())
+    if files is None or not directories:
+      return None
+    return int(float(files) / directories * nDirectories)
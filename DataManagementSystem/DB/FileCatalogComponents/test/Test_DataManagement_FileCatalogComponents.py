@@ -4,15 +4,25 @@
 # pylint: disable=protected-access
 
 # imports
-from mock import MagicMock
+from mock import MagicMock, patch
+
+from DIRAC import S_OK
 
 from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryManager.DirectoryTreeBase import DirectoryTreeBase
 from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryManager.DirectoryLevelTree import DirectoryLevelTree
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryCache import DirectoryCache
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.MetadataStatistics import MetadataStatistics, \
+    RANGE_SELECTIVITY
 # from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectorySimpleTree import DirectorySimpleTree
 # from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryFlatTree import DirectoryFlatTree
 # from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryNodeTree import DirectoryNodeTree
 
 from DIRAC.DataManagementSystem.DB.FileCatalogComponents.FileManager.FileManagerBase import FileManagerBase
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.FileMetadata.FileMetadata import FileMetadata
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DatasetManager.DatasetManager import DatasetManager, \
+    getLFNHash, getDatasetHash
+
+DATASET_MODULE = "DIRAC.DataManagementSystem.DB.FileCatalogComponents.DatasetManager.DatasetManager"
 
 dbMock = MagicMock()
 ugManagerMock = MagicMock()
@@ -44,6 +54,119 @@ def test_Level_makeDirectory():
   assert res['OK'] is True  # this will need to be implemented on a derived class
 
 
+def test_Level_cache():
+  """ The directories found once are then taken from the cache, until they are removed """
+  cacheDBMock = MagicMock()
+  cacheDBMock.dirCache = DirectoryCache()
+  cacheDBMock._escapeString.side_effect = lambda path: {'OK': True, 'Value': "'%s'" % path}
+  cacheDBMock._query.return_value = {'OK': True, 'Value': ((3, 2),)}
+  cacheDBMock._update.return_value = {'OK': True, 'Value': 1}
+  cachedTree = DirectoryLevelTree()
+  cachedTree.db = cacheDBMock
+
+  res = cachedTree.findDir('/vo/data/')
+  assert (res['Value'], res['Level']) == (3, 2)
+  res = cachedTree.findDir('/vo/data')
+  assert (res['Value'], res['Level']) == (3, 2)
+  assert cachedTree.findDirs(['/vo/data'])['Value'] == {'/vo/data': 3}
+  assert cachedTree.getDirectoryPath(3)['Value'] == '/vo/data'
+  assert cacheDBMock._query.call_count == 1
+
+  assert cachedTree.removeDir('/vo/data')['OK']
+  cacheDBMock._query.return_value = {'OK': True, 'Value': ()}
+  assert cachedTree.findDir('/vo/data')['Value'] == ''
+  assert cacheDBMock._query.call_count == 2
+
+
+####################################################################################
+# DirectoryCache
+
+def test_DirectoryCache():
+  """ The entries are found by path and by DirID, and the least recently used are dropped """
+  cache = DirectoryCache(maxSize=2)
+  cache.add(1, '/', Level=0)
+  cache.add(2, '/vo', Level=1, Parent=1)
+  assert cache.get('/vo', 'DirID', 'Level') == (2, 1)
+  assert cache.get(2, 'Path') == '/vo'
+  # The PathIDs of /vo are not known yet
+  assert cache.get(2, 'PathIDs') is None
+  cache.add(2, PathIDs=(1, 2))
+  assert cache.get('/vo', 'PathIDs') == (1, 2)
+
+  # / is the least recently used
+  cache.add(3, '/vo/data', Level=2)
+  assert cache.get('/', 'DirID') is None
+  assert cache.get(3, 'Path') == '/vo/data'
+
+  cache.add(2, Permissions=(1, 1, 0o775))
+  cache.clear(['Permissions'])
+  assert cache.get(2, 'Permissions') is None
+  assert cache.get(2, 'Parent') == 1
+
+  cache.invalidate('/vo')
+  assert cache.get('/vo', 'DirID') is None
+  assert cache.get(2, 'Path') is None
+
+  counters = cache.getCounters()
+  assert counters['Directory Cache Size'] == 1
+  assert counters['Directory Cache Evictions'] == 1
+  assert counters['Directory Cache Hits'] == 5
+  assert counters['Directory Cache Misses'] == 5
+
+
+def test_DirectoryCache_lifeTime():
+  """ The entries expire after their life time, and nothing is kept if the cache is disabled """
+  cache = DirectoryCache(lifeTime=-1)
+  cache.add(1, '/')
+  assert cache.get('/', 'DirID') is None
+  cache = DirectoryCache(maxSize=0)
+  cache.add(1, '/')
+  assert cache.get('/', 'DirID') is None
+
+
+####################################################################################
+# MetadataStatistics
+
+def getStatsDBMock(tableRows, distinctValues):
+  """ Mock of the FileCatalogDB answering the queries of the statistics """
+  statsDBMock = MagicMock()
+  statsDBMock.dtree.getTreeTable.return_value = 'FC_DirectoryList'
+
+  def query(req, *args, **kwargs):
+    if 'information_schema' in req:
+      return S_OK(tableRows.items())
+    return S_OK([(distinctValues[req.split()[-1]],)])
+  statsDBMock._query.side_effect = query
+  return statsDBMock
+
+
+def test_MetadataStatistics_selectivity():
+  """ Fractions of the rows selected by the metadata values """
+  assert MetadataStatistics.getSelectivity(12, 100) == 0.01
+  assert MetadataStatistics.getSelectivity([1, 2], 100) == 0.02
+  assert MetadataStatistics.getSelectivity('abc*', 100) == RANGE_SELECTIVITY
+  assert MetadataStatistics.getSelectivity('Any', 100) == 1.
+  assert MetadataStatistics.getSelectivity({'>': 3, '<': 8}, 100) == RANGE_SELECTIVITY ** 2
+  assert MetadataStatistics.getSelectivity({'nin': [1, 2, 3]}, 10) == 0.7
+  assert MetadataStatistics.getSelectivity('abc', 0) == 1.
+
+
+def test_MetadataStatistics_estimates():
+  """ The numbers of rows are estimated from the table statistics, read once within their life time """
+  statsDBMock = getStatsDBMock({'FC_Files': 1000, 'FC_DirectoryList': 10, 'FC_FileMeta_Run': 400},
+                               {'FC_FileMeta_Run': 20})
+  stats = MetadataStatistics(statsDBMock)
+  assert stats.estimateRows('FC_FileMeta_Run', 7) == 20
+  assert stats.estimateRows('FC_FileMeta_Run', 'Missing', 1000) == 600
+  assert stats.estimateRows('FC_FileMeta_Unknown', 7) is None
+  assert stats.estimateDirectoryFiles(3) == 300
+  assert statsDBMock._query.call_count == 2
+
+  stats.clear()
+  assert stats.getTableRows('FC_Files') == 1000
+  assert statsDBMock._query.call_count == 3
+
+
 ####################################################################################
 # SimpleTree
 # FIXME: this fails... is it a genuine failure?
@@ -99,3 +222,338 @@ def test_Base_addFile():
   res = fmb.addFile({'aa': 'aaa/bbb'}, {})
   assert res['OK'] is True  # this will need to be implemented on a derived class, but it anyway returns S_OK()
   assert 'aa' in res['Value']['Failed']
+
+
+@patch('DIRAC.DataManagementSystem.DB.FileCatalogComponents.FileManager.FileManagerBase.BULK_CHUNK_SIZE', 2)
+def test_Base_bulkResolution():
+  """ The LFNs are resolved by chunks, after their directories, and the LFNs of missing directories fail at once """
+  bulkDBMock = MagicMock()
+  bulkDBMock.lfnPfnConvention = 'Strong'
+  bulkDBMock.dtree.findDirs.side_effect = lambda paths, connection: S_OK(dict((path, len(path))
+                                                                              for path in paths
+                                                                              if path != '/vo/missing'))
+  fileIDs = {'/vo/d1/f1': 1, '/vo/d1/f2': 2, '/vo/d2/f3': 3}
+  bulkFM = FileManagerBase()
+  bulkFM.db = bulkDBMock
+  bulkFM._findFileIDs = MagicMock(side_effect=lambda lfns, connection, directoryIDs: S_OK(
+      {'Successful': dict((lfn, fileIDs[lfn]) for lfn in lfns if lfn in fileIDs),
+       'Failed': dict((lfn, 'No such file or directory') for lfn in lfns if lfn not in fileIDs)}))
+  bulkFM._getFileReplicas = MagicMock(side_effect=lambda ids, **kwargs: S_OK(
+      dict((fileID, {'SE%d' % fileID: {'Status': 'AprioriGood'}}) for fileID in ids)))
+
+  lfns = ['/vo/d2/f3', '/vo/missing/f0', '/vo/d1/f1', '/vo/d2/f4', '/vo/d1/f2']
+  res = bulkFM.getReplicas(lfns, False)
+  assert res['OK']
+  assert res['Value']['Successful'] == {'/vo/d1/f1': {'SE1': ''}, '/vo/d1/f2': {'SE2': ''}, '/vo/d2/f3': {'SE3': ''}}
+  assert sorted(res['Value']['Failed']) == ['/vo/d2/f4', '/vo/missing/f0']
+  # The 3 directories are resolved first, then the files of the found directories, by chunks of 2
+  assert bulkDBMock.dtree.findDirs.call_count == 2
+  assert [len(call[0][0]) for call in bulkFM._findFileIDs.call_args_list] == [2, 2]
+  # with the directories already resolved
+  assert bulkFM._findFileIDs.call_args[1]['directoryIDs'] == {'/vo/d1': 6, '/vo/d2': 6}
+
+  res = bulkFM.exists(lfns)
+  assert res['OK']
+  assert res['Value']['Successful']['/vo/d1/f1'] == '/vo/d1/f1'
+  assert res['Value']['Successful']['/vo/missing/f0'] is False
+
+
+def test_Base_iterateDirectory():
+  """ The files of a directory are read by chunks, each from the last name of the previous one """
+  fileNames = ['f%d' % i for i in range(5)]
+  iterDBMock = MagicMock()
+  iterDBMock.lfnPfnConvention = 'Strong'
+  iterDBMock._escapeString.side_effect = lambda name: S_OK("'%s'" % name)
+  iterDBMock._query.side_effect = lambda req, connection: S_OK(
+      [(name,) for name in fileNames if "'%s'" % name > req.split('FileName > ')[1].split(' ')[0]][:2])
+  iterFM = FileManagerBase()
+  iterFM.db = iterDBMock
+  iterFM._getDirectoryFiles = MagicMock(side_effect=lambda dirID, names, metadata, allStatus=False, connection=False:
+                                        S_OK(dict((name, {'FileID': int(name[1:])}) for name in names
+                                                  if name != 'f3')))
+  iterFM._getFileReplicas = MagicMock(side_effect=lambda ids, **kwargs: S_OK(
+      dict((fileID, {'SE1': {'Status': 'AprioriGood'}} if fileID else {}) for fileID in ids)))
+
+  chunks = list(iterFM.iterateFilesInDirectory(1, chunkSize=2))
+  assert all(chunk['OK'] for chunk in chunks)
+  assert [sorted(chunk['Value']) for chunk in chunks] == [['f0', 'f1'], ['f2'], ['f4']]
+  assert chunks[0]['Value']['f1']['MetaData'] == {'FileID': 1}
+  assert [call[0][0] for call in iterDBMock._escapeString.call_args_list] == ['', 'f1', 'f3']
+
+  # The files without replicas are not returned, as by getDirectoryReplicas
+  chunks = list(iterFM.iterateDirectoryReplicas(1, chunkSize=2))
+  assert [chunk['Value'] for chunk in chunks] == [{'f1': {'SE1': ''}}, {'f2': {'SE1': ''}}, {'f4': {'SE1': ''}}]
+
+
+def test_Base_iterateSEDump():
+  """ The SE dump is read by chunks of increasing FileIDs """
+  seDumpFM = FileManagerBase()
+  seDumpFM.db = MagicMock()
+  seDumpFM.db.seManager.findSE.return_value = S_OK(7)
+  rows = [(fileID, '/vo/f%d' % fileID, 'ad%d' % fileID, fileID * 10) for fileID in (3, 5, 8)]
+  seDumpFM._getSEDumpChunk = MagicMock(side_effect=lambda seID, afterFileID, limit: S_OK(
+      [row for row in rows if row[0] > afterFileID][:limit]))
+
+  chunks = list(seDumpFM.iterateSEDump('SE', chunkSize=2))
+  assert [chunk['Value'] for chunk in chunks] == [[('/vo/f3', 'ad3', 30), ('/vo/f5', 'ad5', 50)],
+                                                  [('/vo/f8', 'ad8', 80)]]
+  assert [call[0][:2] for call in seDumpFM._getSEDumpChunk.call_args_list] == [(7, 0), (7, 5)]
+
+  res = seDumpFM.getSEDump('SE')
+  assert res['OK']
+  assert res['Value'] == [row[1:] for row in rows]
+
+
+####################################################################################
+# FileMetadata
+
+def getPlannerFileMetadata(tableRows, distinctValues):
+  """ FileMetadata on a database mock recording the queries of the file metadata, which return
+      the files 1 to 4 in the directories 1 and 2
+  """
+  plannerDBMock = getStatsDBMock(tableRows, distinctValues)
+  statsQuery = plannerDBMock._query.side_effect
+  plannerDBMock.queries = []
+
+  def query(req, *args, **kwargs):
+    if 'F.FileID' in req:
+      plannerDBMock.queries.append(req)
+      return S_OK([(1, 1), (2, 1), (3, 2), (4, 2)])
+    return statsQuery(req, *args, **kwargs)
+  plannerDBMock._query.side_effect = query
+  plannerDBMock._escapeString.side_effect = lambda value: S_OK("'%s'" % value)
+  plannerDBMock.seNames = {'SE1': 1, 'SE2': 2, 'SE3': 3, 'SE4': 4}
+  plannerDBMock.metaStats = MetadataStatistics(plannerDBMock)
+  fileMetadata = FileMetadata(plannerDBMock)
+  return fileMetadata, plannerDBMock
+
+
+def test_FileMetadata_plan():
+  """ The metadata tables are joined from the most selective one, and the files are selected from it
+      when it is expected to select less files than the directories contain
+  """
+  fileMetadata, plannerDBMock = getPlannerFileMetadata({'FC_Files': 100000, 'FC_DirectoryList': 100,
+                                                        'FC_Replicas': 200000,
+                                                        'FC_FileMeta_Run': 50000, 'FC_FileMeta_Type': 90000},
+                                                       {'FC_FileMeta_Run': 5000, 'FC_FileMeta_Type': 3})
+  findFiles = fileMetadata._FileMetadata__findFilesByMetadata
+  metaDict = {'Type': 'RAW', 'Run': 12, 'SE': 'SE1'}
+
+  # 10 files expected for the run, 1000 files in the directory
+  res = findFiles(metaDict, [1], {})
+  assert res['OK']
+  assert res['Value'] == [1, 2]
+  plan = res['Plan']
+  assert plan['Strategy'] == 'FileFirst'
+  assert plan['Joins'] == [('FC_FileMeta_Run', 10), ('FC_FileMeta_Type', 30000), ('FC_Replicas', 50000)]
+  assert plan['DirectoryFiles'] == 1000
+  assert plannerDBMock.queries[-1].startswith('SELECT STRAIGHT_JOIN F.FileID, F.DirID FROM FC_FileMeta_Run M1 '
+                                              'INNER JOIN FC_FileMeta_Type M2 USING( FileID ) '
+                                              'INNER JOIN FC_Replicas M3 USING( FileID ) '
+                                              'INNER JOIN FC_Files F USING( FileID ) WHERE ')
+  assert 'DirID in' not in plannerDBMock.queries[-1]
+
+  # Without the run, the directory is more selective
+  res = findFiles({'Type': 'RAW'}, [1], {})
+  assert res['OK']
+  assert res['Value'] == [1, 2, 3, 4]
+  assert res['Plan']['Strategy'] == 'DirectoryFirst'
+  assert plannerDBMock.queries[-1] == ("SELECT STRAIGHT_JOIN F.FileID FROM FC_Files F "
+                                       "INNER JOIN FC_FileMeta_Type M1 USING( FileID ) "
+                                       "WHERE F.DirID in (1) AND M1.Value = 'RAW'")
+
+  # The strategy can be forced
+  res = findFiles(metaDict, [1], {}, strategy='DirectoryFirst')
+  assert res['Plan']['Strategy'] == 'DirectoryFirst'
+  assert 'F.DirID in (<1 directories>)' in res['Plan']['Query']
+
+  # The given files are read first
+  res = findFiles(metaDict, [1], {}, fileIDs=[3, 4])
+  assert res['Plan']['Strategy'] == 'DirectoryFirst'
+  assert plannerDBMock.queries[-1].endswith('F.FileID IN (3,4)')
+
+
+def test_FileMetadata_planWithoutStatistics():
+  """ Without statistics, the tables are joined to the files of the directories, as given """
+  fileMetadata, plannerDBMock = getPlannerFileMetadata({'FC_Files': 100000, 'FC_DirectoryList': 100},
+                                                       {})
+  res = fileMetadata._FileMetadata__findFilesByMetadata({'Run': 'Missing'}, [], {})
+  assert res['OK']
+  assert res['Plan']['Strategy'] == 'DirectoryFirst'
+  assert res['Plan']['Joins'] == [('FC_FileMeta_Run', None)]
+  assert plannerDBMock.queries[-1] == ("SELECT F.FileID FROM FC_Files F "
+                                       "LEFT JOIN FC_FileMeta_Run M1 USING( FileID ) WHERE M1.Value IS NULL")
+
+
+####################################################################################
+# DatasetManager
+
+def test_DatasetManager_hash():
+  """ The hash of a dataset does not depend on the order of its files, and can be updated file by file """
+  lfns = ['/vo/f%d' % i for i in range(5)]
+  assert getDatasetHash(lfns) == getDatasetHash(reversed(lfns))
+  assert getDatasetHash([]) == '0' * 32
+  high, low = getLFNHash('/vo/f4')
+  assert getDatasetHash(lfns[:4]) == '%016X%016X' % (int(getDatasetHash(lfns)[:16], 16) ^ high,
+                                                     int(getDatasetHash(lfns)[16:], 16) ^ low)
+
+
+def getDatasetDBMock(answers):
+  """ Mock of the FileCatalogDB answering the queries of the DatasetManager by their beginning """
+  datasetDBMock = MagicMock()
+  datasetDBMock._query.side_effect = lambda req, *args: S_OK([answer for query, answer in answers.iteritems()
+                                                             if req.startswith(query)][0])
+  datasetDBMock._update.return_value = S_OK(1)
+  return datasetDBMock
+
+
+def test_DatasetManager_refresh():
+  """ A materialised dataset is refreshed by evaluating its query on the files changed since its last refresh """
+  f11High, f11Low = getLFNHash('/vo/f11')
+  f10High, f10Low = getLFNHash('/vo/f10')
+  datasetDBMock = getDatasetDBMock({'SELECT LastChangeID, Validated': [(5, 1)],
+                                    'SELECT LastChangeID, PurgedChangeID': [(8, 2)],
+                                    'SELECT FileID FROM FC_MetaDatasetChanges': [(10,), (11,), (10,)],
+                                    'SELECT Size, HashHigh, HashLow': [(50, f11High, f11Low)]})
+  # The file 10 was added and the file 11, in the dataset, was removed
+  datasetDBMock.fmeta.findFilesByMetadata.return_value = S_OK({10: '/vo/f10'})
+  datasetDBMock.fileManager.getFileSize.return_value = S_OK({'Successful': {'/vo/f10': 100}, 'Failed': {}})
+  datasetManager = DatasetManager()
+  datasetManager.db = datasetDBMock
+
+  res = datasetManager._DatasetManager__refreshDataset(1, {'Run': 12, 'Path': '/vo'}, {})
+  assert res['OK']
+  queries = [call[0][0] for call in datasetDBMock._query.call_args_list]
+  # Only the changes up to the last committed change are read
+  assert "SELECT FileID FROM FC_MetaDatasetChanges WHERE ChangeID > 5 AND ChangeID <= 8" in queries
+  args, kwargs = datasetDBMock.fmeta.findFilesByMetadata.call_args
+  assert args[:2] == ({'Run': 12}, '/vo')
+  assert sorted(kwargs['fileIDs']) == [10, 11]
+  updates = [call[0][0] for call in datasetDBMock._update.call_args_list]
+  assert updates[0] == "UPDATE FC_MetaDatasetState SET LastChangeID=8 WHERE DatasetID=1 AND LastChangeID=5"
+  assert updates[1] == "DELETE FROM FC_MetaDatasetDynamicFiles WHERE DatasetID=1 AND FileID IN (10,11)"
+  assert updates[2].endswith("VALUES (1,10,100,%d,%d)" % (f10High, f10Low))
+  assert updates[3] == ("UPDATE FC_MetaDatasetState SET NumberOfFiles=NumberOfFiles+(0), TotalSize=TotalSize+(50), "
+                        "HashHigh=HashHigh^%d, HashLow=HashLow^%d WHERE DatasetID=1" % (f10High ^ f11High,
+                                                                                        f10Low ^ f11Low))
+  assert len(updates) == 4
+
+  # Another service refreshed the dataset meanwhile
+  datasetDBMock._update.reset_mock()
+  datasetDBMock._update.return_value = S_OK(0)
+  res = datasetManager._DatasetManager__refreshDataset(1, {'Run': 12}, {})
+  assert res['OK']
+  assert datasetDBMock._update.call_count == 1
+
+
+def test_DatasetManager_fullRefresh():
+  """ A dataset not validated yet, or whose changes were purged, evaluates its query in full """
+  for state, sequence in [((5, 0), (8, 2)), ((5, 1), (8, 6))]:
+    datasetDBMock = getDatasetDBMock({'SELECT LastChangeID, Validated': [state],
+                                      'SELECT LastChangeID, PurgedChangeID': [sequence],
+                                      'SELECT FileID FROM FC_MetaDatasetChanges': [(10,)]})
+    datasetDBMock.fmeta.findFilesByMetadata.return_value = S_OK({10: '/vo/f10'})
+    datasetDBMock.fileManager.getFileSize.return_value = S_OK({'Successful': {'/vo/f10': 100}, 'Failed': {}})
+    datasetManager = DatasetManager()
+    datasetManager.db = datasetDBMock
+
+    res = datasetManager._DatasetManager__refreshDataset(1, {'Run': 12}, {})
+    assert res['OK']
+    args, kwargs = datasetDBMock.fmeta.findFilesByMetadata.call_args
+    assert kwargs['fileIDs'] is None
+    updates = [call[0][0] for call in datasetDBMock._update.call_args_list]
+    assert updates[0] == "UPDATE FC_MetaDatasetState SET LastChangeID=8 WHERE DatasetID=1 AND LastChangeID=5"
+    assert updates[1] == "DELETE FROM FC_MetaDatasetDynamicFiles WHERE DatasetID=1"
+    assert updates[-1].startswith("INSERT INTO FC_MetaDatasetState")
+    assert "VALUES (1,8,1,100," in updates[-1]
+
+
+def test_DatasetManager_changes():
+  """ The changes are recorded only if there are dynamic datasets, and purged at each check """
+  datasetDBMock = getDatasetDBMock({'SELECT COUNT(*)': [(0,)],
+                                    'SELECT LastChangeID, PurgedChangeID': [(250000, 10)],
+                                    'SELECT MIN(LastChangeID)': [(None,)]})
+  datasetDBMock.fileManager._getStatusInt.return_value = S_OK(2)
+  datasetManager = DatasetManager()
+  datasetManager.db = datasetDBMock
+
+  assert datasetManager._hasDynamicDatasets() is False
+  updates = [call[0][0] for call in datasetDBMock._update.call_args_list]
+  # Without datasets all the changes are purged
+  assert updates == ["UPDATE FC_MetaDatasetSequence SET PurgedChangeID=GREATEST(PurgedChangeID,250000)",
+                     "DELETE FROM FC_MetaDatasetChanges WHERE ChangeID <= 250000"]
+  # The result of the check is kept for a while
+  datasetDBMock._update.reset_mock()
+  assert datasetManager._hasDynamicDatasets() is False
+  datasetDBMock._update.assert_not_called()
+
+  # The changes of a dataset not refreshed for a long time are purged as well
+  datasetDBMock = getDatasetDBMock({'SELECT COUNT(*)': [(1,)],
+                                    'SELECT LastChangeID, PurgedChangeID': [(250000, 10)],
+                                    'SELECT MIN(LastChangeID)': [(20,)]})
+  datasetManager.db = datasetDBMock
+  with patch(DATASET_MODULE + ".time.time", return_value=1e10):
+    assert datasetManager._hasDynamicDatasets() is True
+  updates = [call[0][0] for call in datasetDBMock._update.call_args_list]
+  assert updates[-1] == "DELETE FROM FC_MetaDatasetChanges WHERE ChangeID <= 150000"
+
+  # The change ID is taken in the transaction recording the change
+  datasetDBMock._transaction.return_value = S_OK([])
+  assert datasetManager._recordChanges([10, 11, 10])['OK']
+  commands = datasetDBMock._transaction.call_args[0][0]
+  assert commands[1] == "UPDATE FC_MetaDatasetSequence SET LastChangeID=LAST_INSERT_ID(LastChangeID+1)"
+  assert commands[2] == ("INSERT INTO FC_MetaDatasetChanges (ChangeID,FileID) "
+                         "VALUES (LAST_INSERT_ID(),10),(LAST_INSERT_ID(),11)")
+
+
+def test_DatasetManager_addDataset():
+  """ A new dataset is created from its query, and materialised with the changes recorded before the query """
+  datasetDBMock = MagicMock()
+  datasetDBMock.ugManager = ugManagerMock
+  datasetDBMock._query.return_value = S_OK([(3, 0)])
+  datasetDBMock._update.return_value = S_OK(1)
+  datasetDBMock.fmeta.findFilesByMetadata.return_value = S_OK({10: '/vo/f10', 11: '/vo/f11'})
+  datasetDBMock.fileManager.getFileSize.return_value = S_OK({'Successful': {'/vo/f10': 100, '/vo/f11': 50},
+                                                             'Failed': {}})
+  datasetDBMock.fileManager._getStatusInt.return_value = S_OK(2)
+  datasetDBMock.dtree.existsDir.return_value = S_OK({'Exists': True, 'DirID': 4})
+  datasetDBMock.insertFields.return_value = {'OK': True, 'Value': 1, 'lastRowId': 7}
+  datasetManager = DatasetManager()
+  datasetManager.db = datasetDBMock
+
+  res = datasetManager.addDataset({'/vo/datasets/ds1': {'Run': 12, 'Path': '/vo'}}, {})
+  assert res['OK']
+  assert res['Value'] == {'Successful': {'/vo/datasets/ds1': True}, 'Failed': {}}
+  inDict = datasetDBMock.insertFields.call_args[1]['inDict']
+  assert (inDict['DatasetName'], inDict['DirID']) == ('ds1', 4)
+  assert (inDict['NumberOfFiles'], inDict['TotalSize']) == (2, 150)
+  assert inDict['DatasetHash'] == getDatasetHash(['/vo/f10', '/vo/f11'])
+  updates = [call[0][0] for call in datasetDBMock._update.call_args_list]
+  assert updates[-1].startswith("INSERT INTO FC_MetaDatasetState")
+  f10High, f10Low = getLFNHash('/vo/f10')
+  f11High, f11Low = getLFNHash('/vo/f11')
+  assert "VALUES (7,3,2,150,%d,%d,UTC_TIMESTAMP(),0)" % (f10High ^ f11High, f10Low ^ f11Low) in updates[-1]
+
+  # The query can not be evaluated
+  datasetDBMock.insertFields.reset_mock()
+  datasetDBMock.fmeta.findFilesByMetadata.return_value = {'OK': False, 'Message': 'Wrong query'}
+  res = datasetManager.addDataset({'/vo/datasets/ds2': {'Run': 'x'}}, {})
+  assert res['OK']
+  assert '/vo/datasets/ds2' in res['Value']['Failed']
+  datasetDBMock.insertFields.assert_not_called()
+
+
+def test_Base_findFileIDs():
+  """ The default _findFileIDs uses the directory IDs given, and finds the files whatever their status """
+  bulkDBMock = MagicMock()
+  bulkFM = FileManagerBase()
+  bulkFM.db = bulkDBMock
+  bulkFM._getDirectoryFiles = MagicMock(side_effect=lambda dirID, fileNames, metadata, allStatus, connection: S_OK(
+      dict((fileName, {'FileID': dirID * 10 + int(fileName[1:])}) for fileName in fileNames if fileName != 'f9')))
+
+  res = bulkFM._findFileIDs(['/vo/d1/f1', '/vo/d1/f9', '/vo/d2/f2'], directoryIDs={'/vo/d1': 1, '/vo/d2': 2})
+  assert res['OK']
+  assert res['Value']['Successful'] == {'/vo/d1/f1': 11, '/vo/d2/f2': 22}
+  assert list(res['Value']['Failed']) == ['/vo/d1/f9']
+  bulkDBMock.dtree.findDirs.assert_not_called()
+  assert all(call[1]['allStatus'] is True for call in bulkFM._getDirectoryFiles.call_args_list)
@@ -6,6 +6,10 @@ from DIRAC import gLogger, S_OK, S_ERROR
 from DIRAC.Core.Base.DB import DB
 from DIRAC.Resources.Catalog.Utilities import checkArgumentFormat
 from DIRAC.Core.Utilities.ObjectLoader import ObjectLoader
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryCache import DirectoryCache
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.MetadataStatistics import MetadataStatistics
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DatasetManager.DatasetManager import ALL_FILES
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.FileManager.FileManagerBase import BULK_CHUNK_SIZE
 
 #############################################################################
 
@@ -33,6 +37,10 @@ class FileCatalogDB(DB):
     self.fmeta = None
     self.datasetManager = None
     self.objectLoader = None
+    # Directory entries shared by the components
+    self.dirCache = DirectoryCache()
+    # Statistics of the tables, to plan the metadata queries
+    self.metaStats = MetadataStatistics(self)
 
   def setConfig(self, databaseConfig):
 
@@ -57,6 +65,9 @@ class FileCatalogDB(DB):
     self.validReplicaStatus = databaseConfig['ValidReplicaStatus']
     self.visibleFileStatus = databaseConfig['VisibleFileStatus']
     self.visibleReplicaStatus = databaseConfig['VisibleReplicaStatus']
+    self.dirCache = DirectoryCache(databaseConfig.get('DirectoryCacheSize', 50000),
+                                   databaseConfig.get('DirectoryCacheLifeTime', 60))
+    self.metaStats = MetadataStatistics(self, databaseConfig.get('MetadataStatisticsLifeTime', 600))
 
     # Obtain the plugins to be used for DB interaction
     self.objectLoader = ObjectLoader()
@@ -300,6 +311,8 @@ class FileCatalogDB(DB):
                                          recursive=recursive)
       failed.update(result['Value']['Failed'])
       successful = result['Value']['Successful']
+      # The owner of the files can be part of the dataset queries
+      self.__recordDatasetChanges()
     return S_OK({'Successful': successful, 'Failed': failed})
 
   def changePathGroup(self, paths, credDict, recursive=False):
@@ -321,6 +334,7 @@ class FileCatalogDB(DB):
                                          recursive=recursive)
       failed.update(result['Value']['Failed'])
       successful = result['Value']['Successful']
+      self.__recordDatasetChanges()
     return S_OK({'Successful': successful, 'Failed': failed})
 
   def changePathMode(self, paths, credDict, recursive=False):
@@ -428,6 +442,7 @@ class FileCatalogDB(DB):
       return res
     failed.update(res['Value']['Failed'])
     successful = res['Value']['Successful']
+    self.__recordDatasetChanges(self.__getFileIDs(successful))
     return S_OK({'Successful': successful, 'Failed': failed})
 
   def setFileStatus(self, lfns, credDict):
@@ -454,6 +469,7 @@ class FileCatalogDB(DB):
       return res
     failed.update(res['Value']['Failed'])
     successful = res['Value']['Successful']
+    self.__recordDatasetChanges(self.__getFileIDs(successful))
     return S_OK({'Successful': successful, 'Failed': failed})
 
   def removeFile(self, lfns, credDict):
@@ -475,11 +491,14 @@ class FileCatalogDB(DB):
     if not res['Value']['Successful']:
       return S_OK({'Successful': {}, 'Failed': failed})
 
+    # The IDs of the files are not known any more after their removal
+    fileIDs = self.__getFileIDs(res['Value']['Successful'])
     res = self.fileManager.removeFile(res['Value']['Successful'])
     if not res['OK']:
       return res
     failed.update(res['Value']['Failed'])
     successful = res['Value']['Successful']
+    self.__recordDatasetChanges(fileIDs)
     return S_OK({'Successful': successful, 'Failed': failed})
 
   def addReplica(self, lfns, credDict):
@@ -507,6 +526,7 @@ class FileCatalogDB(DB):
       return res
     failed.update(res['Value']['Failed'])
     successful = res['Value']['Successful']
+    self.__recordDatasetChanges(self.__getFileIDs(successful))
     return S_OK({'Successful': successful, 'Failed': failed})
 
   def removeReplica(self, lfns, credDict):
@@ -529,11 +549,13 @@ class FileCatalogDB(DB):
     if not res['Value']['Successful']:
       return S_OK({'Successful': {}, 'Failed': failed})
 
+    fileIDs = self.__getFileIDs(res['Value']['Successful'])
     res = self.fileManager.removeReplica(res['Value']['Successful'])
     if not res['OK']:
       return res
     failed.update(res['Value']['Failed'])
     successful = res['Value']['Successful']
+    self.__recordDatasetChanges(fileIDs)
     return S_OK({'Successful': successful, 'Failed': failed})
 
   def setReplicaStatus(self, lfns, credDict):
@@ -964,6 +986,40 @@ class FileCatalogDB(DB):
     successful = res['Value']['Successful']
     return S_OK({'Successful': successful, 'Failed': failed})
 
+  def iterateDirectory(self, path, credDict, verbose=False, chunkSize=BULK_CHUNK_SIZE):
+    """
+        List a directory by chunks, for the directories too large to be listed at once
+
+        :param str path: directory
+        :param creDict: credential
+        :param bool verbose: if True, the details of the entries are returned
+        :param int chunkSize: maximum number of entries of a chunk
+
+        :return: S_OK with a generator of S_OK with the "Files", "SubDirs", "Links" and "Datasets"
+           dictionaries of each chunk, S_ERROR if the directory can not be listed
+    """
+    res = self.__checkPathPermission('listDirectory', path, credDict)
+    if not res['OK']:
+      return res
+    return self.dtree.iterateDirectoryContents(res['Value'], details=verbose, chunkSize=chunkSize)
+
+  def iterateDirectoryReplicas(self, path, allStatus, credDict, chunkSize=BULK_CHUNK_SIZE):
+    """
+        Get the replicas of the files of a directory by chunks
+
+        :param str path: directory
+        :param bool allStatus: if False, only the visible files and replicas are returned
+        :param creDict: credential
+        :param int chunkSize: maximum number of files of a chunk
+
+        :return: S_OK with a generator of S_OK with the {fileName: {se: pfn}} dictionary of each chunk,
+           S_ERROR if the directory can not be read
+    """
+    res = self.__checkPathPermission('getDirectoryReplicas', path, credDict)
+    if not res['OK']:
+      return res
+    return self.dtree.iterateDirectoryReplicas(res['Value'], allStatus=allStatus, chunkSize=chunkSize)
+
   def getDirectorySize(self, lfns, longOutput, fromFiles, credDict):
     """
         Get the sizes of a list of directories
@@ -1055,10 +1111,16 @@ class FileCatalogDB(DB):
       return S_ERROR('Failed to determine the path type')
     if result['Value']['Successful'][path]:
       # This is a directory
-      return self.dmeta.setMetadata(path, metadataDict, credDict)
+      result = self.dmeta.setMetadata(path, metadataDict, credDict)
+      # The directory metadata apply to all the files below
+      fileIDs = None
     else:
       # This is a file
-      return self.fmeta.setMetadata(path, metadataDict, credDict)
+      result = self.fmeta.setMetadata(path, metadataDict, credDict)
+      fileIDs = self.__getFileIDs([path])
+    if result['OK']:
+      self.__recordDatasetChanges(fileIDs)
+    return result
 
   def setMetadataBulk(self, pathMetadataDict, credDict):
     """  Add metadata for the given paths
@@ -1106,10 +1168,15 @@ class FileCatalogDB(DB):
       return S_ERROR('Failed to determine the path type')
     if result['Value']['Successful'][path]:
       # This is a directory
-      return self.dmeta.removeMetadata(path, metadata, credDict)
+      result = self.dmeta.removeMetadata(path, metadata, credDict)
+      fileIDs = None
     else:
       # This is a file
-      return self.fmeta.removeMetadata(path, metadata, credDict)
+      result = self.fmeta.removeMetadata(path, metadata, credDict)
+      fileIDs = self.__getFileIDs([path])
+    if result['OK']:
+      self.__recordDatasetChanges(fileIDs)
+    return result
 
   #######################################################################
   #
@@ -1139,6 +1206,7 @@ class FileCatalogDB(DB):
     if not res['OK']:
       return res
     counterDict.update(res['Value'])
+    counterDict.update(self.dirCache.getCounters())
     return S_OK(counterDict)
 
   ########################################################################
@@ -1146,9 +1214,53 @@ class FileCatalogDB(DB):
   #  Security based methods
   #
 
+  def __getFileIDs(self, lfns):
+    """ IDs of the given files, for the changes of the datasets
+
+        :param lfns: list or dictionary of LFNs
+        :return: list of FileIDs, empty if there are no dynamic datasets, None if they could not be found
+    """
+    if not lfns or not self.__recordingDatasetChanges():
+      return []
+    res = self.fileManager._findFileIDs(list(lfns))
+    if not res['OK']:
+      gLogger.warn('Failed to get the IDs of the changed files', res['Message'])
+      return None
+    return res['Value']['Successful'].values()
+
+  def __recordingDatasetChanges(self):
+    """ Check if the changes of the files must be recorded, i.e. if there are dynamic datasets
+    """
+    return self.datasetManager is not None and self.datasetManager._hasDynamicDatasets()
+
+  def __recordDatasetChanges(self, fileIDs=None):
+    """ Record the files changed by a write operation, for the refresh of the dynamic datasets
+
+        :param list fileIDs: IDs of the changed files, None if all the files may have changed
+    """
+    if not self.__recordingDatasetChanges():
+      return
+    if fileIDs is None:
+      fileIDs = [ALL_FILES]
+    res = self.datasetManager._recordChanges(fileIDs)
+    if not res['OK']:
+      gLogger.error('Failed to record the changes for the datasets', res['Message'])
+
   def _checkAdminPermission(self, credDict):
     return self.securityManager.hasAdminAccess(credDict)
 
+  def __checkPathPermission(self, operation, path, credDict):
+    """ Check the permission of an operation on a single path
+
+        :return: S_OK with the path, as normalised by checkArgumentFormat, or S_ERROR
+    """
+    res = self._checkPathPermissions(operation, path, credDict)
+    if not res['OK']:
+      return res
+    if not res['Value']['Successful']:
+      return S_ERROR(res['Value']['Failed'].values()[0] if res['Value']['Failed'] else 'Permission denied')
+    return S_OK(res['Value']['Successful'].keys()[0])
+
   def _checkPathPermissions(self, operation, lfns, credDict):
 
     res = checkArgumentFormat(lfns)
@@ -1181,3 +1293,14 @@ class FileCatalogDB(DB):
         :returns: S_OK with list of tuples (lfn, checksum, size)
     """
     return self.fileManager.getSEDump(seName)
+
+  def iterateSEDump(self, seName, chunkSize=BULK_CHUNK_SIZE):
+    """
+         Return the files at a given SE, together with checksum and size, by chunks
+
+        :param seName: name of the StorageElement
+        :param int chunkSize: maximum number of files of a chunk
+
+        :returns: S_OK with a generator of S_OK with list of tuples (lfn, checksum, size)
+    """
+    return S_OK(self.fileManager.iterateSEDump(seName, chunkSize=chunkSize))
@@ -1864,6 +1864,31 @@ DELIMITER ;
 
 
 
+-- ps_get_se_dump_chunk : dump the lfns in an SE by chunks, with checksum and size
+-- se_id : storageElement's ID
+-- after_file_id : only the files with a larger FileID are returned
+-- max_files : maximum number of files returned
+-- output : FileID, LFN, Checksum, Size, by increasing FileID
+
+DROP PROCEDURE IF EXISTS ps_get_se_dump_chunk;
+DELIMITER //
+CREATE PROCEDURE ps_get_se_dump_chunk
+(IN se_id INT, IN after_file_id INT, IN max_files INT)
+BEGIN
+
+  SELECT SQL_NO_CACHE f.FileID, CONCAT(d.Name, '/', f.FileName), f.Checksum, f.Size
+         FROM FC_Replicas r
+         JOIN FC_Files f on f.FileID = r.FileID
+         JOIN FC_DirectoryList d on d.DirID = f.DirID
+         WHERE r.SEID = se_id AND r.FileID > after_file_id
+         ORDER BY r.FileID
+         LIMIT max_files;
+
+END //
+DELIMITER ;
+
+
+
 -- Consistency checks
 
 
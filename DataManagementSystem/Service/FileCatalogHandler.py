@@ -16,22 +16,39 @@ import six
 import cStringIO
 import csv
 import os
-from types import IntType, LongType, DictType, StringTypes, BooleanType, ListType
+import threading
+import uuid
+from types import IntType, LongType, DictType, StringTypes, BooleanType, ListType, TupleType
 # from DIRAC
 from DIRAC.Core.DISET.RequestHandler import RequestHandler, getServiceOption
 
 from DIRAC import gLogger, S_OK, S_ERROR
 from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
+from DIRAC.Core.Utilities.DictCache import DictCache
 from DIRAC.DataManagementSystem.DB.FileCatalogDB import FileCatalogDB
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.FileManager.FileManagerBase import BULK_CHUNK_SIZE
 
 # This is a global instance of the FileCatalogDB class
 gFileCatalogDB = None
 
+# Cursors opened by the clients reading large results by chunks, see FileCatalogHandler.export_openCursor
+gCursors = DictCache()
+# Seconds after which an unused cursor is closed, and maximum number of cursors open by a user
+gCursorLifeTime = 600
+gMaxOpenCursors = 10
+# The cursors live in the memory of a process: they can't be used when the service runs in several processes
+gCursorsEnabled = True
+# Maximum number of entries of a chunk read through a cursor
+MAX_CURSOR_CHUNK_SIZE = 10 * BULK_CHUNK_SIZE
+
 
 def initializeFileCatalogHandler(serviceInfo):
   """ handler initialisation """
 
   global gFileCatalogDB
+  global gCursorLifeTime
+  global gMaxOpenCursors
+  global gCursorsEnabled
 
   dbLocation = getServiceOption(serviceInfo, 'Database', 'DataManagement/FileCatalogDB')
   gFileCatalogDB = FileCatalogDB(dbLocation)
@@ -63,7 +80,10 @@ def initializeFileCatalogHandler(serviceInfo):
                    'ValidFileStatus': ['AprioriGood', 'Trash', 'Removing', 'Probing'],
                    'ValidReplicaStatus': ['AprioriGood', 'Trash', 'Removing', 'Probing'],
                    'VisibleFileStatus': ['AprioriGood'],
-                   'VisibleReplicaStatus': ['AprioriGood']}
+                   'VisibleReplicaStatus': ['AprioriGood'],
+                   'DirectoryCacheSize': 50000,
+                   'DirectoryCacheLifeTime': 60,
+                   'MetadataStatisticsLifeTime': 600}
   for configKey in sorted(defaultConfig.keys()):
     defaultValue = defaultConfig[configKey]
     configValue = getServiceOption(serviceInfo, configKey, defaultValue)
@@ -71,6 +91,12 @@ def initializeFileCatalogHandler(serviceInfo):
     databaseConfig[configKey] = configValue
   res = gFileCatalogDB.setConfig(databaseConfig)
 
+  gCursorLifeTime = getServiceOption(serviceInfo, 'CursorLifeTime', gCursorLifeTime)
+  gMaxOpenCursors = getServiceOption(serviceInfo, 'MaxOpenCursors', gMaxOpenCursors)
+  gCursorsEnabled = getServiceOption(serviceInfo, 'CloneProcesses', 0) <= 1
+  if not gCursorsEnabled:
+    gLogger.info("Cursors are disabled, the service runs with CloneProcesses > 1")
+
   gMonitor.registerActivity("AddFile", "Amount of addFile calls",
                             "FileCatalogHandler", "calls/min", gMonitor.OP_SUM)
   gMonitor.registerActivity("AddFileSuccessful", "Files successfully added",
@@ -427,6 +453,128 @@ class FileCatalogHandler(RequestHandler):
     """ Get replicas for files in the supplied directory """
     return gFileCatalogDB.getDirectoryReplicas(lfns, allStatus, self.getRemoteCredentials())
 
+  ########################################################################
+  #
+  # Cursors, to read large results by chunks
+  #
+
+  types_openCursor = [StringTypes, [ListType, TupleType]]
+
+  def export_openCursor(self, queryType, queryArgs, chunkSize=BULK_CHUNK_SIZE):
+    """ Open a cursor on the result of a query, which is then read chunk by chunk with fetchCursor,
+        instead of being built and sent at once. The cursor is closed at the end of the result, at the
+        first error, by closeCursor, or after CursorLifeTime seconds without being read.
+
+        :param str queryType: the query, with its arguments: listDirectory (path, verbose),
+                              getDirectoryReplicas (path, allStatus), findFilesByMetadata (metaDict, path)
+                              or getSEDump (seName)
+        :param list queryArgs: arguments of the query
+        :param int chunkSize: maximum number of entries of a chunk
+
+        :return: S_OK with the ID of the cursor
+    """
+    if not gCursorsEnabled:
+      return S_ERROR("Cursors are not available, the service runs with CloneProcesses > 1")
+    if not isinstance(chunkSize, (IntType, LongType)) or chunkSize <= 0:
+      return S_ERROR("Invalid chunk size: %s" % chunkSize)
+    chunkSize = min(chunkSize, MAX_CURSOR_CHUNK_SIZE)
+    credDict = self.getRemoteCredentials()
+    owner = credDict.get('DN')
+
+    gCursors.purgeExpired()
+    openCursors = [cursor for cursor in (gCursors.get(cursorID) for cursorID in gCursors.getKeys())
+                   if cursor and cursor['Owner'] == owner]
+    if len(openCursors) >= gMaxOpenCursors:
+      return S_ERROR("Too many open cursors, close some of them first")
+
+    try:
+      if queryType == 'listDirectory':
+        path, verbose = queryArgs
+        result = gFileCatalogDB.iterateDirectory(path, credDict, verbose=verbose, chunkSize=chunkSize)
+      elif queryType == 'getDirectoryReplicas':
+        path, allStatus = queryArgs
+        result = gFileCatalogDB.iterateDirectoryReplicas(path, allStatus, credDict, chunkSize=chunkSize)
+      elif queryType == 'findFilesByMetadata':
+        metaDict, path = queryArgs
+        result = gFileCatalogDB.fmeta.iterateFilesByMetadata(metaDict, path, credDict, chunkSize=chunkSize)
+        if result['OK']:
+          result['Value'] = self.__getLFNChunks(result['Value'])
+      elif queryType == 'getSEDump':
+        seName, = queryArgs
+        result = gFileCatalogDB.iterateSEDump(seName, chunkSize=chunkSize)
+      else:
+        return S_ERROR("Unknown query for a cursor: %s" % queryType)
+    except ValueError:
+      return S_ERROR("Wrong number of arguments for %s: %d" % (queryType, len(queryArgs)))
+    if not result['OK']:
+      return result
+
+    cursorID = uuid.uuid4().hex
+    gCursors.add(cursorID, gCursorLifeTime, {'Owner': owner,
+                                             'Iterator': result['Value'],
+                                             'Lock': threading.Lock()})
+    return S_OK(cursorID)
+
+  @staticmethod
+  def __getLFNChunks(idLfnChunks):
+    """ Lists of LFNs of the chunks of findFilesByMetadata, as returned by export_findFilesByMetadata """
+    for result in idLfnChunks:
+      if result['OK']:
+        result = S_OK(result['Value'].values())
+      yield result
+
+  def __getCursor(self, cursorID):
+    """ Open cursor of the remote user """
+    cursor = gCursors.get(cursorID)
+    if not cursor or cursor['Owner'] != self.getRemoteCredentials().get('DN'):
+      return S_ERROR("Unknown or expired cursor: %s" % cursorID)
+    return S_OK(cursor)
+
+  types_fetchCursor = [StringTypes]
+
+  def export_fetchCursor(self, cursorID):
+    """ Read the next chunk of the result of a query opened with openCursor
+
+        :param str cursorID: ID of the cursor
+
+        :return: S_OK with a dictionary: 'Chunk', next chunk of the result, in the format of the
+                 result of the query (e.g. the 'Files', 'SubDirs', 'Links' and 'Datasets' dictionaries
+                 of a directory for listDirectory), and 'Done', True at the end of the result, with no chunk
+    """
+    result = self.__getCursor(cursorID)
+    if not result['OK']:
+      return result
+    cursor = result['Value']
+    if not cursor['Lock'].acquire(False):
+      return S_ERROR("Cursor %s is already being read" % cursorID)
+    try:
+      result = next(cursor['Iterator'], None)
+    finally:
+      cursor['Lock'].release()
+
+    if result is None:
+      gCursors.delete(cursorID)
+      return S_OK({'Chunk': None, 'Done': True})
+    if not result['OK']:
+      gCursors.delete(cursorID)
+      return result
+    # Renew the life time of the cursor
+    gCursors.add(cursorID, gCursorLifeTime, cursor)
+    return S_OK({'Chunk': result['Value'], 'Done': False})
+
+  types_closeCursor = [StringTypes]
+
+  def export_closeCursor(self, cursorID):
+    """ Close a cursor before the end of its result
+
+        :param str cursorID: ID of the cursor
+    """
+    result = self.__getCursor(cursorID)
+    if not result['OK']:
+      return result
+    gCursors.delete(cursorID)
+    return S_OK()
+
   ########################################################################
   #
   # Administrative database operations
@@ -554,6 +702,15 @@ class FileCatalogHandler(RequestHandler):
     lfns = result['Value'].values()
     return S_OK(lfns)
 
+  types_explainFindFilesByMetadata = [DictType, StringTypes, StringTypes]
+
+  def export_explainFindFilesByMetadata(self, metaDict, path='/', strategy='Auto'):
+    """ Select the files satisfying the given metadata set, and return how it was done: the
+        plan of the query, with the estimated and found numbers of directories and files, and the times
+    """
+    return gFileCatalogDB.fmeta.explainFindFilesByMetadata(metaDict, path, self.getRemoteCredentials(),
+                                                           strategy=strategy)
+
   types_getReplicasByMetadata = [DictType, StringTypes, BooleanType]
 
   def export_getReplicasByMetadata(self, metaDict, path='/', allStatus=False):
@@ -49,6 +49,38 @@ from DIRAC.Resources.Catalog.FileCatalog import FileCatalog
 from datetime import datetime, timedelta
 import sys, os, time, fnmatch
 fc = FileCatalog()
+# Catalog able to list large directories by chunks, if any
+chunkCatalog = None
+for _catalogName, oCatalog, _master in fc.getReadCatalogs():
+  if hasattr( oCatalog, 'iterateDirectory' ):
+    chunkCatalog = oCatalog
+    break
+
+def iterateDirectory( currentDir ):
+  """ Generator of the contents of a directory, read by chunks if the catalog supports it, else at once """
+  if chunkCatalog:
+    nbChunks = 0
+    for res in chunkCatalog.iterateDirectory( currentDir, withMetadata, timeout = 360 ):
+      if not res['OK']:
+        break
+      nbChunks += 1
+      yield DIRAC.S_OK( ( res['Value']['SubDirs'], res['Value']['Files'] ) )
+    else:
+      return
+    if nbChunks:
+      # The chunks already handled can not be read again
+      yield res
+      return
+    # e.g. the service does not provide cursors
+    gLogger.verbose( "Failed to read the directory by chunks", "%s %s" % ( currentDir, res['Message'] ) )
+  res = fc.listDirectory( currentDir, withMetadata, timeout = 360 )
+  if not res['OK']:
+    yield res
+  elif currentDir in res['Value']['Failed']:
+    yield DIRAC.S_ERROR( res['Value']['Failed'][currentDir] )
+  else:
+    res = res['Value']['Successful'][currentDir]
+    yield DIRAC.S_OK( ( res['SubDirs'], res['Files'] ) )
 
 def isOlderThan( cTimeStruct, days ):
   timeDelta = timedelta( days = days )
@@ -91,45 +123,43 @@ baseDir = baseDir.rstrip( '/' )
 gLogger.notice( 'Will search for files in %s%s' % ( baseDir, ( ' matching %s' % wildcard ) if wildcard else '' ) )
 activeDirs = [baseDir]
 
-allFiles = []
+# The matching files are written as the chunks are read
+outputFileName = '%s.lfns' % baseDir.replace( '/%s' % vo, '%s' % vo ).replace( '/', '-' )
+outputFile = open( outputFileName, 'w' )
+nbFiles = 0
 emptyDirs = []
 
 while len( activeDirs ) > 0:
   currentDir = activeDirs.pop()
-  res = fc.listDirectory( currentDir, withMetadata, timeout = 360 )
-  if not res['OK']:
-    gLogger.error( "Error retrieving directory contents", "%s %s" % ( currentDir, res['Message'] ) )
-  elif currentDir in res['Value']['Failed']:
-    gLogger.error( "Error retrieving directory contents", "%s %s" % ( currentDir, res['Value']['Failed'][currentDir] ) )
+  nbDirFiles = 0
+  nbSubdirs = 0
+  isEmpty = True
+  for res in iterateDirectory( currentDir ):
+    if not res['OK']:
+      gLogger.error( "Error retrieving directory contents", "%s %s" % ( currentDir, res['Message'] ) )
+      break
+    subdirs, files = res['Value']
+    if subdirs or files:
+      isEmpty = False
+    nbSubdirs += len( subdirs )
+    for subdir in sorted( subdirs, reverse = True ):
+      if ( not withMetadata ) or isOlderThan( subdirs[subdir]['CreationDate'], totalDays ):
+        activeDirs.append( subdir )
+    for filename in sorted( files ):
+      if ( not withMetadata ) or isOlderThan( files[filename]['MetaData']['CreationDate'], totalDays ):
+        if wildcard is None or fnmatch.fnmatch( filename, wildcard ):
+          outputFile.write( filename + '\n' )
+          nbDirFiles += 1
   else:
-    dirContents = res['Value']['Successful'][currentDir]
-    subdirs = dirContents['SubDirs']
-    files = dirContents['Files']
-    if not subdirs and not files:
+    if isEmpty:
       emptyDirs.append( currentDir )
       gLogger.notice( '%s: empty directory' % currentDir )
-    else:
-      for subdir in sorted( subdirs, reverse = True ):
-        if ( not withMetadata ) or isOlderThan( subdirs[subdir]['CreationDate'], totalDays ):
-          activeDirs.append( subdir )
-      for filename in sorted( files ):
-        fileOK = False
-        if ( not withMetadata ) or isOlderThan( files[filename]['MetaData']['CreationDate'], totalDays ):
-          if wildcard is None or fnmatch.fnmatch( filename, wildcard ):
-            fileOK = True
-        if not fileOK:
-          files.pop( filename )
-      allFiles += sorted( files )
-
-      if len( files ) or len( subdirs ):
-        gLogger.notice( "%s: %d files%s, %d sub-directories" % ( currentDir, len( files ), ' matching' if withMetadata or wildcard else '', len( subdirs ) ) )
+    elif nbDirFiles or nbSubdirs:
+      gLogger.notice( "%s: %d files%s, %d sub-directories" % ( currentDir, nbDirFiles, ' matching' if withMetadata or wildcard else '', nbSubdirs ) )
+  nbFiles += nbDirFiles
 
-outputFileName = '%s.lfns' % baseDir.replace( '/%s' % vo, '%s' % vo ).replace( '/', '-' )
-outputFile = open( outputFileName, 'w' )
-for lfn in sorted( allFiles ):
-  outputFile.write( lfn + '\n' )
 outputFile.close()
-gLogger.notice( '%d matched files have been put in %s' % ( len( allFiles ), outputFileName ) )
+gLogger.notice( '%d matched files have been put in %s' % ( nbFiles, outputFileName ) )
 
 if emptyDirsFlag:
   outputFileName = '%s.emptydirs' % baseDir.replace( '/%s' % vo, '%s' % vo ).replace( '/', '-' )
@@ -29,6 +29,7 @@ __RCSID__ = '$Id$'
 import sys
 import time
 import errno
+import threading
 
 # # from DIRAC
 from DIRAC import S_OK, S_ERROR, gConfig
@@ -36,8 +37,13 @@ from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
 from DIRAC.Core.Base.AgentModule import AgentModule
 from DIRAC.ConfigurationSystem.Client import PathFinder
 from DIRAC.Core.Utilities.ProcessPool import ProcessPool
+from DIRAC.Core.Utilities.ThreadPool import ThreadPool
+from DIRAC.Core.Utilities.Subprocess import pythonCall
+from DIRAC.RequestManagementSystem.Client.Request import Request
 from DIRAC.RequestManagementSystem.Client.ReqClient import ReqClient
 from DIRAC.RequestManagementSystem.private.RequestTask import RequestTask
+from DIRAC.RequestManagementSystem.private.ExecutionSlots import ExecutionSlots, groupByOwner
+from DIRAC.RequestManagementSystem.private.OperationBatch import BATCH_TYPES, makeBatches
 
 from DIRAC.Core.Utilities.DErrno import cmpError
 # # agent name
@@ -66,10 +72,18 @@ class RequestExecutingAgent(AgentModule):
   """
   .. class:: RequestExecutingAgent
 
-  request processing agent using ProcessPool, Operation handlers and RequestTask
+  request processing agent using ProcessPool (or ThreadPool), Operation handlers and RequestTask
   """
   # # process pool
   __processPool = None
+  # # thread pool, used instead of the process pool in the Thread execution mode
+  __threadPool = None
+  # # number of threads of the thread pool
+  __threadPoolSize = 10
+  # # execution slots of the threads and of the batches
+  __executionSlots = None
+  # # maximum number of files of a batch of operations
+  __batchMaxFiles = 1000
   # # request cache
   __requestCache = {}
   # # requests/cycle
@@ -94,6 +108,8 @@ class RequestExecutingAgent(AgentModule):
   __requestClient = None
   # # Size of the bulk if use of getRequests. If 0, use getRequest
   __bulkRequest = 0
+  # # seconds between the renewals of the leases of the requests being executed
+  __leaseRenewalPeriod = 600
 
   def __init__(self, *args, **kwargs):
     """ c'tor """
@@ -114,6 +130,28 @@ class RequestExecutingAgent(AgentModule):
     self.log.info("ProcessPool sleep time = %d seconds" % self.__poolSleep)
     self.__bulkRequest = self.am_getOption("BulkRequest", 0)
     self.log.info("Bulk request size = %d" % self.__bulkRequest)
+    self.__leaseRenewalPeriod = int(self.am_getOption("LeaseRenewalPeriod", self.__leaseRenewalPeriod))
+    self.log.info("Lease renewal period = %d seconds" % self.__leaseRenewalPeriod)
+    # # Process: each request is executed in a process of the ProcessPool
+    # # Thread: the requests are executed by the threads of a ThreadPool, reusing their handlers
+    self.__threadMode = (self.am_getOption("ExecutionMode", "Process") == "Thread")
+    self.log.info("Execution mode = %s" % ("Thread" if self.__threadMode else "Process"))
+    self.__threadPoolSize = self.am_getOption("ThreadPoolSize", self.__threadPoolSize)
+    if self.__threadMode:
+      self.log.info("ThreadPool size = %d" % self.__threadPoolSize)
+    # # types of the operations of the requests of a bulk executed together
+    self.__batchTypes = []
+    for opType in self.am_getOption("BatchOperations", []):
+      if opType in BATCH_TYPES:
+        self.__batchTypes.append(opType)
+      else:
+        self.log.warn("Operations cannot be batched", "%s (only %s)" % (opType, ", ".join(BATCH_TYPES)))
+    self.__batchMaxFiles = self.am_getOption("BatchMaxFiles", self.__batchMaxFiles)
+    if self.__batchTypes:
+      self.log.info("Batched operations = %s, at most %d files" % (", ".join(self.__batchTypes),
+                                                                   self.__batchMaxFiles))
+      if not self.__bulkRequest:
+        self.log.warn("Operations are only batched when the requests are read in bulk (BulkRequest)")
 
     # # keep config path and agent name
     self.agentName = self.am_getModuleParam("fullName")
@@ -128,6 +166,8 @@ class RequestExecutingAgent(AgentModule):
     opHandlers = opHandlers["Value"]
 
     self.timeOuts = dict()
+    # # maximum number of operations of each type executed at the same time by the threads
+    operationLimits = dict()
 
     # # handlers dict
     self.handlersDict = dict()
@@ -145,6 +185,7 @@ class RequestExecutingAgent(AgentModule):
       fileTimeout = gConfig.getValue("%s/%s/TimeOutPerFile" % (opHandlersPath, opHandler), 0)
       if fileTimeout:
         self.timeOuts[opHandler]["PerFile"] = fileTimeout
+      operationLimits[opHandler] = gConfig.getValue("%s/%s/MaxConcurrency" % (opHandlersPath, opHandler), 0)
 
       self.handlersDict[opHandler] = opLocation
 
@@ -165,6 +206,15 @@ class RequestExecutingAgent(AgentModule):
     # # create request dict
     self.__requestCache = dict()
 
+    if self.__threadMode or self.__batchTypes:
+      # # the batches executed by the agent itself also use the proxy of their owner
+      self.__executionSlots = ExecutionSlots(operationLimits)
+    if self.__threadMode:
+      for opType, limit in self.__executionSlots.operationLimits.items():
+        self.log.info("At most %d %s operations executed at the same time" % (limit, opType))
+    # # handlers and clients of each thread, reused by all the requests it executes
+    self.__threadContext = threading.local()
+
     # ?? Probably should be removed
     self.FTSMode = self.am_getOption("FTSMode", False)
 
@@ -185,10 +235,23 @@ class RequestExecutingAgent(AgentModule):
       self.__processPool.daemonize()
     return self.__processPool
 
+  def threadPool(self):
+    """ facade for ThreadPool, used in the Thread execution mode """
+    if not self.__threadPool:
+      queueSize = abs(self.__queueSize)
+      self.log.info("REA ThreadPool configuration",
+                    "threads = %d queueSize = %d" % (self.__threadPoolSize, queueSize))
+      self.__threadPool = ThreadPool(self.__threadPoolSize, self.__threadPoolSize, queueSize)
+      # # the results are processed by the thread of the pool, as soon as they arrive
+      self.__threadPool.daemonize()
+    return self.__threadPool
+
   def requestClient(self):
-    """ RequestClient getter """
+    """ RequestClient getter, the agent always talks to the ReqManager with its certificate: in the Thread
+        execution mode the proxy of the process can be the one of the owner of the requests being executed
+    """
     if not self.__requestClient:
-      self.__requestClient = ReqClient()
+      self.__requestClient = ReqClient(useCertificates=True)
     return self.__requestClient
 
   def cacheRequest(self, request):
@@ -196,7 +259,7 @@ class RequestExecutingAgent(AgentModule):
 
     :param ~Request.Request request: Request instance
     """
-    maxProcess = max(self.__minProcess, self.__maxProcess)
+    maxProcess = self.__threadPoolSize if self.__threadMode else max(self.__minProcess, self.__maxProcess)
     if len(self.__requestCache) > maxProcess + 50:
       # For the time being we just print a warning... If the ProcessPool is working well, this is not needed
       # We don't know how much is acceptable as it depends on many factors
@@ -251,9 +314,36 @@ class RequestExecutingAgent(AgentModule):
         self.log.debug("putAllRequests: request %s has been put back with its initial state" % requestID)
     return S_OK()
 
+  def renewLeases(self):
+    """ extend the leases of the requests being executed, so that they are not claimed by another agent
+        while they wait for a free slot or execute long operations
+    """
+    requests = self.__requestCache.values()
+    if not requests:
+      return S_OK()
+    renewed = self.requestClient().renewLeases(requests)
+    if not renewed['OK']:
+      self.log.error("Could not renew the leases", renewed['Message'])
+      return renewed
+    for requestID, message in renewed['Value']['Failed'].iteritems():
+      # # the requests put back meanwhile have no lease anymore
+      if requestID in self.__requestCache:
+        self.log.warn("Lease lost, the request will not be put back", "%s: %s" % (requestID, message))
+    self.log.verbose("Renewed leases", "of %d requests" % len(renewed['Value']['Successful']))
+    return renewed
+
+  def __renewLeasesLoop(self):
+    """ renew the leases periodically, independently of the execution cycles """
+    while True:
+      time.sleep(self.__leaseRenewalPeriod)
+      self.renewLeases()
+
   def initialize(self):
     """ initialize agent
     """
+    renewal = threading.Thread(target=self.__renewLeasesLoop, name="LeaseRenewal")
+    renewal.setDaemon(True)
+    renewal.start()
     return S_OK()
 
   def execute(self):
@@ -291,12 +381,34 @@ class RequestExecutingAgent(AgentModule):
 
         requestsToExecute = getRequests["Value"]["Successful"].values()
 
+      if self.__batchTypes and len(requestsToExecute) > 1:
+        requestsToExecute, putBack = self.executeBatches(requestsToExecute)
+        if putBack:
+          gMonitor.addMark("Processed", putBack)
+          taskCounter += putBack
+
       self.log.info("execute: will execute requests ", "%s" % len(requestsToExecute))
 
+      if self.__threadMode:
+        # # the threads execute the requests of one owner at a time (see ExecutionSlots)
+        requestsToExecute = groupByOwner(requestsToExecute)
+
       for request in requestsToExecute:
         # # set task id
         taskID = request.RequestID
 
+        if self.__threadMode:
+          queued = self.queueInThreadPool(request)
+          if not queued['OK']:
+            self.putAllRequests()
+            return queued
+          if queued['Value']:
+            # # update monitor
+            gMonitor.addMark("Processed", 1)
+            # # update request counter
+            taskCounter += 1
+          continue
+
         self.log.info("processPool status", "tasks idle = %s working = %s" %
                       (self.processPool().getNumIdleProcesses(), self.processPool().getNumWorkingProcesses()))
 
@@ -357,6 +469,11 @@ class RequestExecutingAgent(AgentModule):
               time.sleep(0.1)
               break
 
+    if self.__threadMode:
+      # # the results are processed by the thread pool as they arrive
+      self.log.info("Requests still executed", "(%d requests in cache)" % len(self.__requestCache))
+      return S_OK()
+
     self.log.info("Flushing callbacks", "(%d requests still in cache)" % len(self.__requestCache))
     processed = self.processPool().processResults()
     # This happens when the result queue is screwed up.
@@ -369,6 +486,146 @@ class RequestExecutingAgent(AgentModule):
     # # clean return
     return S_OK()
 
+  def queueInThreadPool(self, request):
+    """ queue a request in the thread pool, waiting for a free slot if it is full
+
+    :param ~Request.Request request: Request instance
+    :return: S_OK( True ) if the request is queued, S_OK( False ) if it is skipped, S_ERROR if the cache is full
+    """
+    res = self.cacheRequest(request)
+    if not res['OK']:
+      if cmpError(res, errno.EALREADY):
+        return S_OK(False)
+      self.log.error("Too many requests in cache",
+                     '(%d requests): put back all requests and exit cycle. Error %s' %
+                     (len(self.__requestCache), res['Message']))
+      return res
+    # # the task works on its own copy: the cached request is put back as it is if the task fails
+    result = request.toJSON()
+    if not result['OK']:
+      return S_OK(False)
+    if self.threadPool().isFull():
+      self.log.info("No free slot in the threadPool", "waiting for one")
+    self.log.info("queueing task for request", "'%s/%s'" % (request.RequestID, request.RequestName))
+    # # blocks until a thread takes a queued request
+    enqueue = self.threadPool().generateJobAndQueueIt(self.executeInThread,
+                                                      args=(result['Value'],),
+                                                      sTJId=request.RequestID,
+                                                      oCallback=self.threadResultCallback,
+                                                      oExceptionCallback=self.threadExceptionCallback,
+                                                      blocking=True)
+    if not enqueue['OK']:
+      self.log.error("Could not enqueue task", enqueue["Message"])
+      return S_OK(False)
+    return S_OK(True)
+
+  def executeInThread(self, requestJSON):
+    """ execute a request in a thread of the pool, with the operation handlers and the client of the thread
+
+    :param str requestJSON: request serialized to JSON
+    :return: S_OK(Request)/S_ERROR(Message)
+    """
+    context = self.__getThreadContext()
+    task = RequestTask(requestJSON, self.handlersDict, self.__configPath, self.agentName,
+                       requestClient=context.requestClient,
+                       handlers=context.handlers,
+                       executionSlots=self.__executionSlots)
+    return task()
+
+  def __getThreadContext(self):
+    """ operation handlers and request client of the current thread """
+    context = self.__threadContext
+    if not hasattr(context, "handlers"):
+      context.handlers = dict()
+      # # the requests are put back with the certificate of the agent, as in the Process execution mode
+      context.requestClient = ReqClient(useCertificates=True)
+    return context
+
+  def executeBatches(self, requests):
+    """ execute together the waiting operations of requests which can be batched (see OperationBatch),
+        then put back the requests of which these operations are not finished
+
+    :param list requests: Request instances
+    :return: tuple (list of the requests to execute, number of requests put back)
+    """
+    # # the requests still executed are not executed again
+    candidates = [request for request in requests if request.RequestID not in self.__requestCache]
+    batches = makeBatches(candidates, self.__batchTypes, self.__batchMaxFiles)
+    if not batches:
+      return requests, 0
+
+    context = self.__getThreadContext()
+    putBack = set()
+    for batch in batches:
+      batchRequest = batch.getRequest()
+      self.log.info("executing batch", "%s: %d files of %d requests" % (batchRequest.RequestName,
+                                                                        len(batchRequest[0]),
+                                                                        len(batch.requests)))
+      task = RequestTask(batchRequest.toJSON()['Value'], self.handlersDict, self.__configPath, self.agentName,
+                         requestClient=context.requestClient,
+                         handlers=context.handlers,
+                         executionSlots=self.__executionSlots,
+                         batch=True)
+      result = self.__executeBatchTask(task, batchRequest)
+      if not result['OK']:
+        self.log.error("Batch execution failed", "%s: %s" % (batchRequest.RequestName, result['Message']))
+        continue
+      # # the requests of which the files are all processed go on with their next operation
+      for request in batch.fanOut(result['Value']):
+        reset = self.requestClient().putRequest(request, useFailoverProxy=False, retryMainService=2)
+        if not reset['OK']:
+          self.log.error("Could not put back request", "%s: %s" % (request.RequestID, reset['Message']))
+          continue
+        putBack.add(request.RequestID)
+    return [request for request in requests if request.RequestID not in putBack], len(putBack)
+
+  def __executeBatchTask(self, task, batchRequest):
+    """ execute the task of a batch: in the Process execution mode, it is executed in a child process killed
+        after the timeout of the batch, as the tasks of the ProcessPool
+
+    :param RequestTask task: task of the batch
+    :param ~Request.Request batchRequest: request of the batch
+    :return: S_OK(Request)/S_ERROR(Message)
+    """
+    if self.__threadMode:
+      # # threads cannot be killed: no timeout, as for the requests executed by the threads
+      return task()
+    result = pythonCall(self.getTimeout(batchRequest), self.__executeTaskToJSON, task)
+    # # the result of the task is wrapped in the result of the call
+    if result['OK']:
+      result = result['Value']
+    if not result['OK']:
+      return result
+    return S_OK(Request(result['Value']))
+
+  @staticmethod
+  def __executeTaskToJSON(task):
+    """ execute a task in a child process, the request is sent back to the agent in JSON
+
+    :param RequestTask task: task to execute
+    :return: S_OK(request serialized to JSON)/S_ERROR(Message)
+    """
+    result = task()
+    if not result['OK']:
+      return result
+    return result['Value'].toJSON()
+
+  def threadResultCallback(self, threadedJob, taskResult):
+    """ result callback of the threads
+
+    :param threadedJob: ThreadedJob of the request
+    :param dict taskResult: task result S_OK(Request)/S_ERROR(Message)
+    """
+    self.resultCallback(threadedJob.jobId(), taskResult)
+
+  def threadExceptionCallback(self, threadedJob, exceptionInfo):
+    """ exception callback of the threads
+
+    :param threadedJob: ThreadedJob of the request
+    :param tuple exceptionInfo: sys.exc_info() of the exception
+    """
+    self.exceptionCallback(threadedJob.jobId(), exceptionInfo[1])
+
   def getTimeout(self, request):
     """ get timeout for request """
     timeout = 0
@@ -388,6 +645,11 @@ class RequestExecutingAgent(AgentModule):
     """ agent finalization """
     if self.__processPool:
       self.processPool().finalize(timeout=self.__poolTimeout)
+    if self.__threadPool:
+      # # threads cannot be killed: wait for the requests being executed, at most the pool timeout
+      endTime = time.time() + self.__poolTimeout
+      while self.__threadPool.isWorking() and time.time() < endTime:
+        time.sleep(1)
     self.putAllRequests()
     return S_OK()
 
@@ -0,0 +1,83 @@
+""" Test class for the RequestExecutingAgent
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+from mock import MagicMock
+
+from DIRAC import S_OK, S_ERROR, gLogger
+from DIRAC.RequestManagementSystem.Agent.RequestExecutingAgent import RequestExecutingAgent
+
+MODULE = "DIRAC.RequestManagementSystem.Agent.RequestExecutingAgent"
+
+
+def makeAgent(mocker, options):
+  """ RequestExecutingAgent with the given options and a RemoveFile handler """
+  mocker.patch(MODULE + ".AgentModule.__init__")
+  mocker.patch.object(RequestExecutingAgent, "log", gLogger, create=True)
+  mocker.patch(MODULE + ".AgentModule.am_getOption",
+               side_effect=lambda name, default=None: options.get(name, default))
+  mocker.patch(MODULE + ".AgentModule.am_getModuleParam", return_value="RequestManagement/RequestExecutingAgent")
+  mocker.patch(MODULE + ".PathFinder.getAgentSection", return_value="/Agents/RequestExecutingAgent")
+  configMock = mocker.patch(MODULE + ".gConfig")
+  configMock.getSections.return_value = S_OK(["RemoveFile"])
+  configMock.getValue.side_effect = lambda path, default=None: ("DIRAC/DataManagementSystem/Agent/"
+                                                                "RequestOperations/RemoveFile"
+                                                                if path.endswith("/Location") else default)
+  mocker.patch(MODULE + ".gMonitor")
+  return RequestExecutingAgent()
+
+
+def makeRequest(requestID, ownerDN):
+  request = MagicMock(RequestID=requestID, RequestName="request%d" % requestID,
+                      OwnerDN=ownerDN, OwnerGroup="dirac_user", Status="Waiting")
+  return request
+
+
+def test_ownerProxy(mocker):
+  """ While the threads use the proxy of an owner, the agent puts back the requests of another owner
+      with its certificate """
+  reqClientMock = mocker.patch(MODULE + ".ReqClient")
+  reqClientMock.return_value.putRequest.return_value = S_OK()
+  agent = makeAgent(mocker, {"ExecutionMode": "Thread"})
+  executionSlots = agent._RequestExecutingAgent__executionSlots
+
+  # A request of the first owner is being executed
+  task = MagicMock(request=makeRequest(1, "/DN=first"))
+  task.setupProxy.return_value = S_OK({"Shifter": [], "ProxyFile": "/tmp/first"})
+  assert executionSlots.enterOwner(task)["OK"]
+  try:
+    # The result of a request of the second owner arrives meanwhile
+    request = makeRequest(2, "/DN=second")
+    assert agent.cacheRequest(request)["OK"]
+    agent.resultCallback(2, S_OK(request))
+    reqClientMock.return_value.putRequest.assert_called_once_with(request, useFailoverProxy=False,
+                                                                  retryMainService=2)
+    # The clients of the threads use the certificate as well
+    agent._RequestExecutingAgent__getThreadContext()
+  finally:
+    executionSlots.leaveOwner()
+
+  assert reqClientMock.call_count == 2
+  for call in reqClientMock.call_args_list:
+    assert call == mocker.call(useCertificates=True)
+
+
+def test_batchTimeout(mocker):
+  """ In the Process execution mode, the batches are executed in a child process, with the timeout of their files,
+      and their requests are executed one by one if the batch timed out """
+  mocker.patch(MODULE + ".ReqClient")
+  agent = makeAgent(mocker, {"BatchOperations": ["RemoveFile"], "BulkRequest": 10})
+  requests = [makeRequest(1, "/DN=first"), makeRequest(2, "/DN=first")]
+  batch = MagicMock(requests=requests)
+  batch.getRequest.return_value = MagicMock(RequestName="batch")
+  mocker.patch(MODULE + ".makeBatches", return_value=[batch])
+  taskMock = mocker.patch(MODULE + ".RequestTask")
+  mocker.patch.object(agent, "getTimeout", return_value=1234)
+  pythonCallMock = mocker.patch(MODULE + ".pythonCall", return_value=S_ERROR('1234 seconds timeout for "call" call'))
+
+  assert agent.executeBatches(requests) == (requests, 0)
+  assert pythonCallMock.call_args[0][0] == 1234
+  # # the task is only executed by the child process
+  taskMock.return_value.assert_not_called()
+  batch.fanOut.assert_not_called()
@@ -24,10 +24,11 @@ import six
 from DIRAC import S_OK, S_ERROR
 from DIRAC.Core.Utilities.File import checkGuid
 from DIRAC.RequestManagementSystem.private.JSONUtils import RMSEncoder
+from DIRAC.RequestManagementSystem.private.ChangeTracking import ChangeTracking, CHANGES_KEY
 
 
 ########################################################################
-class File(object):
+class File(ChangeTracking):
 
   """
    A bag object holding Operation file attributes.
@@ -48,6 +49,10 @@ class File(object):
 
   """
 
+  # # attributes stored in the DB
+  TRACKED_ATTRIBUTES = ("Status", "LFN", "PFN", "ChecksumType", "Checksum", "GUID", "Attempt",
+                        "Size", "Error")
+
   _datetimeFormat = '%Y-%m-%d %H:%M:%S'
 
   def __init__(self, fromDict=None):
@@ -67,6 +72,7 @@ class File(object):
     self.Size = 0
     self.Error = None
     self._duration = 0
+    self._changes = None
 
     # This variable is used in the setter to know whether they are called
     # because of the json initialization or not
@@ -75,6 +81,7 @@ class File(object):
     fromDict = fromDict if isinstance(fromDict, dict)\
         else json.loads(fromDict) if isinstance(fromDict, six.string_types)\
         else {}
+    changes = fromDict.pop(CHANGES_KEY, None)
 
     for attrName, attrValue in fromDict.iteritems():
       # The JSON module forces the use of UTF-8, which is not properly
@@ -85,6 +92,10 @@ class File(object):
       if attrValue:
         setattr(self, attrName, attrValue)
 
+    # A File read from the DB tracks its changes
+    if getattr(self, 'FileID', None):
+      self._startTracking(changes)
+
     self.initialLoading = False
 
   @property
@@ -194,4 +205,6 @@ class File(object):
       else:
         jsonData[attrName] = value
 
+    jsonData[CHANGES_KEY] = self._getJSONChanges()
+
     return jsonData
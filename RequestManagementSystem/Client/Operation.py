@@ -22,12 +22,13 @@ import six
 from DIRAC import S_OK, S_ERROR
 from DIRAC.RequestManagementSystem.Client.File import File
 from DIRAC.RequestManagementSystem.private.JSONUtils import RMSEncoder
+from DIRAC.RequestManagementSystem.private.ChangeTracking import ChangeTracking, CHANGES_KEY
 
 
 
 
 ########################################################################
-class Operation( object ):
+class Operation( ChangeTracking ):
   """
   :param long OperationID: OperationID as read from DB backend
   :param long RequestID: parent RequestID
@@ -58,6 +59,9 @@ class Operation( object ):
   ATTRIBUTE_NAMES = ['OperationID', 'RequestID', "Type", "Status", "Arguments",
                      "Order", "SourceSE", "TargetSE", "Catalog", "Error",
                      "CreationTime", "SubmitTime", "LastUpdate"]
+  # # attributes stored in the DB
+  TRACKED_ATTRIBUTES = ( "Type", "Status", "Arguments", "Order", "SourceSE", "TargetSE", "Catalog", "Error",
+                         "CreationTime", "SubmitTime", "LastUpdate" )
 
   _datetimeFormat = '%Y-%m-%d %H:%M:%S'
 
@@ -70,6 +74,7 @@ class Operation( object ):
     :param dict fromDict: attributes dictionary
     """
     self._parent = None
+    self._changes = None
 
     now = datetime.datetime.utcnow().replace( microsecond = 0 )
     self._SubmitTime = now
@@ -91,6 +96,7 @@ class Operation( object ):
     fromDict = fromDict if isinstance( fromDict, dict )\
                else json.loads(fromDict) if isinstance(fromDict, six.string_types)\
                else {}
+    changes = fromDict.pop( CHANGES_KEY, None )
 
 
     if "Files" in fromDict:
@@ -108,6 +114,10 @@ class Operation( object ):
       if value:
         setattr( self, key, value )
 
+    # An Operation read from the DB tracks its changes, its status is set again by its parent Request
+    if getattr( self, 'OperationID', None ):
+      self._startTracking( changes, Status = fromDict.get( "Status", self._Status ) )
+
 
   # # protected methods for parent only
   def _notify( self ):
@@ -169,6 +179,7 @@ class Operation( object ):
     if opFile not in self:
       self.__files__.append( opFile )
       opFile._parent = self
+      self._forgetChanges()
     self._notify()
 
   # # helpers for looping
@@ -183,12 +194,14 @@ class Operation( object ):
   def __delitem__( self, i ):
     """ remove file from op, only if OperationID is NOT set """
     self.__files__.__delitem__( i )
+    self._forgetChanges()
     self._notify()
 
   def __setitem__( self, i, opFile ):
     """ overwrite opFile """
     self.__files__.__setitem__( i, opFile )
     opFile._parent = self
+    self._forgetChanges()
     self._notify()
 
   def fileStatusList( self ):
@@ -354,5 +367,6 @@ class Operation( object ):
         jsonData[attrName] = value
 
     jsonData['Files'] = self.__files__
+    jsonData[CHANGES_KEY] = self._getJSONChanges()
 
     return jsonData
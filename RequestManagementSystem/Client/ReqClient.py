@@ -19,6 +19,7 @@ from DIRAC.Core.DISET.RPCClient import RPCClient
 from DIRAC.Core.Utilities.List import randomize, fromChar
 from DIRAC.Core.Utilities.JEncode import strToIntDict
 from DIRAC.Core.Utilities.DEncode import ignoreEncodeWarning
+from DIRAC.Core.Utilities.DErrno import cmpError, ERMSLEASE
 from DIRAC.ConfigurationSystem.Client import PathFinder
 from DIRAC.Core.Base.Client import Client, createClient
 from DIRAC.RequestManagementSystem.Client.Request import Request
@@ -95,6 +96,10 @@ class ReqClient(Client):
       setRequestMgr = self._getRPC().putRequest(requestJSON)
       if setRequestMgr["OK"]:
         return setRequestMgr
+      # the request was claimed again since it was read: it must not be put back, neither later nor elsewhere
+      if cmpError(setRequestMgr, ERMSLEASE):
+        self.log.warn("putRequest: request '%s' lost its lease" % request.RequestName, setRequestMgr["Message"])
+        return setRequestMgr
       errorsDict["RequestManager"] = setRequestMgr["Message"]
       # sleep a bit
       time.sleep(random.randint(1, 5))
@@ -167,6 +172,26 @@ class ReqClient(Client):
     failed = strToIntDict(getRequests["Value"]["Failed"])
     return S_OK({"Successful": reqInstances, "Failed": failed})
 
+  def renewLeases(self, requests):
+    """ extend the leases of requests assigned to the caller, e.g. while their execution lasts
+
+    :param self: self reference
+    :param list requests: Request instances, as given by getRequest or getBulkRequests
+
+    :return: S_OK( Successful : { requestID, new lease expiry }, Failed : { requestID, message } ) or S_ERROR
+    """
+    leases = dict((request.RequestID, request.LeaseOwner) for request in requests
+                  if getattr(request, 'LeaseOwner', None))
+    if not leases:
+      return S_OK({"Successful": {}, "Failed": {}})
+    self.log.debug("renewLeases: attempting to renew %d leases." % len(leases))
+    renewLeases = self._getRPC().renewLeases(leases)
+    if not renewLeases["OK"]:
+      self.log.error("renewLeases: unable to renew leases", renewLeases["Message"])
+      return renewLeases
+    return S_OK({"Successful": strToIntDict(renewLeases["Value"]["Successful"]),
+                 "Failed": strToIntDict(renewLeases["Value"]["Failed"])})
+
   def peekRequest(self, requestID):
     """ peek request """
     self.log.debug("peekRequest: attempting to get request.")
@@ -220,6 +245,14 @@ class ReqClient(Client):
       self.log.error("getDBSummary: unable to get RequestDB summary", dbSummary["Message"])
     return dbSummary
 
+  def getSchedulingSummary(self):
+    """ Get the depth of the queues of the requests to execute, by type of their waiting operation. """
+    self.log.debug("getSchedulingSummary: attempting to get the queues of the RequestDB.")
+    summary = self._getRPC().getSchedulingSummary()
+    if not summary["OK"]:
+      self.log.error("getSchedulingSummary: unable to get the queues of the RequestDB", summary["Message"])
+    return summary
+
   def getDigest(self, requestID):
     """ Get the request digest given a request ID.
 
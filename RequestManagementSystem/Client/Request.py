@@ -24,11 +24,12 @@ from DIRAC import S_OK, S_ERROR
 from DIRAC.Core.Security.ProxyInfo import getProxyInfo
 from DIRAC.RequestManagementSystem.Client.Operation import Operation
 from DIRAC.RequestManagementSystem.private.JSONUtils import RMSEncoder
+from DIRAC.RequestManagementSystem.private.ChangeTracking import ChangeTracking, CHANGES_KEY
 from DIRAC.DataManagementSystem.Utilities.DMSHelpers import DMSHelpers
 
 
 ########################################################################
-class Request( object ):
+class Request( ChangeTracking ):
   """
   :param int RequestID: requestID
   :param str Name: request' name
@@ -42,6 +43,7 @@ class Request( object ):
   :param datetime.datetime LastUpdate: UTC datetime
   :param datetime.datetime NotBefore: UTC datetime
   :param str Status: request's status
+  :param str LeaseOwner: token of the lease of a request claimed for execution, not stored in the DB
   :param TypedList.TypedList operations: list of operations
 
   It is managed by SQLAlchemy, so the RequestID should never be set by hand (except when constructed from
@@ -52,6 +54,10 @@ class Request( object ):
 
   FINAL_STATES = ( "Done", "Failed", "Canceled" )
 
+  # # attributes stored in the DB
+  TRACKED_ATTRIBUTES = ( "RequestName", "OwnerDN", "OwnerGroup", "Status", "Error", "DIRACSetup", "SourceComponent",
+                         "JobID", "CreationTime", "SubmitTime", "LastUpdate", "NotBefore" )
+
   _datetimeFormat = '%Y-%m-%d %H:%M:%S'
 
 
@@ -62,6 +68,7 @@ class Request( object ):
     :param fromDict: if false, new request. Can be json string that represents the object, or the dictionary directly
     """
     self.__waiting = None
+    self._changes = None
 
     now = datetime.datetime.utcnow().replace( microsecond = 0 )
 
@@ -94,6 +101,7 @@ class Request( object ):
     fromDict = fromDict if isinstance( fromDict, dict )\
                else json.loads(fromDict) if isinstance(fromDict, six.string_types)\
                 else {}
+    changes = fromDict.pop( CHANGES_KEY, None )
 
 
     if "Operations" in fromDict:
@@ -112,6 +120,10 @@ class Request( object ):
       if value:
         setattr( self, key, value )
 
+    # A Request read from the DB tracks its changes
+    if getattr( self, 'RequestID', None ):
+      self._startTracking( changes )
+
     self._notify()
 
 
@@ -187,6 +199,7 @@ class Request( object ):
     if operation not in self:
       self.__operations__.append( operation )
       operation._parent = self
+      self._forgetChanges()
       self._notify()
     return self
 
@@ -202,6 +215,7 @@ class Request( object ):
     if newOperation in self:
       return S_ERROR( "%s is already in" % newOperation )
     self.__operations__.insert( self.__operations__.index( existingOperation ), newOperation )
+    self._forgetChanges()
     self._notify()
     return S_OK()
 
@@ -217,6 +231,7 @@ class Request( object ):
     if newOperation in self:
       return S_ERROR( "%s is already in" % newOperation )
     self.__operations__.insert( self.__operations__.index( existingOperation ) + 1, newOperation )
+    self._forgetChanges()
     self._notify()
     return S_OK()
 
@@ -248,12 +263,14 @@ class Request( object ):
     """ self[i] = val """
 
     self.__operations__.__setitem__( i, value )
+    self._forgetChanges()
     self._notify()
 
   def __delitem__( self, i ):
     """ del self[i]"""
 
     self.__operations__.__delitem__( i )
+    self._forgetChanges()
     self._notify()
 
   def indexOf( self, subReq ):
@@ -389,7 +406,7 @@ class Request( object ):
 
     attrNames = ['RequestID', "RequestName", "OwnerDN", "OwnerGroup",
                  "Status", "Error", "DIRACSetup", "SourceComponent",
-                 "JobID", "CreationTime", "SubmitTime", "LastUpdate", "NotBefore"]
+                 "JobID", "CreationTime", "SubmitTime", "LastUpdate", "NotBefore", "LeaseOwner"]
     jsonData = {}
 
     for attrName in attrNames :
@@ -407,6 +424,7 @@ class Request( object ):
         jsonData[attrName] = value
 
     jsonData['Operations'] = self.__operations__
+    jsonData[CHANGES_KEY] = self._getJSONChanges()
 
     return jsonData
 
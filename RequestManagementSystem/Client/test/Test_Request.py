@@ -26,6 +26,7 @@ __RCSID__ = "$Id$"
 
 # # imports
 import six
+import json
 import unittest
 import datetime
 # # from DIRAC
@@ -481,6 +482,56 @@ class RequestTests(unittest.TestCase):
         self.assertEqual(len(r[2]), 1, 'Wrong number of files: %d' % len(r[1]))
         self.assertEqual(len(r[3]), 2, 'Wrong number of files: %d' % len(r[1]))
 
+  def test_09Changes(self):
+    """ changes tracked through the JSON of a request read from the DB """
+    r = Request({"RequestName": "changes"})
+    op = Operation({"Type": "RemoveFile"})
+    for i in range(3):
+      op.addFile(File({"LFN": "/a/b/%d" % i}))
+    r.addOperation(op)
+
+    # new objects: the changes are unknown
+    self.assertEqual(r._getChangedAttributes(), None)
+    self.assertEqual(op[0]._getChangedAttributes(), None)
+
+    # as read from the DB
+    jsonDict = json.loads(r.toJSON()["Value"])
+    jsonDict.update({"RequestID": 1, "ChangedAttributes": []})
+    jsonDict["Operations"][0].update({"OperationID": 2, "Status": "Waiting", "ChangedAttributes": []})
+    for i, fileDict in enumerate(jsonDict["Operations"][0]["Files"]):
+      fileDict.update({"FileID": 3 + i, "ChangedAttributes": []})
+    r = Request(jsonDict)
+    self.assertEqual(r._getChangedAttributes(), [])
+    self.assertEqual(r[0]._getChangedAttributes(), [])
+    self.assertEqual([opFile._getChangedAttributes() for opFile in r[0]], [[], [], []])
+
+    r[0][1].Attempt += 1
+    r[0][1].Error = "an error"
+
+    # the changes travel with the JSON
+    r = Request(r.toJSON()["Value"])
+    self.assertEqual([opFile._getChangedAttributes() for opFile in r[0]], [[], ["Attempt", "Error"], []])
+    r[0][1].Status = "Done"
+    self.assertEqual(r[0][1]._getChangedAttributes(), ["Attempt", "Error", "Status"])
+    self.assertEqual(r[0][2]._getChangedAttributes(), [])
+
+    # a removed File makes the changes of its Operation unknown
+    del r[0][0]
+    self.assertEqual(r[0]._getChangedAttributes(), None)
+    r = Request(r.toJSON()["Value"])
+    self.assertEqual(r[0]._getChangedAttributes(), None)
+    self.assertEqual(r._getChangedAttributes(), [])
+
+  def test_10LeaseOwner(self):
+    """ the token of the lease of a claimed request travels with its JSON """
+    r = Request({"RequestName": "lease"})
+    self.assertFalse("LeaseOwner" in json.loads(r.toJSON()["Value"]))
+
+    r.LeaseOwner = "/DN=agent#0123"
+    r = Request(r.toJSON()["Value"])
+    self.assertEqual(r.LeaseOwner, "/DN=agent#0123")
+
+
 # # test execution
 if __name__ == "__main__":
 
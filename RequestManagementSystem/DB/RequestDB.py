@@ -17,26 +17,35 @@
     db holding Request, Operation and File
 """
 import six
-import random
+import uuid
 
 import datetime
 
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm import relationship, backref, sessionmaker, joinedload, mapper
-from sqlalchemy.sql import update
-from sqlalchemy import create_engine, func, Table, Column, MetaData, ForeignKey, \
+from sqlalchemy.sql import update, select, case, and_, or_
+from sqlalchemy import create_engine, func, inspect, Table, Column, MetaData, ForeignKey, Index, \
     Integer, String, DateTime, Enum, BLOB, BigInteger, distinct
 
 # # from DIRAC
 from DIRAC import S_OK, S_ERROR, gLogger
+from DIRAC.Core.Utilities import DErrno
 from DIRAC.RequestManagementSystem.Client.Request import Request
 from DIRAC.RequestManagementSystem.Client.Operation import Operation
 from DIRAC.RequestManagementSystem.Client.File import File
+from DIRAC.RequestManagementSystem.private.RequestScheduler import RequestScheduler, PENDING_STATUSES
 from DIRAC.ConfigurationSystem.Client.Utilities import getDBParameters
 
 
 __RCSID__ = "$Id $"
 
+# Default number of seconds during which the requests claimed by an agent are assigned to it
+LEASE_TIME = 3600
+# Maximum number of rows changed by a single UPDATE of putRequest
+BULK_UPDATE_SIZE = 1000
+# Maximum number of UPDATEs of a claim, when concurrent claimers took some of the chosen requests
+CLAIM_ATTEMPTS = 5
+
 
 # Metadata instance that is used to bind the engine, Object and tables
 metadata = MetaData()
@@ -124,22 +133,35 @@ requestTable = Table('Request', metadata,
                      Column('RequestID', Integer, primary_key=True),
                      Column('SourceComponent', BLOB),
                      Column('NotBefore', DateTime),
+                     Column('LeaseOwner', String(255), index=True),
+                     Column('LeaseExpiry', DateTime),
+                     Column('OperationType', String(64)),
+                     Column('Priority', Integer, server_default='0'),
+                     Index('ix_Request_Status_LastUpdate', 'Status', 'LastUpdate'),
                      mysql_engine='InnoDB')
 
-# Map the Request object to the requestTable, with a few special attributes
+# The candidates of a claim are read by decreasing priority, then from the oldest
+Index('ix_Request_Status_Priority_LastUpdate',
+      requestTable.c.Status, requestTable.c.Priority.desc(), requestTable.c.LastUpdate)
 
-mapper(Request, requestTable, properties={'_CreationTime': requestTable.c.CreationTime,
-                                          '_Status': requestTable.c.Status,
-                                          '_LastUpdate': requestTable.c.LastUpdate,
-                                          '_SubmitTime': requestTable.c.SubmitTime,
-                                          '_NotBefore': requestTable.c.NotBefore,
-                                          '__operations__': relationship(Operation,
-                                                                         backref=backref('_parent',
-                                                                                         lazy='immediate'),
-                                                                         order_by=operationTable.c.Order,
-                                                                         lazy='immediate',
-                                                                         passive_deletes=True,
-                                                                         cascade="all, delete-orphan")})
+# Map the Request object to the requestTable, with a few special attributes
+# The lease and scheduling columns are only used by the DB, they are not attributes of the Request
+# (the token of the lease is given to the claimer in the LeaseOwner attribute of the claimed requests,
+# see claimRequests)
+
+mapper(Request, requestTable, exclude_properties=['LeaseOwner', 'LeaseExpiry', 'OperationType', 'Priority'],
+       properties={'_CreationTime': requestTable.c.CreationTime,
+                   '_Status': requestTable.c.Status,
+                   '_LastUpdate': requestTable.c.LastUpdate,
+                   '_SubmitTime': requestTable.c.SubmitTime,
+                   '_NotBefore': requestTable.c.NotBefore,
+                   '__operations__': relationship(Operation,
+                                                  backref=backref('_parent',
+                                                                  lazy='immediate'),
+                                                  order_by=operationTable.c.Order,
+                                                  lazy='immediate',
+                                                  passive_deletes=True,
+                                                  cascade="all, delete-orphan")})
 
 
 ########################################################################
@@ -187,14 +209,72 @@ class RequestDB(object):
 
     self.DBSession = sessionmaker(bind=self.engine)
 
+    # Seconds during which the claimed requests are assigned to their claimer
+    self.leaseTime = LEASE_TIME
+    # Choice of the claimed requests
+    self.scheduler = RequestScheduler()
+
   def createTables(self):
     """ create tables """
     try:
       metadata.create_all(self.engine)
+      self.__addColumns()
     except Exception as e:
       return S_ERROR(e)
     return S_OK()
 
+  def __addColumns(self):
+    """ Add the lease and scheduling columns and their indexes to a Request table created before they existed """
+    inspector = inspect(self.engine)
+    columns = set(column['name'] for column in inspector.get_columns('Request'))
+    indexes = set(index['name'] for index in inspector.get_indexes('Request'))
+    alterations = []
+    if 'LeaseOwner' not in columns:
+      alterations.append("ADD COLUMN `LeaseOwner` VARCHAR(255)")
+    if 'LeaseExpiry' not in columns:
+      alterations.append("ADD COLUMN `LeaseExpiry` DATETIME")
+    if 'ix_Request_LeaseOwner' not in indexes:
+      alterations.append("ADD INDEX `ix_Request_LeaseOwner` (`LeaseOwner`)")
+    if 'ix_Request_Status_LastUpdate' not in indexes:
+      alterations.append("ADD INDEX `ix_Request_Status_LastUpdate` (`Status`, `LastUpdate`)")
+    if 'OperationType' not in columns:
+      alterations.append("ADD COLUMN `OperationType` VARCHAR(64)")
+    if 'Priority' not in columns:
+      alterations.append("ADD COLUMN `Priority` INTEGER DEFAULT '0'")
+    if 'ix_Request_Status_Priority_LastUpdate' not in indexes:
+      alterations.append("ADD INDEX `ix_Request_Status_Priority_LastUpdate` (`Status`, `Priority` DESC, `LastUpdate`)")
+    if alterations:
+      self.log.info("Adding the lease and scheduling columns to the Request table")
+      self.engine.execute("ALTER TABLE `Request` %s" % ', '.join(alterations))
+    if 'OperationType' not in columns or 'Priority' not in columns:
+      self.__fillSchedulingColumns()
+
+  def __fillSchedulingColumns(self):
+    """ Set the scheduling columns of the requests still to execute, put before the columns existed,
+        as getSchedulingValues of the scheduler does
+    """
+    nextOperationType = select([operationTable.c.Type]) \
+        .where(operationTable.c.RequestID == requestTable.c.RequestID) \
+        .where(operationTable.c.Status.in_(PENDING_STATUSES)) \
+        .order_by(operationTable.c.Order) \
+        .limit(1) \
+        .as_scalar()
+    jobPriority = case([(requestTable.c.JobID > 0, self.scheduler.jobPriority)], else_=0)
+    if self.scheduler.operationPriorities:
+      priority = case([(requestTable.c.OperationType == operationType, operationPriority)
+                       for operationType, operationPriority in self.scheduler.operationPriorities.iteritems()],
+                      else_=0) + jobPriority
+    else:
+      priority = jobPriority
+    pendingRequests = requestTable.c.Status.in_(('Waiting', 'Assigned', 'Scheduled'))
+    self.log.info("Setting the scheduling columns of the requests to execute")
+    self.engine.execute(update(requestTable)
+                        .where(pendingRequests)
+                        .values({requestTable.c.OperationType: nextOperationType}))
+    self.engine.execute(update(requestTable)
+                        .where(pendingRequests)
+                        .values({requestTable.c.Priority: priority}))
+
   def cancelRequest(self, requestID):
     session = self.DBSession()
     try:
@@ -221,30 +301,59 @@ class RequestDB(object):
   def putRequest(self, request):
     """ update or insert request into db
 
+        A request carrying the token of a lease (see claimRequests) is only written if the lease is still held
+        by this token: otherwise the request was given to another claimer in the meantime, and the put is
+        rejected with ERMSLEASE. The requests without token, e.g. new ones, are written unconditionally.
+
     :param ~Request.Request request: Request instance
     """
 
     session = self.DBSession(expire_on_commit=False)
     try:
 
+      changedRows = None
       try:
         if hasattr(request, 'RequestID'):
 
-          status = session.query(Request._Status)\
-                          .filter(Request.RequestID == request.RequestID)\
-                          .one()
+          # the row is locked until the commit, so that the lease cannot be claimed meanwhile
+          status, leaseOwner = session.query(Request._Status, requestTable.c.LeaseOwner)\
+                                      .filter(Request.RequestID == request.RequestID)\
+                                      .with_for_update()\
+                                      .one()
 
-          if status[0] == 'Canceled':
+          if status == 'Canceled':
             self.log.info("Request %s(%s) was canceled, don't put it back" % (request.RequestID, request.RequestName))
             return S_OK(request.RequestID)
 
+          leaseToken = getattr(request, 'LeaseOwner', None)
+          if leaseToken and leaseToken != leaseOwner:
+            self.log.warn("Request %s(%s) was claimed again, don't put it back" % (request.RequestID,
+                                                                                   request.RequestName))
+            return S_ERROR(DErrno.ERMSLEASE, "putRequest: lease of request %s lost" % request.RequestID)
+
+          changedRows = self.__getChangedRows(request)
+
       except NoResultFound as e:
         pass
 
+      # Only the rows changed since the request was read are written, if the changes are known
+      if changedRows is not None:
+        self.__updateChangedRows(session, request, *changedRows)
+        session.commit()
+        return S_OK(request.RequestID)
+
+      # The request is given back, its lease is released, and it is scheduled again
+      requestValues = {'LeaseOwner': None, 'LeaseExpiry': None}
+      requestValues.update(self.scheduler.getSchedulingValues(request))
+
       # Since the object request is not attached to the session, we merge it to have an update
       # instead of an insert with duplicate primary key
       request = session.merge(request)
       session.add(request)
+      session.flush()
+      session.execute(update(requestTable)
+                      .where(requestTable.c.RequestID == request.RequestID)
+                      .values(requestValues))
       session.commit()
       session.expunge_all()
 
@@ -257,6 +366,82 @@ class RequestDB(object):
     finally:
       session.close()
 
+  @staticmethod
+  def __getChangedRows(request):
+    """ Operation and File rows changed since a request was read from the DB
+
+    :param ~Request.Request request: Request instance
+    :return: tuple ( { OperationID: { column: value } }, { FileID: { column: value } } ),
+             None if the changes are not known, e.g. an Operation or a File was added or removed
+    """
+    if request._getChangedAttributes() is None:
+      return None
+
+    operationRows = {}
+    fileRows = {}
+    for operation in request:
+      changes = operation._getChangedAttributes() if getattr(operation, 'OperationID', None) else None
+      if changes is None:
+        return None
+      if changes:
+        operationRows[operation.OperationID] = dict((attrName, operation._getRawValue(attrName))
+                                                    for attrName in changes)
+      for opFile in operation:
+        changes = opFile._getChangedAttributes() if getattr(opFile, 'FileID', None) else None
+        if changes is None:
+          return None
+        if changes:
+          fileRows[opFile.FileID] = dict((attrName, opFile._getRawValue(attrName)) for attrName in changes)
+
+    return operationRows, fileRows
+
+  @staticmethod
+  def __bulkUpdate(session, table, idColumn, rows, parentColumn, parentIDs):
+    """ Update rows with a single UPDATE for all the rows given the same values
+
+    :param session: session of the update
+    :param table: Table of the rows
+    :param idColumn: primary key column
+    :param dict rows: { primary key: { column: value } }
+    :param parentColumn: column of the ID of the parent
+    :param parentIDs: IDs of the parents, or a query selecting them, so that only the rows of the request are updated
+    """
+    idsByValues = {}
+    for rowID, values in rows.iteritems():
+      idsByValues.setdefault(tuple(sorted(values.iteritems())), []).append(rowID)
+
+    for values, rowIDs in idsByValues.iteritems():
+      for i in xrange(0, len(rowIDs), BULK_UPDATE_SIZE):
+        session.execute(update(table)
+                        .where(idColumn.in_(rowIDs[i:i + BULK_UPDATE_SIZE]))
+                        .where(parentColumn.in_(parentIDs))
+                        .values(dict(values)))
+
+  def __updateChangedRows(self, session, request, operationRows, fileRows):
+    """ Write the Request row, releasing its lease and scheduling it again, and the changed Operation and File rows
+
+    :param session: session of the update
+    :param ~Request.Request request: Request instance
+    :param dict operationRows: { OperationID: { column: value } }
+    :param dict fileRows: { FileID: { column: value } }
+    """
+    requestValues = dict((attrName, request._getRawValue(attrName)) for attrName in Request.TRACKED_ATTRIBUTES)
+    requestValues.update({'Status': request.Status, 'LeaseOwner': None, 'LeaseExpiry': None})
+    requestValues.update(self.scheduler.getSchedulingValues(request))
+    session.execute(update(requestTable)
+                    .where(requestTable.c.RequestID == request.RequestID)
+                    .values(requestValues))
+
+    self.__bulkUpdate(session, operationTable, operationTable.c.OperationID, operationRows,
+                      operationTable.c.RequestID, [request.RequestID])
+    # The OperationIDs of the client are not trusted: the files are those of the operations of the request in the DB
+    requestOperationIDs = select([operationTable.c.OperationID]).where(operationTable.c.RequestID == request.RequestID)
+    self.__bulkUpdate(session, fileTable, fileTable.c.FileID, fileRows,
+                      fileTable.c.OperationID, requestOperationIDs)
+    self.log.verbose("putRequest: updated request %s, %s operations and %s files" % (request.RequestID,
+                                                                                     len(operationRows),
+                                                                                     len(fileRows)))
+
   def getScheduledRequest(self, operationID):
     session = self.DBSession()
     try:
@@ -285,13 +470,156 @@ class RequestDB(object):
 #     finally:
 #       session.close()
 
-  def getRequest(self, reqID=0, assigned=True):
+  def __newLeaseToken(self, leaseOwner=None):
+    """ Unique token identifying a claim of requests, prefixed by the name of the claimer
+
+    :param str leaseOwner: name of the claimer, e.g. its DN
+    """
+    return '%s#%s' % ((leaseOwner or 'unknown')[:200], uuid.uuid4().hex)
+
+  def claimRequests(self, numberOfRequest=10, leaseOwner=None, leaseTime=None):
+    """ Claim Waiting requests for execution, and the Assigned requests of which the lease expired
+
+        The candidates are read by priority and age, and the scheduler chooses the requests among them
+        (see RequestScheduler). They are assigned by a single UPDATE, checking again that they can be claimed,
+        so that concurrent claimers never get the same request. Concurrent claimers read the same candidates:
+        if some of the chosen requests were taken meanwhile, the scheduler chooses again among the candidates
+        not chosen yet, up to CLAIM_ATTEMPTS times. The claimed requests are then read in a single query.
+        They are given back by putRequest, otherwise their lease expires after leaseTime seconds,
+        and they are given to the next claimer.
+
+    :param int numberOfRequest: maximum number of requests to claim
+    :param str leaseOwner: name of the claimer, e.g. its DN
+    :param int leaseTime: seconds during which the requests are assigned to the claimer (default self.leaseTime)
+
+    :returns: S_OK( list of Request objects ), with the 'LeaseOwner' token and the 'LeaseExpiry' time
+              of the claim as extra keys. The token is also the LeaseOwner attribute of the requests, it has to
+              be given back with them (see putRequest and renewLeases)
+    """
+
+    # expire_on_commit is set to False so that we can still use the object after we close the session
+    session = self.DBSession(expire_on_commit=False)
+    log = self.log.getSubLogger('claimRequests')
+
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    leaseExpiry = now + datetime.timedelta(seconds=self.leaseTime if leaseTime is None else leaseTime)
+    leaseToken = self.__newLeaseToken(leaseOwner)
+
+    claimable = or_(and_(requestTable.c.Status == 'Waiting', requestTable.c.NotBefore < now),
+                    and_(requestTable.c.Status == 'Assigned', requestTable.c.LeaseExpiry < now))
+
+    try:
+      candidates = session.execute(select([requestTable.c.RequestID, requestTable.c.OwnerGroup,
+                                           requestTable.c.OperationType, requestTable.c.Priority])
+                                   .where(claimable)
+                                   .order_by(requestTable.c.Priority.desc(), requestTable.c.LastUpdate)
+                                   .limit(self.scheduler.getCandidateNumber(numberOfRequest))).fetchall()
+      candidates = [tuple(candidate) for candidate in candidates]
+
+      claimed = 0
+      for _attempt in xrange(CLAIM_ATTEMPTS):
+        requestIDs = self.scheduler.selectRequests(candidates, int(numberOfRequest) - claimed)
+        if not requestIDs:
+          break
+        claimed += session.execute(update(requestTable)
+                                   .where(requestTable.c.RequestID.in_(requestIDs))
+                                   .where(claimable)
+                                   .values({requestTable.c.Status: 'Assigned',
+                                            requestTable.c.LeaseOwner: leaseToken,
+                                            requestTable.c.LeaseExpiry: leaseExpiry,
+                                            requestTable.c.LastUpdate: now})).rowcount
+        session.commit()
+        if claimed >= int(numberOfRequest):
+          break
+        # # the chosen requests are either claimed or taken by a concurrent claimer
+        chosen = set(requestIDs)
+        candidates = [candidate for candidate in candidates if candidate[0] not in chosen]
+
+      requests = []
+      if claimed:
+        # the joinedload is to force the non-lazy loading of all the attributes, especially _parent
+        requests = session.query(Request) \
+                          .options(joinedload('__operations__').joinedload('__files__')) \
+                          .filter(requestTable.c.LeaseOwner == leaseToken)\
+                          .all()
+        session.expunge_all()
+        for request in requests:
+          request.LeaseOwner = leaseToken
+      log.verbose("Claimed %s requests until %s" % (len(requests), leaseExpiry))
+
+    except Exception as e:
+      session.rollback()
+      log.exception("unexpected exception", lException=e)
+      return S_ERROR("claimRequests: unexpected exception : %s" % e)
+    finally:
+      session.close()
+
+    result = S_OK(requests)
+    result['LeaseOwner'] = leaseToken
+    result['LeaseExpiry'] = leaseExpiry
+    return result
+
+  def renewLeases(self, leases, leaseTime=None):
+    """ Extend the leases of requests still executed by their claimer, so that they do not expire during
+        long operations
+
+    :param dict leases: { RequestID: token of the lease, i.e. the LeaseOwner attribute of the claimed request }
+    :param int leaseTime: seconds during which the requests stay assigned (default self.leaseTime)
+
+    :returns: S_OK( { 'Successful': { RequestID: new LeaseExpiry }, 'Failed': { RequestID: message } } ),
+              the lease of the failed requests was lost: they were put back or claimed by another claimer
+    """
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    leaseExpiry = now + datetime.timedelta(seconds=self.leaseTime if leaseTime is None else leaseTime)
+
+    requestIDsByToken = {}
+    for requestID, leaseToken in leases.iteritems():
+      requestIDsByToken.setdefault(leaseToken, []).append(int(requestID))
+
+    session = self.DBSession()
+    try:
+      renewed = set()
+      for leaseToken, requestIDs in requestIDsByToken.iteritems():
+        held = and_(requestTable.c.RequestID.in_(requestIDs),
+                    requestTable.c.LeaseOwner == leaseToken,
+                    requestTable.c.Status == 'Assigned')
+        session.execute(update(requestTable)
+                        .where(held)
+                        .values({requestTable.c.LeaseExpiry: leaseExpiry}))
+        renewed.update(row[0] for row in session.execute(select([requestTable.c.RequestID]).where(held)))
+      session.commit()
+    except Exception as e:
+      session.rollback()
+      self.log.exception("renewLeases: unexpected exception", lException=e)
+      return S_ERROR("renewLeases: unexpected exception %s" % e)
+    finally:
+      session.close()
+
+    result = {'Successful': {}, 'Failed': {}}
+    for requestIDs in requestIDsByToken.itervalues():
+      for requestID in requestIDs:
+        if requestID in renewed:
+          result['Successful'][requestID] = leaseExpiry
+        else:
+          result['Failed'][requestID] = DErrno.strerror(DErrno.ERMSLEASE)
+    return S_OK(result)
+
+  def getRequest(self, reqID=0, assigned=True, leaseOwner=None):
     """ read request for execution
 
-    :param reqID: request's ID (default 0) If 0, take a pseudo random one
+    :param reqID: request's ID (default 0) If 0, take the Waiting request of highest priority waiting
+                  for the longest time
+    :param bool assigned: if True, the request is assigned to the caller, see claimRequests
+    :param str leaseOwner: name of the caller, e.g. its DN
 
     """
 
+    if not reqID and assigned:
+      claimed = self.claimRequests(1, leaseOwner=leaseOwner)
+      if not claimed['OK']:
+        return claimed
+      return S_OK(claimed['Value'][0] if claimed['Value'] else None)
+
     # expire_on_commit is set to False so that we can still use the object after we close the session
     session = self.DBSession(expire_on_commit=False)
     log = self.log.getSubLogger('getRequest' if assigned else 'peekRequest')
@@ -317,35 +645,19 @@ class RequestDB(object):
 
       else:
         now = datetime.datetime.utcnow().replace(microsecond=0)
-        reqIDs = set()
         try:
-          reqAscIDs = session.query(Request.RequestID)\
+          requestID = session.query(Request.RequestID)\
                              .filter(Request._Status == 'Waiting')\
                              .filter(Request._NotBefore < now)\
-                             .order_by(Request._LastUpdate)\
-                             .limit(100)\
-                             .all()
-
-          reqIDs = set([reqID[0] for reqID in reqAscIDs])
-
-          reqDescIDs = session.query(Request.RequestID)\
-                              .filter(Request._Status == 'Waiting')\
-                              .filter(Request._NotBefore < now)\
-                              .order_by(Request._LastUpdate.desc())\
-                              .limit(50)\
-                              .all()
-
-          reqIDs |= set([reqID[0] for reqID in reqDescIDs])
+                             .order_by(requestTable.c.Priority.desc(), Request._LastUpdate)\
+                             .first()
         # No Waiting requests
         except NoResultFound as e:
           return S_OK()
 
-        if not reqIDs:
+        if not requestID:
           return S_OK()
-
-        reqIDs = list(reqIDs)
-        random.shuffle(reqIDs)
-        requestID = reqIDs[0]
+        requestID = requestID[0]
 
       # If we are here, the request MUST exist, so no try catch
       # the joinedload is to force the non-lazy loading of all the attributes, especially _parent
@@ -354,23 +666,22 @@ class RequestDB(object):
                        .filter(Request.RequestID == requestID)\
                        .one()
 
-      if not reqID:
-        log.verbose(
-            "selected request %s('%s')%s" %
-            (request.RequestID,
-             request.RequestName,
-             ' (Assigned)' if assigned else ''))
-
+      leaseToken = None
       if assigned:
-        session.execute(update(Request)
-                        .where(Request.RequestID == requestID)
-                        .values({Request._Status: 'Assigned',
-                                 Request._LastUpdate: datetime.datetime.utcnow()
-                                 .strftime(Request._datetimeFormat)})
+        now = datetime.datetime.utcnow().replace(microsecond=0)
+        leaseToken = self.__newLeaseToken(leaseOwner)
+        session.execute(update(requestTable)
+                        .where(requestTable.c.RequestID == requestID)
+                        .values({requestTable.c.Status: 'Assigned',
+                                 requestTable.c.LastUpdate: now,
+                                 requestTable.c.LeaseOwner: leaseToken,
+                                 requestTable.c.LeaseExpiry: now + datetime.timedelta(seconds=self.leaseTime)})
                         )
         session.commit()
 
       session.expunge_all()
+      if leaseToken:
+        request.LeaseOwner = leaseToken
       return S_OK(request)
 
     except Exception as e:
@@ -380,56 +691,49 @@ class RequestDB(object):
     finally:
       session.close()
 
-  def getBulkRequests(self, numberOfRequest=10, assigned=True):
+  def getBulkRequests(self, numberOfRequest=10, assigned=True, leaseOwner=None):
     """ read as many requests as requested for execution
 
     :param int numberOfRequest: Number of Request we want (default 10)
-    :param bool assigned: if True, the status of the selected requests are set to assign
+    :param bool assigned: if True, the selected requests are assigned to the caller, see claimRequests
+    :param str leaseOwner: name of the caller, e.g. its DN
 
     :returns: a dictionary of Request objects indexed on the RequestID
 
     """
 
+    if assigned:
+      claimed = self.claimRequests(numberOfRequest, leaseOwner=leaseOwner)
+      if not claimed['OK']:
+        return claimed
+      return S_OK(dict((req.RequestID, req) for req in claimed['Value']))
+
     # expire_on_commit is set to False so that we can still use the object after we close the session
     session = self.DBSession(expire_on_commit=False)
-    log = self.log.getSubLogger('getBulkRequest' if assigned else 'peekBulkRequest')
+    log = self.log.getSubLogger('peekBulkRequest')
 
     requestDict = {}
 
     try:
-      # If we are here, the request MUST exist, so no try catch
-      # the joinedload is to force the non-lazy loading of all the attributes, especially _parent
-      try:
-        now = datetime.datetime.utcnow().replace(microsecond=0)
-        requestIDs = session.query(Request.RequestID)\
-            .with_for_update()\
-            .filter(Request._Status == 'Waiting')\
-            .filter(Request._NotBefore < now)\
-            .order_by(Request._LastUpdate)\
-            .limit(numberOfRequest)\
-            .all()
+      now = datetime.datetime.utcnow().replace(microsecond=0)
+      requestIDs = session.query(Request.RequestID)\
+          .filter(Request._Status == 'Waiting')\
+          .filter(Request._NotBefore < now)\
+          .order_by(requestTable.c.Priority.desc(), Request._LastUpdate)\
+          .limit(numberOfRequest)\
+          .all()
 
-        requestIDs = [ridTuple[0] for ridTuple in requestIDs]
-        log.debug("Got request ids %s" % requestIDs)
+      requestIDs = [ridTuple[0] for ridTuple in requestIDs]
+      log.debug("Got request ids %s" % requestIDs)
 
+      if requestIDs:
+        # the joinedload is to force the non-lazy loading of all the attributes, especially _parent
         requests = session.query(Request) \
                           .options(joinedload('__operations__').joinedload('__files__')) \
                           .filter(Request.RequestID.in_(requestIDs))\
                           .all()
         log.debug("Got %s Request objects " % len(requests))
         requestDict = dict((req.RequestID, req) for req in requests)
-      # No Waiting requests
-      except NoResultFound as e:
-        pass
-
-      if assigned and requestDict:
-        session.execute(update(Request)
-                        .where(Request.RequestID.in_(requestDict.keys()))
-                        .values({Request._Status: 'Assigned',
-                                 Request._LastUpdate: datetime.datetime.utcnow()
-                                 .strftime(Request._datetimeFormat)})
-                        )
-      session.commit()
 
       session.expunge_all()
 
@@ -538,6 +842,56 @@ class RequestDB(object):
 
     return S_OK(retDict)
 
+  def getSchedulingSummary(self):
+    """ Depth of the queues of the requests to execute, by class, i.e. by type of their waiting operation
+
+    :return: S_OK( { operationType: { 'Waiting': number of requests which can be executed,
+                                      'Delayed': number of Waiting requests of which NotBefore is not reached,
+                                      'Assigned': number of requests being executed,
+                                      'Expired': number of Assigned requests of which the lease expired,
+                                      'Priorities': { priority: number of requests which can be executed },
+                                      'OwnerGroups': { group: number of requests which can be executed },
+                                      'OldestWaiting': seconds since the oldest request which can be executed
+                                                       was updated } } )
+    """
+    retDict = {}
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    state = case([(and_(requestTable.c.Status == 'Waiting', requestTable.c.NotBefore < now), 'Waiting'),
+                  (requestTable.c.Status == 'Waiting', 'Delayed'),
+                  (requestTable.c.LeaseExpiry < now, 'Expired')],
+                 else_='Assigned').label('State')
+
+    session = self.DBSession()
+
+    try:
+      queues = session.execute(select([requestTable.c.OperationType, requestTable.c.Priority,
+                                       requestTable.c.OwnerGroup, state,
+                                       func.count(requestTable.c.RequestID), func.min(requestTable.c.LastUpdate)])
+                               .where(requestTable.c.Status.in_(['Waiting', 'Assigned']))
+                               .group_by(requestTable.c.OperationType, requestTable.c.Priority,
+                                         requestTable.c.OwnerGroup, state)).fetchall()
+
+      for opType, priority, ownerGroup, queueState, count, oldest in queues:
+        queue = retDict.setdefault(opType or 'Unknown', {'Waiting': 0, 'Delayed': 0, 'Assigned': 0, 'Expired': 0,
+                                                         'Priorities': {}, 'OwnerGroups': {},
+                                                         'OldestWaiting': 0})
+        queue[queueState] += count
+        if queueState != 'Waiting':
+          continue
+        priority = priority or 0
+        queue['Priorities'][priority] = queue['Priorities'].get(priority, 0) + count
+        queue['OwnerGroups'][ownerGroup] = queue['OwnerGroups'].get(ownerGroup, 0) + count
+        if oldest:
+          queue['OldestWaiting'] = max(queue['OldestWaiting'], int((now - oldest).total_seconds()))
+
+    except Exception as e:
+      self.log.exception("getSchedulingSummary: unexpected exception", lException=e)
+      return S_ERROR("getSchedulingSummary: unexpected exception : %s" % e)
+    finally:
+      session.close()
+
+    return S_OK(retDict)
+
   def getRequestSummaryWeb(self, selectDict, sortList, startItem, maxItems):
     """ Returns a list of Request for the web portal
 
@@ -16,7 +16,7 @@ import json
 import datetime
 import math
 # # from DIRAC
-from DIRAC import gLogger, S_OK, S_ERROR
+from DIRAC import gLogger, gConfig, S_OK, S_ERROR
 from DIRAC.Core.DISET.RequestHandler import RequestHandler, getServiceOption
 from DIRAC.Core.Utilities import DErrno
 from DIRAC.Core.Utilities.DEncode import ignoreEncodeWarning
@@ -24,6 +24,7 @@ from DIRAC.Core.Utilities.DEncode import ignoreEncodeWarning
 from DIRAC.RequestManagementSystem.Client.Request import Request
 from DIRAC.RequestManagementSystem.private.RequestValidator import RequestValidator
 from DIRAC.RequestManagementSystem.DB.RequestDB import RequestDB
+from DIRAC.RequestManagementSystem.private.RequestScheduler import RequestScheduler, JOB_PRIORITY, CANDIDATE_FACTOR
 
 
 class ReqManagerHandler(RequestHandler):
@@ -50,10 +51,30 @@ class ReqManagerHandler(RequestHandler):
     # If there is a constant delay to be applied to each request
     cls.constantRequestDelay = getServiceOption(serviceInfoDict, 'ConstantRequestDelay', 0)
 
+    # Seconds after which the requests assigned to an agent are given to another one, if not put back
+    cls.__requestDB.leaseTime = getServiceOption(serviceInfoDict, 'LeaseTime', cls.__requestDB.leaseTime)
+
+    # Priorities, fair share and quotas of the requests given to the agents
+    cls.__requestDB.scheduler = RequestScheduler(
+        operationPriorities=cls.__getOptionsDict(serviceInfoDict, 'Scheduling/OperationPriorities'),
+        groupShares=cls.__getOptionsDict(serviceInfoDict, 'Scheduling/GroupShares'),
+        operationQuotas=cls.__getOptionsDict(serviceInfoDict, 'Scheduling/OperationQuotas'),
+        jobPriority=getServiceOption(serviceInfoDict, 'Scheduling/JobPriority', JOB_PRIORITY),
+        candidateFactor=getServiceOption(serviceInfoDict, 'Scheduling/CandidateFactor', CANDIDATE_FACTOR))
+
     # # create tables for empty db
     return cls.__requestDB.createTables()
 
   # # helper functions
+  @staticmethod
+  def __getOptionsDict(serviceInfoDict, sectionName):
+    """ options of a section of the service, resolving default values from the master service """
+    for csPath in serviceInfoDict['csPaths']:
+      result = gConfig.getOptionsDict("%s/%s" % (csPath, sectionName))
+      if result['OK']:
+        return result['Value']
+    return {}
+
   @classmethod
   def validate(cls, request):
     """ request validation """
@@ -169,12 +190,18 @@ class ReqManagerHandler(RequestHandler):
     """ Get the summary of requests in the Request DB """
     return cls.__requestDB.getDBSummary()
 
-  types_getRequest = [six.integer_types]
+  types_getSchedulingSummary = []
 
   @classmethod
-  def export_getRequest(cls, requestID=0):
+  def export_getSchedulingSummary(cls):
+    """ Get the depth of the queues of the requests to execute, by type of their waiting operation """
+    return cls.__requestDB.getSchedulingSummary()
+
+  types_getRequest = [six.integer_types]
+
+  def export_getRequest(self, requestID=0):
     """ Get a request of given type from the database """
-    getRequest = cls.__requestDB.getRequest(requestID)
+    getRequest = self.__requestDB.getRequest(requestID, leaseOwner=self.getRemoteCredentials().get('DN'))
     if not getRequest["OK"]:
       gLogger.error("getRequest: %s" % getRequest["Message"])
       return getRequest
@@ -188,9 +215,8 @@ class ReqManagerHandler(RequestHandler):
 
   types_getBulkRequests = [int, bool]
 
-  @classmethod
   @ignoreEncodeWarning
-  def export_getBulkRequests(cls, numberOfRequest, assigned):
+  def export_getBulkRequests(self, numberOfRequest, assigned):
     """ Get a request of given type from the database
 
         :warning: the dictionary may contain string keys instead of int (json serialization)
@@ -199,8 +225,8 @@ class ReqManagerHandler(RequestHandler):
         :param numberOfRequest: size of the bulk (default 10)
         :return: S_OK( {Failed : message, Successful : list of Request.toJSON()} )
     """
-    getRequests = cls.__requestDB.getBulkRequests(
-        numberOfRequest=numberOfRequest, assigned=assigned)
+    getRequests = self.__requestDB.getBulkRequests(
+        numberOfRequest=numberOfRequest, assigned=assigned, leaseOwner=self.getRemoteCredentials().get('DN'))
     if not getRequests["OK"]:
       gLogger.error("getRequests: %s" % getRequests["Message"])
       return getRequests
@@ -218,6 +244,20 @@ class ReqManagerHandler(RequestHandler):
       return S_OK(toJSONDict)
     return S_OK()
 
+  types_renewLeases = [dict]
+
+  @classmethod
+  def export_renewLeases(cls, leases):
+    """ Extend the leases of the requests still executed by the caller
+
+        :param dict leases: { RequestID: LeaseOwner token of the request }
+        :return: S_OK( {Successful : { RequestID: new LeaseExpiry }, Failed : { RequestID: message } } )
+    """
+    renewed = cls.__requestDB.renewLeases(leases)
+    if not renewed["OK"]:
+      gLogger.error("renewLeases: %s" % renewed["Message"])
+    return renewed
+
   types_peekRequest = [six.integer_types]
 
   @classmethod
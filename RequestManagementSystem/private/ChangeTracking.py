@@ -0,0 +1,70 @@
+"""
+:mod: ChangeTracking
+
+.. module: ChangeTracking
+  :synopsis: changes of the RMS objects since they were read
+
+Request, Operation and File read from the JSON of the ReqManager remember the values of their attributes,
+so that only the attributes changed since are written back to the RequestDB. The names of the changed
+attributes travel in the JSON of the objects, under the CHANGES_KEY key.
+"""
+__RCSID__ = "$Id$"
+
+# Key of the changed attributes in the JSON of the objects
+CHANGES_KEY = 'ChangedAttributes'
+
+
+class ChangeTracking(object):
+  """ Mixin tracking the changes of the attributes stored in the RequestDB
+
+  The changes are unknown (None) for the new objects, for the objects read without the list of their changes,
+  e.g. from an older client, and for the objects of which a child was added, removed or replaced:
+  such objects have to be written entirely.
+  """
+
+  # # attributes stored in the DB, set by the classes
+  TRACKED_ATTRIBUTES = ()
+
+  def _getRawValue(self, attrName):
+    """ value of an attribute, without the side effects of its property """
+    privateName = '_' + attrName
+    return getattr(self, privateName) if hasattr(self, privateName) else getattr(self, attrName, None)
+
+  def _startTracking(self, changes=None, **readValues):
+    """ remember the current values of the attributes
+
+    :param list changes: attributes already changed, e.g. by the sender of the JSON, None if they are unknown
+    :param readValues: values read which differ from the current ones, e.g. a status computed again from
+                       the statuses of the children
+    """
+    if changes is None:
+      self._changes = None
+      return
+    self._changes = set(changes) & set(self.TRACKED_ATTRIBUTES)
+    self._readValues = dict((attrName, self._getRawValue(attrName)) for attrName in self.TRACKED_ATTRIBUTES)
+    self._readValues.update(readValues)
+
+  def _forgetChanges(self):
+    """ the changes become unknown, e.g. after a child was removed """
+    self._changes = None
+
+  def _getChangedAttributes(self):
+    """ names of the attributes changed since the object was read
+
+    :return: list, or None if the changes are unknown
+    """
+    changes = getattr(self, '_changes', None)
+    if changes is None:
+      return None
+    return sorted(changes | set(attrName for attrName, value in self._readValues.iteritems()
+                                if self._getRawValue(attrName) != value))
+
+  def _getJSONChanges(self):
+    """ changes to put in the JSON of the object
+
+    :return: list, or None if the changes are unknown
+    """
+    # Objects loaded from the DB by SQLAlchemy are not initialized: they have no change
+    if '_changes' not in self.__dict__:
+      return []
+    return self._getChangedAttributes()
@@ -0,0 +1,165 @@
+""" :mod: ExecutionSlots
+
+    ====================
+
+    .. module: ExecutionSlots
+
+    :synopsis: slots of the requests executed by the threads of the RequestExecutingAgent
+
+    The threads of an agent share the environment of the process, in particular the proxy it uses
+    (X509_USER_PROXY and /DIRAC/Security/UseServerCertificate). The requests executed at the same time
+    are thus those of a single owner: the requests of another owner wait until they are all finished,
+    and new requests of the current owner wait as well, so that the owners take turns. The agent queues
+    the requests it claims grouped by owner (see groupByOwner), so that the threads execute the requests
+    of an owner together. The calls of the agent itself to the ReqManager must not depend on this
+    environment, they always use the certificate of the agent explicitly.
+
+    The numbers of operations of each type executed at the same time can also be limited, e.g. to protect
+    a storage or a catalog.
+"""
+__RCSID__ = "$Id$"
+
+import time
+import threading
+from collections import OrderedDict
+
+from DIRAC import S_OK
+from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationData
+
+# Seconds during which the proxy set up for an owner is reused, when it takes its turn again
+PROXY_LIFETIME = 600
+
+
+def groupByOwner(requests):
+  """ order requests so that those of an owner follow each other, the owners in the order of their first request
+
+  :param list requests: Request instances
+  :return: list of Request instances
+  """
+  owners = OrderedDict()
+  for request in requests:
+    owners.setdefault((request.OwnerDN, request.OwnerGroup), []).append(request)
+  return [request for ownerRequests in owners.itervalues() for request in ownerRequests]
+
+
+class ExecutionSlots(object):
+  """
+  .. class:: ExecutionSlots
+
+  owner turns and operation type limits of the threads executing requests
+  """
+
+  def __init__(self, operationLimits=None, useServerCertificate=True):
+    """ c'tor
+
+    :param dict operationLimits: maximum number of operations executed at the same time, by operation type
+    :param bool useServerCertificate: True if the agent uses its certificate when no request is executed
+    """
+    self.operationLimits = dict((opType, limit) for opType, limit in (operationLimits or {}).iteritems() if limit)
+    self.useServerCertificate = useServerCertificate
+    self.__condition = threading.Condition()
+    # # owner of the requests being executed and their number
+    self.__owner = None
+    self.__running = 0
+    # # the proxy of the owner is being set up
+    self.__switching = False
+    # # number of requests waiting for their turn, by owner
+    self.__waiting = {}
+    # # result of RequestTask.setupProxy for the owner, and the time it was set up
+    self.__proxySetup = None
+    self.__proxySetupTime = 0
+    # # operations being executed, by type
+    self.__operations = {}
+
+  def __mayEnter(self, owner):
+    """ True if a request of owner may start now """
+    if self.__switching:
+      return False
+    othersWaiting = any(count for waitingOwner, count in self.__waiting.iteritems() if waitingOwner != owner)
+    if not self.__running:
+      # # the next turn goes to another owner, if any is waiting
+      return owner != self.__owner or not othersWaiting
+    return owner == self.__owner and not othersWaiting
+
+  def enterOwner(self, task):
+    """ wait for the turn of the owner of the request of a task, and set up its proxy if needed
+
+    :param ~RequestTask.RequestTask task: task about to execute its request
+    :return: result of task.setupProxy(), leaveOwner has to be called after the execution if it is OK
+    """
+    owner = (task.request.OwnerDN, task.request.OwnerGroup)
+    with self.__condition:
+      self.__waiting[owner] = self.__waiting.get(owner, 0) + 1
+      while not self.__mayEnter(owner):
+        self.__condition.wait()
+      self.__waiting[owner] -= 1
+      if not self.__waiting[owner]:
+        del self.__waiting[owner]
+      self.__running += 1
+      if self.__running > 1:
+        return self.__proxySetup
+      newOwner = (owner != self.__owner) or (time.time() - self.__proxySetupTime > PROXY_LIFETIME)
+      self.__owner = owner
+      self.__switching = True
+
+    # # first request of the turn: use the proxy of the owner, set up again if it changed
+    try:
+      if newOwner or not self.__proxySetup or not self.__proxySetup['OK']:
+        self.__proxySetup = task.setupProxy()
+        self.__proxySetupTime = time.time()
+      if self.__proxySetup['OK']:
+        gConfigurationData.setOptionInCFG('/DIRAC/Security/UseServerCertificate', 'false')
+    finally:
+      with self.__condition:
+        self.__switching = False
+        if not self.__proxySetup or not self.__proxySetup['OK']:
+          self.__running -= 1
+          self.__restoreCertificate()
+        self.__condition.notifyAll()
+    return self.__proxySetup
+
+  def leaveOwner(self):
+    """ a request of the current owner is finished """
+    with self.__condition:
+      self.__running -= 1
+      self.__restoreCertificate()
+      self.__condition.notifyAll()
+
+  def __restoreCertificate(self):
+    """ the agent uses its certificate again when no request is executed """
+    if not self.__running and self.useServerCertificate:
+      gConfigurationData.setOptionInCFG('/DIRAC/Security/UseServerCertificate', 'true')
+
+  def acquireOperation(self, opType):
+    """ wait until an operation of a type can be executed
+
+    :param str opType: operation type
+    """
+    limit = self.operationLimits.get(opType)
+    if not limit:
+      return
+    with self.__condition:
+      while self.__operations.get(opType, 0) >= limit:
+        self.__condition.wait()
+      self.__operations[opType] = self.__operations.get(opType, 0) + 1
+
+  def releaseOperation(self, opType):
+    """ an operation of a type is finished
+
+    :param str opType: operation type
+    """
+    if not self.operationLimits.get(opType):
+      return
+    with self.__condition:
+      self.__operations[opType] -= 1
+      self.__condition.notifyAll()
+
+  def getStatus(self):
+    """ current owner, number of requests executed and waiting, and operations executed by type
+
+    :return: S_OK( dict )
+    """
+    with self.__condition:
+      return S_OK({'Owner': self.__owner, 'Running': self.__running,
+                   'Waiting': sum(self.__waiting.itervalues()),
+                   'Operations': dict(self.__operations)})
@@ -0,0 +1,153 @@
+""" :mod: OperationBatch
+
+    ====================
+
+    .. module: OperationBatch
+
+    :synopsis: batches of the waiting operations of several requests
+
+    The waiting operations of the same type, with the same arguments, SEs and catalogs, of requests of the same
+    owner, are executed together by a single handler call: its bulk DataManager and FileCatalog calls then
+    cover the files of all the requests. The statuses of the files executed are copied back to the requests.
+
+    Only the operation types of which the handlers act on the files and on the operation only (and not on the
+    rest of the request, e.g. by inserting new operations) can be batched, see BATCH_TYPES.
+"""
+__RCSID__ = "$Id$"
+
+from DIRAC.RequestManagementSystem.Client.Request import Request
+from DIRAC.RequestManagementSystem.Client.Operation import Operation
+from DIRAC.RequestManagementSystem.Client.File import File
+
+# Operation types that can be batched
+BATCH_TYPES = ("RemoveFile", "RemoveReplica", "RegisterFile", "RegisterReplica")
+# Attributes of the operations which have to be the same in a batch
+BATCH_ATTRIBUTES = ("Type", "Arguments", "SourceSE", "TargetSE", "Catalog")
+# Attributes of the files copied to the batch
+FILE_ATTRIBUTES = ("LFN", "PFN", "GUID", "Checksum", "ChecksumType", "Size", "Attempt")
+
+
+def getBatchKey(request, batchTypes):
+  """ key of the batch of the waiting operation of a request
+
+  :param ~Request.Request request: Request instance
+  :param list batchTypes: operation types to batch
+  :return: tuple, None if the operation cannot be batched
+  """
+  if request.Status != "Waiting":
+    return None
+  operation = request.getWaiting()
+  if not operation["OK"] or not operation["Value"]:
+    return None
+  operation = operation["Value"]
+  if operation.Type not in batchTypes or operation.Status != "Waiting":
+    return None
+  operationKey = tuple(getattr(operation, attrName) for attrName in BATCH_ATTRIBUTES)
+  return operationKey + (request.OwnerDN, request.OwnerGroup)
+
+
+def makeBatches(requests, batchTypes, maxFiles=Operation.MAX_FILES):
+  """ group the waiting operations of requests in batches
+
+  :param list requests: Request instances
+  :param list batchTypes: operation types to batch
+  :param int maxFiles: maximum number of files of a batch
+  :return: list of OperationBatch of at least two requests
+  """
+  maxFiles = min(maxFiles, Operation.MAX_FILES)
+  # # key -> batches of the key
+  openBatches = {}
+  batches = []
+  for request in requests:
+    key = getBatchKey(request, batchTypes)
+    if key is None:
+      continue
+    keyBatches = openBatches.setdefault(key, [])
+    if any(batch.addRequest(request, maxFiles) for batch in keyBatches):
+      continue
+    batch = OperationBatch(key)
+    if batch.addRequest(request, maxFiles):
+      keyBatches.append(batch)
+      batches.append(batch)
+  return [batch for batch in batches if len(batch.requests) > 1]
+
+
+class OperationBatch(object):
+  """
+  .. class:: OperationBatch
+
+  waiting operations of several requests, executed as one
+  """
+
+  def __init__(self, key):
+    """ c'tor
+
+    :param tuple key: batch key of the operations, see getBatchKey
+    """
+    self.key = key
+    self.requests = []
+    # # batched operation of each request
+    self.__operations = []
+    # # LFN -> File of the request
+    self.__files = {}
+
+  def addRequest(self, request, maxFiles=Operation.MAX_FILES):
+    """ add the waiting operation of a request to the batch
+
+    :param ~Request.Request request: Request instance, of which the waiting operation has the key of the batch
+    :param int maxFiles: maximum number of files of the batch
+    :return: False if the batch is full, or if the request has no waiting file or files already in the batch
+    """
+    operation = request.getWaiting()["Value"]
+    waitingFiles = [opFile for opFile in operation if opFile.Status == "Waiting"]
+    if not waitingFiles or len(self.__files) + len(waitingFiles) > maxFiles:
+      return False
+    # # the same file in two requests is executed separately, with its own attempts
+    lfns = set(opFile.LFN for opFile in waitingFiles)
+    if len(lfns) != len(waitingFiles) or lfns.intersection(self.__files):
+      return False
+    self.requests.append(request)
+    self.__operations.append(operation)
+    for opFile in waitingFiles:
+      self.__files[opFile.LFN] = opFile
+    return True
+
+  def getRequest(self):
+    """ request of the owner of the batch, with an operation made of the waiting files of all the requests
+
+    :return: Request instance
+    """
+    attributes = dict(zip(BATCH_ATTRIBUTES, self.key))
+    request = Request()
+    request.RequestName = "Batch_%s_%s" % (attributes["Type"], self.requests[0].RequestID)
+    request.OwnerDN, request.OwnerGroup = self.key[len(BATCH_ATTRIBUTES):]
+    operation = Operation(dict((attrName, value) for attrName, value in attributes.iteritems() if value))
+    for opFile in self.__files.itervalues():
+      operation.addFile(File(dict((attrName, getattr(opFile, attrName)) for attrName in FILE_ATTRIBUTES)))
+    request.addOperation(operation)
+    return request
+
+  def fanOut(self, batchRequest):
+    """ copy the results of the batch to the files and operations of the requests
+
+    :param ~Request.Request batchRequest: request of the batch, once executed
+    :return: list of the requests of which the batched operation still has waiting files
+    """
+    batchOperation = batchRequest[0]
+    for batchFile in batchOperation:
+      opFile = self.__files.get(batchFile.LFN)
+      if opFile is None:
+        continue
+      opFile.Attempt = batchFile.Attempt
+      if batchFile.Status != opFile.Status:
+        opFile.Status = batchFile.Status
+      if batchFile.Error:
+        opFile.Error = batchFile.Error
+
+    waiting = []
+    for request, operation in zip(self.requests, self.__operations):
+      if batchOperation.Error and operation.Status != "Done":
+        operation.Error = batchOperation.Error
+      if any(opFile.Status == "Waiting" for opFile in operation):
+        waiting.append(request)
+    return waiting
@@ -0,0 +1,129 @@
+"""
+:mod: RequestScheduler
+
+.. module: RequestScheduler
+  :synopsis: choice of the requests given to the executing agents
+
+The RequestDB keeps, for each request, the type of its waiting operation and its priority, computed here when
+the request is put. When requests are claimed, the RequestDB reads more candidates than asked for, by priority and
+age, and the scheduler chooses among them:
+
+* the requests of higher priority first: the requests of jobs, which block the finalisation of their job, get
+  jobPriority on top of the priority of their operation type,
+* at the same priority, the owner groups get requests in proportion of their share, the oldest request first,
+* each operation type gets at most its quota (fraction) of the requests of a claim, as long as requests of other
+  types are waiting.
+"""
+__RCSID__ = "$Id$"
+
+import math
+import itertools
+from collections import OrderedDict, deque
+
+# Priority added to the requests of jobs
+JOB_PRIORITY = 10
+# Number of candidates read for each request claimed
+CANDIDATE_FACTOR = 5
+# Statuses of the operations which are not executed yet
+PENDING_STATUSES = ('Waiting', 'Queued', 'Scheduled')
+
+
+class RequestScheduler(object):
+  """
+  .. class:: RequestScheduler
+
+  priorities, fair share between the owner groups and quotas of the operation types
+  """
+
+  def __init__(self, operationPriorities=None, groupShares=None, operationQuotas=None,
+               jobPriority=JOB_PRIORITY, candidateFactor=CANDIDATE_FACTOR):
+    """ c'tor
+
+    :param dict operationPriorities: priority of the requests by type of their waiting operation (default 0)
+    :param dict groupShares: share of the owner groups (default 1)
+    :param dict operationQuotas: maximum fraction of the requests of a claim by operation type (default 1)
+    :param int jobPriority: priority added to the requests of jobs
+    :param int candidateFactor: number of candidates read for each request claimed
+    """
+    self.operationPriorities = dict((opType, int(priority))
+                                    for opType, priority in (operationPriorities or {}).iteritems())
+    self.groupShares = dict((group, float(share)) for group, share in (groupShares or {}).iteritems()
+                            if float(share) > 0)
+    self.operationQuotas = dict((opType, float(quota)) for opType, quota in (operationQuotas or {}).iteritems()
+                                if 0 < float(quota) < 1)
+    self.jobPriority = int(jobPriority)
+    self.candidateFactor = max(1, int(candidateFactor))
+
+  @staticmethod
+  def getOperationType(request):
+    """ type of the next operation of a request to execute
+
+    :param ~Request.Request request: Request instance
+    :return: operation type, None if all its operations are executed
+    """
+    for operation in request:
+      if operation.Status in PENDING_STATUSES:
+        return operation.Type
+    return None
+
+  def getPriority(self, operationType, jobID=0):
+    """ priority of a request
+
+    :param str operationType: type of its waiting operation
+    :param int jobID: ID of the job of the request, 0 if none
+    """
+    return self.operationPriorities.get(operationType, 0) + (self.jobPriority if jobID else 0)
+
+  def getSchedulingValues(self, request):
+    """ values of the scheduling columns of a request
+
+    :param ~Request.Request request: Request instance
+    :return: dict { column: value }
+    """
+    operationType = self.getOperationType(request)
+    return {'OperationType': operationType,
+            'Priority': self.getPriority(operationType, getattr(request, 'JobID', 0))}
+
+  def getCandidateNumber(self, numberOfRequest):
+    """ number of candidates to read for a claim
+
+    :param int numberOfRequest: number of requests to claim
+    """
+    return int(numberOfRequest) * self.candidateFactor
+
+  def selectRequests(self, candidates, numberOfRequest):
+    """ choose the requests to claim
+
+    :param list candidates: tuples ( RequestID, OwnerGroup, OperationType, Priority ), by decreasing priority
+                            and from the oldest to the newest
+    :param int numberOfRequest: number of requests to claim
+    :return: list of RequestIDs
+    """
+    quotas = dict((opType, max(1, int(math.ceil(quota * numberOfRequest))))
+                  for opType, quota in self.operationQuotas.iteritems())
+    selected = []
+    overQuota = []
+    typeCounts = {}
+    groupCounts = {}
+    for _priority, levelCandidates in itertools.groupby(candidates, key=lambda candidate: candidate[3]):
+      if len(selected) >= numberOfRequest:
+        break
+      # # the requests of each group, oldest first, the groups in the order of their oldest request
+      queues = OrderedDict()
+      for candidate in levelCandidates:
+        queues.setdefault(candidate[1], deque()).append(candidate)
+      while queues and len(selected) < numberOfRequest:
+        # # the group which got the fewest requests for its share
+        group = min(queues, key=lambda group: groupCounts.get(group, 0) / self.groupShares.get(group, 1.))
+        requestID, _group, opType, _priority = queues[group].popleft()
+        if not queues[group]:
+          del queues[group]
+        if opType in quotas and typeCounts.get(opType, 0) >= quotas[opType]:
+          overQuota.append(requestID)
+          continue
+        selected.append(requestID)
+        typeCounts[opType] = typeCounts.get(opType, 0) + 1
+        groupCounts[group] = groupCounts.get(group, 0) + 1
+
+    # # the quotas do not leave the agents idle: the requests over quota fill the remaining slots
+    return selected + overQuota[:max(0, numberOfRequest - len(selected))]
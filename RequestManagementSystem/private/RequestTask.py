@@ -55,12 +55,20 @@ class RequestTask(object):
           csPath,
           agentName,
           standalone=False,
-          requestClient=None):
+          requestClient=None,
+          handlers=None,
+          executionSlots=None,
+          batch=False):
     """c'tor
 
     :param self: self reference
     :param str requestJSON: request serialized to JSON
     :param dict opHandlers: operation handlers
+    :param dict handlers: operation handler instances by operation type, reused by the tasks of a thread
+    :param ~ExecutionSlots.ExecutionSlots executionSlots: slots of the threads of the agent, None if the task
+                                                          is executed in its own process
+    :param bool batch: the request is a batch of the operations of several requests (see OperationBatch),
+                       which is not put back to the RequestDB
     """
     self.request = Request(requestJSON)
     # # csPath
@@ -72,19 +80,24 @@ class RequestTask(object):
     # # handlers dict
     self.handlersDict = handlersDict
     # # handlers class def
-    self.handlers = {}
+    self.handlers = handlers if handlers is not None else {}
+    # # execution slots of the threads
+    self.executionSlots = executionSlots
+    # # batch flag
+    self.batch = batch
     # # own sublogger
     self.log = gLogger.getSubLogger("pid_%s/%s" % (os.getpid(), self.request.RequestName))
     # # get shifters info
     self.__managersDict = {}
-    shifterProxies = self.__setupManagerProxies()
-    if not shifterProxies["OK"]:
-      self.log.error("Cannot setup shifter proxies", shifterProxies["Message"])
+    if not self.executionSlots:
+      shifterProxies = self.__setupManagerProxies()
+      if not shifterProxies["OK"]:
+        self.log.error("Cannot setup shifter proxies", shifterProxies["Message"])
 
-    # # initialize gMonitor
-    gMonitor.setComponentType(gMonitor.COMPONENT_AGENT)
-    gMonitor.setComponentName(self.agentName)
-    gMonitor.initialize()
+      # # initialize gMonitor, the monitoring of the agent is used by its threads
+      gMonitor.setComponentType(gMonitor.COMPONENT_AGENT)
+      gMonitor.setComponentName(self.agentName)
+      gMonitor.initialize()
 
     # # own gMonitor activities
     gMonitor.registerActivity("RequestAtt", "Requests processed",
@@ -259,12 +272,27 @@ class RequestTask(object):
 
   def __call__(self):
     """ request processing """
+    if not self.executionSlots:
+      # # setup proxy for request owner
+      return self.__processRequest(self.setupProxy())
+
+    # # the threads of the agent share the proxy of the process, set up for the owner of the request
+    setupProxy = self.executionSlots.enterOwner(self)
+    try:
+      return self.__processRequest(setupProxy)
+    finally:
+      if setupProxy["OK"]:
+        self.executionSlots.leaveOwner()
+
+  def __processRequest(self, setupProxy):
+    """ request processing, once the proxy of the owner is set up
+
+    :param dict setupProxy: result of setupProxy
+    """
 
     self.log.debug("about to execute request")
     gMonitor.addMark("RequestAtt", 1)
 
-    # # setup proxy for request owner
-    setupProxy = self.setupProxy()
     if not setupProxy["OK"]:
       self.request.Error = setupProxy["Message"]
       if 'has no proxy registered' in setupProxy["Message"]:
@@ -304,7 +332,10 @@ class RequestTask(object):
       handler.shifter = shifter
       # # and execute
       pluginName = self.getPluginName(self.handlersDict.get(operation.Type))
-      if self.standalone:
+      if self.executionSlots:
+        # The execution slots use the proxy of the owner as long as its requests are executed
+        useServerCertificate = False
+      elif self.standalone:
         useServerCertificate = gConfig.useServerCertificate()
       else:
         # Always use server certificates if executed within an agent
@@ -315,7 +346,13 @@ class RequestTask(object):
         # Always use request owner proxy
         if useServerCertificate:
           gConfigurationData.setOptionInCFG('/DIRAC/Security/UseServerCertificate', 'false')
-        exe = handler()
+        if self.executionSlots:
+          self.executionSlots.acquireOperation(operation.Type)
+        try:
+          exe = handler()
+        finally:
+          if self.executionSlots:
+            self.executionSlots.releaseOperation(operation.Type)
         if useServerCertificate:
           gConfigurationData.setOptionInCFG('/DIRAC/Security/UseServerCertificate', 'true')
         if not exe["OK"]:
@@ -360,6 +397,10 @@ class RequestTask(object):
     if error:
       return S_ERROR(error)
 
+    # # the results of a batch are copied to its requests by the agent
+    if self.batch:
+      return S_OK(self.request)
+
     # # request done?
     if self.request.Status == "Done":
       # # update request to the RequestDB
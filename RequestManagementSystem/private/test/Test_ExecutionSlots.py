@@ -0,0 +1,125 @@
+""" :mod: Test_ExecutionSlots
+    =======================
+
+    .. module: Test_ExecutionSlots
+    :synopsis: ExecutionSlots test cases
+
+    ExecutionSlots test cases
+"""
+
+__RCSID__ = "$Id $"
+
+# # imports
+import time
+import threading
+import unittest
+
+from DIRAC import S_OK, S_ERROR
+# # SUT
+from DIRAC.RequestManagementSystem.private.ExecutionSlots import ExecutionSlots, groupByOwner
+
+
+class FakeRequest(object):
+  """ owner of a request """
+
+  def __init__(self, ownerDN, ownerGroup, requestID=0):
+    self.OwnerDN = ownerDN
+    self.OwnerGroup = ownerGroup
+    self.RequestID = requestID
+
+
+class FakeTask(object):
+  """ RequestTask counting its proxy set ups """
+
+  def __init__(self, ownerDN, ownerGroup="dirac_user", proxyOK=True):
+    self.request = FakeRequest(ownerDN, ownerGroup)
+    self.proxyOK = proxyOK
+    self.setups = 0
+
+  def setupProxy(self):
+    self.setups += 1
+    return S_OK() if self.proxyOK else S_ERROR("no proxy")
+
+
+class ExecutionSlotsTests(unittest.TestCase):
+  """
+  .. class:: ExecutionSlotsTests
+
+  """
+
+  def setUp(self):
+    """ test set up """
+    self.slots = ExecutionSlots({"ReplicateAndRegister": 2, "RemoveFile": 0})
+
+  def test01Owner(self):
+    """ same owner: the proxy is set up once for the requests executed together """
+    first, second = FakeTask("/DN=a"), FakeTask("/DN=a")
+    self.assertTrue(self.slots.enterOwner(first)["OK"])
+    self.assertTrue(self.slots.enterOwner(second)["OK"])
+    self.assertEqual(first.setups + second.setups, 1)
+    self.assertEqual(self.slots.getStatus()["Value"]["Running"], 2)
+    self.slots.leaveOwner()
+    self.slots.leaveOwner()
+    status = self.slots.getStatus()["Value"]
+    self.assertEqual(status["Running"], 0)
+    self.assertEqual(status["Owner"], ("/DN=a", "dirac_user"))
+
+  def test02Turns(self):
+    """ the requests of another owner wait until those of the current owner are finished """
+    self.assertTrue(self.slots.enterOwner(FakeTask("/DN=a"))["OK"])
+    other = FakeTask("/DN=b")
+    entered = []
+    thread = threading.Thread(target=lambda: entered.append(self.slots.enterOwner(other)))
+    thread.start()
+    time.sleep(0.2)
+    self.assertEqual(entered, [])
+    self.assertEqual(self.slots.getStatus()["Value"]["Waiting"], 1)
+    self.slots.leaveOwner()
+    thread.join(5)
+    self.assertTrue(entered[0]["OK"])
+    self.assertEqual(other.setups, 1)
+    self.assertEqual(self.slots.getStatus()["Value"]["Owner"], ("/DN=b", "dirac_user"))
+    self.slots.leaveOwner()
+
+  def test03ProxyFailure(self):
+    """ a failed proxy set up does not take a slot """
+    result = self.slots.enterOwner(FakeTask("/DN=c", proxyOK=False))
+    self.assertFalse(result["OK"])
+    self.assertEqual(self.slots.getStatus()["Value"]["Running"], 0)
+    task = FakeTask("/DN=c")
+    self.assertTrue(self.slots.enterOwner(task)["OK"])
+    self.assertEqual(task.setups, 1)
+    self.slots.leaveOwner()
+
+  def test04Operations(self):
+    """ limits of the operation types """
+    self.assertEqual(self.slots.operationLimits, {"ReplicateAndRegister": 2})
+    # # no limit
+    for _i in range(5):
+      self.slots.acquireOperation("RemoveFile")
+    self.slots.acquireOperation("ReplicateAndRegister")
+    self.slots.acquireOperation("ReplicateAndRegister")
+    acquired = []
+    thread = threading.Thread(target=lambda: acquired.append(self.slots.acquireOperation("ReplicateAndRegister")))
+    thread.start()
+    time.sleep(0.2)
+    self.assertEqual(acquired, [])
+    self.slots.releaseOperation("ReplicateAndRegister")
+    thread.join(5)
+    self.assertEqual(len(acquired), 1)
+    self.assertEqual(self.slots.getStatus()["Value"]["Operations"], {"ReplicateAndRegister": 2})
+
+  def test05GroupByOwner(self):
+    """ the requests of an owner are queued together, the owners in the order of their first request """
+    requests = [FakeRequest("/DN=b", "dirac_user", 1), FakeRequest("/DN=a", "dirac_user", 2),
+                FakeRequest("/DN=b", "dirac_prod", 3), FakeRequest("/DN=a", "dirac_user", 4),
+                FakeRequest("/DN=b", "dirac_user", 5)]
+    self.assertEqual([request.RequestID for request in groupByOwner(requests)], [1, 5, 2, 4, 3])
+    self.assertEqual(groupByOwner([]), [])
+
+
+# # test execution
+if __name__ == "__main__":
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase(ExecutionSlotsTests)
+  unittest.TextTestRunner(verbosity=3).run(gSuite)
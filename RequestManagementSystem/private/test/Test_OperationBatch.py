@@ -0,0 +1,92 @@
+""" :mod: Test_OperationBatch
+    =======================
+
+    .. module: Test_OperationBatch
+    :synopsis: OperationBatch test cases
+
+    OperationBatch test cases
+"""
+
+__RCSID__ = "$Id $"
+
+# # imports
+import unittest
+
+from DIRAC.RequestManagementSystem.Client.Request import Request
+from DIRAC.RequestManagementSystem.Client.Operation import Operation
+from DIRAC.RequestManagementSystem.Client.File import File
+# # SUT
+from DIRAC.RequestManagementSystem.private.OperationBatch import makeBatches, getBatchKey
+
+
+def createRequest(requestID, lfns, opType="RemoveFile", ownerDN="/DN=owner", targetSE=None):
+  """ request of an operation on some files, followed by a ForwardDISET """
+  request = Request({"RequestID": requestID, "RequestName": "request_%s" % requestID,
+                     "OwnerDN": ownerDN, "OwnerGroup": "dirac_user"})
+  operation = Operation({"Type": opType})
+  if targetSE:
+    operation.TargetSE = targetSE
+  for lfn in lfns:
+    operation.addFile(File({"LFN": lfn, "Attempt": 1}))
+  request.addOperation(operation)
+  request.addOperation(Operation({"Type": "ForwardDISET", "Arguments": "foo"}))
+  return request
+
+
+class OperationBatchTests(unittest.TestCase):
+  """
+  .. class:: OperationBatchTests
+
+  """
+
+  def test01Key(self):
+    """ operations which can be batched """
+    self.assertTrue(getBatchKey(createRequest(1, ["/a"]), ["RemoveFile"]))
+    self.assertEqual(getBatchKey(createRequest(1, ["/a"]), ["RemoveReplica"]), None)
+    self.assertNotEqual(getBatchKey(createRequest(1, ["/a"]), ["RemoveFile"]),
+                        getBatchKey(createRequest(2, ["/b"], ownerDN="/DN=other"), ["RemoveFile"]))
+    self.assertNotEqual(getBatchKey(createRequest(1, ["/a"], "RemoveReplica", targetSE="SE1"), ["RemoveReplica"]),
+                        getBatchKey(createRequest(2, ["/b"], "RemoveReplica", targetSE="SE2"), ["RemoveReplica"]))
+
+  def test02Batches(self):
+    """ grouping of the requests """
+    requests = [createRequest(1, ["/a", "/b"]), createRequest(2, ["/c"]),
+                createRequest(3, ["/d"], ownerDN="/DN=other"),
+                createRequest(4, ["/a"]), createRequest(5, ["/e", "/f"])]
+    batches = makeBatches(requests, ["RemoveFile"])
+    # # request 3 is alone with its owner, request 4 has a file of request 1
+    self.assertEqual(len(batches), 1)
+    self.assertEqual([request.RequestID for request in batches[0].requests], [1, 2, 5])
+    # # size limit
+    batches = makeBatches(requests, ["RemoveFile"], maxFiles=3)
+    self.assertEqual([[request.RequestID for request in batch.requests] for batch in batches], [[1, 2], [4, 5]])
+
+  def test03FanOut(self):
+    """ results copied back to the requests """
+    requests = [createRequest(1, ["/a", "/b"]), createRequest(2, ["/c"])]
+    batch = makeBatches(requests, ["RemoveFile"])[0]
+    batchRequest = Request(batch.getRequest().toJSON()["Value"])
+    self.assertEqual(batchRequest.OwnerDN, "/DN=owner")
+    self.assertEqual(len(batchRequest), 1)
+    self.assertEqual(sorted(opFile.LFN for opFile in batchRequest[0]), ["/a", "/b", "/c"])
+
+    for opFile in batchRequest[0]:
+      opFile.Attempt += 1
+      if opFile.LFN == "/b":
+        opFile.Error = "No such SE"
+      else:
+        opFile.Status = "Done"
+    waiting = batch.fanOut(batchRequest)
+
+    self.assertEqual([request.RequestID for request in waiting], [1])
+    self.assertEqual([(opFile.Status, opFile.Attempt, opFile.Error) for opFile in requests[0][0]],
+                     [("Done", 2, ""), ("Waiting", 2, "No such SE")])
+    self.assertEqual(requests[1][0].Status, "Done")
+    self.assertEqual(requests[1].getWaiting()["Value"].Type, "ForwardDISET")
+
+
+# # test execution
+if __name__ == "__main__":
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase(OperationBatchTests)
+  unittest.TextTestRunner(verbosity=3).run(gSuite)
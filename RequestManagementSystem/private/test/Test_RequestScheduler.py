@@ -0,0 +1,71 @@
+""" :mod: Test_RequestScheduler
+    =========================
+
+    .. module: Test_RequestScheduler
+    :synopsis: RequestScheduler test cases
+
+    RequestScheduler test cases
+"""
+
+__RCSID__ = "$Id $"
+
+# # imports
+import unittest
+
+from DIRAC.RequestManagementSystem.Client.Request import Request
+from DIRAC.RequestManagementSystem.Client.Operation import Operation
+from DIRAC.RequestManagementSystem.Client.File import File
+# # SUT
+from DIRAC.RequestManagementSystem.private.RequestScheduler import RequestScheduler
+
+
+class RequestSchedulerTests(unittest.TestCase):
+  """
+  .. class:: RequestSchedulerTests
+
+  """
+
+  def test01Priority(self):
+    """ scheduling values of a request """
+    scheduler = RequestScheduler(operationPriorities={"RegisterFile": "5"}, jobPriority=10)
+    request = Request({"RequestName": "test", "JobID": 123})
+    done = Operation({"Type": "RemoveFile"})
+    done += File({"LFN": "/a", "Status": "Done"})
+    request += done
+    waiting = Operation({"Type": "RegisterFile"})
+    waiting += File({"LFN": "/b"})
+    request += waiting
+    self.assertEqual(scheduler.getSchedulingValues(request), {"OperationType": "RegisterFile", "Priority": 15})
+    request.JobID = 0
+    self.assertEqual(scheduler.getSchedulingValues(request), {"OperationType": "RegisterFile", "Priority": 5})
+    waiting[0].Status = "Done"
+    self.assertEqual(scheduler.getSchedulingValues(request), {"OperationType": None, "Priority": 0})
+
+  def test02Priorities(self):
+    """ the requests of higher priority first """
+    scheduler = RequestScheduler()
+    candidates = [(1, "user", "RegisterFile", 10), (2, "user", "RemoveFile", 0), (3, "user", "RemoveFile", 0)]
+    self.assertEqual(scheduler.selectRequests(candidates, 2), [1, 2])
+
+  def test03FairShare(self):
+    """ the owner groups share the requests """
+    candidates = [(i, "prod", "RemoveFile", 0) for i in range(10)] + [(10, "user", "RemoveFile", 0),
+                                                                      (11, "user", "RemoveFile", 0)]
+    self.assertEqual(RequestScheduler().selectRequests(candidates, 4), [0, 10, 1, 11])
+    scheduler = RequestScheduler(groupShares={"prod": 3})
+    self.assertEqual(scheduler.selectRequests(candidates, 4), [0, 10, 1, 2])
+
+  def test04Quotas(self):
+    """ the quotas of the operation types apply as long as other requests are waiting """
+    scheduler = RequestScheduler(operationQuotas={"RemoveFile": 0.5})
+    candidates = [(i, "prod", "RemoveFile", 0) for i in range(10)] + [(10, "prod", "ReplicateAndRegister", 0)]
+    self.assertEqual(scheduler.selectRequests(candidates, 4), [0, 1, 10, 2])
+    self.assertEqual(scheduler.selectRequests(candidates[:10], 4), [0, 1, 2, 3])
+    self.assertEqual(scheduler.getCandidateNumber(4), 20)
+
+
+# # test execution
+if __name__ == "__main__":
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase(RequestSchedulerTests)
+  unittest.TextTestRunner(verbosity=3).run(gSuite)
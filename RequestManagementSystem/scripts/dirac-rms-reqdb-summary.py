@@ -43,4 +43,18 @@ if __name__ == "__main__":
   for fState, fCount in sorted(fs.items()):
     DIRAC.gLogger.always("- '%s' %s" % (fState, fCount))
 
+  queues = reqClient.getSchedulingSummary()
+  if not queues["OK"]:
+    DIRAC.gLogger.error(queues["Message"])
+    DIRAC.exit(-1)
+  DIRAC.gLogger.always("Queues:")
+  for opType, queue in sorted(queues["Value"].items()):
+    DIRAC.gLogger.always("- '%s': %s waiting (oldest %s s), %s delayed, %s assigned (%s expired)" %
+                         (opType, queue["Waiting"], queue["OldestWaiting"], queue["Delayed"],
+                          queue["Assigned"], queue["Expired"]))
+    for priority, count in sorted(queue["Priorities"].items(), reverse=True):
+      DIRAC.gLogger.always("  - priority %s: %s" % (priority, count))
+    for ownerGroup, count in sorted(queue["OwnerGroups"].items()):
+      DIRAC.gLogger.always("  - '%s': %s" % (ownerGroup, count))
+
   DIRAC.exit(0)
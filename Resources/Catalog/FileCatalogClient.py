@@ -27,7 +27,8 @@ class FileCatalogClient(FileCatalogClientBase):
        'findDirectoriesByMetadata', 'getReplicasByMetadata', 'findFilesByMetadataDetailed',
        'findFilesByMetadataWeb', 'getCompatibleMetadata', 'getMetadataSet', 'getDatasets',
        'getFileDescendents', 'getFileAncestors', 'getDirectoryUserMetadata', 'getFileUserMetadata',
-       'checkDataset', 'getDatasetParameters', 'getDatasetFiles', 'getDatasetAnnotation']
+       'checkDataset', 'getDatasetParameters', 'getDatasetFiles', 'getDatasetAnnotation',
+       'explainFindFilesByMetadata']
 
   WRITE_METHODS = [
       'createLink',
@@ -68,6 +69,7 @@ class FileCatalogClient(FileCatalogClientBase):
 
   NO_LFN_METHODS = [
       'findFilesByMetadata',
+      'explainFindFilesByMetadata',
       'addMetadataField',
       'deleteMetadataField',
       'getMetadataFields',
@@ -285,6 +287,17 @@ class FileCatalogClient(FileCatalogClientBase):
     else:
       return S_ERROR('Illegal return value type %s' % type(result['Value']))
 
+  def explainFindFilesByMetadata(self, metaDict, path='/', strategy='Auto', timeout=120):
+    """ Execute the file selection of a meta data query in the service, and get the plan it followed,
+        with the estimated and actual numbers of directories and files of each step, and the timings
+
+    :param dict metaDict: meta data query
+    :param str path: path to search into
+    :param str strategy: Auto, DirectoryFirst or FileFirst
+    """
+    rpcClient = self._getRPC(timeout=timeout)
+    return rpcClient.explainFindFilesByMetadata(metaDict, path, strategy)
+
   def getFileUserMetadata(self, path, timeout=120):
     """Get the meta data attached to a file, but also to
     the its corresponding directory
@@ -661,6 +674,100 @@ class FileCatalogClient(FileCatalogClientBase):
     """
     return self._getRPC(timeout=timeout).getDatasetFiles(datasets)
 
+  #############################################################################
+  #
+  # Large results read by chunks: the methods below are generators, each yielding
+  # S_OK with a chunk of the result, or S_ERROR after which the iteration stops.
+  #
+
+  def _iterateCursor(self, queryType, queryArgs, chunkSize, timeout):
+    """ Read the result of a query by chunks through a cursor of the service.
+        All the calls go through the same RPC client, hence to the service instance
+        holding the cursor, which is closed if the iteration is not completed.
+
+        :param str queryType: query, see FileCatalogHandler.export_openCursor
+        :param list queryArgs: arguments of the query
+        :param int chunkSize: maximum number of entries of a chunk
+        :param int timeout: timeout of each call
+    """
+    rpcClient = self._getRPC(timeout=timeout)
+    result = rpcClient.openCursor(queryType, queryArgs, chunkSize)
+    if not result['OK']:
+      yield result
+      return
+    cursorID = result['Value']
+    isOpen = True
+    try:
+      while True:
+        result = rpcClient.fetchCursor(cursorID)
+        if not result['OK']:
+          # The service closes the cursor after an error
+          isOpen = False
+          yield result
+          return
+        if result['Value']['Done']:
+          isOpen = False
+          return
+        yield S_OK(result['Value']['Chunk'])
+    finally:
+      if isOpen:
+        rpcClient.closeCursor(cursorID)
+
+  def iterateDirectory(self, lfn, verbose=False, chunkSize=1000, timeout=120):
+    """ List the contents of a directory by chunks, for the directories too large to be listed at once
+
+        :param str lfn: directory
+        :param bool verbose: if True, return the details of the entries, as listDirectory
+        :param int chunkSize: maximum number of entries of a chunk
+
+        :return: generator of S_OK with the 'Files', 'SubDirs', 'Links' and 'Datasets' dictionaries
+                 of each chunk, keyed by LFN as with listDirectory
+    """
+    for result in self._iterateCursor('listDirectory', [lfn, verbose], chunkSize, timeout):
+      if result['OK']:
+        for entryType in ['Files', 'SubDirs', 'Links']:
+          entryDict = result['Value'][entryType]
+          for fname in entryDict.keys():
+            entryDict[os.path.join(lfn, os.path.basename(fname))] = entryDict.pop(fname)
+      yield result
+
+  def iterateDirectoryReplicas(self, lfn, allStatus=False, chunkSize=1000, timeout=120):
+    """ Find the replicas of the files of a directory by chunks
+
+        :param str lfn: directory
+        :param bool allStatus: if True, return all the replicas, not only the visible ones
+        :param int chunkSize: maximum number of files of a chunk
+
+        :return: generator of S_OK with the {lfn: {se: pfn}} dictionary of each chunk
+    """
+    for result in self._iterateCursor('getDirectoryReplicas', [lfn, allStatus], chunkSize, timeout):
+      if result['OK']:
+        pathDict = result['Value']
+        for fname in pathDict.keys():
+          fileLFN = '%s/%s' % (lfn, os.path.basename(fname))
+          detailsDict = pathDict.pop(fname)
+          for se in detailsDict:
+            if not detailsDict[se]:
+              detailsDict[se] = fileLFN
+          pathDict[fileLFN] = detailsDict
+      yield result
+
+  def iterateFilesByMetadata(self, metaDict, path='/', chunkSize=1000, timeout=120):
+    """ Find files given the meta data query and the path, by chunks
+
+        :return: generator of S_OK with the list of LFNs of each chunk
+    """
+    return self._iterateCursor('findFilesByMetadata', [metaDict, path], chunkSize, timeout)
+
+  def iterateSEDump(self, seName, chunkSize=1000, timeout=120):
+    """ Get the content of an SE by chunks
+
+        :param seName: name of the StorageElement
+
+        :return: generator of S_OK with the list of [lfn, checksum, size] of each chunk
+    """
+    return self._iterateCursor('getSEDump', [seName], chunkSize, timeout)
+
   #############################################################################
 
   def getSEDump(self, seName, outputFilename):
@@ -1239,12 +1239,18 @@ class TransformationDB(DB):
       return res
     # Insert only files not found, and assume the LFN is unique in the table
     lfnFileIDs = res['Value'][1]
-    for lfn in set(lfns) - set(lfnFileIDs):
-      req = "INSERT INTO DataFiles (LFN,Status) VALUES ('%s','New');" % lfn
-      res = self._update(req, connection)
-      # If the LFN is duplicate we get an error and ignore it
-      if res['OK']:
-        lfnFileIDs[lfn] = res['lastRowId']
+    newLFNs = list(set(lfns) - set(lfnFileIDs))
+    if not newLFNs:
+      return S_OK(lfnFileIDs)
+    # All the new files are inserted with one statement, ignoring the duplicates
+    req = "INSERT IGNORE INTO DataFiles (LFN,Status) VALUES (%s,'New')"
+    res = self._updatemany(req, [(lfn,) for lfn in newLFNs], conn=connection)
+    if not res['OK']:
+      return res
+    res = self.__getFileIDsForLfns(newLFNs, connection=connection)
+    if not res['OK']:
+      return res
+    lfnFileIDs.update(res['Value'][1])
     return S_OK(lfnFileIDs)
 
   def __setDataFileStatus(self, fileIDs, status, connection=False):
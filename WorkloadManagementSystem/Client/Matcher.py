@@ -7,7 +7,10 @@ __RCSID__ = "$Id"
 
 import time
 
-from DIRAC import gLogger
+from six.moves import queue
+
+from DIRAC import gLogger, S_OK
+from DIRAC.Core.Utilities import Time
 
 from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
 from DIRAC.Core.Utilities.PrettyPrint import printDict
@@ -23,12 +26,64 @@ from DIRAC.WorkloadManagementSystem.DB.JobLoggingDB import JobLoggingDB
 from DIRAC.ResourceStatusSystem.Client.SiteStatus import SiteStatus
 
 
+class WriteBehindQueue(object):
+  """ Buffer for the non critical updates done after a match (pilot information,
+      pilot to job mapping, logging records). They are executed by flush(),
+      out of the matching critical path
+  """
+
+  def __init__(self, maxSize=10000):
+    self.__queue = queue.Queue(maxSize)
+    self.log = gLogger.getSubLogger("WriteBehindQueue")
+
+  def add(self, description, func, *args, **kwargs):
+    """ Queue an update. If the queue is full, the update is executed immediately
+
+        :param str description: used to report the failures
+        :param func: callable returning S_OK/S_ERROR
+    """
+    try:
+      self.__queue.put_nowait((description, func, args, kwargs))
+    except queue.Full:
+      self.__execute(description, func, args, kwargs)
+
+  def __execute(self, description, func, args, kwargs):
+    try:
+      result = func(*args, **kwargs)
+    except Exception as excp:  # pylint: disable=broad-except
+      self.log.exception("Exception in delayed update", description, lException=excp)
+      return False
+    if not result['OK']:
+      self.log.error("Problem in delayed update", "%s: %s" % (description, result['Message']))
+      return False
+    return True
+
+  def flush(self):
+    """ Execute all the queued updates
+
+        :return: S_OK( number of updates executed )
+    """
+    done = 0
+    while True:
+      try:
+        description, func, args, kwargs = self.__queue.get_nowait()
+      except queue.Empty:
+        break
+      self.__execute(description, func, args, kwargs)
+      done += 1
+    if done:
+      self.log.verbose("Executed delayed updates", done)
+    return S_OK(done)
+
+
 class Matcher(object):
   """ Logic for matching
   """
 
-  def __init__(self, pilotAgentsDB=None, jobDB=None, tqDB=None, jlDB=None, opsHelper=None):
+  def __init__(self, pilotAgentsDB=None, jobDB=None, tqDB=None, jlDB=None, opsHelper=None, writeBehind=None):
     """ c'tor
+
+        :param WriteBehindQueue writeBehind: if given, the non critical updates are queued there
     """
     if pilotAgentsDB:
       self.pilotAgentsDB = pilotAgentsDB
@@ -52,6 +107,8 @@ class Matcher(object):
     else:
       self.opsHelper = Operations()
 
+    self.writeBehind = writeBehind
+
     self.log = gLogger.getSubLogger("Matcher")
 
     self.limiter = Limiter(jobDB=self.jobDB, opsHelper=self.opsHelper)
@@ -92,12 +149,13 @@ class Matcher(object):
       return {}
 
     jobID = result['jobId']
-    resAtt = self.jobDB.getJobAttributes(jobID, ['OwnerDN', 'OwnerGroup', 'Status'])
-    if not resAtt['OK']:
+    resBundle = self.jobDB.getJobMatchBundle(jobID)
+    if not resBundle['OK']:
       raise RuntimeError('Could not retrieve job attributes')
-    if not resAtt['Value']:
+    if not resBundle['Value']:
       raise RuntimeError("No attributes returned for job")
-    if not resAtt['Value']['Status'] == 'Waiting':
+    jobAttributes = resBundle['Value']['Attributes']
+    if not jobAttributes['Status'] == 'Waiting':
       self.log.error('Job matched by the TQ is not in Waiting state', str(jobID))
       result = self.tqDB.deleteJob(jobID)
       if not result['OK']:
@@ -106,12 +164,8 @@ class Matcher(object):
 
     self._reportStatus(resourceDict, jobID)
 
-    result = self.jobDB.getJobJDL(jobID)
-    if not result['OK']:
-      raise RuntimeError("Failed to get the job JDL")
-
     resultDict = {}
-    resultDict['JDL'] = result['Value']
+    resultDict['JDL'] = resBundle['Value']['JDL']
     resultDict['JobID'] = jobID
 
     matchTime = time.time() - startTime
@@ -119,15 +173,7 @@ class Matcher(object):
     gMonitor.addMark("matchTime", matchTime)
 
     # Get some extra stuff into the response returned
-    resOpt = self.jobDB.getJobOptParameters(jobID)
-    if resOpt['OK']:
-      for key, value in resOpt['Value'].items():
-        resultDict[key] = value
-    resAtt = self.jobDB.getJobAttributes(jobID, ['OwnerDN', 'OwnerGroup'])
-    if not resAtt['OK']:
-      raise RuntimeError('Could not retrieve job attributes')
-    if not resAtt['Value']:
-      raise RuntimeError('No attributes returned for job')
+    resultDict.update(resBundle['Value']['OptParameters'])
 
     if self.opsHelper.getValue("JobScheduling/CheckMatchingDelay", True):
       self.limiter.updateDelayCounters(resourceDict['Site'], jobID)
@@ -137,12 +183,79 @@ class Matcher(object):
       self._updatePilotInfo(resourceDict)
     self._updatePilotJobMapping(resourceDict, jobID)
 
-    resultDict['DN'] = resAtt['Value']['OwnerDN']
-    resultDict['Group'] = resAtt['Value']['OwnerGroup']
+    resultDict['DN'] = jobAttributes['OwnerDN']
+    resultDict['Group'] = jobAttributes['OwnerGroup']
     resultDict['PilotInfoReportedFlag'] = True
 
     return resultDict
 
+  def selectJobs(self, resourceDescription, credDict, maxJobs):
+    """ Select up to maxJobs jobs matching the resource capacity, in one match round-trip.
+        Used by pilots able to run several payloads at once
+
+        :return: list of job description dicts, as returned by selectJob
+    """
+
+    startTime = time.time()
+
+    resourceDict = self._getResourceDict(resourceDescription, credDict)
+    self.log.info('Resource description for bulk matching', "(%s jobs) %s" % (maxJobs, printDict(resourceDict)))
+
+    negativeCond = self.limiter.getNegativeCondForSite(resourceDict['Site'])
+    result = self.tqDB.matchAndGetJobs(resourceDict, maxJobs=maxJobs, negativeCond=negativeCond)
+    if not result['OK']:
+      raise RuntimeError(result['Message'])
+    result = result['Value']
+    if not result['matchFound']:
+      self.log.info("No match found")
+      return []
+
+    jobIDs = [jobID for jobID, _tqID in result['jobs']]
+    resBundles = self.jobDB.getJobMatchBundles(jobIDs)
+    if not resBundles['OK']:
+      raise RuntimeError('Could not retrieve job attributes')
+    bundles = resBundles['Value']
+
+    pilotInfoReportedFlag = resourceDict.get('PilotInfoReportedFlag', False)
+    checkDelay = self.opsHelper.getValue("JobScheduling/CheckMatchingDelay", True)
+    resultList = []
+    for jobID in jobIDs:
+      if jobID not in bundles:
+        # The job was already taken out of the TQ: it is failed rather than left Waiting without a TQ
+        self.log.error("No attributes returned for job", str(jobID))
+        self._failJob(jobID, 'No attributes returned at matching')
+        continue
+      jobAttributes = bundles[jobID]['Attributes']
+      if jobAttributes['Status'] != 'Waiting':
+        self.log.error('Job matched by the TQ is not in Waiting state', str(jobID))
+        result = self.tqDB.deleteJob(jobID)
+        if not result['OK']:
+          self.log.error("Could not delete job from the TQ", "%s: %s" % (jobID, result['Message']))
+        continue
+
+      self._reportStatus(resourceDict, jobID)
+
+      resultDict = {'JDL': bundles[jobID]['JDL'], 'JobID': jobID}
+      resultDict.update(bundles[jobID]['OptParameters'])
+
+      if checkDelay:
+        self.limiter.updateDelayCounters(resourceDict['Site'], jobID)
+      self._updatePilotJobMapping(resourceDict, jobID)
+
+      resultDict['DN'] = jobAttributes['OwnerDN']
+      resultDict['Group'] = jobAttributes['OwnerGroup']
+      resultDict['PilotInfoReportedFlag'] = True
+      resultList.append(resultDict)
+
+    if resultList and not pilotInfoReportedFlag:
+      self._updatePilotInfo(resourceDict)
+
+    matchTime = time.time() - startTime
+    self.log.info("Bulk match time", "[%s] for %d jobs" % (matchTime, len(resultList)))
+    gMonitor.addMark("matchTime", matchTime)
+
+    return resultList
+
   def _getResourceDict(self, resourceDescription, credDict):
     """ from resourceDescription to resourceDict (just various mods)
     """
@@ -236,6 +349,12 @@ class Matcher(object):
     else:
       self.log.verbose("Set job attributes for jobID", jobID)
 
+    if self.writeBehind:
+      # The record is time stamped now, so it keeps its place in the job history
+      self.writeBehind.add("addLoggingRecord, jobID = %s" % jobID, self.jlDB.addLoggingRecord,
+                           jobID, status='Matched', minor='Assigned', date=Time.dateTime(), source='Matcher')
+      return
+
     result = self.jlDB.addLoggingRecord(jobID,
                                         status='Matched',
                                         minor='Assigned',
@@ -246,6 +365,23 @@ class Matcher(object):
     else:
       self.log.verbose("Added logging record for jobID", jobID)
 
+  def _failJob(self, jobID, minorStatus):
+    """ Fail a job taken out of the TQ which can not be served, in jobDB and jobLoggingDB
+
+        Do not fail if errors happen here
+    """
+    result = self.jobDB.setJobStatus(jobID, status='Failed', minor=minorStatus)
+    if not result['OK']:
+      self.log.error("Problem failing job",
+                     "setJobStatus, jobID = %s: %s" % (jobID, result['Message']))
+    result = self.jlDB.addLoggingRecord(jobID,
+                                        status='Failed',
+                                        minor=minorStatus,
+                                        source='Matcher')
+    if not result['OK']:
+      self.log.error("Problem failing job",
+                     "addLoggingRecord, jobID = %s: %s" % (jobID, result['Message']))
+
   def _checkMask(self, resourceDict):
     """ Check the mask: are we allowed to run normal jobs?
 
@@ -281,6 +417,12 @@ class Matcher(object):
                                                                      site,
                                                                      benchmark))
 
+      if self.writeBehind:
+        self.writeBehind.add("setPilotStatus, pilotReference = %s" % pilotReference,
+                             self.pilotAgentsDB.setPilotStatus, pilotReference, status='Running',
+                             gridSite=site, destination=gridCE, benchmark=benchmark)
+        return
+
       result = self.pilotAgentsDB.setPilotStatus(pilotReference, status='Running', gridSite=site,
                                                  destination=gridCE, benchmark=benchmark)
       if not result['OK']:
@@ -292,6 +434,12 @@ class Matcher(object):
     """
     pilotReference = resourceDict.get('PilotReference', '')
     if pilotReference and pilotReference != 'Unknown':
+      if self.writeBehind:
+        self.writeBehind.add("setCurrentJobID, pilotReference = %s" % pilotReference,
+                             self.pilotAgentsDB.setCurrentJobID, pilotReference, jobID)
+        self.writeBehind.add("setJobForPilot, pilotReference = %s" % pilotReference,
+                             self.pilotAgentsDB.setJobForPilot, jobID, pilotReference, updateStatus=False)
+        return
       result = self.pilotAgentsDB.setCurrentJobID(pilotReference, jobID)
       if not result['OK']:
         self.log.error("Problem updating pilot information",
@@ -148,6 +148,42 @@ class MatcherTestCase(ClientsTestCase):
 
     self.assertEqual(res, resExpected)
 
+  def test_selectJobs(self):
+
+    self.matcher._getResourceDict = MagicMock(return_value={'Site': 'DIRAC.Jenkins.ch'})
+    self.matcher._updatePilotInfo = MagicMock()
+    self.matcher._updatePilotJobMapping = MagicMock()
+    self.matcher.limiter = MagicMock()
+    self.matcher.limiter.getNegativeCondForSite.return_value = {}
+    self.opsHelperMock.getValue.return_value = True
+    self.jobDBMock.setJobAttributes.return_value = S_OK()
+    self.jobDBMock.setJobStatus.return_value = S_OK()
+    self.jlDBMock.addLoggingRecord.return_value = S_OK()
+    self.tqDBMock.deleteJob.return_value = S_OK()
+
+    # No match
+    self.tqDBMock.matchAndGetJobs.return_value = S_OK({'matchFound': False, 'jobs': [], 'tqMatch': {}})
+    self.assertEqual(self.matcher.selectJobs({}, {}, 3), [])
+
+    # Job 1 is served, job 2 is not Waiting any more, job 3 has no attributes
+    self.tqDBMock.matchAndGetJobs.return_value = S_OK({'matchFound': True, 'jobs': [(1, 10), (2, 10), (3, 11)],
+                                                       'tqMatch': {}})
+    self.jobDBMock.getJobMatchBundles.return_value = S_OK({
+        1: {'Attributes': {'Status': 'Waiting', 'OwnerDN': '/DN/user', 'OwnerGroup': 'user'},
+            'JDL': '[ Executable = "ls"; ]', 'OptParameters': {'InputData': 'a'}},
+        2: {'Attributes': {'Status': 'Killed', 'OwnerDN': '/DN/user', 'OwnerGroup': 'user'},
+            'JDL': '[]', 'OptParameters': {}}})
+    res = self.matcher.selectJobs({}, {}, 3)
+    self.assertEqual(res, [{'JDL': '[ Executable = "ls"; ]', 'JobID': 1, 'InputData': 'a',
+                            'DN': '/DN/user', 'Group': 'user', 'PilotInfoReportedFlag': True}])
+    self.tqDBMock.matchAndGetJobs.assert_called_with({'Site': 'DIRAC.Jenkins.ch'}, maxJobs=3, negativeCond={})
+    self.jobDBMock.setJobAttributes.assert_called_once_with(1, ['Status', 'MinorStatus', 'ApplicationStatus', 'Site'],
+                                                            ['Matched', 'Assigned', 'Unknown', 'DIRAC.Jenkins.ch'])
+    self.tqDBMock.deleteJob.assert_called_once_with(2)
+    # the job without attributes is not left Waiting without a TQ
+    self.jobDBMock.setJobStatus.assert_called_once_with(3, status='Failed', minor='No attributes returned at matching')
+    self.assertEqual(self.matcher._updatePilotInfo.call_count, 1)
+
 #############################################################################
 
 
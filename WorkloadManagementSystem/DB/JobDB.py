@@ -24,6 +24,7 @@ import operator
 __RCSID__ = "$Id$"
 
 from DIRAC.Core.Utilities import DErrno
+from DIRAC.Core.Utilities.List import breakListIntoChunks
 from DIRAC.Core.Utilities.ClassAd.ClassAdLight import ClassAd
 from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
 from DIRAC.Core.Utilities import Time
@@ -55,6 +56,8 @@ class JobDB(DB):
     self.__initialized = False
     self.maxRescheduling = self.getCSOption('MaxRescheduling', 3)
     self.compressJDLs = self.getCSOption('CompressJDLs', False)
+    # whether multi-row inserts into JobJDLs get consecutive JobIDs, checked on first use
+    self.__consecutiveAutoInc = None
 
     # loading the function that will be used to determine the platform (it can be VO specific)
     res = ObjectLoader().loadObject("ConfigurationSystem.Client.Helpers.Resources", 'getDIRACPlatform')
@@ -699,6 +702,72 @@ class JobDB(DB):
 
     return S_OK()
 
+#############################################################################
+  def setJobsStatus(self, jobIDList, status='', minor='', application='', chunkSize=1000):
+    """ Set the status of several jobs at once, with grouped UPDATE statements.
+        As for the single job updates done by the JobStateUpdate service, the EndExecTime
+        is set for the final states and the StartExecTime for Running/Application.
+
+        :param list jobIDList: job IDs
+        :param str status: new major status
+        :param str minor: new minor status
+        :param str application: new application status
+        :param int chunkSize: maximum number of jobs per statement
+
+        :return: S_OK( { jobID: { 'Status': status, 'MinorStatus': minor } } ) with the status of
+                 the jobs as found after the update, non existing jobs are not in the result
+    """
+    if not jobIDList:
+      return S_OK({})
+
+    attrNames = []
+    attrValues = []
+    if status:
+      attrNames.append('Status')
+      attrValues.append(status)
+    if minor:
+      attrNames.append('MinorStatus')
+      attrValues.append(minor)
+    if application:
+      attrNames.append('ApplicationStatus')
+      attrValues.append(application[:255])
+
+    attr = []
+    for name, value in zip(attrNames, attrValues):
+      ret = self._escapeString(value)
+      if not ret['OK']:
+        return ret
+      attr.append("%s=%s" % (name, ret['Value']))
+    # Do not update the LastUpdate time stamp if setting the Stalled status
+    if attr and status != "Stalled":
+      attr.append("LastUpdateTime=UTC_TIMESTAMP()")
+
+    jobIDList = [int(jobID) for jobID in jobIDList]
+    resultDict = {}
+    for jobChunk in breakListIntoChunks(jobIDList, chunkSize):
+      jobString = ', '.join([str(jobID) for jobID in jobChunk])
+      cmdList = []
+      if attr:
+        cmdList.append('UPDATE Jobs SET %s WHERE JobID in ( %s )' % (', '.join(attr), jobString))
+      if status in JobStatus.JOB_FINAL_STATES:
+        cmdList.append("UPDATE Jobs SET EndExecTime=UTC_TIMESTAMP() WHERE JobID in ( %s ) \
+AND EndExecTime IS NULL" % jobString)
+      if status == JobStatus.RUNNING and minor == 'Application':
+        cmdList.append("UPDATE Jobs SET StartExecTime=UTC_TIMESTAMP() WHERE JobID in ( %s ) \
+AND StartExecTime IS NULL" % jobString)
+      if cmdList:
+        result = self._transaction(cmdList)
+        if not result['OK']:
+          return result
+
+      result = self.getAttributesForJobList(jobChunk, ['Status', 'MinorStatus'])
+      if not result['OK']:
+        return result
+      for jobID, attrDict in result['Value'].items():
+        resultDict[jobID] = {'Status': attrDict['Status'], 'MinorStatus': attrDict['MinorStatus']}
+
+    return S_OK(resultDict)
+
 #############################################################################
   def setEndExecTime(self, jobID, endDate=None):
     """ Set EndExecTime time stamp
@@ -764,20 +833,13 @@ class JobDB(DB):
     if not parameters:
       return S_OK()
 
-    insertValueList = []
-    for name, value in parameters:
-      ret = self._escapeString(name)
-      if not ret['OK']:
-        return ret
-      e_name = ret['Value']
-      ret = self._escapeString(value)
-      if not ret['OK']:
-        return ret
-      e_value = ret['Value']
-      insertValueList.append('(%s,%s,%s)' % (jobID, e_name, e_value))
+    try:
+      data = [(int(jobID), str(name), str(value)) for name, value in parameters]
+    except ValueError:
+      return S_ERROR('JobDB.setJobParameters: invalid parameters for job %s' % jobID)
 
-    cmd = 'REPLACE JobParameters (JobID,Name,Value) VALUES %s' % ', '.join(insertValueList)
-    return self._update(cmd)
+    cmd = 'REPLACE JobParameters (JobID,Name,Value) VALUES (%s,%s,%s)'
+    return self._updatemany(cmd, data)
 
 #############################################################################
   def setJobOptParameter(self, jobID, name, value):
@@ -938,6 +1000,46 @@ class JobDB(DB):
 
     return S_OK(jobID)
 
+  def __insertNewJDLs(self, jdlList, chunkSize=500):
+    """Insert several new JDLs in the system, this produces the new JobIDs, in the order of jdlList
+
+       The multi-row insert only gives consecutive ids when InnoDB does not interleave the
+       auto-increment values (innodb_autoinc_lock_mode 0 or 1), otherwise the JDLs are inserted one by one
+    """
+    if self.__consecutiveAutoInc is None:
+      result = self._query("SELECT @@innodb_autoinc_lock_mode")
+      self.__consecutiveAutoInc = bool(result['OK'] and result['Value'] and
+                                       int(result['Value'][0][0]) in (0, 1))
+    if not self.__consecutiveAutoInc:
+      jobIDs = []
+      for jdl in jdlList:
+        result = self.__insertNewJDL(jdl)
+        if not result['OK']:
+          return result
+        jobIDs.append(result['Value'])
+      return S_OK(jobIDs)
+
+    jobIDs = []
+    for jdlChunk in breakListIntoChunks(jdlList, chunkSize):
+      values = []
+      for jdl in jdlChunk:
+        result = self._escapeString(self.__compressJDL(jdl))
+        if not result['OK']:
+          return result
+        values.append("('', '', %s)" % result['Value'])
+      result = self._update("INSERT INTO JobJDLs (JDL, JobRequirements, OriginalJDL) VALUES %s" % ', '.join(values))
+      if not result['OK']:
+        self.log.error('Can not insert New JDLs', result['Message'])
+        return result
+      if 'lastRowId' not in result:
+        return S_ERROR('JobDB.__insertNewJDLs: Failed to retrieve new Ids.')
+      # lastRowId is the id of the first row of a multi-row insert
+      firstID = int(result['lastRowId'])
+      jobIDs.extend(range(firstID, firstID + len(jdlChunk)))
+
+    self.log.info('JobDB: New JobIDs served', "%d jobs, %s to %s" % (len(jobIDs), jobIDs[0], jobIDs[-1]))
+    return S_OK(jobIDs)
+
 #############################################################################
   def getJobJDL(self, jobID, original=False):
     """ Get JDL for job specified by its jobID. By default the current job JDL
@@ -961,6 +1063,59 @@ class JobDB(DB):
       return S_OK(self.__extractJDL(jdl[0][0]))
     return result
 
+#############################################################################
+  def getJobMatchBundles(self, jobIDList, attrList=None):
+    """ Get in a single query everything needed to serve matched jobs: the job attributes,
+        the current (decompressed) JDL and the optimizer parameters.
+
+        :param list jobIDList: list of job IDs
+        :param list attrList: job attributes to retrieve, by default OwnerDN, OwnerGroup and Status
+        :return: S_OK( { jobID : { 'Attributes' : dict, 'JDL' : str, 'OptParameters' : dict } } ) / S_ERROR
+    """
+    if not jobIDList:
+      return S_OK({})
+    if not attrList:
+      attrList = ['OwnerDN', 'OwnerGroup', 'Status']
+    missingAttr = [repr(x) for x in attrList if x not in self.jobAttributeNames]
+    if missingAttr:
+      return S_ERROR("JobDB.getJobMatchBundles: Unknown Attribute(s): %s" % ", ".join(missingAttr))
+
+    cmd = "SELECT J.JobID, %s, D.JDL, O.Name, O.Value FROM Jobs J \
+JOIN JobJDLs D ON D.JobID = J.JobID LEFT JOIN OptimizerParameters O ON O.JobID = J.JobID \
+WHERE J.JobID IN ( %s )" % (", ".join(["J.`%s`" % attr for attr in attrList]),
+                             ", ".join([str(int(jobID)) for jobID in jobIDList]))
+    result = self._query(cmd)
+    if not result['OK']:
+      return result
+
+    bundles = {}
+    nAttr = len(attrList)
+    for row in result['Value']:
+      jobID = int(row[0])
+      if jobID not in bundles:
+        bundles[jobID] = {'Attributes': dict(zip(attrList, [str(value) for value in row[1:nAttr + 1]])),
+                          'JDL': self.__extractJDL(row[nAttr + 1]),
+                          'OptParameters': {}}
+      name, value = row[nAttr + 2:]
+      if name is not None:
+        try:
+          value = value.tostring()
+        except BaseException:
+          pass
+        bundles[jobID]['OptParameters'][name] = value
+    return S_OK(bundles)
+
+  def getJobMatchBundle(self, jobID, attrList=None):
+    """ Get the attributes, JDL and optimizer parameters of a matched job in a single query,
+        see getJobMatchBundles
+
+        :return: S_OK( { 'Attributes' : dict, 'JDL' : str, 'OptParameters' : dict } ), S_OK( {} ) if not found
+    """
+    result = self.getJobMatchBundles([jobID], attrList=attrList)
+    if not result['OK']:
+      return result
+    return S_OK(result['Value'].get(int(jobID), {}))
+
 #############################################################################
   def insertNewJobIntoDB(self, jdl, owner, ownerDN, ownerGroup, diracSetup,
                          initialStatus=JobStatus.RECEIVED,
@@ -978,6 +1133,174 @@ class JobDB(DB):
         :param str initialMinorStatus: optional initial minor job status
         :return: new job ID
     """
+    result = self.__loadJobManifest(jdl, owner, ownerDN, ownerGroup, diracSetup)
+    if not result['OK']:
+      return result
+    jobManifest = result['Value']
+
+    # 1.- insert original JDL on DB and get new JobID
+    # Fix the possible lack of the brackets in the JDL
+    if jdl.strip()[0].find('[') != 0:
+      jdl = '[' + jdl + ']'
+    result = self.__insertNewJDL(jdl)
+    if not result['OK']:
+      return S_ERROR(EWMSSUBM, 'Failed to insert JDL in to DB')
+    jobID = result['Value']
+
+    # 2.- Check JDL and Prepare DIRAC JDL
+    result = self.__prepareNewJob(jobID, jobManifest, owner, ownerDN, ownerGroup, diracSetup,
+                                  initialStatus, initialMinorStatus)
+    if not result['OK']:
+      return result
+    job = result['Value']
+
+    retVal = S_OK(jobID)
+    retVal['JobID'] = jobID
+    retVal['Status'] = job['Status']
+    retVal['MinorStatus'] = job['MinorStatus']
+
+    if job['JDL'] is not None:
+      result = self.setJobJDL(jobID, job['JDL'])
+      if not result['OK']:
+        return result
+
+    # Adding the job in the Jobs table
+    result = self.insertFields('Jobs', job['AttrNames'], job['AttrValues'])
+    if not result['OK']:
+      return result
+    if job['JDL'] is None:
+      return retVal
+
+    # Setting the Job parameters
+    result = self.setJobParameters(jobID, job['Parameters'])
+    if not result['OK']:
+      return result
+
+    # Looking for the Input Data
+    values = []
+    for lfn in job['InputData']:
+      ret = self._escapeString(lfn)
+      if not ret['OK']:
+        return ret
+      values.append('(%d, %s )' % (jobID, ret['Value']))
+
+    if values:
+      cmd = 'INSERT INTO InputData (JobID,LFN) VALUES %s' % ', '.join(values)
+      result = self._update(cmd)
+      if not result['OK']:
+        return result
+
+    return retVal
+
+  def insertNewJobsIntoDB(self, jdlList, owner, ownerDN, ownerGroup, diracSetup,
+                          initialStatus=JobStatus.RECEIVED,
+                          initialMinorStatus="Job accepted",
+                          chunkSize=500):
+    """ Bulk version of insertNewJobIntoDB, used for parametric jobs: the rows of all the jobs
+        are written with multi-row statements into JobJDLs, Jobs, JobParameters and InputData
+
+        :param list jdlList: list of job description JDLs
+        :param str owner: job owner user name
+        :param str ownerDN: job owner DN
+        :param str ownerGroup: job owner group
+        :param str diracSetup: setup in which context the jobs are submitted
+        :param str initialStatus: optional initial job status (Received by default)
+        :param str initialMinorStatus: optional initial minor job status
+        :param int chunkSize: maximum number of rows per statement
+        :return: S_OK( list of { 'JobID', 'Status', 'MinorStatus' } dicts, in the order of jdlList ) / S_ERROR
+    """
+    if not jdlList:
+      return S_OK([])
+
+    # Check all the descriptions before writing anything
+    manifests = []
+    fixedJDLs = []
+    for jdl in jdlList:
+      result = self.__loadJobManifest(jdl, owner, ownerDN, ownerGroup, diracSetup)
+      if not result['OK']:
+        return result
+      manifests.append(result['Value'])
+      if jdl.strip()[0].find('[') != 0:
+        jdl = '[' + jdl + ']'
+      fixedJDLs.append(jdl)
+
+    # 1.- insert original JDLs on DB and get the new JobIDs
+    result = self.__insertNewJDLs(fixedJDLs, chunkSize=chunkSize)
+    if not result['OK']:
+      return S_ERROR(EWMSSUBM, 'Failed to insert JDL in to DB')
+    jobIDs = result['Value']
+
+    # 2.- Write the rows of the jobs, or remove the JDLs inserted above if anything fails
+    result = self.__insertNewJobRows(jobIDs, manifests, owner, ownerDN, ownerGroup, diracSetup,
+                                     initialStatus, initialMinorStatus, chunkSize)
+    if not result['OK']:
+      self._update("DELETE FROM JobJDLs WHERE JobID IN ( %s )" % ', '.join([str(jID) for jID in jobIDs]))
+    return result
+
+  def __insertNewJobRows(self, jobIDs, manifests, owner, ownerDN, ownerGroup, diracSetup,
+                         initialStatus, initialMinorStatus, chunkSize):
+    """ Check the JDLs of new jobs of which the JDLs were inserted, and write all their rows in a transaction
+
+        :return: S_OK( list of { 'JobID', 'Status', 'MinorStatus' } dicts ) / S_ERROR
+    """
+    # Check JDLs and prepare all the rows
+    jdlRows = []
+    jobRows = {}
+    parameterRows = []
+    inputDataRows = []
+    jobsInfo = []
+    for jobID, jobManifest in zip(jobIDs, manifests):
+      result = self.__prepareNewJob(jobID, jobManifest, owner, ownerDN, ownerGroup, diracSetup,
+                                    initialStatus, initialMinorStatus)
+      if not result['OK']:
+        return result
+      job = result['Value']
+      jobsInfo.append({'JobID': jobID, 'Status': job['Status'], 'MinorStatus': job['MinorStatus']})
+
+      result = self._escapeValues(job['AttrValues'])
+      if not result['OK']:
+        return result
+      jobRows.setdefault(tuple(job['AttrNames']), []).append('(%s)' % ', '.join(result['Value']))
+      if job['JDL'] is None:
+        continue
+      result = self._escapeString(self.__compressJDL(job['JDL']))
+      if not result['OK']:
+        return result
+      jdlRows.append("(%d, %s, '', '')" % (jobID, result['Value']))
+      for name, value in job['Parameters']:
+        result = self._escapeValues([name, value])
+        if not result['OK']:
+          return result
+        parameterRows.append('(%d, %s)' % (jobID, ', '.join(result['Value'])))
+      for lfn in job['InputData']:
+        result = self._escapeString(lfn)
+        if not result['OK']:
+          return result
+        inputDataRows.append('(%d, %s)' % (jobID, result['Value']))
+
+    # Write everything, with at most chunkSize rows per statement
+    cmdList = []
+    for rowChunk in breakListIntoChunks(jdlRows, chunkSize):
+      cmdList.append("INSERT INTO JobJDLs (JobID, JDL, JobRequirements, OriginalJDL) VALUES %s \
+ON DUPLICATE KEY UPDATE JDL = VALUES(JDL)" % ', '.join(rowChunk))
+    for attrNames, rows in jobRows.items():
+      for rowChunk in breakListIntoChunks(rows, chunkSize):
+        cmdList.append("INSERT INTO Jobs (%s) VALUES %s" % (', '.join(['`%s`' % name for name in attrNames]),
+                                                            ', '.join(rowChunk)))
+    for rowChunk in breakListIntoChunks(parameterRows, chunkSize):
+      cmdList.append("REPLACE JobParameters (JobID, Name, Value) VALUES %s" % ', '.join(rowChunk))
+    for rowChunk in breakListIntoChunks(inputDataRows, chunkSize):
+      cmdList.append("INSERT INTO InputData (JobID, LFN) VALUES %s" % ', '.join(rowChunk))
+    result = self._transaction(cmdList)
+    if not result['OK']:
+      return result
+
+    self.log.info("JobDB: bulk inserted jobs", "%d jobs in %d statements" % (len(jobsInfo), len(cmdList)))
+    return S_OK(jobsInfo)
+
+  def __loadJobManifest(self, jdl, owner, ownerDN, ownerGroup, diracSetup):
+    """ Load and check the manifest of a new job
+    """
     jobManifest = JobManifest()
     result = jobManifest.load(jdl)
     if not result['OK']:
@@ -989,18 +1312,18 @@ class JobDB(DB):
     result = jobManifest.check()
     if not result['OK']:
       return result
+    return S_OK(jobManifest)
+
+  def __prepareNewJob(self, jobID, jobManifest, owner, ownerDN, ownerGroup, diracSetup,
+                      initialStatus, initialMinorStatus):
+    """ Prepare the content of the DB rows of a new job, without writing them
+
+        :return: S_OK( dict with AttrNames, AttrValues, JDL, Parameters, InputData, Status and MinorStatus ) / S_ERROR
+                 JDL is None if the job is Failed because of a JDL syntax error
+    """
     jobAttrNames = []
     jobAttrValues = []
 
-    # 1.- insert original JDL on DB and get new JobID
-    # Fix the possible lack of the brackets in the JDL
-    if jdl.strip()[0].find('[') != 0:
-      jdl = '[' + jdl + ']'
-    result = self.__insertNewJDL(jdl)
-    if not result['OK']:
-      return S_ERROR(EWMSSUBM, 'Failed to insert JDL in to DB')
-    jobID = result['Value']
-
     jobManifest.setOption('JobID', jobID)
 
     jobAttrNames.append('JobID')
@@ -1024,7 +1347,6 @@ class JobDB(DB):
     jobAttrNames.append('DIRACSetup')
     jobAttrValues.append(diracSetup)
 
-    # 2.- Check JDL and Prepare DIRAC JDL
     jobJDL = jobManifest.dumpAsJDL()
 
     # Replace the JobID placeholder if any
@@ -1033,8 +1355,6 @@ class JobDB(DB):
 
     classAdJob = ClassAd(jobJDL)
     classAdReq = ClassAd('[]')
-    retVal = S_OK(jobID)
-    retVal['JobID'] = jobID
     if not classAdJob.isOK():
       jobAttrNames.append('Status')
       jobAttrValues.append(JobStatus.FAILED)
@@ -1042,13 +1362,9 @@ class JobDB(DB):
       jobAttrNames.append('MinorStatus')
       jobAttrValues.append('Error in JDL syntax')
 
-      result = self.insertFields('Jobs', jobAttrNames, jobAttrValues)
-      if not result['OK']:
-        return result
-
-      retVal['Status'] = 'Failed'
-      retVal['MinorStatus'] = 'Error in JDL syntax'
-      return retVal
+      return S_OK({'AttrNames': jobAttrNames, 'AttrValues': jobAttrValues,
+                   'JDL': None, 'Parameters': [], 'InputData': [],
+                   'Status': 'Failed', 'MinorStatus': 'Error in JDL syntax'})
 
     classAdJob.insertAttributeInt('JobID', jobID)
     result = self.__checkAndPrepareJob(jobID, classAdJob, classAdReq,
@@ -1091,54 +1407,19 @@ class JobDB(DB):
     reqJDL = classAdReq.asJDL()
     classAdJob.insertAttributeInt('JobRequirements', reqJDL)
 
-    jobJDL = classAdJob.asJDL()
-
-    result = self.setJobJDL(jobID, jobJDL)
-    if not result['OK']:
-      return result
-
-    # Adding the job in the Jobs table
-    result = self.insertFields('Jobs', jobAttrNames, jobAttrValues)
-    if not result['OK']:
-      return result
-
-    # Setting the Job parameters
-    result = self.__setInitialJobParameters(classAdJob, jobID)
-    if not result['OK']:
-      return result
+    # Extract initital job parameters
+    parameters = {}
+    if classAdJob.lookupAttribute("Parameters"):
+      parameters = classAdJob.getDictionaryFromSubJDL("Parameters")
 
-    # Looking for the Input Data
+    # Looking for the Input Data, some jobs are setting empty string as InputData
     inputData = []
     if classAdJob.lookupAttribute('InputData'):
-      inputData = classAdJob.getListFromExpression('InputData')
-    values = []
-
-    ret = self._escapeString(jobID)
-    if not ret['OK']:
-      return ret
-    e_jobID = ret['Value']
-
-    for lfn in inputData:
-      # some jobs are setting empty string as InputData
-      if not lfn:
-        continue
-      ret = self._escapeString(lfn.strip())
-      if not ret['OK']:
-        return ret
-      lfn = ret['Value']
-
-      values.append('(%s, %s )' % (e_jobID, lfn))
+      inputData = [lfn.strip() for lfn in classAdJob.getListFromExpression('InputData') if lfn]
 
-    if values:
-      cmd = 'INSERT INTO InputData (JobID,LFN) VALUES %s' % ', '.join(values)
-      result = self._update(cmd)
-      if not result['OK']:
-        return result
-
-    retVal['Status'] = initialStatus
-    retVal['MinorStatus'] = initialMinorStatus
-
-    return retVal
+    return S_OK({'AttrNames': jobAttrNames, 'AttrValues': jobAttrValues,
+                 'JDL': classAdJob.asJDL(), 'Parameters': list(parameters.items()), 'InputData': inputData,
+                 'Status': initialStatus, 'MinorStatus': initialMinorStatus})
 
   def __checkAndPrepareJob(self, jobID, classAdJob, classAdReq, owner, ownerDN,
                            ownerGroup, diracSetup, jobAttrNames, jobAttrValues):
@@ -1958,6 +2239,73 @@ class JobDB(DB):
       return S_OK()
     return S_ERROR('Failed to store some or all the parameters')
 
+#####################################################################################
+  def setHeartBeatDataBulk(self, heartBeats, chunkSize=1000):
+    """ Add the heart beat data of several jobs to the database with grouped statements.
+        Since the heart beats may be written some time after they were received, the status
+        of the jobs is only restored to Running if they are Stalled or Matched, so that a job
+        which reached another status in the meantime is not changed.
+        The heart beats of the jobs which are not in the database are ignored.
+
+        :param dict heartBeats: { jobID: { 'HeartBeatTime': str, 'StaticData': dict,
+                                           'DynamicData': [ ( name, value, time ) ] } }
+        :param int chunkSize: maximum number of jobs per statement
+        :return: S_OK( list of the IDs of the unknown jobs ) / S_ERROR
+    """
+    unknownJobs = []
+    if not heartBeats:
+      return S_OK(unknownJobs)
+
+    restoreCondition = "Status IN ('%s', '%s')" % (JobStatus.STALLED, JobStatus.MATCHED)
+    for jobChunk in breakListIntoChunks(sorted(heartBeats), chunkSize):
+      result = self._query("SELECT JobID FROM Jobs WHERE JobID IN ( %s )" %
+                           ', '.join([str(int(jobID)) for jobID in jobChunk]))
+      if not result['OK']:
+        return result
+      knownJobs = set(row[0] for row in result['Value'])
+      unknownJobs.extend(jobID for jobID in jobChunk if int(jobID) not in knownJobs)
+      jobChunk = [jobID for jobID in jobChunk if int(jobID) in knownJobs]
+      if not jobChunk:
+        continue
+
+      timeCases = []
+      parameterValues = []
+      loggingValues = []
+      for jobID in jobChunk:
+        heartBeat = heartBeats[jobID]
+        result = self._escapeString(heartBeat['HeartBeatTime'])
+        if not result['OK']:
+          return result
+        timeCases.append("WHEN %d THEN %s" % (int(jobID), result['Value']))
+        for name, value in heartBeat['StaticData'].items():
+          result = self._escapeValues([name, value])
+          if not result['OK']:
+            return result
+          parameterValues.append('(%d,%s)' % (int(jobID), ','.join(result['Value'])))
+        for name, value, hbTime in heartBeat['DynamicData']:
+          result = self._escapeValues([name, value, hbTime])
+          if not result['OK']:
+            self.log.warn('Failed to escape heart beat data', name)
+            continue
+          loggingValues.append('(%d,%s)' % (int(jobID), ','.join(result['Value'])))
+
+      # LastUpdateTime must be set before Status, the assignments being evaluated from left to right
+      cmdList = ["UPDATE Jobs SET HeartBeatTime = CASE JobID %s END, \
+LastUpdateTime = IF(%s, UTC_TIMESTAMP(), LastUpdateTime), Status = IF(%s, '%s', Status) \
+WHERE JobID IN ( %s )" % (' '.join(timeCases), restoreCondition, restoreCondition, JobStatus.RUNNING,
+                          ', '.join([str(int(jobID)) for jobID in jobChunk]))]
+      # FIXME: It is rather not optimal to use parameters to store the heartbeat info, must find a proper solution
+      if parameterValues:
+        cmdList.append('REPLACE JobParameters (JobID,Name,Value) VALUES %s' % ', '.join(parameterValues))
+      if loggingValues:
+        cmdList.append("INSERT INTO HeartBeatLoggingInfo (JobID,Name,Value,HeartBeatTime) VALUES %s" %
+                       ','.join(loggingValues))
+      result = self._transaction(cmdList)
+      if not result['OK']:
+        return S_ERROR('Failed to set the heart beat data: %s' % result['Message'])
+
+    return S_OK(unknownJobs)
+
 #####################################################################################
   def getHeartBeatData(self, jobID):
     """ Retrieve the job's heart beat data
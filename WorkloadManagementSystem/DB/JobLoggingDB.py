@@ -2,6 +2,7 @@
     The following methods are provided
 
     addLoggingRecord()
+    addLoggingRecords()
     getJobLoggingInfo()
     deleteJob()
     getWMSTimeStamps()
@@ -14,6 +15,7 @@ import time
 
 from DIRAC import S_OK, S_ERROR
 from DIRAC.Core.Utilities import Time
+from DIRAC.Core.Utilities.List import breakListIntoChunks
 from DIRAC.Core.Base.DB import DB
 
 MAGIC_EPOC_NUMBER = 1270000000
@@ -50,6 +52,74 @@ class JobLoggingDB(DB):
     event = 'status/minor/app=%s/%s/%s' % (status, minor, application)
     self.log.info("Adding record for job ", str(jobID) + ": '" + event + "' from " + source)
 
+    _date, time_order = self.__getStatusTime(date)
+
+    cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
+          "StatusTime, StatusTimeOrder, StatusSource) VALUES (%d,'%s','%s','%s','%s',%f,'%s')" % \
+        (int(jobID), status, minor, application[:255],
+         str(_date), time_order, source)
+
+    return self._update(cmd)
+
+#############################################################################
+  def addLoggingRecords(self,
+                        jobIDList,
+                        status='idem',
+                        minor='idem',
+                        application='idem',
+                        date='',
+                        source='Unknown',
+                        chunkSize=1000):
+    """ Bulk version of addLoggingRecord: the records of all the jobs are added with multi-row inserts.
+        Each of status, minor, application and date can be either a single value used for all
+        the jobs or a list of values with the same length as jobIDList.
+    """
+    if not jobIDList:
+      return S_OK()
+
+    def _perJob(value):
+      """ Expand a single value to one value per job """
+      if isinstance(value, (list, tuple)):
+        return list(value)
+      return [value] * len(jobIDList)
+
+    statusList = _perJob(status)
+    minorList = _perJob(minor)
+    applicationList = _perJob(application)
+    dateList = _perJob(date)
+    for valueList in (statusList, minorList, applicationList, dateList):
+      if len(valueList) != len(jobIDList):
+        return S_ERROR('addLoggingRecords: the number of values does not match the number of jobs')
+
+    self.log.info("Adding records for jobs", "%d jobs from %s" % (len(jobIDList), source))
+
+    result = self._escapeString(source)
+    if not result['OK']:
+      return result
+    e_source = result['Value']
+
+    values = []
+    for jobID, jobStatus, jobMinor, jobApplication, jobDate in zip(jobIDList, statusList, minorList,
+                                                                   applicationList, dateList):
+      _date, time_order = self.__getStatusTime(jobDate)
+      result = self._escapeValues([jobStatus, jobMinor, jobApplication[:255], str(_date)])
+      if not result['OK']:
+        return result
+      values.append("(%d,%s,%f,%s)" % (int(jobID), ','.join(result['Value']), time_order, e_source))
+
+    for valueChunk in breakListIntoChunks(values, chunkSize):
+      cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
+            "StatusTime, StatusTimeOrder, StatusSource) VALUES %s" % ','.join(valueChunk)
+      result = self._update(cmd)
+      if not result['OK']:
+        return result
+    return S_OK()
+
+  def __getStatusTime(self, date):
+    """ Evaluate the time stamp of a logging record and its order key
+
+        :return: tuple ( datetime, time order )
+    """
     if not date:
       # Make the UTC datetime string and float
       _date = Time.dateTime()
@@ -77,13 +147,7 @@ class JobLoggingDB(DB):
         _date = Time.dateTime()
         epoc = time.mktime(_date.timetuple()) - MAGIC_EPOC_NUMBER
         time_order = round(epoc, 3)
-
-    cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
-          "StatusTime, StatusTimeOrder, StatusSource) VALUES (%d,'%s','%s','%s','%s',%f,'%s')" % \
-        (int(jobID), status, minor, application[:255],
-         str(_date), time_order, source)
-
-    return self._update(cmd)
+    return _date, time_order
 
 #############################################################################
   def getJobLoggingInfo(self, jobID):
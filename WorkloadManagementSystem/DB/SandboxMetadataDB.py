@@ -91,15 +91,28 @@ class SandboxMetadataDB(DB):
     # Its not there, insert it
     sqlCmd = "INSERT INTO `sb_Owners` ( OwnerId, Owner, OwnerDN, OwnerGroup ) VALUES ( 0, %s, %s, %s )" % (
         ownerEscaped, ownerDNEscaped, ownerGroupEscaped)
-    result = self._update(sqlCmd)
+    return self.__insertAndGetId(sqlCmd, "owner id")
+
+  def __insertAndGetId(self, sqlCmd, idName):
+    """
+    Insert a row and get its id, LAST_INSERT_ID() must be queried on the connection of the insertion
+    """
+    result = self._getConnection()
     if not result['OK']:
       return result
-    if 'lastRowId' in result:
-      return S_OK(result['lastRowId'])
-    result = self._query("SELECT LAST_INSERT_ID()")
-    if not result['OK']:
-      return S_ERROR("Can't determine owner id after insertion")
-    return S_OK(result['Value'][0][0])
+    connObj = result['Value']
+    try:
+      result = self._update(sqlCmd, conn=connObj)
+      if not result['OK']:
+        return result
+      if 'lastRowId' in result:
+        return S_OK(result['lastRowId'])
+      result = self._query("SELECT LAST_INSERT_ID()", conn=connObj)
+      if not result['OK']:
+        return S_ERROR("Can't determine %s after insertion" % idName)
+      return S_OK(result['Value'][0][0])
+    finally:
+      self._releaseConnection()
 
   def registerAndGetSandbox(self, owner, ownerDN, ownerGroup, sbSE, sbPFN, size=0):
     """
@@ -113,7 +126,7 @@ class SandboxMetadataDB(DB):
     sqlCmd = "INSERT INTO `sb_SandBoxes` ( SBId, OwnerId, SEName, SEPFN, Bytes, RegistrationTime, LastAccessTime )"
     sqlCmd = "%s VALUES ( 0, '%s', '%s', '%s', %d, UTC_TIMESTAMP(), UTC_TIMESTAMP() )" % (sqlCmd, ownerId, sbSE,
                                                                                           sbPFN, size)
-    result = self._update(sqlCmd)
+    result = self.__insertAndGetId(sqlCmd, "sand box id")
     if not result['OK']:
       if result['Message'].find("Duplicate entry") == -1:
         return result
@@ -128,13 +141,7 @@ class SandboxMetadataDB(DB):
       sbId = result['Value'][0][0]
       self.accessedSandboxById(sbId)
       return S_OK((sbId, False))
-    # Inserted, time to get the id
-    if 'lastRowId' in result:
-      return S_OK((result['lastRowId'], True))
-    result = self._query("SELECT LAST_INSERT_ID()")
-    if not result['OK']:
-      return S_ERROR("Can't determine sand box id after insertion")
-    return S_OK((result['Value'][0][0], True))
+    return S_OK((result['Value'], True))
 
   def accessedSandboxById(self, sbId):
     """
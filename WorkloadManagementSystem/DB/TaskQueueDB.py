@@ -17,6 +17,7 @@ from DIRAC.Core.Security import Properties
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 from DIRAC.ConfigurationSystem.Client.Helpers import Registry
 from DIRAC.WorkloadManagementSystem.private.SharesCorrector import SharesCorrector
+from DIRAC.WorkloadManagementSystem.private.TaskQueueMatchIndex import TaskQueueMatchIndex
 
 DEFAULT_GROUP_SHARE = 1000
 TQ_MIN_SHARE = 0.001
@@ -62,6 +63,7 @@ class TaskQueueDB(DB):
     self.__opsHelper = Operations()
     self.__ensureInsertionIsSingle = False
     self.__sharesCorrector = SharesCorrector(self.__opsHelper)
+    self.__matchIndex = None
     result = self.__initializeDB()
     if not result['OK']:
       raise Exception("Can't create tables: %s" % result['Message'])
@@ -252,7 +254,10 @@ class TaskQueueDB(DB):
       result = self._getConnection()
       if not result['OK']:
         return S_ERROR("Can't create task queue: %s" % result['Message'])
-      connObj = result['Value']
+      try:
+        return self.__createTaskQueue(tqDefDict, priority, connObj=result['Value'])
+      finally:
+        self._releaseConnection()
     tqDefDict['CPUTime'] = self.fitCPUTimeToSegments(tqDefDict['CPUTime'])
     sqlSingleFields = ['TQId', 'Priority']
     sqlValues = ["0", str(priority)]
@@ -290,6 +295,8 @@ class TaskQueueDB(DB):
                        "%s : %s" % field, result['Message'])
         self.cleanOrphanedTaskQueues(connObj=connObj)
         return S_ERROR("Can't insert values %s for field %s: %s" % (str(values), field, result['Message']))
+    if self.__matchIndex is not None:
+      self.__matchIndex.invalidate(tqId)
     self.log.info("Created TQ", tqId)
     return S_OK(tqId)
 
@@ -317,6 +324,9 @@ class TaskQueueDB(DB):
         "DELETE FROM `tq_TaskQueues` WHERE TQId in ( %s )" % ','.join(orphanedTQs), conn=connObj)
     if not result['OK']:
       return result
+    if self.__matchIndex is not None:
+      for tqId in orphanedTQs:
+        self.__matchIndex.removeTaskQueue(int(tqId))
     return S_OK()
 
   def __setTaskQueueEnabled(self, tqId, enabled=True, connObj=False):
@@ -359,7 +369,14 @@ class TaskQueueDB(DB):
     retVal = self._getConnection()
     if not retVal['OK']:
       return S_ERROR("Can't insert job: %s" % retVal['Message'])
-    connObj = retVal['Value']
+    try:
+      return self.__insertJob(jobId, tqDefDict, jobPriority, skipTQDefCheck, retVal['Value'])
+    finally:
+      self._releaseConnection()
+
+  def __insertJob(self, jobId, tqDefDict, jobPriority, skipTQDefCheck, connObj):
+    """ Insert a job in a task queue using the given connection
+    """
     if not skipTQDefCheck:
       tqDefDict = dict(tqDefDict)
       retVal = self._checkTaskQueueDefinition(tqDefDict)
@@ -412,7 +429,10 @@ class TaskQueueDB(DB):
       result = self._getConnection()
       if not result['OK']:
         return S_ERROR("Can't insert job: %s" % result['Message'])
-      connObj = result['Value']
+      try:
+        return self.__insertJobInTaskQueue(jobId, tqId, jobPriority, checkTQExists, connObj=result['Value'])
+      finally:
+        self._releaseConnection()
     if checkTQExists:
       result = self._query("SELECT tqId FROM `tq_TaskQueues` WHERE TQId = %s" % tqId, conn=connObj)
       if not result['OK'] or not result['Value']:
@@ -515,6 +535,8 @@ ORDER BY COUNT( `tq_Jobs`.JobID ) ASC" % (sqlCmd, result['Value'])
     """
     if negativeCond is None:
       negativeCond = {}
+    # The match index works with the original (non escaped) values
+    rawMatchDict = dict(tqMatchDict)
     # Make a copy to avoid modification of original if escaping needs to be done
     tqMatchDict = dict(tqMatchDict)
     retVal = self._checkMatchDefinition(tqMatchDict)
@@ -524,7 +546,15 @@ ORDER BY COUNT( `tq_Jobs`.JobID ) ASC" % (sqlCmd, result['Value'])
     retVal = self._getConnection()
     if not retVal['OK']:
       return S_ERROR("Can't connect to DB: %s" % retVal['Message'])
-    connObj = retVal['Value']
+    try:
+      return self.__matchAndGetJob(tqMatchDict, rawMatchDict, numJobsPerTry, numQueuesPerTry, negativeCond,
+                                   retVal['Value'])
+    finally:
+      self._releaseConnection()
+
+  def __matchAndGetJob(self, tqMatchDict, rawMatchDict, numJobsPerTry, numQueuesPerTry, negativeCond, connObj):
+    """ Match a job using the given connection
+    """
     preJobSQL = "SELECT `tq_Jobs`.JobId, `tq_Jobs`.TQId \
 FROM `tq_Jobs` WHERE `tq_Jobs`.TQId = %s AND `tq_Jobs`.Priority = %s"
     prioSQL = "SELECT `tq_Jobs`.Priority FROM `tq_Jobs` \
@@ -539,6 +569,10 @@ WHERE `tq_Jobs`.TQId = %s ORDER BY RAND() / `tq_Jobs`.RealPriority ASC LIMIT 1"
                                            skipMatchDictDef=True,
                                            connObj=connObj)
         preJobSQL = "%s AND `tq_Jobs`.JobId = %s " % (preJobSQL, tqMatchDict['JobID'])
+      elif self.__matchIndex is not None:
+        retVal = self.__matchTaskQueuesInIndex(rawMatchDict,
+                                               numQueuesToGet=numQueuesPerTry,
+                                               negativeCond=negativeCond)
       else:
         retVal = self.matchAndGetTaskQueue(tqMatchDict,
                                            numQueuesToGet=numQueuesPerTry,
@@ -567,6 +601,9 @@ WHERE `tq_Jobs`.TQId = %s ORDER BY RAND() / `tq_Jobs`.RealPriority ASC LIMIT 1"
         if not jobTQList:
           self.log.info("Task queue seems to be empty, triggering a cleaning of", tqId)
           self.__deleteTQWithDelay.add(tqId, 300, (tqId, tqOwnerDN, tqOwnerGroup))
+          if self.__matchIndex is not None:
+            # It will come back with the next refresh if jobs are inserted in the meantime
+            self.__matchIndex.removeTaskQueue(tqId)
         while jobTQList:
           jobId, tqId = jobTQList.pop(random.randint(0, len(jobTQList) - 1))
           self.log.info("Trying to extract job from TQ",
@@ -588,6 +625,208 @@ WHERE `tq_Jobs`.TQId = %s ORDER BY RAND() / `tq_Jobs`.RealPriority ASC LIMIT 1"
     self.log.info("Could not find a match after %s match retries" % self.__maxMatchRetry)
     return S_ERROR("Could not find a match after %s match retries" % self.__maxMatchRetry)
 
+  def matchAndGetJobs(self, tqMatchDict, maxJobs=1, numJobsPerTry=50, numQueuesPerTry=10, negativeCond=None):
+    """ Match up to maxJobs jobs based on requirements. The jobs are taken out of the
+        task queues in one transaction per task queue
+
+        :param dict tqMatchDict: dict of the resource requirements
+        :param int maxJobs: maximum number of jobs to extract
+        :returns: S_OK( { 'matchFound' : bool, 'jobs' : [ ( jobId, tqId ) ], 'tqMatch' : dict } ) / S_ERROR
+    """
+    if negativeCond is None:
+      negativeCond = {}
+    if 'JobID' in tqMatchDict or maxJobs <= 1:
+      # A given JobID can only be matched once
+      result = self.matchAndGetJob(tqMatchDict, numJobsPerTry=numJobsPerTry,
+                                   numQueuesPerTry=numQueuesPerTry, negativeCond=negativeCond)
+      if not result['OK'] or not result['Value']['matchFound']:
+        return result
+      match = result['Value']
+      return S_OK({'matchFound': True, 'jobs': [(match['jobId'], match['taskQueueId'])], 'tqMatch': match['tqMatch']})
+
+    rawMatchDict = dict(tqMatchDict)
+    tqMatchDict = dict(tqMatchDict)
+    retVal = self._checkMatchDefinition(tqMatchDict)
+    if not retVal['OK']:
+      self.log.error("TQ match request check failed", retVal['Message'])
+      return retVal
+    retVal = self._getConnection()
+    if not retVal['OK']:
+      return S_ERROR("Can't connect to DB: %s" % retVal['Message'])
+    try:
+      return self.__matchAndGetJobs(tqMatchDict, rawMatchDict, maxJobs, numJobsPerTry, numQueuesPerTry, negativeCond,
+                                    retVal['Value'])
+    finally:
+      self._releaseConnection()
+
+  def __matchAndGetJobs(self, tqMatchDict, rawMatchDict, maxJobs, numJobsPerTry, numQueuesPerTry, negativeCond,
+                        connObj):
+    """ Match up to maxJobs jobs using the given connection
+    """
+    prioSQL = "SELECT `tq_Jobs`.Priority FROM `tq_Jobs` \
+WHERE `tq_Jobs`.TQId = %s ORDER BY RAND() / `tq_Jobs`.RealPriority ASC LIMIT 1"
+    jobSQL = "SELECT `tq_Jobs`.JobId FROM `tq_Jobs` WHERE `tq_Jobs`.TQId = %s AND `tq_Jobs`.Priority = %s \
+ORDER BY `tq_Jobs`.JobId ASC LIMIT %s"
+    matchedJobs = []
+    for _ in xrange(self.__maxMatchRetry):
+      if self.__matchIndex is not None:
+        retVal = self.__matchTaskQueuesInIndex(rawMatchDict,
+                                               numQueuesToGet=numQueuesPerTry,
+                                               negativeCond=negativeCond)
+      else:
+        retVal = self.matchAndGetTaskQueue(tqMatchDict,
+                                           numQueuesToGet=numQueuesPerTry,
+                                           skipMatchDictDef=True,
+                                           negativeCond=negativeCond,
+                                           connObj=connObj)
+      if not retVal['OK']:
+        return retVal
+      tqList = retVal['Value']
+      if not tqList:
+        self.log.info("No TQ matches requirements")
+        break
+      for tqId, tqOwnerDN, tqOwnerGroup in tqList:
+        retVal = self._query(prioSQL % tqId, conn=connObj)
+        if not retVal['OK']:
+          return S_ERROR("Can't retrieve winning priority for matching job: %s" % retVal['Message'])
+        if not retVal['Value']:
+          continue
+        prio = retVal['Value'][0][0]
+        retVal = self._query(jobSQL % (tqId, prio, max(numJobsPerTry, maxJobs - len(matchedJobs))), conn=connObj)
+        if not retVal['OK']:
+          return retVal
+        jobIDs = [row[0] for row in retVal['Value']]
+        if not jobIDs:
+          self.log.info("Task queue seems to be empty, triggering a cleaning of", tqId)
+          self.__deleteTQWithDelay.add(tqId, 300, (tqId, tqOwnerDN, tqOwnerGroup))
+          if self.__matchIndex is not None:
+            self.__matchIndex.removeTaskQueue(tqId)
+          continue
+        random.shuffle(jobIDs)
+        retVal = self.__extractJobs(jobIDs[:maxJobs - len(matchedJobs)], connObj=connObj)
+        if not retVal['OK']:
+          self.log.error("Could not take jobs out from the TQ", "%s: %s" % (tqId, retVal['Message']))
+          return retVal
+        self.log.info("Extracted jobs with prio from TQ", "(%d : %s : %s)" % (len(retVal['Value']), prio, tqId))
+        matchedJobs.extend([(jobId, tqId) for jobId in retVal['Value']])
+        self.__deleteTQWithDelay.add(tqId, 300, (tqId, tqOwnerDN, tqOwnerGroup))
+        if len(matchedJobs) >= maxJobs:
+          break
+      if len(matchedJobs) >= maxJobs:
+        break
+    return S_OK({'matchFound': bool(matchedJobs), 'jobs': matchedJobs, 'tqMatch': tqMatchDict})
+
+  def __extractJobs(self, jobIDs, connObj=False):
+    """ Atomically delete jobs from the task queues: the rows are locked in a transaction
+        so that only the jobs that were still there (and not taken by a concurrent match) are returned
+
+        :param list jobIDs: candidate job IDs
+        :returns: S_OK( list of extracted job IDs ) / S_ERROR
+    """
+    if not jobIDs:
+      return S_OK([])
+    result = self.transactionStart()
+    if not result['OK']:
+      return result
+    jobString = ", ".join([str(int(jobId)) for jobId in jobIDs])
+    result = self._query("SELECT JobId FROM `tq_Jobs` WHERE JobId IN ( %s ) FOR UPDATE" % jobString, conn=connObj)
+    if not result['OK']:
+      self.transactionRollback()
+      return result
+    lockedIDs = [row[0] for row in result['Value']]
+    if lockedIDs:
+      lockedString = ", ".join([str(jobId) for jobId in lockedIDs])
+      result = self._update("DELETE FROM `tq_Jobs` WHERE JobId IN ( %s )" % lockedString, conn=connObj)
+      if not result['OK']:
+        self.transactionRollback()
+        return result
+    result = self.transactionCommit()
+    if not result['OK']:
+      return result
+    return S_OK(lockedIDs)
+
+  def enableMatchIndex(self):
+    """ Keep an in-memory index of the task queue definitions, used by matchAndGetJob
+        to select the candidate task queues without querying the DB.
+        The index is updated by this object for the TQs it creates or deletes,
+        refreshMatchIndex has to be called periodically to catch changes done by other processes
+
+        :returns: S_OK() / S_ERROR
+    """
+    if self.__matchIndex is None:
+      self.__matchIndex = TaskQueueMatchIndex()
+    return self.refreshMatchIndex()
+
+  def refreshMatchIndex(self):
+    """ Synchronise the match index with the DB: drop the deleted TQs, update the priorities
+        and load the definitions of the new ones
+
+        :returns: S_OK( number of loaded TQs ) / S_ERROR
+    """
+    if self.__matchIndex is None:
+      return S_ERROR("Match index is not enabled")
+    result = self._query("SELECT TQId, Priority FROM `tq_TaskQueues`")
+    if not result['OK']:
+      self.log.error("Can't refresh the task queue match index", result['Message'])
+      return result
+    toLoad = self.__matchIndex.sync(dict((row[0], row[1]) for row in result['Value']))
+    return self.__loadInMatchIndex(toLoad)
+
+  def __loadInMatchIndex(self, tqIdList):
+    """ Load the given TQs definitions in the match index
+    """
+    if not tqIdList:
+      return S_OK(0)
+    result = self.getTaskQueueDefinitions(list(tqIdList))
+    if not result['OK']:
+      for tqId in tqIdList:
+        self.__matchIndex.invalidate(tqId)
+      return result
+    for tqId, tqDef in result['Value'].items():
+      self.__matchIndex.addTaskQueue(tqId, tqDef)
+    return S_OK(len(result['Value']))
+
+  def __matchTaskQueuesInIndex(self, tqMatchDict, numQueuesToGet=1, negativeCond=None):
+    """ Get the queues that match the requirements from the match index
+    """
+    # Load first the TQs created by this process since the last refresh
+    result = self.__loadInMatchIndex(self.__matchIndex.getPendingTaskQueues())
+    if not result['OK']:
+      self.log.warn("Could not load new task queues in the match index", result['Message'])
+    return self.__matchIndex.match(tqMatchDict, numQueuesToGet=numQueuesToGet, negativeCond=negativeCond)
+
+  def getMatchIndexStats(self):
+    """ Get the counters of the match index, if enabled
+    """
+    if self.__matchIndex is None:
+      return S_ERROR("Match index is not enabled")
+    return S_OK(self.__matchIndex.getStats())
+
+  def getTaskQueueDefinitions(self, tqIdList):
+    """ Get the full definition of the given task queues, including empty ones
+
+        :param list tqIdList: list of TQ IDs
+        :returns: S_OK( { tqId : { field : value(s) } } ) / S_ERROR
+    """
+    if not tqIdList:
+      return S_OK({})
+    tqCond = "TQId in ( %s )" % ", ".join([str(int(tqId)) for tqId in tqIdList])
+    sqlFields = ['TQId', 'Priority'] + list(singleValueDefFields)
+    result = self._query("SELECT %s FROM `tq_TaskQueues` WHERE %s" % (", ".join(sqlFields), tqCond))
+    if not result['OK']:
+      return result
+    tqData = {}
+    for record in result['Value']:
+      tqData[record[0]] = dict(zip(sqlFields[1:], record[1:]))
+    for field in multiValueDefFields:
+      result = self._query("SELECT TQId, Value FROM `tq_TQTo%s` WHERE %s" % (field, tqCond))
+      if not result['OK']:
+        return result
+      for tqId, value in result['Value']:
+        if tqId in tqData:
+          tqData[tqId].setdefault(field, []).append(value)
+    return S_OK(tqData)
+
   def matchAndGetTaskQueue(self, tqMatchDict, numQueuesToGet=1, skipMatchDictDef=False,
                            negativeCond=None, connObj=False):
     """ Get a queue that matches the requirements
@@ -879,7 +1118,10 @@ WHERE `tq_Jobs`.TQId = %s ORDER BY RAND() / `tq_Jobs`.RealPriority ASC LIMIT 1"
       retVal = self._getConnection()
       if not retVal['OK']:
         return S_ERROR("Can't delete job: %s" % retVal['Message'])
-      connObj = retVal['Value']
+      try:
+        return self.deleteJob(jobId, connObj=retVal['Value'])
+      finally:
+        self._releaseConnection()
     retVal = self._query(
         "SELECT t.TQId, t.OwnerDN, t.OwnerGroup \
 FROM `tq_TaskQueues` t, `tq_Jobs` j \
@@ -911,7 +1153,10 @@ WHERE j.JobId = %s AND t.TQId = j.TQId" %
       retVal = self._getConnection()
       if not retVal['OK']:
         return S_ERROR("Can't get TQ for job: %s" % retVal['Message'])
-      connObj = retVal['Value']
+      try:
+        return self.getTaskQueueForJob(jobId, connObj=retVal['Value'])
+      finally:
+        self._releaseConnection()
 
     retVal = self._query('SELECT TQId FROM `tq_Jobs` WHERE JobId = %s ' % jobId, conn=connObj)
 
@@ -932,7 +1177,10 @@ WHERE j.JobId = %s AND t.TQId = j.TQId" %
       if not retVal['OK']:
         self.log.error("Can't get TQs for a job list", retVal['Message'])
         return retVal
-      connObj = retVal['Value']
+      try:
+        return self.getTaskQueueForJobs(jobIDs, connObj=retVal['Value'])
+      finally:
+        self._releaseConnection()
 
     jobString = ','.join([str(x) for x in jobIDs])
     retVal = self._query('SELECT JobId,TQId FROM `tq_Jobs` WHERE JobId in (%s) ' % jobString, conn=connObj)
@@ -978,7 +1226,10 @@ WHERE j.JobId = %s AND t.TQId = j.TQId" %
       if not retVal['OK']:
         self.log.error("Can't insert job", retVal['Message'])
         return retVal
-      connObj = retVal['Value']
+      try:
+        return self.deleteTaskQueueIfEmpty(tqId, tqOwnerDN, tqOwnerGroup, connObj=retVal['Value'])
+      finally:
+        self._releaseConnection()
     if not tqOwnerDN or not tqOwnerGroup:
       retVal = self.__getOwnerForTaskQueue(tqId, connObj=connObj)
       if not retVal['OK']:
@@ -1005,6 +1256,8 @@ WHERE j.JobId = %s AND t.TQId = j.TQId" %
       retVal = self._update("DELETE FROM `tq_TaskQueues` WHERE TQId = %s" % tqId, conn=connObj)
       if not retVal['OK']:
         return retVal
+      if self.__matchIndex is not None:
+        self.__matchIndex.removeTaskQueue(tqId)
       self.recalculateTQSharesForEntity(tqOwnerDN, tqOwnerGroup, connObj=connObj)
       self.log.info("Deleted empty and enabled TQ", tqId)
       return S_OK()
@@ -1019,7 +1272,10 @@ WHERE j.JobId = %s AND t.TQId = j.TQId" %
       retVal = self._getConnection()
       if not retVal['OK']:
         return S_ERROR("Can't insert job: %s" % retVal['Message'])
-      connObj = retVal['Value']
+      try:
+        return self.deleteTaskQueue(tqId, tqOwnerDN, tqOwnerGroup, connObj=retVal['Value'])
+      finally:
+        self._releaseConnection()
     if not tqOwnerDN or not tqOwnerGroup:
       retVal = self.__getOwnerForTaskQueue(tqId, connObj=connObj)
       if not retVal['OK']:
@@ -1041,6 +1297,8 @@ WHERE j.JobId = %s AND t.TQId = j.TQId" %
       retVal = self._update("DELETE FROM `tq_TQTo%s` WHERE TQId = %s" % (field, tqId), conn=connObj)
       if not retVal['OK']:
         return retVal
+    if self.__matchIndex is not None:
+      self.__matchIndex.removeTaskQueue(tqId)
     if delTQ > 0:
       self.recalculateTQSharesForEntity(tqOwnerDN, tqOwnerGroup, connObj=connObj)
       return S_OK(True)
@@ -1152,9 +1410,6 @@ WHERE j.JobId = %s AND t.TQId = j.TQId" %
       self.__sharesCorrector.update()
     self.__updateGlobalShares()
     self.log.info("Recalculating shares for all TQs")
-    retVal = self._getConnection()
-    if not retVal['OK']:
-      return S_ERROR("Can't insert job: %s" % retVal['Message'])
     result = self._query("SELECT DISTINCT( OwnerGroup ) FROM `tq_TaskQueues`")
     if not result['OK']:
       return result
@@ -1289,7 +1544,10 @@ FROM `tq_TaskQueues` t, `tq_Jobs` j WHERE "
     for prio in prioDict:
       tqList = ", ".join([str(tqId) for tqId in prioDict[prio]])
       updateSQL = "UPDATE `tq_TaskQueues` SET Priority=%.4f WHERE TQId in ( %s )" % (prio, tqList)
-      self._update(updateSQL, conn=connObj)
+      result = self._update(updateSQL, conn=connObj)
+      if result['OK'] and self.__matchIndex is not None:
+        for tqId in prioDict[prio]:
+          self.__matchIndex.setPriority(tqId, prio)
     return S_OK()
 
   @staticmethod
@@ -35,3 +35,23 @@ class JobDBTest(unittest.TestCase):
     print(result)
     self.assertTrue(result['OK'])
     self.assertEqual(result['Value'], ['/vo/user/lfn1', '/vo/user/lfn2'])
+
+  def test_getJobMatchBundles(self):
+    self.jobDB.jobAttributeNames = ['OwnerDN', 'OwnerGroup', 'Status']
+    self.jobDB._query.return_value = S_OK(((123, '/DN/user', 'user', 'Waiting', '[ Executable = "ls"; ]', 'a', '1'),
+                                           (123, '/DN/user', 'user', 'Waiting', '[ Executable = "ls"; ]', 'b', '2'),
+                                           (124, '/DN/user', 'user', 'Done', '[]', None, None)))
+    result = self.jobDB.getJobMatchBundles([123, 124])
+    self.assertTrue(result['OK'])
+    self.assertEqual(result['Value'][123], {'Attributes': {'OwnerDN': '/DN/user', 'OwnerGroup': 'user',
+                                                           'Status': 'Waiting'},
+                                            'JDL': '[ Executable = "ls"; ]',
+                                            'OptParameters': {'a': '1', 'b': '2'}})
+    self.assertEqual(result['Value'][124]['OptParameters'], {})
+
+    result = self.jobDB.getJobMatchBundle(125)
+    self.assertTrue(result['OK'])
+    self.assertEqual(result['Value'], {})
+
+    result = self.jobDB.getJobMatchBundles([123], ['NotAnAttribute'])
+    self.assertFalse(result['OK'])
@@ -0,0 +1,103 @@
+""" tests for the bulk matching of the TaskQueueDB module """
+
+# pylint: disable=protected-access, missing-docstring
+
+import re
+import unittest
+from mock import MagicMock, patch
+
+from DIRAC import S_OK, S_ERROR
+
+MODULE_NAME = "DIRAC.WorkloadManagementSystem.DB.TaskQueueDB"
+
+
+class TaskQueueDBTest(unittest.TestCase):
+
+  def setUp(self):
+
+    def mockInit(self):
+      self.log = MagicMock()
+      self.logger = MagicMock()
+      self._connected = True
+
+    from DIRAC.WorkloadManagementSystem.DB.TaskQueueDB import TaskQueueDB
+    with patch(MODULE_NAME + ".TaskQueueDB.__init__", new=mockInit):
+      self.tqDB = TaskQueueDB()
+    self.tqDB._TaskQueueDB__maxMatchRetry = 3
+    self.tqDB._TaskQueueDB__matchIndex = None
+    self.tqDB._TaskQueueDB__deleteTQWithDelay = MagicMock()
+    self.tqDB._checkMatchDefinition = MagicMock(return_value=S_OK())
+    self.tqDB._getConnection = MagicMock(return_value=S_OK('connection'))
+    self.tqDB._releaseConnection = MagicMock()
+    self.tqDB.transactionStart = MagicMock(return_value=S_OK())
+    self.tqDB.transactionCommit = MagicMock(return_value=S_OK())
+    self.tqDB.transactionRollback = MagicMock(return_value=S_OK())
+    self.tqDB._update = MagicMock(return_value=S_OK())
+    # Jobs still in the task queues, the others were taken by concurrent matches
+    self.queuedJobs = set([1, 2, 4])
+    self.tqDB._query = MagicMock(side_effect=self.query)
+
+  def query(self, sql, conn=False):
+    if 'RealPriority' in sql:
+      return S_OK(((5,),))
+    if 'FOR UPDATE' in sql:
+      jobIDs = [int(jobID) for jobID in re.search(r'IN \( ([\d, ]+) \)', sql).group(1).split(', ')]
+      return S_OK(tuple((jobID,) for jobID in jobIDs if jobID in self.queuedJobs))
+    if 'TQId = 10' in sql:
+      return S_OK(((1,), (2,)))
+    if 'TQId = 11' in sql:
+      return S_OK(((3,), (4,)))
+    return S_ERROR('Unexpected query %s' % sql)
+
+  def test_extractJobs(self):
+    result = self.tqDB._TaskQueueDB__extractJobs([1, 2, 3])
+    self.assertTrue(result['OK'])
+    self.assertEqual(result['Value'], [1, 2])
+    self.assertTrue('1, 2' in self.tqDB._update.call_args[0][0])
+    self.assertEqual(self.tqDB.transactionCommit.call_count, 1)
+
+    # Nothing to delete when all the jobs were taken
+    self.tqDB._update.reset_mock()
+    result = self.tqDB._TaskQueueDB__extractJobs([3])
+    self.assertTrue(result['OK'])
+    self.assertEqual(result['Value'], [])
+    self.tqDB._update.assert_not_called()
+
+    # The transaction is rolled back on error
+    self.tqDB._update.return_value = S_ERROR('Deadlock')
+    result = self.tqDB._TaskQueueDB__extractJobs([1])
+    self.assertFalse(result['OK'])
+    self.assertEqual(self.tqDB.transactionRollback.call_count, 1)
+
+  def test_matchAndGetJobs(self):
+    self.tqDB.matchAndGetTaskQueue = MagicMock(side_effect=[S_OK([(10, '/DN/user', 'user'),
+                                                                  (11, '/DN/user', 'user')]),
+                                                            S_OK([])])
+    result = self.tqDB.matchAndGetJobs({'Setup': 'aSetup'}, maxJobs=4)
+    self.assertTrue(result['OK'])
+    self.assertTrue(result['Value']['matchFound'])
+    # job 3 was taken by another match
+    self.assertEqual(sorted(result['Value']['jobs']), [(1, 10), (2, 10), (4, 11)])
+    self.assertEqual(self.tqDB.matchAndGetTaskQueue.call_count, 2)
+
+    # No more than maxJobs jobs are extracted
+    self.queuedJobs = set([1, 2, 3, 4])
+    self.tqDB.matchAndGetTaskQueue = MagicMock(return_value=S_OK([(10, '/DN/user', 'user'),
+                                                                  (11, '/DN/user', 'user')]))
+    result = self.tqDB.matchAndGetJobs({'Setup': 'aSetup'}, maxJobs=3)
+    self.assertTrue(result['OK'])
+    self.assertEqual(len(result['Value']['jobs']), 3)
+    self.assertEqual(self.tqDB.matchAndGetTaskQueue.call_count, 1)
+
+    # No match
+    self.tqDB.matchAndGetTaskQueue = MagicMock(return_value=S_OK([]))
+    result = self.tqDB.matchAndGetJobs({'Setup': 'aSetup'}, maxJobs=3)
+    self.assertTrue(result['OK'])
+    self.assertFalse(result['Value']['matchFound'])
+
+  def test_matchAndGetJobsSingle(self):
+    self.tqDB.matchAndGetJob = MagicMock(return_value=S_OK({'matchFound': True, 'jobId': 7, 'taskQueueId': 10,
+                                                            'tqMatch': {}}))
+    result = self.tqDB.matchAndGetJobs({'Setup': 'aSetup', 'JobID': 7}, maxJobs=3)
+    self.assertTrue(result['OK'])
+    self.assertEqual(result['Value']['jobs'], [(7, 10)])
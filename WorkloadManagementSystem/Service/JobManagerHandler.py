@@ -178,8 +178,27 @@ class JobManagerHandler(RequestHandler):
       initialStatus = JobStatus.RECEIVED
       initialMinorStatus = 'Job accepted'
 
-    for jobDescription in jobDescList:  # jobDescList because there might be a list generated by a parametric job
-      result = gJobDB.insertNewJobIntoDB(jobDescription,
+    if parametricJob:
+      # All the jobs of a parametric job are inserted with multi-row statements
+      result = gJobDB.insertNewJobsIntoDB(jobDescList,
+                                          self.owner,
+                                          self.ownerDN,
+                                          self.ownerGroup,
+                                          self.diracSetup,
+                                          initialStatus=initialStatus,
+                                          initialMinorStatus=initialMinorStatus)
+      if not result['OK']:
+        return result
+      jobsInfo = result['Value']
+      jobIDList = [jobInfo['JobID'] for jobInfo in jobsInfo]
+      self.log.info('Jobs added to the JobDB', "%d jobs for %s/%s" % (len(jobIDList), self.ownerDN, self.ownerGroup))
+
+      gJobLoggingDB.addLoggingRecords(jobIDList,
+                                      [jobInfo['Status'] for jobInfo in jobsInfo],
+                                      [jobInfo['MinorStatus'] for jobInfo in jobsInfo],
+                                      source='JobManager')
+    else:
+      result = gJobDB.insertNewJobIntoDB(jobDesc,
                                          self.owner,
                                          self.ownerDN,
                                          self.ownerGroup,
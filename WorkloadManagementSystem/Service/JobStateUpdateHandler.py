@@ -16,26 +16,36 @@ __RCSID__ = "$Id$"
 import time
 
 from DIRAC import S_OK, S_ERROR
-from DIRAC.Core.DISET.RequestHandler import RequestHandler
+from DIRAC.Core.DISET.RequestHandler import RequestHandler, getServiceOption
 from DIRAC.Core.Utilities import Time
+from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
 from DIRAC.WorkloadManagementSystem.DB.ElasticJobDB import ElasticJobDB
 from DIRAC.WorkloadManagementSystem.DB.JobLoggingDB import JobLoggingDB
 from DIRAC.WorkloadManagementSystem.Client import JobStatus
+from DIRAC.WorkloadManagementSystem.private.HeartBeatBuffer import HeartBeatBuffer
 
 # This is a global instance of the JobDB class
 jobDB = False
 logDB = False
 elasticJobDB = False
+heartBeatBuffer = None
 
 
 def initializeJobStateUpdateHandler(serviceInfo):
 
   global jobDB
   global logDB
+  global heartBeatBuffer
   jobDB = JobDB()
   logDB = JobLoggingDB()
+
+  # Heart beats are buffered and written in bulk if a flush period is defined
+  heartBeatFlushPeriod = getServiceOption(serviceInfo, 'HeartBeatFlushPeriod', 0)
+  if heartBeatFlushPeriod > 0:
+    heartBeatBuffer = HeartBeatBuffer(maxJobs=getServiceOption(serviceInfo, 'HeartBeatBufferSize', 50000))
+    gThreadScheduler.addPeriodicTask(heartBeatFlushPeriod, heartBeatBuffer.flush, taskArgs=(jobDB,))
   return S_OK()
 
 
@@ -111,13 +121,28 @@ class JobStateUpdateHandler(RequestHandler):
   types_setJobsStatus = [list]
 
   def export_setJobsStatus(self, jobIDs, status='', minorStatus='', source='Unknown', datetime=None):
-    """ Set the major and minor status for job specified by its JobId.
+    """ Set the major and minor status for the jobs specified by their JobIds.
         Set optionally the status date and source component which sends the
-        status information.
+        status information. The jobs are updated with grouped statements.
+
+        :return: S_OK( { 'Successful': { jobID: { 'Status', 'MinorStatus' } }, 'Failed': { jobID: error } } )
     """
-    for jobID in jobIDs:
-      self.__setJobStatus(int(jobID), status, minorStatus, source, datetime)
-    return S_OK()
+    jobIDs = [int(jobID) for jobID in jobIDs]
+    result = jobDB.setJobsStatus(jobIDs, status, minorStatus)
+    if not result['OK']:
+      return result
+    successful = result['Value']
+    failed = dict((jobID, 'Job %d does not exist' % jobID) for jobID in jobIDs if jobID not in successful)
+
+    updatedJobs = sorted(successful)
+    result = logDB.addLoggingRecords(updatedJobs,
+                                     [successful[jobID]['Status'] for jobID in updatedJobs],
+                                     [successful[jobID]['MinorStatus'] for jobID in updatedJobs],
+                                     date=datetime if datetime else '',
+                                     source=source)
+    if not result['OK']:
+      return result
+    return S_OK({'Successful': successful, 'Failed': failed})
 
   def __setJobStatus(self, jobID, status, minorStatus, source, datetime):
     """ update the job status. """
@@ -360,6 +385,13 @@ class JobStateUpdateHandler(RequestHandler):
     """ Send a heart beat sign of life for a job jobID
     """
 
+    # With the buffer, the heart beat data are written later and the job status restored then,
+    # the pending job commands are still returned right away. The heart beats of unknown jobs
+    # are not written by JobDB.setHeartBeatDataBulk
+    if heartBeatBuffer:
+      if heartBeatBuffer.add(int(jobID), staticData, dynamicData):
+        return self.__getJobCommands(int(jobID))
+
     result = jobDB.setHeartBeatData(int(jobID), staticData, dynamicData)
     if not result['OK']:
       self.log.warn('Failed to set the heart beat data', 'for job %d ' % int(jobID))
@@ -378,13 +410,18 @@ class JobStateUpdateHandler(RequestHandler):
      if not result['OK']:
        self.log.warn('Failed to restore the job status to Running')
 
+    return self.__getJobCommands(int(jobID))
+
+  def __getJobCommands(self, jobID):
+    """ Get the pending commands of a job and flag them as sent
+    """
     jobMessageDict = {}
-    result = jobDB.getJobCommand(int(jobID))
+    result = jobDB.getJobCommand(jobID)
     if result['OK']:
       jobMessageDict = result['Value']
 
     if jobMessageDict:
       for key, _value in jobMessageDict.items():
-        result = jobDB.setJobCommandStatus(int(jobID), key, 'Sent')
+        result = jobDB.setJobCommandStatus(jobID, key, 'Sent')
 
     return S_OK(jobMessageDict)
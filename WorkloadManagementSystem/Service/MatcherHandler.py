@@ -11,7 +11,7 @@ from DIRAC import gLogger, S_OK, S_ERROR
 
 from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
 from DIRAC.Core.Utilities.Decorators import deprecated
-from DIRAC.Core.DISET.RequestHandler import RequestHandler
+from DIRAC.Core.DISET.RequestHandler import RequestHandler, getServiceOption
 
 from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
 
@@ -20,12 +20,13 @@ from DIRAC.WorkloadManagementSystem.DB.TaskQueueDB import TaskQueueDB
 from DIRAC.WorkloadManagementSystem.DB.JobLoggingDB import JobLoggingDB
 from DIRAC.WorkloadManagementSystem.DB.PilotAgentsDB import PilotAgentsDB
 
-from DIRAC.WorkloadManagementSystem.Client.Matcher import Matcher
+from DIRAC.WorkloadManagementSystem.Client.Matcher import Matcher, WriteBehindQueue
 from DIRAC.WorkloadManagementSystem.Client.Limiter import Limiter
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 
 gJobDB = False
 gTaskQueueDB = False
+gWriteBehind = None
 
 
 def initializeMatcherHandler(serviceInfo):
@@ -36,6 +37,7 @@ def initializeMatcherHandler(serviceInfo):
   global gTaskQueueDB
   global jlDB
   global pilotAgentsDB
+  global gWriteBehind
 
   gJobDB = JobDB()
   gTaskQueueDB = TaskQueueDB()
@@ -55,6 +57,18 @@ def initializeMatcherHandler(serviceInfo):
   gThreadScheduler.addPeriodicTask(120, gTaskQueueDB.recalculateTQSharesForAll)
   gThreadScheduler.addPeriodicTask(60, sendNumTaskQueues)
 
+  writeBehindPeriod = getServiceOption(serviceInfo, 'WriteBehindPeriod', 0)
+  if writeBehindPeriod > 0:
+    gWriteBehind = WriteBehindQueue()
+    gThreadScheduler.addPeriodicTask(writeBehindPeriod, gWriteBehind.flush)
+
+  if getServiceOption(serviceInfo, 'UseMatchIndex', False):
+    result = gTaskQueueDB.enableMatchIndex()
+    if not result['OK']:
+      return result
+    gThreadScheduler.addPeriodicTask(getServiceOption(serviceInfo, 'MatchIndexRefreshPeriod', 30),
+                                     gTaskQueueDB.refreshMatchIndex)
+
   sendNumTaskQueues()
 
   return S_OK()
@@ -90,7 +104,8 @@ class MatcherHandler(RequestHandler):
                         jobDB=gJobDB,
                         tqDB=gTaskQueueDB,
                         jlDB=jlDB,
-                        opsHelper=opsHelper)
+                        opsHelper=opsHelper,
+                        writeBehind=gWriteBehind)
       result = matcher.selectJob(resourceDescription, credDict)
     except RuntimeError as rte:
       self.log.error("Error requesting job: ", rte)
@@ -104,6 +119,36 @@ class MatcherHandler(RequestHandler):
     # FIXME: This is correctly interpreted by the JobAgent, but DErrno should be used instead
     return S_ERROR("No match found")
 
+##############################################################################
+  types_requestJobs = [[basestring, dict], six.integer_types]
+
+  def export_requestJobs(self, resourceDescription, maxJobs):
+    """ Serve up to maxJobs jobs to the request of an agent, in one call.
+        Returns the list of matched jobs, possibly empty
+    """
+
+    resourceDescription['Setup'] = self.serviceInfoDict['clientSetup']
+    credDict = self.getRemoteCredentials()
+    maxJobs = max(1, min(maxJobs, getServiceOption(self.serviceInfoDict, 'MaxJobsPerMatch', 100)))
+
+    try:
+      opsHelper = Operations(group=credDict['group'])
+      matcher = Matcher(pilotAgentsDB=pilotAgentsDB,
+                        jobDB=gJobDB,
+                        tqDB=gTaskQueueDB,
+                        jlDB=jlDB,
+                        opsHelper=opsHelper,
+                        writeBehind=gWriteBehind)
+      result = matcher.selectJobs(resourceDescription, credDict, maxJobs)
+    except RuntimeError as rte:
+      self.log.error("Error requesting jobs: ", rte)
+      return S_ERROR("Error requesting jobs")
+
+    gMonitor.addMark("matchesDone")
+    if result:
+      gMonitor.addMark("matchesOK", len(result))
+    return S_OK(result)
+
 ##############################################################################
   types_getActiveTaskQueues = []
 
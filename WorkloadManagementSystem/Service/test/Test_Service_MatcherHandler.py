@@ -0,0 +1,56 @@
+""" Test of the bulk job requests of the Matcher service
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+from DIRAC import gLogger
+from DIRAC.WorkloadManagementSystem.Service.MatcherHandler import MatcherHandler
+
+MODULE = "DIRAC.WorkloadManagementSystem.Service.MatcherHandler"
+
+
+def makeHandler(mocker, maxJobsPerMatch=100):
+  """ MatcherHandler with a mocked Matcher, as set up for a call """
+  mocker.patch(MODULE + ".RequestHandler.__init__", return_value=None)
+  mocker.patch(MODULE + ".Operations")
+  mocker.patch(MODULE + ".gMonitor")
+  mocker.patch(MODULE + ".pilotAgentsDB", create=True)
+  mocker.patch(MODULE + ".jlDB", create=True)
+  mocker.patch(MODULE + ".getServiceOption", return_value=maxJobsPerMatch)
+  matcherMock = mocker.patch(MODULE + ".Matcher")
+  handler = MatcherHandler({}, None)
+  handler.serviceInfoDict = {'clientSetup': 'aSetup'}
+  handler.getRemoteCredentials = mocker.MagicMock(return_value={'DN': '/DN/pilot', 'group': 'pilot'})
+  handler.log = gLogger
+  return handler, matcherMock.return_value
+
+
+def test_requestJobs(mocker):
+  handler, matcher = makeHandler(mocker, maxJobsPerMatch=10)
+  matcher.selectJobs.return_value = [{'JobID': 1}, {'JobID': 2}]
+
+  result = handler.export_requestJobs({'Site': 'aSite'}, 5)
+  assert result['OK']
+  assert result['Value'] == [{'JobID': 1}, {'JobID': 2}]
+  assert matcher.selectJobs.call_args[0] == ({'Site': 'aSite', 'Setup': 'aSetup'},
+                                             {'DN': '/DN/pilot', 'group': 'pilot'}, 5)
+
+  # The number of jobs is bounded by MaxJobsPerMatch, and at least one job is requested
+  handler.export_requestJobs({'Site': 'aSite'}, 500)
+  assert matcher.selectJobs.call_args[0][2] == 10
+  handler.export_requestJobs({'Site': 'aSite'}, 0)
+  assert matcher.selectJobs.call_args[0][2] == 1
+
+  # No match is not an error
+  matcher.selectJobs.return_value = []
+  result = handler.export_requestJobs({'Site': 'aSite'}, 5)
+  assert result['OK']
+  assert result['Value'] == []
+
+
+def test_requestJobsError(mocker):
+  handler, matcher = makeHandler(mocker)
+  matcher.selectJobs.side_effect = RuntimeError('Could not retrieve job attributes')
+
+  result = handler.export_requestJobs({'Site': 'aSite'}, 5)
+  assert not result['OK']
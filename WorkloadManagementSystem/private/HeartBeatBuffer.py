@@ -0,0 +1,105 @@
+""" Buffer of the job heart beats received by the JobStateUpdate service.
+
+    Every running job sends a heart beat periodically, each one costing an UPDATE of
+    the Jobs table, a REPLACE into JobParameters and an INSERT into HeartBeatLoggingInfo.
+    The buffer coalesces the heart beats received during a time window: only the last
+    heart beat time and the last static data of each job are kept, while the dynamic data
+    are kept with their time stamps. The content is then written with a few bulk statements
+    by JobDB.setHeartBeatDataBulk.
+"""
+
+__RCSID__ = "$Id$"
+
+import threading
+
+from DIRAC import gLogger, S_OK
+from DIRAC.Core.Utilities import Time
+
+
+class HeartBeatBuffer(object):
+  """ Thread safe buffer of the heart beats, keyed by job ID
+  """
+
+  def __init__(self, maxJobs=50000):
+    """ c'tor
+
+        :param int maxJobs: maximum number of jobs with buffered heart beats,
+                            above it add() refuses new jobs
+    """
+    self.log = gLogger.getSubLogger("HeartBeatBuffer")
+    self.maxJobs = maxJobs
+    self.__lock = threading.Lock()
+    self.__heartBeats = {}
+
+  def __len__(self):
+    return len(self.__heartBeats)
+
+  def __contains__(self, jobID):
+    return jobID in self.__heartBeats
+
+  def add(self, jobID, staticData, dynamicData, heartBeatTime=None):
+    """ Buffer a heart beat
+
+        :param int jobID: job ID
+        :param dict staticData: static data, stored as job parameters
+        :param dict dynamicData: dynamic data, stored in the heart beat logging
+        :param str heartBeatTime: time of the heart beat, now by default
+        :return: True if the heart beat was buffered, False if the buffer is full
+    """
+    if not heartBeatTime:
+      heartBeatTime = Time.toString()
+    with self.__lock:
+      heartBeat = self.__heartBeats.get(jobID)
+      if heartBeat is None:
+        if len(self.__heartBeats) >= self.maxJobs:
+          return False
+        heartBeat = {'HeartBeatTime': heartBeatTime, 'StaticData': {}, 'DynamicData': []}
+        self.__heartBeats[jobID] = heartBeat
+      heartBeat['HeartBeatTime'] = max(heartBeat['HeartBeatTime'], heartBeatTime)
+      heartBeat['StaticData'].update(staticData)
+      heartBeat['DynamicData'].extend((key, value, heartBeatTime) for key, value in dynamicData.items())
+    return True
+
+  def pop(self):
+    """ Take out all the buffered heart beats
+
+        :return: dict { jobID: { 'HeartBeatTime': str, 'StaticData': dict, 'DynamicData': [ ( name, value, time ) ] } }
+    """
+    with self.__lock:
+      heartBeats = self.__heartBeats
+      self.__heartBeats = {}
+    return heartBeats
+
+  def restore(self, heartBeats):
+    """ Put back heart beats taken out with pop(), merging them with the ones received since.
+        They are kept even if the buffer is full
+
+        :param dict heartBeats: heart beats as returned by pop()
+    """
+    with self.__lock:
+      for jobID, heartBeat in heartBeats.items():
+        newHeartBeat = self.__heartBeats.get(jobID)
+        if newHeartBeat is not None:
+          heartBeat['HeartBeatTime'] = max(heartBeat['HeartBeatTime'], newHeartBeat['HeartBeatTime'])
+          heartBeat['StaticData'].update(newHeartBeat['StaticData'])
+          heartBeat['DynamicData'].extend(newHeartBeat['DynamicData'])
+        self.__heartBeats[jobID] = heartBeat
+
+  def flush(self, jobDB):
+    """ Write the buffered heart beats to the JobDB. If it fails, they are kept for the next flush
+
+        :param jobDB: JobDB instance
+        :return: S_OK( number of jobs flushed ) / S_ERROR
+    """
+    heartBeats = self.pop()
+    if not heartBeats:
+      return S_OK(0)
+    result = jobDB.setHeartBeatDataBulk(heartBeats)
+    if not result['OK']:
+      self.log.error("Failed to flush the heart beats", "of %d jobs: %s" % (len(heartBeats), result['Message']))
+      self.restore(heartBeats)
+      return result
+    if result['Value']:
+      self.log.warn("Heart beats of unknown jobs ignored", ', '.join(str(jobID) for jobID in result['Value']))
+    self.log.verbose("Heart beats flushed", "for %d jobs" % len(heartBeats))
+    return S_OK(len(heartBeats))
@@ -0,0 +1,315 @@
+""" In-memory mirror of the task queue definitions, used to pick candidate
+    task queues for a resource without going to the database.
+
+    The task queue definitions (owner, setup, CPU segment and the multi value
+    fields such as sites, tags or platforms) never change once a task queue is
+    created, only its priority does. This allows to keep them in plain dicts and
+    sets, indexed by value, and to reproduce in memory the matching logic of
+    TaskQueueDB.__generateTQMatchSQL. The database remains the authority for the
+    jobs themselves: only the job extraction is done there.
+"""
+
+__RCSID__ = "$Id$"
+
+import random
+import string
+import threading
+
+from DIRAC import gLogger, S_OK, S_ERROR
+from DIRAC.Core.Security import Properties
+from DIRAC.ConfigurationSystem.Client.Helpers import Registry
+
+# Matching field -> task queue definition field
+MULTI_VALUE_FIELDS = {'GridCE': 'GridCEs',
+                      'Site': 'Sites',
+                      'GridMiddleware': 'GridMiddlewares',
+                      'Platform': 'Platforms',
+                      'PilotType': 'PilotTypes',
+                      'SubmitPool': 'SubmitPools',
+                      'JobType': 'JobTypes',
+                      'Tag': 'Tags'}
+SINGLE_VALUE_FIELDS = ('OwnerDN', 'OwnerGroup', 'Setup', 'CPUTime')
+MATCH_ORDER = ('GridCE', 'Site', 'GridMiddleware', 'Platform', 'PilotType', 'SubmitPool', 'JobType', 'Tag')
+
+
+def _toList(value):
+  """ Normalise a match value to a list
+  """
+  if value is None:
+    return []
+  if isinstance(value, (list, tuple, set)):
+    return list(value)
+  return [value]
+
+
+def _isAny(value):
+  """ True if the value (or any of the values) is the 'any' wildcard, as understood by the SQL matching
+  """
+  for val in _toList(value):
+    if ''.join(c for c in str(val) if c not in string.punctuation).lower() == 'any':
+      return True
+  return False
+
+
+class TaskQueueMatchIndex(object):
+  """ Dict and set based index of the task queue definitions
+  """
+
+  def __init__(self):
+    self.log = gLogger.getSubLogger("TaskQueueMatchIndex")
+    self.__lock = threading.Lock()
+    self.__tqs = {}
+    # Single value indexes
+    self.__bySetup = {}
+    self.__byOwner = {}
+    self.__byGroup = {}
+    # field -> value -> set( tqIds ), and field -> set( tqIds without any value for that field )
+    self.__byValue = dict((field, {}) for field in list(MULTI_VALUE_FIELDS.values()) + ['BannedSites'])
+    self.__withoutValue = dict((field, set()) for field in MULTI_VALUE_FIELDS.values())
+    self.__pending = set()
+
+  def __len__(self):
+    return len(self.__tqs)
+
+  def getTaskQueueIDs(self):
+    """ Get the set of task queues known to the index
+    """
+    with self.__lock:
+      return set(self.__tqs)
+
+  def getPendingTaskQueues(self):
+    """ Get and clear the task queues that have to be (re)loaded from the DB
+    """
+    with self.__lock:
+      pending = self.__pending
+      self.__pending = set()
+    return pending
+
+  def invalidate(self, tqId):
+    """ Mark a task queue as created/changed: it will be loaded at the next refresh
+    """
+    with self.__lock:
+      self.__pending.add(tqId)
+
+  def addTaskQueue(self, tqId, tqDef):
+    """ Add (or replace) a task queue definition
+
+        :param int tqId: task queue ID
+        :param dict tqDef: definition as returned by TaskQueueDB.getTaskQueueDefinitions
+    """
+    with self.__lock:
+      self.__remove(tqId)
+      self.__add(tqId, tqDef)
+
+  def removeTaskQueue(self, tqId):
+    """ Remove a task queue from the index
+    """
+    with self.__lock:
+      self.__pending.discard(tqId)
+      self.__remove(tqId)
+
+  def setPriority(self, tqId, priority):
+    """ Update the priority of a task queue
+    """
+    with self.__lock:
+      if tqId in self.__tqs:
+        self.__tqs[tqId]['Priority'] = float(priority)
+
+  def __add(self, tqId, tqDef):
+    entry = {'OwnerDN': tqDef['OwnerDN'],
+             'OwnerGroup': tqDef['OwnerGroup'],
+             'Setup': tqDef['Setup'],
+             'CPUTime': int(tqDef['CPUTime']),
+             'Priority': float(tqDef.get('Priority', 1))}
+    self.__bySetup.setdefault(entry['Setup'], set()).add(tqId)
+    self.__byOwner.setdefault((entry['OwnerDN'], entry['OwnerGroup']), set()).add(tqId)
+    self.__byGroup.setdefault(entry['OwnerGroup'], set()).add(tqId)
+    for field in self.__byValue:
+      values = frozenset(val for val in tqDef.get(field, []) if val.strip())
+      entry[field] = values
+      if not values and field in self.__withoutValue:
+        self.__withoutValue[field].add(tqId)
+      for value in values:
+        self.__byValue[field].setdefault(value, set()).add(tqId)
+    self.__tqs[tqId] = entry
+
+  def __remove(self, tqId):
+    entry = self.__tqs.pop(tqId, None)
+    if entry is None:
+      return
+    for index, key in ((self.__bySetup, entry['Setup']),
+                       (self.__byOwner, (entry['OwnerDN'], entry['OwnerGroup'])),
+                       (self.__byGroup, entry['OwnerGroup'])):
+      index[key].discard(tqId)
+      if not index[key]:
+        index.pop(key)
+    for field in self.__byValue:
+      self.__withoutValue.get(field, set()).discard(tqId)
+      for value in entry[field]:
+        self.__byValue[field][value].discard(tqId)
+        if not self.__byValue[field][value]:
+          self.__byValue[field].pop(value)
+
+  def __union(self, field, values):
+    result = set()
+    for value in values:
+      result |= self.__byValue[field].get(value, set())
+    return result
+
+  def match(self, tqMatchDict, numQueuesToGet=1, negativeCond=None):
+    """ Get the task queues matching a resource, ordered randomly according to their priority.
+        Same semantics as TaskQueueDB.matchAndGetTaskQueue, but the values must not be escaped
+
+        :param dict tqMatchDict: resource description
+        :param int numQueuesToGet: maximum number of task queues to return (0 for all)
+        :param negativeCond: dict or list of dicts of conditions the task queues must not fulfill
+        :return: S_OK( [ ( tqId, OwnerDN, OwnerGroup ) ] ) / S_ERROR
+    """
+    with self.__lock:
+      result = self.__match(tqMatchDict, negativeCond)
+      if not result['OK']:
+        return result
+      candidates = [(random.random() / max(self.__tqs[tqId]['Priority'], 1e-9), tqId) for tqId in result['Value']]
+      candidates.sort()
+      if numQueuesToGet:
+        candidates = candidates[:numQueuesToGet]
+      return S_OK([(tqId, self.__tqs[tqId]['OwnerDN'], self.__tqs[tqId]['OwnerGroup'])
+                   for _, tqId in candidates])
+
+  def __match(self, tqMatchDict, negativeCond):
+    """ Get the set of matching task queue IDs. The lock must be held
+    """
+    candidates = set(self.__tqs)
+
+    # Owners
+    if 'OwnerDN' in tqMatchDict and 'OwnerGroup' in tqMatchDict:
+      owners = set()
+      for group in _toList(tqMatchDict['OwnerGroup']):
+        if Properties.JOB_SHARING in Registry.getPropertiesForGroup(group):
+          owners |= self.__byGroup.get(group, set())
+        else:
+          for dn in _toList(tqMatchDict['OwnerDN']):
+            owners |= self.__byOwner.get((dn, group), set())
+      candidates &= owners
+    else:
+      if 'OwnerGroup' in tqMatchDict:
+        candidates &= set().union(*[self.__byGroup.get(group, set())
+                                    for group in _toList(tqMatchDict['OwnerGroup'])])
+      if 'OwnerDN' in tqMatchDict:
+        dns = set(_toList(tqMatchDict['OwnerDN']))
+        candidates = set(tqId for tqId in candidates if self.__tqs[tqId]['OwnerDN'] in dns)
+
+    if 'Setup' in tqMatchDict:
+      candidates &= set().union(*[self.__bySetup.get(setup, set()) for setup in _toList(tqMatchDict['Setup'])])
+    if 'CPUTime' in tqMatchDict and candidates:
+      cpuTime = max(int(cpu) for cpu in _toList(tqMatchDict['CPUTime']))
+      candidates = set(tqId for tqId in candidates if self.__tqs[tqId]['CPUTime'] <= cpuTime)
+
+    # Multi value fields
+    tags = None
+    if 'Tag' not in tqMatchDict and 'RequiredTag' not in tqMatchDict:
+      tags = []
+    elif 'Tag' in tqMatchDict:
+      tags = _toList(tqMatchDict['Tag'])
+    for field in MATCH_ORDER:
+      if not candidates:
+        break
+      tqField = MULTI_VALUE_FIELDS[field]
+      if field == 'Tag':
+        if tags is None or _isAny(tags):
+          continue
+        # All the TQ tags have to be provided by the resource
+        resourceTags = set(tags)
+        candidates = set(tqId for tqId in candidates if self.__tqs[tqId]['Tags'] <= resourceTags)
+        continue
+      values = tqMatchDict.get(field)
+      if not values or _isAny(values):
+        continue
+      values = _toList(values)
+      candidates &= (self.__withoutValue[tqField] | self.__union(tqField, values))
+      if field == 'Site':
+        # At least one of the sites must not be banned by the TQ
+        candidates = set(tqId for tqId in candidates
+                         if any(site not in self.__tqs[tqId]['BannedSites'] for site in values))
+
+    # Required tags
+    requiredTags = _toList(tqMatchDict.get('RequiredTag'))
+    if requiredTags and not _isAny(requiredTags):
+      if not set(requiredTags).issubset(set(tags or [])):
+        return S_ERROR('Wrong conditions')
+      requiredTags = set(requiredTags)
+      candidates = set(tqId for tqId in candidates if requiredTags <= self.__tqs[tqId]['Tags'])
+
+    # Resource banning
+    for field in MATCH_ORDER:
+      bannedValues = tqMatchDict.get("Banned%s" % field)
+      if not bannedValues or _isAny(bannedValues):
+        continue
+      tqField = MULTI_VALUE_FIELDS[field]
+      bannedValues = _toList(bannedValues)
+      candidates = set(tqId for tqId in candidates
+                       if any(value not in self.__tqs[tqId][tqField] for value in bannedValues))
+
+    if negativeCond:
+      if isinstance(negativeCond, dict):
+        negativeCond = [negativeCond]
+      elif not isinstance(negativeCond, (list, tuple)):
+        return S_ERROR("negativeCond has to be either a list or a dict or a tuple, and it's %s" % type(negativeCond))
+      candidates = set(tqId for tqId in candidates
+                       if any(self.__checkNotCond(self.__tqs[tqId], cond) for cond in negativeCond))
+
+    return S_OK(candidates)
+
+  @staticmethod
+  def __checkNotCond(entry, negativeCond):
+    """ Evaluate not( cond1 and cond2 ... ) for a task queue, see TaskQueueDB.__generateNotDictSQL
+    """
+    results = []
+    for field, values in negativeCond.items():
+      values = _toList(values)
+      if field in MULTI_VALUE_FIELDS:
+        results.append(all(value not in entry[MULTI_VALUE_FIELDS[field]] for value in values))
+      elif field in SINGLE_VALUE_FIELDS:
+        results.extend(value != entry[field] for value in values)
+    if not results:
+      return True
+    return any(results)
+
+  def load(self, tqDefs):
+    """ Replace the content of the index
+
+        :param dict tqDefs: { tqId : definition }
+    """
+    with self.__lock:
+      for tqId in list(self.__tqs):
+        self.__remove(tqId)
+      for tqId, tqDef in tqDefs.items():
+        self.__add(tqId, tqDef)
+      self.__pending -= set(tqDefs)
+    self.log.verbose("Loaded task queues in the match index", len(tqDefs))
+    return S_OK(len(tqDefs))
+
+  def sync(self, tqPriorities):
+    """ Synchronise the index with the list of existing task queues
+
+        :param dict tqPriorities: { tqId : priority } for all the task queues in the DB
+        :return: set of task queue IDs that are missing from the index and have to be loaded
+    """
+    with self.__lock:
+      for tqId in set(self.__tqs) - set(tqPriorities):
+        self.__remove(tqId)
+      for tqId, priority in tqPriorities.items():
+        if tqId in self.__tqs:
+          self.__tqs[tqId]['Priority'] = float(priority)
+      missing = (set(tqPriorities) - set(self.__tqs)) | (self.__pending & set(tqPriorities))
+      self.__pending -= missing
+    return missing
+
+  def getStats(self):
+    """ Get some numbers about the content of the index
+    """
+    with self.__lock:
+      stats = {'TaskQueues': len(self.__tqs), 'Pending': len(self.__pending)}
+      for field, index in self.__byValue.items():
+        stats['Distinct%s' % field] = len(index)
+    return stats
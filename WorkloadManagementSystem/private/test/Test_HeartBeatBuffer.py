@@ -0,0 +1,92 @@
+""" Test of the buffer of job heart beats
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+import unittest
+from mock import MagicMock
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.WorkloadManagementSystem.private.HeartBeatBuffer import HeartBeatBuffer
+
+
+class HeartBeatBufferTest(unittest.TestCase):
+
+  def setUp(self):
+    self.buffer = HeartBeatBuffer(maxJobs=2)
+
+  def test_coalesce(self):
+    self.assertTrue(self.buffer.add(1, {'Node': 'wn1'}, {'CPU': 1}, heartBeatTime='2020-01-01 10:00:00'))
+    self.assertTrue(self.buffer.add(1, {'Node': 'wn2'}, {'CPU': 2}, heartBeatTime='2020-01-01 10:05:00'))
+    self.assertTrue(self.buffer.add(2, {}, {}))
+    self.assertEqual(len(self.buffer), 2)
+
+    heartBeats = self.buffer.pop()
+    self.assertEqual(len(self.buffer), 0)
+    self.assertEqual(heartBeats[1]['HeartBeatTime'], '2020-01-01 10:05:00')
+    self.assertEqual(heartBeats[1]['StaticData'], {'Node': 'wn2'})
+    self.assertEqual(heartBeats[1]['DynamicData'], [('CPU', 1, '2020-01-01 10:00:00'),
+                                                    ('CPU', 2, '2020-01-01 10:05:00')])
+    self.assertEqual(heartBeats[2]['DynamicData'], [])
+
+  def test_full(self):
+    self.assertTrue(self.buffer.add(1, {}, {}))
+    self.assertTrue(self.buffer.add(2, {}, {}))
+    self.assertFalse(self.buffer.add(3, {}, {}))
+    # Jobs already in the buffer are still accepted
+    self.assertTrue(self.buffer.add(1, {}, {'Memory': 10}))
+
+  def test_flush(self):
+    jobDB = MagicMock()
+    jobDB.setHeartBeatDataBulk.return_value = S_OK([])
+    result = self.buffer.flush(jobDB)
+    self.assertTrue(result['OK'])
+    self.assertEqual(result['Value'], 0)
+    jobDB.setHeartBeatDataBulk.assert_not_called()
+
+    self.buffer.add(1, {}, {'CPU': 1})
+    result = self.buffer.flush(jobDB)
+    self.assertEqual(result['Value'], 1)
+    self.assertEqual(list(jobDB.setHeartBeatDataBulk.call_args[0][0]), [1])
+
+    # The heart beats are kept if they could not be written
+    jobDB.setHeartBeatDataBulk.return_value = S_ERROR('Boom')
+    self.buffer.add(1, {'Node': 'wn1'}, {'CPU': 1}, heartBeatTime='2020-01-01 10:00:00')
+    self.assertFalse(self.buffer.flush(jobDB)['OK'])
+    self.assertEqual(len(self.buffer), 1)
+    self.assertIn(1, self.buffer)
+
+    # and merged with the ones received since
+    jobDB.setHeartBeatDataBulk.return_value = S_OK([])
+    self.buffer.add(1, {'Node': 'wn2'}, {'CPU': 2}, heartBeatTime='2020-01-01 10:05:00')
+    self.assertEqual(self.buffer.flush(jobDB)['Value'], 1)
+    heartBeat = jobDB.setHeartBeatDataBulk.call_args[0][0][1]
+    self.assertEqual(heartBeat['HeartBeatTime'], '2020-01-01 10:05:00')
+    self.assertEqual(heartBeat['StaticData'], {'Node': 'wn2'})
+    self.assertEqual(heartBeat['DynamicData'], [('CPU', 1, '2020-01-01 10:00:00'),
+                                                ('CPU', 2, '2020-01-01 10:05:00')])
+    self.assertEqual(len(self.buffer), 0)
+
+    # The heart beats of unknown jobs are dropped
+    jobDB.setHeartBeatDataBulk.return_value = S_OK([2])
+    self.buffer.add(2, {}, {'CPU': 1})
+    self.assertEqual(self.buffer.flush(jobDB)['Value'], 1)
+    self.assertEqual(len(self.buffer), 0)
+
+  def test_restoreMerge(self):
+    self.buffer.add(1, {'Node': 'wn1'}, {'CPU': 1}, heartBeatTime='2020-01-01 10:00:00')
+    heartBeats = self.buffer.pop()
+    self.buffer.add(1, {'Node': 'wn2'}, {'CPU': 2}, heartBeatTime='2020-01-01 10:05:00')
+    self.buffer.add(2, {}, {})
+    # The restored heart beats are kept even if the buffer is full
+    self.buffer.restore({3: {'HeartBeatTime': '2020-01-01 09:00:00', 'StaticData': {}, 'DynamicData': []}})
+    self.buffer.restore(heartBeats)
+    self.assertEqual(len(self.buffer), 3)
+    heartBeats = self.buffer.pop()
+    self.assertEqual(heartBeats[1]['StaticData'], {'Node': 'wn2'})
+    self.assertEqual(len(heartBeats[1]['DynamicData']), 2)
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase(HeartBeatBufferTest)
+  unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,72 @@
+""" Test of the in-memory task queue match index
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+import unittest
+from mock import patch
+
+from DIRAC.WorkloadManagementSystem.private.TaskQueueMatchIndex import TaskQueueMatchIndex
+
+MODULE_NAME = "DIRAC.WorkloadManagementSystem.private.TaskQueueMatchIndex"
+
+TQ_DEFS = {1: {'OwnerDN': '/DN/user1', 'OwnerGroup': 'user', 'Setup': 'Prod', 'CPUTime': 3600, 'Priority': 1.},
+           2: {'OwnerDN': '/DN/user1', 'OwnerGroup': 'user', 'Setup': 'Prod', 'CPUTime': 86400, 'Priority': 1.,
+               'Sites': ['Site1', 'Site2']},
+           3: {'OwnerDN': '/DN/prod', 'OwnerGroup': 'prod', 'Setup': 'Prod', 'CPUTime': 3600, 'Priority': 1.,
+               'Tags': ['MultiProcessor'], 'BannedSites': ['Site1']},
+           4: {'OwnerDN': '/DN/prod', 'OwnerGroup': 'prod', 'Setup': 'Test', 'CPUTime': 3600, 'Priority': 1.,
+               'Platforms': ['x86_64-slc6']}}
+
+
+@patch(MODULE_NAME + ".Registry.getPropertiesForGroup", new=lambda group: [])
+class TaskQueueMatchIndexTest(unittest.TestCase):
+
+  def setUp(self):
+    self.index = TaskQueueMatchIndex()
+    self.index.load(dict((tqId, dict(tqDef)) for tqId, tqDef in TQ_DEFS.items()))
+
+  def _match(self, matchDict, negativeCond=None):
+    result = self.index.match(matchDict, numQueuesToGet=0, negativeCond=negativeCond)
+    self.assertTrue(result['OK'])
+    return sorted(tq[0] for tq in result['Value'])
+
+  def test_singleValues(self):
+    self.assertEqual(self._match({'Setup': 'Prod', 'CPUTime': 86400}), [1, 2])
+    self.assertEqual(self._match({'Setup': 'Prod', 'CPUTime': 3600}), [1])
+    self.assertEqual(self._match({'Setup': 'Test', 'CPUTime': 86400}), [4])
+    self.assertEqual(self._match({'Setup': 'Prod', 'CPUTime': 86400, 'OwnerGroup': 'user', 'OwnerDN': '/DN/prod'}),
+                     [])
+
+  def test_multiValues(self):
+    self.assertEqual(self._match({'Setup': 'Prod', 'CPUTime': 86400, 'Site': 'Site3'}), [1])
+    self.assertEqual(self._match({'Setup': 'Prod', 'CPUTime': 86400, 'Site': 'Site1', 'Tag': ['MultiProcessor']}),
+                     [1, 2])
+    self.assertEqual(self._match({'Setup': 'Prod', 'CPUTime': 86400, 'Site': 'Site2', 'Tag': ['MultiProcessor']}),
+                     [1, 2, 3])
+    self.assertEqual(self._match({'Setup': 'Prod', 'CPUTime': 86400, 'Site': 'ANY'}), [1, 2])
+    self.assertEqual(self._match({'Setup': 'Test', 'CPUTime': 86400, 'Platform': 'x86_64-slc7'}), [])
+
+  def test_requiredTags(self):
+    self.assertEqual(self._match({'Setup': 'Prod', 'CPUTime': 86400,
+                                  'Tag': ['MultiProcessor'], 'RequiredTag': ['MultiProcessor']}), [3])
+    result = self.index.match({'Setup': 'Prod', 'CPUTime': 86400, 'RequiredTag': ['MultiProcessor']})
+    self.assertFalse(result['OK'])
+
+  def test_negativeCond(self):
+    self.assertEqual(self._match({'Setup': 'Prod', 'CPUTime': 86400}, negativeCond={'Site': 'Site1'}), [1])
+    self.assertEqual(self._match({'Setup': 'Prod', 'CPUTime': 86400},
+                                 negativeCond={'OwnerGroup': ['user']}), [])
+
+  def test_incrementalUpdates(self):
+    self.index.removeTaskQueue(1)
+    self.assertEqual(self._match({'Setup': 'Prod', 'CPUTime': 86400}), [2])
+    self.index.addTaskQueue(5, {'OwnerDN': '/DN/user1', 'OwnerGroup': 'user', 'Setup': 'Prod', 'CPUTime': 60})
+    self.assertEqual(self._match({'Setup': 'Prod', 'CPUTime': 86400}), [2, 5])
+    self.assertEqual(self.index.sync({2: 1., 3: 2., 4: 1., 6: 1.}), set([6]))
+    self.assertEqual(self.index.getTaskQueueIDs(), set([2, 3, 4]))
+
+  def test_limit(self):
+    result = self.index.match({'Setup': 'Prod', 'CPUTime': 86400, 'Tag': ['MultiProcessor']}, numQueuesToGet=2)
+    self.assertTrue(result['OK'])
+    self.assertEqual(len(result['Value']), 2)
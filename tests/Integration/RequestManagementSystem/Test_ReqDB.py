@@ -10,12 +10,15 @@ from __future__ import print_function
 import unittest
 import sys
 import time
+import json
 
 from DIRAC.Core.Base.Script import parseCommandLine
 parseCommandLine()
 
 
 from DIRAC import gLogger
+from DIRAC.Core.Utilities import DErrno
+from DIRAC.Core.Utilities.DErrno import cmpError
 
 from DIRAC.RequestManagementSystem.Client.Request import Request
 from DIRAC.RequestManagementSystem.Client.Operation import Operation
@@ -219,6 +222,234 @@ class ReqDBMix(ReqDBTestCase):
     delete = db.deleteRequest(reqID)
     self.assertEqual(delete["OK"], True, delete['Message'] if 'Message' in delete else 'OK')
 
+  def test04Lease(self):
+    """ claimed requests are not given twice, until their lease expires """
+    db = RequestDB()
+
+    reqIDs = []
+    for i in xrange(3):
+      request = Request({"RequestName": "lease-%d" % i})
+      op = Operation({"Type": "RemoveReplica", "TargetSE": "CERN-USER"})
+      op += File({"LFN": "/a/b/c/lease-%d" % i})
+      request += op
+      put = db.putRequest(request)
+      self.assertEqual(put["OK"], True, put['Message'] if 'Message' in put else 'OK')
+      reqIDs.append(put['Value'])
+
+    time.sleep(1)
+
+    # an expired lease
+    first = db.claimRequests(1, leaseOwner='agent1', leaseTime=-10)
+    self.assertEqual(first["OK"], True, first['Message'] if 'Message' in first else 'OK')
+    self.assertEqual(len(first['Value']), 1)
+    self.assertTrue(first['LeaseOwner'].startswith('agent1#'))
+
+    second = db.claimRequests(10, leaseOwner='agent2')
+    self.assertEqual(second["OK"], True, second['Message'] if 'Message' in second else 'OK')
+    claimedIDs = set(req.RequestID for req in second['Value'])
+    # the request of which the lease expired is claimed again, with the two others
+    self.assertEqual(claimedIDs, set(reqIDs))
+
+    third = db.getBulkRequests(10, True, leaseOwner='agent3')
+    self.assertEqual(third["OK"], True, third['Message'] if 'Message' in third else 'OK')
+    self.assertEqual(third['Value'], {})
+
+    # a request put back can be claimed again
+    request = second['Value'][0]
+    put = db.putRequest(request)
+    self.assertEqual(put["OK"], True, put['Message'] if 'Message' in put else 'OK')
+    time.sleep(1)
+    fourth = db.getRequest(leaseOwner='agent3')
+    self.assertEqual(fourth["OK"], True, fourth['Message'] if 'Message' in fourth else 'OK')
+    self.assertEqual(fourth['Value'].RequestID, request.RequestID)
+
+    for reqID in reqIDs:
+      delete = db.deleteRequest(reqID)
+      self.assertEqual(delete["OK"], True, delete['Message'] if 'Message' in delete else 'OK')
+
+  def test05Changes(self):
+    """ only the changes of a request read from the DB are written back """
+    db = RequestDB()
+
+    request = Request({"RequestName": "changes"})
+    op = Operation({"Type": "RemoveReplica", "TargetSE": "CERN-USER"})
+    for i in xrange(5):
+      op += File({"LFN": "/a/b/c/changes-%d" % i})
+    request += op
+    put = db.putRequest(request)
+    self.assertEqual(put["OK"], True, put['Message'] if 'Message' in put else 'OK')
+    reqID = put['Value']
+
+    # as sent to and received from an agent
+    peek = db.peekRequest(reqID)
+    self.assertEqual(peek["OK"], True, peek['Message'] if 'Message' in peek else 'OK')
+    request = Request(peek['Value'].toJSON()['Value'])
+    request[0][1].Status = 'Done'
+    request[0][2].Attempt += 1
+    request = Request(request.toJSON()['Value'])
+    self.assertEqual(request[0][1]._getChangedAttributes(), ['Error', 'Status'])
+
+    put = db.putRequest(request)
+    self.assertEqual(put["OK"], True, put['Message'] if 'Message' in put else 'OK')
+
+    peek = db.peekRequest(reqID)
+    self.assertEqual(peek["OK"], True, peek['Message'] if 'Message' in peek else 'OK')
+    self.assertEqual([opFile.Status for opFile in peek['Value'][0]],
+                     ['Waiting', 'Done', 'Waiting', 'Waiting', 'Waiting'])
+    self.assertEqual(peek['Value'][0][2].Attempt, 1)
+
+    # the changes cannot touch the files of another request
+    otherRequest = Request({"RequestName": "otherChanges"})
+    otherOp = Operation({"Type": "RemoveReplica", "TargetSE": "CERN-USER"})
+    otherOp += File({"LFN": "/a/b/c/otherChanges"})
+    otherRequest += otherOp
+    put = db.putRequest(otherRequest)
+    self.assertEqual(put["OK"], True, put['Message'] if 'Message' in put else 'OK')
+    otherID = put['Value']
+    otherPeek = db.peekRequest(otherID)
+    self.assertEqual(otherPeek["OK"], True, otherPeek['Message'] if 'Message' in otherPeek else 'OK')
+
+    crafted = json.loads(peek['Value'].toJSON()['Value'])
+    crafted['Operations'][0]['Files'][0]['FileID'] = otherPeek['Value'][0][0].FileID
+    crafted['Operations'][0]['Files'][0]['OperationID'] = otherPeek['Value'][0].OperationID
+    request = Request(crafted)
+    request[0][0].Status = 'Done'
+    put = db.putRequest(request)
+    self.assertEqual(put["OK"], True, put['Message'] if 'Message' in put else 'OK')
+
+    otherPeek = db.peekRequest(otherID)
+    self.assertEqual(otherPeek["OK"], True, otherPeek['Message'] if 'Message' in otherPeek else 'OK')
+    self.assertEqual(otherPeek['Value'][0][0].Status, 'Waiting')
+
+    for requestID in (reqID, otherID):
+      delete = db.deleteRequest(requestID)
+      self.assertEqual(delete["OK"], True, delete['Message'] if 'Message' in delete else 'OK')
+
+  def test06Scheduling(self):
+    """ the requests of jobs are claimed before the older requests, and counted by class """
+    db = RequestDB()
+
+    reqIDs = []
+    for i, jobID in enumerate([0, 0, 123]):
+      request = Request({"RequestName": "scheduling-%d" % i, "JobID": jobID})
+      op = Operation({"Type": "RegisterFile" if jobID else "RemoveFile"})
+      op += File({"LFN": "/a/b/c/scheduling-%d" % i, "PFN": "/a/b/c/scheduling-%d" % i, "GUID": "1",
+                  "Checksum": "12345678", "ChecksumType": "ADLER32", "Size": 1})
+      request += op
+      put = db.putRequest(request)
+      self.assertEqual(put["OK"], True, put['Message'] if 'Message' in put else 'OK')
+      reqIDs.append(put['Value'])
+
+    time.sleep(1)
+
+    summary = db.getSchedulingSummary()
+    self.assertEqual(summary["OK"], True, summary['Message'] if 'Message' in summary else 'OK')
+    self.assertTrue(summary['Value']['RemoveFile']['Waiting'] >= 2)
+    self.assertTrue(summary['Value']['RegisterFile']['Priorities'].get(db.scheduler.jobPriority, 0) >= 1)
+
+    claimed = db.claimRequests(1, leaseOwner='agent1')
+    self.assertEqual(claimed["OK"], True, claimed['Message'] if 'Message' in claimed else 'OK')
+    self.assertEqual([req.RequestID for req in claimed['Value']], [reqIDs[2]])
+
+    for reqID in reqIDs:
+      delete = db.deleteRequest(reqID)
+      self.assertEqual(delete["OK"], True, delete['Message'] if 'Message' in delete else 'OK')
+
+  def test07StaleLease(self):
+    """ a request claimed again cannot be put back by its previous claimer, the leases are renewed """
+    db = RequestDB()
+
+    request = Request({"RequestName": "stale"})
+    op = Operation({"Type": "RemoveReplica", "TargetSE": "CERN-USER"})
+    op += File({"LFN": "/a/b/c/stale"})
+    request += op
+    put = db.putRequest(request)
+    self.assertEqual(put["OK"], True, put['Message'] if 'Message' in put else 'OK')
+    reqID = put['Value']
+
+    time.sleep(1)
+
+    # the lease of the first claimer expires, the request is claimed again
+    first = db.claimRequests(1, leaseOwner='agent1', leaseTime=-10)
+    self.assertEqual(first["OK"], True, first['Message'] if 'Message' in first else 'OK')
+    self.assertEqual(first['Value'][0].LeaseOwner, first['LeaseOwner'])
+    second = db.getRequest(leaseOwner='agent2')
+    self.assertEqual(second["OK"], True, second['Message'] if 'Message' in second else 'OK')
+    self.assertEqual(second['Value'].RequestID, reqID)
+
+    # the token travels with the JSON of the request
+    staleRequest = Request(first['Value'][0].toJSON()['Value'])
+    request = Request(second['Value'].toJSON()['Value'])
+
+    renewed = db.renewLeases({reqID: staleRequest.LeaseOwner})
+    self.assertEqual(renewed["OK"], True, renewed['Message'] if 'Message' in renewed else 'OK')
+    self.assertEqual(renewed['Value']['Successful'], {})
+    self.assertTrue(reqID in renewed['Value']['Failed'])
+    renewed = db.renewLeases({reqID: request.LeaseOwner})
+    self.assertEqual(renewed["OK"], True, renewed['Message'] if 'Message' in renewed else 'OK')
+    self.assertTrue(reqID in renewed['Value']['Successful'])
+
+    staleRequest[0][0].Status = 'Done'
+    put = db.putRequest(staleRequest)
+    self.assertEqual(put["OK"], False, 'Stale request put back')
+    self.assertTrue(cmpError(put, DErrno.ERMSLEASE))
+
+    put = db.putRequest(request)
+    self.assertEqual(put["OK"], True, put['Message'] if 'Message' in put else 'OK')
+    # the lease is released
+    put = db.putRequest(request)
+    self.assertEqual(put["OK"], False, 'Request put back twice with the same lease')
+
+    peek = db.peekRequest(reqID)
+    self.assertEqual(peek["OK"], True, peek['Message'] if 'Message' in peek else 'OK')
+    self.assertEqual(peek['Value'][0][0].Status, 'Waiting')
+
+    delete = db.deleteRequest(reqID)
+    self.assertEqual(delete["OK"], True, delete['Message'] if 'Message' in delete else 'OK')
+
+  def test08ConcurrentClaims(self):
+    """ a claimer gets other candidates when the requests it chose were taken by a concurrent claimer """
+    db = RequestDB()
+
+    reqIDs = []
+    for i in xrange(4):
+      request = Request({"RequestName": "concurrent-%d" % i})
+      op = Operation({"Type": "RemoveReplica", "TargetSE": "CERN-USER"})
+      op += File({"LFN": "/a/b/c/concurrent-%d" % i})
+      request += op
+      put = db.putRequest(request)
+      self.assertEqual(put["OK"], True, put['Message'] if 'Message' in put else 'OK')
+      reqIDs.append(put['Value'])
+
+    time.sleep(1)
+
+    # another claimer takes the chosen requests between the choice and the UPDATE
+    selectRequests = db.scheduler.selectRequests
+    concurrentClaims = []
+
+    def selectConcurrently(candidates, numberOfRequest):
+      requestIDs = selectRequests(candidates, numberOfRequest)
+      if not concurrentClaims:
+        concurrentClaims.append(None)
+        concurrentClaims.append(db.claimRequests(numberOfRequest, leaseOwner='agent1'))
+      return requestIDs
+
+    db.scheduler.selectRequests = selectConcurrently
+    claimed = db.claimRequests(2, leaseOwner='agent2')
+    db.scheduler.selectRequests = selectRequests
+    self.assertEqual(claimed["OK"], True, claimed['Message'] if 'Message' in claimed else 'OK')
+    concurrent = concurrentClaims[1]
+    self.assertEqual(concurrent["OK"], True, concurrent['Message'] if 'Message' in concurrent else 'OK')
+    claimedIDs = set(req.RequestID for req in claimed['Value'])
+    concurrentIDs = set(req.RequestID for req in concurrent['Value'])
+    self.assertEqual(len(claimedIDs), 2)
+    self.assertEqual(len(concurrentIDs), 2)
+    self.assertFalse(claimedIDs & concurrentIDs)
+
+    for reqID in reqIDs:
+      delete = db.deleteRequest(reqID)
+      self.assertEqual(delete["OK"], True, delete['Message'] if 'Message' in delete else 'OK')
+
 
 if __name__ == '__main__':
   suite = unittest.defaultTestLoader.loadTestsFromTestCase(ReqDBTestCase)
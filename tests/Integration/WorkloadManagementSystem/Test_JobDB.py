@@ -4,7 +4,7 @@
         python -m pytest -c ../pytest.ini  -vv tests/Integration/WorkloadManagementSystem/Test_JobDB.py
 """
 
-# pylint: disable=wrong-import-position
+# pylint: disable=wrong-import-position,protected-access
 
 from __future__ import print_function, absolute_import
 
@@ -15,7 +15,7 @@ __RCSID__ = "$Id$"
 from DIRAC.Core.Base.Script import parseCommandLine
 parseCommandLine()
 
-from DIRAC import gLogger
+from DIRAC import gLogger, S_ERROR
 from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
 
 jdl = """[
@@ -82,6 +82,66 @@ def test_insertAndRemoveJobIntoDB():
     assert res['OK'] is True
 
 
+def test_insertNewJobsIntoDB():
+
+  res = jobDB.insertNewJobsIntoDB([jdl] * 3, 'owner', '/DN/OF/owner', 'ownerGroup', 'someSetup',
+                                  initialStatus='Submitting', initialMinorStatus='Bulk transaction confirmation')
+  assert res['OK'] is True, str(res)
+  assert len(res['Value']) == 3
+  jobIDs = [jobInfo['JobID'] for jobInfo in res['Value']]
+  assert len(set(jobIDs)) == 3
+  for jobID in jobIDs:
+    res = jobDB.getJobAttributes(jobID, ['Status', 'MinorStatus', 'JobName'])
+    assert res['OK'] is True
+    assert res['Value'] == {'Status': 'Submitting', 'MinorStatus': 'Bulk transaction confirmation',
+                            'JobName': 'helloWorld'}
+    res = jobDB.getJobJDL(jobID)
+    assert res['OK'] is True
+    assert 'JobID = %d' % jobID in res['Value']
+
+  for jobID in jobIDs:
+    res = jobDB.removeJobFromDB(jobID)
+    assert res['OK'] is True
+
+
+def test_insertNewJobsIntoDBFailure(mocker):
+  """ the JDLs inserted are removed when the jobs can not be written """
+
+  res = jobDB._query("SELECT COUNT(*) FROM JobJDLs")
+  assert res['OK'] is True
+  nbJDLs = res['Value'][0][0]
+
+  mocker.patch.object(jobDB, '_transaction', return_value=S_ERROR('Transaction failed'))
+  res = jobDB.insertNewJobsIntoDB([jdl] * 3, 'owner', '/DN/OF/owner', 'ownerGroup', 'someSetup')
+  assert res['OK'] is False
+
+  res = jobDB._query("SELECT COUNT(*) FROM JobJDLs")
+  assert res['OK'] is True
+  assert res['Value'][0][0] == nbJDLs
+
+
+def test_setJobsStatus():
+
+  jobIDs = []
+  for _ in range(2):
+    res = jobDB.insertNewJobIntoDB(jdl, 'owner', '/DN/OF/owner', 'ownerGroup', 'someSetup')
+    assert res['OK'] is True
+    jobIDs.append(res['JobID'])
+
+  res = jobDB.setJobsStatus(jobIDs + [0], status='Done', minor='Execution Complete')
+  assert res['OK'] is True, str(res)
+  assert sorted(res['Value']) == sorted(jobIDs)
+  for jobID in jobIDs:
+    assert res['Value'][jobID] == {'Status': 'Done', 'MinorStatus': 'Execution Complete'}
+    res2 = jobDB.getJobAttributes(jobID, ['EndExecTime'])
+    assert res2['OK'] is True
+    assert res2['Value']['EndExecTime'] != 'None'
+
+  for jobID in jobIDs:
+    res = jobDB.removeJobFromDB(jobID)
+    assert res['OK'] is True
+
+
 def test_rescheduleJob():
 
   res = jobDB.insertNewJobIntoDB(jdl, 'owner', '/DN/OF/owner', 'ownerGroup', 'someSetup')
@@ -140,3 +200,37 @@ def test_heartBeatLogging():
   res = jobDB.getHeartBeatData(jobID)
   assert res['OK'] is True, str(res)
   assert not res['Value'], str(res)
+
+
+def test_heartBeatLoggingBulk():
+
+  res = jobDB.insertNewJobIntoDB(jdl, 'owner', '/DN/OF/owner', 'ownerGroup', 'someSetup')
+  assert res['OK'] is True
+  jobID = res['JobID']
+
+  res = jobDB.setJobStatus(jobID, status='Stalled')
+  assert res['OK'] is True
+  now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+  res = jobDB.setHeartBeatDataBulk({jobID: {'HeartBeatTime': now,
+                                            'StaticData': {'Node': 'wn1'},
+                                            'DynamicData': [('CPU', 2345, now), ('Memory', 5555, now)]},
+                                    jobID + 1000000: {'HeartBeatTime': now,
+                                                      'StaticData': {'Node': 'wn1'},
+                                                      'DynamicData': [('CPU', 2345, now)]}})
+  assert res['OK'] is True, str(res)
+  assert res['Value'] == [jobID + 1000000]
+  res = jobDB.getHeartBeatData(jobID + 1000000)
+  assert res['OK'] is True
+  assert not res['Value'], str(res)
+  res = jobDB.getJobAttributes(jobID, ['Status', 'HeartBeatTime'])
+  assert res['OK'] is True
+  assert res['Value'] == {'Status': 'Running', 'HeartBeatTime': now}
+  res = jobDB.getHeartBeatData(jobID)
+  assert res['OK'] is True
+  assert len(res['Value']) == 2, str(res)
+  res = jobDB.getJobParameter(jobID, 'Node')
+  assert res['OK'] is True
+  assert res['Value'] == 'wn1'
+
+  res = jobDB.removeJobFromDB(jobID)
+  assert res['OK'] is True
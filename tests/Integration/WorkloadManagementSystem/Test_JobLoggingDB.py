@@ -58,6 +58,23 @@ class JobLoggingCase(JobLoggingDBTestCase):
     self.jlogDB.deleteJob(1)
 
 
+  def test_bulkJobStatus(self):
+
+    result = self.jlogDB.addLoggingRecords([1, 2], status="testing",
+                                           minor=['minor 1', 'minor 2'],
+                                           source='Unittest')
+    self.assertTrue(result['OK'], result.get('Message'))
+    result = self.jlogDB.addLoggingRecords([1, 2], status="testing",
+                                           minor=['minor 1'],
+                                           source='Unittest')
+    self.assertFalse(result['OK'])
+
+    for jobID in (1, 2):
+      result = self.jlogDB.getJobLoggingInfo(jobID)
+      self.assertTrue(result['OK'], result.get('Message'))
+      self.assertEqual(result['Value'][-1][1], 'minor %d' % jobID)
+      self.jlogDB.deleteJob(jobID)
+
 if __name__ == '__main__':
   suite = unittest.defaultTestLoader.loadTestsFromTestCase(JobLoggingCase)
   testResult = unittest.TextTestRunner(verbosity=2).run(suite)
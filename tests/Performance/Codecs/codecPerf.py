@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+""" This script compares the codecs of the DISET messages, DEncode and BinEncode,
+    on payloads shaped like the replies of the DIRAC services.
+    It does not need any service: the payloads are generated, encoded and decoded
+    in memory, also by chunks for the BinEncode StreamDecoder, as done by the transports.
+    It prints, for each payload and codec, the encoded size and the best time out of
+    a few repetitions.
+
+    Tunable parameters:
+      * nbFiles: number of LFNs of the file catalog payloads
+      * nbJobs: number of jobs of the job monitoring payload
+      * repeat: number of repetitions of each measurement
+      * chunkSize: size of the chunks given to the StreamDecoder
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+import datetime
+
+from DIRAC.Core.Utilities import DEncode, BinEncode
+
+nbFiles = 50000
+nbJobs = 20000
+repeat = 3
+chunkSize = 16384
+
+
+def getReplicasPayload():
+  """ Reply of FileCatalog.getReplicas """
+  successful = {}
+  for i in xrange(nbFiles):
+    lfn = '/dirac/data/2018/RAW/%06d/file_%08d.raw' % (i / 1000, i)
+    successful[lfn] = {'CERN-RAW': 'root://eos.cern.ch//eos/dirac%s' % lfn,
+                       'IN2P3-RAW': 'srm://ccsrm.in2p3.fr/pnfs/in2p3.fr/data/dirac%s' % lfn}
+  return {'OK': True, 'Value': {'Successful': successful, 'Failed': {}}}
+
+
+def getFileMetadataPayload():
+  """ Reply of FileCatalog.getFileMetadata """
+  now = datetime.datetime.utcnow().replace(microsecond=0)
+  successful = {}
+  for i in xrange(nbFiles):
+    lfn = '/dirac/data/2018/RAW/%06d/file_%08d.raw' % (i / 1000, i)
+    successful[lfn] = {'Size': 3000000000 + i, 'Checksum': '%08x' % i, 'ChecksumType': 'Adler32',
+                       'GUID': '6A0F3C1E-%012d' % i, 'Status': 'AprioriGood', 'Mode': 509,
+                       'Owner': 'diracprod', 'OwnerGroup': 'dirac_prod', 'FileID': i,
+                       'CreationDate': now, 'ModificationDate': now}
+  return {'OK': True, 'Value': {'Successful': successful, 'Failed': {}}}
+
+
+def getJobsSummaryPayload():
+  """ Reply of JobMonitoring.getJobsSummary """
+  now = datetime.datetime.utcnow().replace(microsecond=0)
+  jobs = {}
+  for jobID in xrange(nbJobs):
+    jobs[jobID] = {'Status': 'Running', 'MinorStatus': 'Application', 'ApplicationStatus': 'step 2/3',
+                   'Site': 'LCG.CERN.cern', 'JobGroup': '00012345', 'JobName': 'job_%d' % jobID,
+                   'Owner': 'diracuser', 'OwnerGroup': 'dirac_user', 'JobType': 'User',
+                   'SubmissionTime': now, 'LastUpdateTime': now, 'HeartBeatTime': now,
+                   'RescheduleCounter': '0', 'UserPriority': '1'}
+  return {'OK': True, 'Value': jobs}
+
+
+def getLFNListPayload():
+  """ Arguments of a bulk call with a list of LFNs """
+  return [['/dirac/data/2018/RAW/%06d/file_%08d.raw' % (i / 1000, i) for i in xrange(nbFiles)]]
+
+
+def bestTime(func, *args):
+  """ Best time of the repetitions of a call """
+  times = []
+  for _ in xrange(repeat):
+    start = time.time()
+    func(*args)
+    times.append(time.time() - start)
+  return min(times)
+
+
+def streamDecode(encodedData):
+  """ Decode with the StreamDecoder, by chunks """
+  decoder = BinEncode.StreamDecoder()
+  for index in xrange(0, len(encodedData), chunkSize):
+    decoder.feed(encodedData[index:index + chunkSize])
+  return decoder.getValue()
+
+
+def main():
+  print("%-16s %-10s %12s %10s %10s %10s" % ('Payload', 'Codec', 'Size', 'Encode', 'Decode', 'Stream'))
+  for payloadName, payloadFunc in (('getReplicas', getReplicasPayload),
+                                   ('getFileMetadata', getFileMetadataPayload),
+                                   ('getJobsSummary', getJobsSummaryPayload),
+                                   ('LFN list', getLFNListPayload)):
+    payload = payloadFunc()
+    for codecName, codec in (('DEncode', DEncode), ('BinEncode', BinEncode)):
+      encodedData = codec.encode(payload)
+      if codec.decode(encodedData)[0] != payload:
+        print("%s does not decode %s properly" % (codecName, payloadName))
+        sys.exit(1)
+      encodeTime = bestTime(codec.encode, payload)
+      decodeTime = bestTime(codec.decode, encodedData)
+      streamTime = bestTime(streamDecode, encodedData) if codec is BinEncode else None
+      print("%-16s %-10s %12d %10.3f %10.3f %10s" % (payloadName, codecName, len(encodedData),
+                                                     encodeTime, decodeTime,
+                                                     '%.3f' % streamTime if streamTime is not None else '-'))
+
+
+if __name__ == "__main__":
+  main()
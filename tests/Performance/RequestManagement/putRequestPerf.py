@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+""" This script measures RequestDB.putRequest for requests of various sizes, when the request is
+    written back with the changes of its files (only the changed rows are updated) and entirely
+    (as done for the requests of which the changes are not known, e.g. sent by older clients).
+    It needs a RequestDB, as the integration tests: the requests it creates are deleted at the end.
+    It prints, for each number of files, the best time out of a few repetitions of both writes.
+
+    Tunable parameters:
+      * nbFilesList: numbers of files of the operation of the requests
+      * changedFraction: fraction of the files of which the status is changed before each write
+      * repeat: number of repetitions of each measurement
+"""
+
+# pylint: disable=wrong-import-position
+
+from __future__ import print_function
+
+import json
+import time
+
+from DIRAC.Core.Base.Script import parseCommandLine
+parseCommandLine()
+
+from DIRAC.RequestManagementSystem.Client.Request import Request
+from DIRAC.RequestManagementSystem.Client.Operation import Operation
+from DIRAC.RequestManagementSystem.Client.File import File
+from DIRAC.RequestManagementSystem.private.ChangeTracking import CHANGES_KEY
+from DIRAC.RequestManagementSystem.DB.RequestDB import RequestDB
+
+nbFilesList = [10, 100, 1000, 10000]
+changedFraction = 0.1
+repeat = 3
+
+
+def createRequest(db, nbFiles):
+  """ Insert a removal request of nbFiles files, and return its ID """
+  request = Request({"RequestName": "putRequestPerf-%d" % nbFiles})
+  operation = Operation({"Type": "RemoveReplica", "TargetSE": "CERN-USER"})
+  for i in xrange(nbFiles):
+    operation += File({"LFN": "/dirac/user/p/perf/%06d/file_%08d" % (i / 1000, i),
+                       "Checksum": "%08x" % i, "ChecksumType": "ADLER32", "Size": 1000000 + i})
+  request += operation
+  result = db.putRequest(request)
+  if not result['OK']:
+    raise RuntimeError(result['Message'])
+  return result['Value']
+
+
+def forgetChanges(jsonDict):
+  """ Drop the changes from the JSON of a request and of its operations and files """
+  jsonDict.pop(CHANGES_KEY, None)
+  for operationDict in jsonDict.get("Operations", []):
+    operationDict.pop(CHANGES_KEY, None)
+    for fileDict in operationDict.get("Files", []):
+      fileDict.pop(CHANGES_KEY, None)
+  return jsonDict
+
+
+def readRequest(db, requestID, withChanges):
+  """ The request as an agent gets it from the ReqManager, with some files executed """
+  request = db.peekRequest(requestID)
+  if not request['OK']:
+    raise RuntimeError(request['Message'])
+  request = Request(request['Value'].toJSON()['Value'])
+  operation = request[0]
+  nbChanged = max(1, int(len(operation) * changedFraction))
+  for opFile in operation:
+    if opFile.Status == "Waiting" and nbChanged:
+      opFile.Attempt += 1
+      opFile.Status = "Done"
+      nbChanged -= 1
+  jsonDict = json.loads(request.toJSON()['Value'])
+  if not withChanges:
+    forgetChanges(jsonDict)
+  # As received by the ReqManager
+  return Request(jsonDict)
+
+
+def timePut(db, requestID, withChanges):
+  """ Best time of putRequest """
+  best = None
+  for _i in xrange(repeat):
+    request = readRequest(db, requestID, withChanges)
+    start = time.time()
+    result = db.putRequest(request)
+    duration = time.time() - start
+    if not result['OK']:
+      raise RuntimeError(result['Message'])
+    best = duration if best is None else min(best, duration)
+  return best
+
+
+def main():
+  db = RequestDB()
+  print("%10s %15s %15s %10s" % ("Files", "Changes (s)", "Entire (s)", "Speedup"))
+  for nbFiles in nbFilesList:
+    requestID = createRequest(db, nbFiles)
+    try:
+      delta = timePut(db, requestID, True)
+      full = timePut(db, requestID, False)
+    finally:
+      db.deleteRequest(requestID)
+    print("%10d %15.4f %15.4f %10.1f" % (nbFiles, delta, full, full / delta if delta else 0.))
+
+
+if __name__ == "__main__":
+  main()